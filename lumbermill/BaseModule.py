@@ -2,12 +2,20 @@
 import os
 import sys
 import abc
+import time
+import itertools
 import logging
+import threading
 from functools import wraps
 
 from lumbermill.constants import LOGLEVEL_STRING_TO_LOGLEVEL_INT
 from lumbermill.utils.ConfigurationValidator import ConfigurationValidator
-from lumbermill.utils.DynamicValues import parseDynamicValue, mapDynamicValue
+from lumbermill.utils.Histogram import LogHistogram
+from lumbermill.utils.DynamicValues import parseDynamicValue, mapDynamicValue, compileFilter, compileFilterGroup
+from lumbermill.utils.Buffers import Buffer, BufferedQueue, PartitionedQueue
+from lumbermill.utils.RoutingIndex import RoutingIndex
+from lumbermill.utils.Tracing import getEventTracer, getTraceMetadata
+from lumbermill.utils.StatisticCollector import EVENTS_IN, EVENTS_OUT, EVENTS_DROPPED, EVENTS_ERRORED, countLostEvents
 
 
 class BaseModule:
@@ -36,6 +44,9 @@ class BaseModule:
     module_type = "generic"
     """ Set module type. """
     can_run_forked = True
+    processEvent = None
+    """ Modules that always emit exactly the one event they received can implement processEvent(event) and return
+    the event. This allows a fused module chain to call the module without the generator overhead of handleEvent. """
 
     def __init__(self, lumbermill):
         self.logger = logging.getLogger(self.__class__.__name__)
@@ -43,9 +54,20 @@ class BaseModule:
         self.receivers = {}
         self.configuration_data = {}
         self.input_filter = None
+        self.input_filter_string = None
         self.output_filters = {}
+        self.output_filter_strings = {}
+        self.routing_index = RoutingIndex()
+        self.receiver_filters = None
         self.process_id = os.getpid()
         self.is_configured = False
+        self.input_paused = False
+        self.input_resumed = threading.Event()
+        self.input_resumed.set()
+        # Events in, out, dropped and errored in this process, see countEvents.
+        self.event_counts = [0, 0, 0, 0]
+        # Handling and cpu time histograms of this process, see measureTimings.
+        self.timing_histograms = {}
 
     def configure(self, configuration=None):
         """
@@ -155,13 +177,16 @@ class BaseModule:
         filter: $(lumbermill.source_module) == 'TcpServer'
         converts to:
         lambda event : event.get('lumbermill.source_module', False) == 'TcpServer'
+        which will be compiled to a function using precompiled field accessors.
         """
         try:
-            event_filter = eval(filter_string)
+            event_filter = compileFilter(filter_string, globals())
         except:
             etype, evalue, etb = sys.exc_info()
             self.logger.error("Failed to compile filter: %s. Exception: %s, Error: %s." % (filter_string, etype, evalue))
             self.lumbermill.shutDown()
+        self.input_filter = event_filter
+        self.input_filter_string = filter_string
         # Wrap default receiveEvent method with filtered one.
         self.wrapReceiveEventWithFilter(event_filter, filter_string)
 
@@ -172,10 +197,13 @@ class BaseModule:
         filter: $(lumbermill.source_module) == 'TcpServer'
         converts to:
         lambda event : event.get('lumbermill.source_module', False) == 'TcpServer'
+        Simple equality and membership filters will also be added to the routing index.
         """
         try:
-            output_filter = eval(filter_string)
+            output_filter = compileFilter(filter_string, globals())
             self.output_filters[receiver_name] = output_filter
+            self.output_filter_strings[receiver_name] = filter_string
+            self.routing_index.addFilter(receiver_name, filter_string)
         except:
             etype, evalue, etb = sys.exc_info()
             self.logger.error("Failed to compile filter: %s. Exception: %s, Error: %s." % (filter_string, etype, evalue))
@@ -184,35 +212,122 @@ class BaseModule:
     def getFilteredReceivers(self, event):
         if not self.output_filters:
             return self.receivers
+        matching_receiver_names = self.routing_index.getMatchingReceiverNames(event) if self.routing_index else ()
         filterd_receivers = {}
         for receiver_name, receiver in self.receivers.items():
-            if receiver_name not in self.output_filters:
+            if receiver_name not in self.output_filters or receiver_name in matching_receiver_names:
                 filterd_receivers[receiver_name] = receiver
                 continue
+            if receiver_name in self.routing_index:
+                continue
             try:
                 # The filter needs the event variable to work correctly.
                 matched = self.output_filters[receiver_name](self.lumbermill, event)
             except:
                 etype, evalue, etb = sys.exc_info()
                 self.logger.warning("Output filter for %s failed. Exception: %s, Error: %s." % (receiver_name, etype, evalue))
-                print(event)
+                self.event_counts[EVENTS_ERRORED] += 1
+                countLostEvents('output_filter')
                 continue
             # If the filter succeeds, the data will be send to the receiver.
             if matched:
                 filterd_receivers[receiver_name] = receiver
         return filterd_receivers
 
+    def compileReceiverFilters(self):
+        """
+        Compile the output filters of this module and the input filters of its directly connected receivers into
+        filter groups. Subexpressions used in more than one of these filters will only be computed once per event.
+
+        Input filters of the receivers are evaluated after the common actions of this module were applied. So if
+        the module has common actions, the output and input filters are compiled into two separate groups.
+        This method is called by LumberMill after all modules have been connected.
+        """
+        # Filters in the routing index are evaluated via the index.
+        output_filter_names = [receiver_name for receiver_name in self.receivers if receiver_name in self.output_filter_strings and receiver_name not in self.routing_index]
+        input_filter_names = []
+        for receiver_name, receiver in self.receivers.items():
+            if (isinstance(receiver, BaseModule) and receiver.input_filter_string
+                    and type(receiver).receiveEvent is BaseModule.receiveEvent
+                    and type(receiver).receiveEvents is BaseModule.receiveEvents):
+                input_filter_names.append(receiver_name)
+        if len(output_filter_names) + len(input_filter_names) < 2:
+            self.receiver_filters = None
+            return
+        output_filters = [self.output_filter_strings[receiver_name] for receiver_name in output_filter_names]
+        input_filters = [self.receivers[receiver_name].input_filter_string for receiver_name in input_filter_names]
+        self.receiver_filters = {'output_filter_names': output_filter_names,
+                                 'input_filter_names': input_filter_names,
+                                 'output': compileFilterGroup(output_filters, globals()),
+                                 'input': compileFilterGroup(input_filters, globals()),
+                                 'combined': compileFilterGroup(output_filters + input_filters, globals())}
+
+    def getReceiverEvents(self, event, apply_common_actions=True):
+        """
+        Distribute an event to the receivers via the compiled receiver filters.
+
+        Returns a list of (receiver_name, event, input_filter_matched) tuples. input_filter_matched is None, if the
+        input filter of the receiver was not evaluated here.
+        """
+        receiver_filters = self.receiver_filters
+        output_filter_count = len(receiver_filters['output_filter_names'])
+        input_filter_results = None
+        if apply_common_actions and self.hasCommonActions():
+            output_filter_results = receiver_filters['output'](self.lumbermill, event) if output_filter_count else []
+        else:
+            results = receiver_filters['combined'](self.lumbermill, event)
+            output_filter_results = results[:output_filter_count]
+            input_filter_results = results[output_filter_count:]
+        if self.routing_index:
+            matching_receiver_names = self.routing_index.getMatchingReceiverNames(event)
+            receiver_names = [receiver_name for receiver_name in self.receivers if receiver_name not in self.routing_index or receiver_name in matching_receiver_names]
+        else:
+            receiver_names = list(self.receivers)
+        for receiver_name, matched in zip(receiver_filters['output_filter_names'], output_filter_results):
+            if isinstance(matched, Exception):
+                self.logger.warning("Output filter for %s failed. Exception: %s, Error: %s." % (receiver_name, type(matched), matched))
+                self.event_counts[EVENTS_ERRORED] += 1
+                countLostEvents('output_filter')
+                matched = False
+            if not matched:
+                receiver_names.remove(receiver_name)
+        if not receiver_names:
+            return []
+        if apply_common_actions:
+            event = self.commonActions(event)
+        if input_filter_results is None:
+            input_filter_results = receiver_filters['input'](self.lumbermill, event) if receiver_filters['input_filter_names'] else []
+        input_filter_matches = {}
+        for receiver_name, matched in zip(receiver_filters['input_filter_names'], input_filter_results):
+            if isinstance(matched, Exception):
+                receiver = self.receivers[receiver_name]
+                receiver.logger.warning("Filter <%s> failed. Exception: %s, Error: %s." % (receiver.input_filter_string, type(matched), matched))
+                receiver.event_counts[EVENTS_ERRORED] += 1
+                matched = False
+            input_filter_matches[receiver_name] = bool(matched)
+        # Clone the event for all additional receivers before the first receiver gets a chance to change it.
+        receiver_events = []
+        for receiver_name in receiver_names:
+            receiver_event = event if not receiver_events else event.clone()
+            receiver_events.append((receiver_name, receiver_event, input_filter_matches.get(receiver_name)))
+        return receiver_events
+
     def initAfterFork(self):
         """
-        Call startInterval on receiver buffered queue.
+        Call startInterval on receiver buffered queues and on the buffer of this module.
         This is done here since the buffer uses a thread to flush buffer in
         given intervals. The thread will not survive a fork of the main process.
         So we need to start this after the fork was executed.
         """
         self.process_id = os.getpid()
         for receiver_name, receiver in self.receivers.items():
-            if isinstance(receiver, BaseModule) and hasattr(receiver, 'put'):
+            if isinstance(receiver, (BufferedQueue, PartitionedQueue)):
                 receiver.startInterval()
+        if isinstance(getattr(self, 'buffer', None), Buffer):
+            self.buffer.startInterval()
+
+    def hasCommonActions(self):
+        return bool(self.add_fields or self.delete_fields or self.event_type or self.set_internal)
 
     def commonActions(self, event):
         #if not self.input_filter or self.input_filter_matched:
@@ -236,27 +351,143 @@ class BaseModule:
         return event
 
     def sendEvent(self, event, apply_common_actions=True):
+        if self.receiver_filters:
+            for receiver_name, receiver_event, input_filter_matched in self.getReceiverEvents(event, apply_common_actions):
+                receiver = self.receivers[receiver_name]
+                if input_filter_matched is None:
+                    if hasattr(receiver, 'receiveEvent'):
+                        receiver.receiveEvent(receiver_event)
+                    else:
+                        receiver.put(receiver_event)
+                elif input_filter_matched:
+                    receiver.receiveMatchedEvent(receiver_event)
+                else:
+                    # Common actions will only be applied if the filter for the module matched.
+                    receiver.sendEvent(receiver_event, apply_common_actions=False)
+            return
         receivers = self.receivers if not self.output_filters else self.getFilteredReceivers(event)
         if not receivers:
             return
         if(apply_common_actions):
             event = self.commonActions(event)
-        if len(receivers) > 1:
-            event_clone = event.copy()
-        copy_event = False
-        for receiver in receivers.values():
+        # Clone the event for all additional receivers before the first receiver gets a chance to change it.
+        # Clones are copy-on-write, so nested fields will only be copied if a receiver changes them.
+        events = [event]
+        for _ in range(len(receivers) - 1):
+            events.append(event.clone())
+        for receiver, receiver_event in zip(receivers.values(), events):
             self.logger.debug("Sending event from %s to %s" % (self, receiver))
             if hasattr(receiver, 'receiveEvent'):
-                receiver.receiveEvent(event if not copy_event else event_clone.copy())
+                receiver.receiveEvent(receiver_event)
             else:
-                receiver.put(event if not copy_event else event_clone.copy())
-            copy_event = True
+                receiver.put(receiver_event)
+
+    def sendEvents(self, events, apply_common_actions=True):
+        """
+        Send a batch of events to the receivers.
+
+        Receivers that provide a receiveEvents method will get all their events as one list.
+        """
+        if self.receiver_filters:
+            return self.sendEventsViaReceiverFilters(events, apply_common_actions)
+        receivers_events = {}
+        for event in events:
+            receivers = self.receivers if not self.output_filters else self.getFilteredReceivers(event)
+            if not receivers:
+                continue
+            if apply_common_actions:
+                event = self.commonActions(event)
+            # The receivers are called after all events have been distributed. So the clones for additional receivers
+            # are created before the first receiver gets a chance to change the event.
+            receiver_event = None
+            for receiver_name in receivers:
+                receiver_event = event if receiver_event is None else event.clone()
+                try:
+                    receivers_events[receiver_name].append(receiver_event)
+                except KeyError:
+                    receivers_events[receiver_name] = [receiver_event]
+        for receiver_name, receiver_events in receivers_events.items():
+            receiver = self.receivers[receiver_name]
+            self.logger.debug("Sending %s event(s) from %s to %s" % (len(receiver_events), self, receiver))
+            if hasattr(receiver, 'receiveEvents'):
+                receiver.receiveEvents(receiver_events)
+            elif hasattr(receiver, 'receiveEvent'):
+                for receiver_event in receiver_events:
+                    receiver.receiveEvent(receiver_event)
+            else:
+                for receiver_event in receiver_events:
+                    receiver.put(receiver_event)
+
+    def sendEventsViaReceiverFilters(self, events, apply_common_actions=True):
+        receivers_events = {}
+        for event in events:
+            for receiver_name, receiver_event, input_filter_matched in self.getReceiverEvents(event, apply_common_actions):
+                try:
+                    receivers_events[(receiver_name, input_filter_matched)].append(receiver_event)
+                except KeyError:
+                    receivers_events[(receiver_name, input_filter_matched)] = [receiver_event]
+        for (receiver_name, input_filter_matched), receiver_events in receivers_events.items():
+            receiver = self.receivers[receiver_name]
+            if input_filter_matched is None:
+                if hasattr(receiver, 'receiveEvents'):
+                    receiver.receiveEvents(receiver_events)
+                elif hasattr(receiver, 'receiveEvent'):
+                    for receiver_event in receiver_events:
+                        receiver.receiveEvent(receiver_event)
+                else:
+                    for receiver_event in receiver_events:
+                        receiver.put(receiver_event)
+            elif input_filter_matched:
+                receiver.receiveMatchedEvents(receiver_events)
+            else:
+                # Common actions will only be applied if the filter for the module matched.
+                receiver.sendEvents(receiver_events, apply_common_actions=False)
 
     def receiveEvent(self, event):
         for event in self.handleEvent(event):
             if event:
                 self.sendEvent(event)
 
+    def receiveMatchedEvent(self, event):
+        """
+        Receive an event whose input filter was already evaluated by the sending module and matched.
+        """
+        for event in self.handleEvent(event):
+            if event:
+                self.sendEvent(event)
+
+    def receiveMatchedEvents(self, events):
+        self.sendEvents(self.handleEvents(events))
+
+    def receiveEvents(self, events):
+        """
+        Receive a batch of events.
+
+        If an input filter is set, only matching events will be handled by this module. All other events will be
+        passed on unchanged.
+        """
+        if self.input_filter:
+            matched_events = []
+            unmatched_events = []
+            for event in events:
+                try:
+                    matched = self.input_filter(self.lumbermill, event)
+                except:
+                    etype, evalue, etb = sys.exc_info()
+                    self.logger.warning("Filter <%s> failed. Exception: %s, Error: %s." % (self.input_filter_string, etype, evalue))
+                    self.event_counts[EVENTS_ERRORED] += 1
+                    matched = False
+                if matched:
+                    matched_events.append(event)
+                else:
+                    unmatched_events.append(event)
+            if unmatched_events:
+                # Common actions will only be applied if the filter for the module matched.
+                self.sendEvents(unmatched_events, apply_common_actions=False)
+            events = matched_events
+        if events:
+            self.sendEvents(self.handleEvents(events))
+
     def wrapReceiveEventWithFilter(self, event_filter, filter_string):
         wrapped_func = self.receiveEvent
         @wraps(wrapped_func)
@@ -270,6 +501,7 @@ class BaseModule:
             except:
                 etype, evalue, etb = sys.exc_info()
                 self.logger.warning("Filter <%s> failed. Exception: %s, Error: %s." % (filter_string, etype, evalue))
+                self.event_counts[EVENTS_ERRORED] += 1
                 # Pass event to next module.
                 # Common actions will only be applied if the filter for the module matched.
                 self.sendEvent(event, apply_common_actions=False)
@@ -284,5 +516,300 @@ class BaseModule:
         """
         yield event
 
+    def handleEvents(self, events):
+        """
+        Process a batch of events.
+
+        The default implementation passes each event to handleEvent. Modules that can work on a whole batch
+        more efficiently may overwrite this method.
+
+        @param events: list of dictionaries
+        @return: list of dictionaries
+        """
+        handled_events = []
+        handle_event = self.handleEvent
+        for event in events:
+            for handled_event in handle_event(event):
+                if handled_event:
+                    handled_events.append(handled_event)
+        return handled_events
+
+    def hasCustomHandleEvents(self):
+        """
+        Return True if this module handles batches via its own handleEvents. Modules may overwrite the method in their
+        class or set it on the instance, e.g. in configure.
+        """
+        return getattr(self.handleEvents, '__func__', None) is not BaseModule.handleEvents
+
+    def wrapHandleMethods(self, before_event, after_event, before_batch, after_batch, before_step=None, after_step=None):
+        """
+        Call hooks around the handling of each event and each batch by this module. Only the methods of this instance
+        are wrapped, so modules without statistics, timings or tracing have no overhead.
+
+        before_event(event) is called before an event gets handled and returns a state. If the state is None, the
+        event is handled without further hooks. Otherwise after_event(state, emitted) is called once the module
+        handled the event, with the number of events it emitted or None if handling raised an exception.
+        before_step(state) and after_step(state) enclose each step of a handleEvent generator. The receivers of the
+        yielded events are called between the steps.
+        before_batch(events) and after_batch(state, events, handled_events) work the same way for modules with their
+        own handleEvents. handled_events is None if handling raised an exception.
+        """
+        if self.processEvent:
+            # These modules emit exactly the event processEvent returns, so handleEvent is based on the wrapped method.
+            # A custom handleEvents of these modules calls processEvent as well.
+            process_event = self.processEvent
+
+            def processEvent(event):
+                state = before_event(event)
+                if state is None:
+                    return process_event(event)
+                emitted = None
+                if before_step:
+                    before_step(state)
+                try:
+                    event = process_event(event)
+                    emitted = 1 if event else 0
+                    return event
+                finally:
+                    if after_step:
+                        after_step(state)
+                    after_event(state, emitted)
+            self.processEvent = processEvent
+
+            def handleEvent(event):
+                yield processEvent(event)
+            self.handleEvent = handleEvent
+            return
+        handle_event = self.handleEvent
+
+        def wrappedHandleEvent(event, state):
+            emitted = 0
+            try:
+                handled_events = iter(handle_event(event))
+                while True:
+                    if before_step:
+                        before_step(state)
+                    try:
+                        handled_event = next(handled_events)
+                    except StopIteration:
+                        break
+                    finally:
+                        if after_step:
+                            after_step(state)
+                    if handled_event:
+                        emitted += 1
+                    yield handled_event
+            except Exception:
+                after_event(state, None)
+                raise
+            after_event(state, emitted)
+
+        def handleEvent(event):
+            state = before_event(event)
+            if state is None:
+                return handle_event(event)
+            return wrappedHandleEvent(event, state)
+        self.handleEvent = handleEvent
+        if self.hasCustomHandleEvents():
+            # The default handleEvents calls the wrapped handleEvent, so only custom batch methods need to be wrapped.
+            handle_events = self.handleEvents
+
+            def handleEvents(events):
+                state = before_batch(events)
+                if state is None:
+                    return handle_events(events)
+                try:
+                    handled_events = [handled_event for handled_event in handle_events(events) if handled_event]
+                except Exception:
+                    after_batch(state, events, None)
+                    raise
+                after_batch(state, events, handled_events)
+                return handled_events
+            self.handleEvents = handleEvents
+
+    def countEvents(self):
+        """
+        Count the events this module handles in event_counts: events in, events out, events that did not result in
+        an output event (dropped) and events whose handling raised an exception (errored).
+        LumberMill publishes the counts to the SharedMemoryStatisticCollector. Output modules do not emit events, so
+        for these, only events in and errored are counted.
+        """
+        event_counts = self.event_counts
+        count_emitted = self.module_type != 'output'
+
+        def beforeEvent(event):
+            event_counts[EVENTS_IN] += 1
+            return True
+
+        def afterEvent(state, emitted):
+            if emitted is None:
+                event_counts[EVENTS_ERRORED] += 1
+            elif count_emitted:
+                event_counts[EVENTS_OUT] += emitted
+                if not emitted:
+                    event_counts[EVENTS_DROPPED] += 1
+
+        def beforeBatch(events):
+            event_counts[EVENTS_IN] += len(events)
+            return True
+
+        def afterBatch(state, events, handled_events):
+            if handled_events is None:
+                event_counts[EVENTS_ERRORED] += len(events)
+            elif count_emitted:
+                event_counts[EVENTS_OUT] += len(handled_events)
+                event_counts[EVENTS_DROPPED] += max(len(events) - len(handled_events), 0)
+        self.wrapHandleMethods(beforeEvent, afterEvent, beforeBatch, afterBatch)
+
+    def measureTimings(self, sample_interval=64):
+        """
+        Measure the wall clock and the thread cpu time this module needs to handle an event.
+        Only every sample_interval-th call is measured, the others are passed to the handle methods directly. A
+        measured value is counted sample_interval times, so counts and sums of the histograms estimate all events.
+        The time a module spends in a handleEvent generator is only measured while the generator runs. So the time
+        spent by the modules receiving the yielded events is not included.
+        LumberMill publishes the histograms to the SharedMemoryStatisticCollector.
+        """
+        handling_time = self.timing_histograms['handling_time'] = LogHistogram()
+        cpu_time = self.timing_histograms['cpu_time'] = LogHistogram()
+        calls = itertools.count(1)
+
+        def beforeEvent(event):
+            if next(calls) % sample_interval:
+                return None
+            # Handling seconds, cpu seconds and the start times of the current step.
+            return [0, 0, 0, 0]
+
+        def beforeStep(state):
+            state[2] = time.perf_counter()
+            state[3] = time.thread_time()
+
+        def afterStep(state):
+            state[0] += time.perf_counter() - state[2]
+            state[1] += time.thread_time() - state[3]
+
+        def afterEvent(state, emitted):
+            handling_time.add(state[0], sample_interval)
+            cpu_time.add(state[1], sample_interval)
+
+        def beforeBatch(events):
+            if next(calls) % sample_interval or not events:
+                return None
+            return time.perf_counter(), time.thread_time()
+
+        def afterBatch(state, events, handled_events):
+            started, cpu_started = state
+            # Spread the time of the batch evenly over its events.
+            handling_time.add((time.perf_counter() - started) / len(events), len(events) * sample_interval)
+            cpu_time.add((time.thread_time() - cpu_started) / len(events), len(events) * sample_interval)
+        self.wrapHandleMethods(beforeEvent, afterEvent, beforeBatch, afterBatch, beforeStep, afterStep)
+
+    def traceEvents(self, module_id, sample_interval):
+        """
+        Record spans for events marked for tracing, see EventTracer. Input modules mark every sample_interval-th
+        event they send.
+        The span of an event includes the time of receivers called between the steps of a handleEvent generator. The
+        time spent in the module itself is added as self_time_ms.
+        """
+        tracer = getEventTracer()
+        if self.module_type == 'input':
+            self.markEventsForTracing(module_id, sample_interval)
+
+        def beforeEvent(event):
+            trace_metadata = getTraceMetadata(event)
+            if trace_metadata is None:
+                return None
+            started = time.time()
+            tracer.addQueueSpan(module_id, trace_metadata, started)
+            # Trace metadata, start time, self time and the start time of the current step.
+            return [trace_metadata, started, 0, 0]
+
+        def beforeStep(state):
+            state[3] = time.time()
+
+        def afterStep(state):
+            state[2] += time.time() - state[3]
+
+        def afterEvent(state, emitted):
+            trace_metadata, started, self_time, _ = state
+            tracer.addSpan(module_id, trace_metadata['trace_id'], started, time.time() - started, args={'self_time_ms': self_time * 1000})
+
+        def beforeBatch(events):
+            traces_metadata = [trace_metadata for trace_metadata in map(getTraceMetadata, events) if trace_metadata is not None]
+            if not traces_metadata:
+                return None
+            started = time.time()
+            for trace_metadata in traces_metadata:
+                tracer.addQueueSpan(module_id, trace_metadata, started)
+            return traces_metadata, started
+
+        def afterBatch(state, events, handled_events):
+            traces_metadata, started = state
+            duration = time.time() - started
+            for trace_metadata in traces_metadata:
+                tracer.addSpan(module_id, trace_metadata['trace_id'], started, duration, args={'batch_size': len(events)})
+        self.wrapHandleMethods(beforeEvent, afterEvent, beforeBatch, afterBatch, beforeStep, afterStep)
+
+    def markEventsForTracing(self, module_id, sample_interval):
+        tracer = getEventTracer()
+        calls = itertools.count(1)
+        send_event = self.sendEvent
+        send_events = self.sendEvents
+
+        def markEvent(event):
+            trace_id = tracer.createTraceId()
+            event['lumbermill']['trace_id'] = trace_id
+            tracer.addMark(module_id, trace_id, time.time())
+
+        def sendEvent(event, apply_common_actions=True):
+            if not next(calls) % sample_interval:
+                markEvent(event)
+            send_event(event, apply_common_actions)
+
+        def sendEvents(events, apply_common_actions=True):
+            for event in events:
+                if not next(calls) % sample_interval:
+                    markEvent(event)
+            send_events(events, apply_common_actions)
+        self.sendEvent = sendEvent
+        self.sendEvents = sendEvents
+
+    def pauseInput(self):
+        """
+        Called by Backpressure while the pipeline is congested. Input modules should stop reading new data until
+        resumeInput is called. Polling inputs can simply call waitWhilePaused before each poll.
+        """
+        self.input_paused = True
+        self.input_resumed.clear()
+
+    def resumeInput(self):
+        self.input_paused = False
+        self.input_resumed.set()
+
+    def waitWhilePaused(self):
+        while self.input_paused and getattr(self, 'alive', True):
+            self.input_resumed.wait(1)
+
+    def getPendingEventCount(self):
+        """
+        Return the number of events this module holds in the current process without having handed them on yet.
+
+        LumberMill drains the pipeline on shutdown until all modules report zero, see PipelineDrain. Events held in
+        self.buffer are counted by default. Modules keeping events elsewhere, e.g. in a lookup queue, should
+        overwrite this together with flushPendingEvents.
+        """
+        if isinstance(getattr(self, 'buffer', None), Buffer):
+            return self.buffer.bufsize()
+        return 0
+
+    def flushPendingEvents(self, timeout=None):
+        """
+        Hand the events this module holds on to the receivers or the backend. Wait at most timeout seconds.
+        """
+        if isinstance(getattr(self, 'buffer', None), Buffer):
+            self.buffer.flush(timeout)
+
     def shutDown(self):
         self.alive = False
+        if isinstance(getattr(self, 'buffer', None), Buffer):
+            self.buffer.stop()
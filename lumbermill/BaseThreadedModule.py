@@ -18,6 +18,9 @@ class BaseThreadedModule(BaseModule.BaseModule, threading.Thread):
     If you happen to override one of the methods defined here, be sure to know what you
     are doing ;) You have been warned...
 
+    partition_by: When running with multiple workers, events with the same value in this field will always be
+                  handled by the same worker. Stateful modules can then keep their per key state locally.
+
     Configuration template:
 
     - module: SomeModuleName
@@ -29,6 +32,7 @@ class BaseThreadedModule(BaseModule.BaseModule, threading.Thread):
        set_internal:                     # <default: {}; type: dict; is: optional>
        log_level:                        # <default: 'info'; type: string; values: ['info', 'warn', 'error', 'critical', 'fatal', 'debug']; is: optional>
        queue_size:                       # <default: 20; type: integer; is: optional>
+       partition_by:                     # <default: None; type: None||string; is: optional>
        receivers:
         - ModuleName
         - ModuleAlias
@@ -40,6 +44,8 @@ class BaseThreadedModule(BaseModule.BaseModule, threading.Thread):
         self.input_queue = False
         self.alive = True
         self.daemon = True
+        # Events taken from the input queue, that are still being handled.
+        self.handled_event_count = 0
 
     def setInputQueue(self, queue):
         self.input_queue = queue
@@ -68,7 +74,12 @@ class BaseThreadedModule(BaseModule.BaseModule, threading.Thread):
                 self.logger.error("Shutting down module %s since no receivers are set." % (self.__class__.__name__))
                 return
         while self.alive:
-            for event in self.pollQueue():
-                if not event:
-                    continue
-                self.receiveEvent(event)
+            # BufferedQueue delivers events in batches. Pass these on as a whole.
+            events = [event for event in self.pollQueue() if event]
+            if events:
+                self.handled_event_count = len(events)
+                self.receiveEvents(events)
+                self.handled_event_count = 0
+
+    def getPendingEventCount(self):
+        return self.handled_event_count + BaseModule.BaseModule.getPendingEventCount(self)
@@ -1,12 +1,16 @@
 #!/usr/bin/env python3
 # -*- coding: UTF-8 -*-
+import copy
 import getopt
 import logging.config
 import multiprocessing
 import os
 import signal
+import socket
 import sys
 import time
+import tempfile
+import threading
 
 from collections import OrderedDict
 
@@ -29,12 +33,25 @@ module_dirs = ['input',
 #    print('Usage: %s -m %s -c <path/to/config.conf>' % (sys.executable, os.path.splitext(sys.argv[0])[0]))
 #    sys.exit()
 
-from lumbermill.constants import MSGPACK_AVAILABLE, ZMQ_AVAILABLE, LOGLEVEL_STRING_TO_LOGLEVEL_INT
-from lumbermill.utils.misc import TimedFunctionManager, coloredConsoleLogging, restartMainProcess
-from lumbermill.utils.Buffers import BufferedQueue, ZeroMqMpQueue
-from lumbermill.utils.DictUtils import mergeNestedDicts
+from lumbermill.constants import LOGLEVEL_STRING_TO_LOGLEVEL_INT
+from lumbermill.utils.misc import TimedFunctionManager, coloredConsoleLogging, restartMainProcess, startMainProcess
+from lumbermill.utils.Backpressure import getBackpressure
+from lumbermill.utils.Buffers import Buffer, BufferedQueue, PartitionedQueue, IPC_TRANSPORTS, produceIpcQueue
+from lumbermill.utils.DictUtils import mergeNestedDicts, setEventIdStrategy
 from lumbermill.utils.ConfigurationValidator import ConfigurationValidator
+from lumbermill.utils.ConfigurationDiff import getModuleDefinitions, getReceiverNames, diffModuleDefinitions
 from lumbermill.utils.MultiProcessDataStore import MultiProcessDataStore
+from lumbermill.utils.StatisticCollector import SharedMemoryStatisticCollector, MODULE_EVENT_COUNTERS, countLostEvents
+from lumbermill.utils.Decorators import setInterval
+from lumbermill.utils.Histogram import LogHistogram
+from lumbermill.utils.Profiler import SamplingProfiler, getStartupProfiler
+from lumbermill.utils.ModuleRegistry import ModuleRegistry
+from lumbermill.utils.SocketHandoff import getSocketHandoff, HANDOFF_PATH_ENVIRONMENT_VARIABLE
+from lumbermill.utils.Tracing import getEventTracer
+from lumbermill.utils.ModuleFusion import isFusable, getModuleChain, fuseModuleChain, unfuseModuleChain
+from lumbermill.utils.IpcBenchmark import benchmarkIpcTransports, getRecommendedIpcTransport
+from lumbermill.utils.PipelineBenchmark import runBenchmarkSuite
+from lumbermill.utils.PipelineDrain import PipelineDrain, getTopologicalOrder
 
 try:
     import Queue
@@ -48,6 +65,10 @@ except ImportError:
 #import nest_asyncio
 #nest_asyncio.apply()
 
+class ReloadError(Exception):
+    """Raised if a new configuration can not be applied to the running modules."""
+    pass
+
 class LumberMill():
     """
     A stream parser with configurable modules and message paths.
@@ -65,38 +86,64 @@ class LumberMill():
         self.alive = False
         self.child_processes = []
         self.main_process_pid = os.getpid()
+        self.worker_index = 0
         self.modules = OrderedDict()
         self.internal_datastore = MultiProcessDataStore()
+        self.profiler = None
+        self.reloading = False
+        self.io_loop = None
+        self.socket_handoff_monitor = None
+        self.global_configuration_section = {}
         self.global_configuration = {'workers': multiprocessing.cpu_count() - 1,
                                      'queue_size': 20,
                                      'queue_buffer_size': 50,
+                                     'ipc_transport': 'multiprocessing',
+                                     'pipeline_fusion': True,
+                                     'event_id_strategy': 'random',
+                                     'module_statistics': False,
+                                     'module_timings': False,
+                                     'tracing': {'sample_interval': 0,
+                                                 'max_spans': 100000,
+                                                 'path': tempfile.gettempdir()},
+                                     'profiler': {'duration': 30,
+                                                  'interval': .01,
+                                                  'path': tempfile.gettempdir()},
+                                     'backpressure': {'high_water_mark': .8,
+                                                      'low_water_mark': .5},
+                                     'drain': {'timeout': 10},
+                                     'socket_handoff': {'enabled': False,
+                                                        'path': tempfile.gettempdir(),
+                                                        'timeout': 60},
                                      'logging': {'level': 'info',
                                                  'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
                                                  'filename': None,
                                                  'filemode': 'w'}}
         logging.basicConfig(handlers=[logging.StreamHandler()])
         self.logger = logging.getLogger(self.__class__.__name__)
-        success = self.setConfiguration(self.readConfiguration(self.path_to_config_file), merge=False)
+        self.module_registry = ModuleRegistry(module_dirs)
+        with getStartupProfiler().measure("read", self.path_to_config_file):
+            success = self.setConfiguration(self.readConfiguration(self.path_to_config_file), merge=False)
         if not success:
             self.shutDown()
 
-    def produceQueue(self, queue_type='simple', queue_max_size=20, queue_buffer_size=1):
+    def produceQueue(self, queue_type='simple', queue_max_size=20, queue_buffer_size=1, partition_by=None, bind_receiver=False):
         """Returns a queue with queue_max_size"""
         queue = None
         if queue_type == 'simple':
-            queue =  BufferedQueue(queue=Queue.Queue(queue_max_size), buffersize=queue_buffer_size)
+            queue =  BufferedQueue(queue=Queue.Queue(queue_max_size), buffersize=queue_buffer_size, queue_max_size=queue_max_size)
         if queue_type == 'multiprocess':
-            # At the moment I ran into a problem with zmq.
-            # This problem causes the performance to be comparable with the normal python multiprocessing.Queue.
-            # To make things worse, the load balancing between multiple workers is better when using multiprocessing.Queue.
-            # Update 28.04.2015: With pypy-2.5 and normal python, the load balancing problem seems to be gone. ZMQ is
-            # still a bit faster (ca. ~15%).
-            # TODO: Analyze this problem more thoroughly.
-            if False and ZMQ_AVAILABLE and MSGPACK_AVAILABLE:
-                  queue = ZeroMqMpQueue(queue_max_size)
-            else:
-                queue = multiprocessing.Queue(queue_max_size)
-            queue = BufferedQueue(queue=queue, buffersize=queue_buffer_size)
+            # Throughput and load balancing of the transports depend on the host and python implementation.
+            # Use --benchmark-ipc to find the best one.
+            try:
+                queue = produceIpcQueue(self.global_configuration['ipc_transport'], queue_max_size, bind_receiver, queue_buffer_size)
+                queue = BufferedQueue(queue=queue, buffersize=queue_buffer_size, queue_max_size=queue_max_size)
+            except ValueError:
+                etype, evalue, etb = sys.exc_info()
+                self.logger.error("Could not produce ipc queue. Exception: %s, Error: %s." % (etype, evalue))
+        if queue_type == 'partitioned':
+            # One multiprocess queue per worker. Each worker will only read from its own queue.
+            queues = [self.produceQueue('multiprocess', queue_max_size, queue_buffer_size, bind_receiver=True) for _ in range(self.getWorkerCount())]
+            queue = PartitionedQueue(queues, partition_by)
         if not queue:
             self.logger.error("Could not produce requested queue %s." % (queue_type))
             self.shutDown()
@@ -127,6 +174,9 @@ class LumberMill():
     def getWorkerCount(self):
         return self.global_configuration['workers']
 
+    def getWorkerIndex(self):
+        return self.worker_index
+
     def setConfiguration(self, configuration, merge=True):
         configuration_errors = ConfigurationValidator().validateConfiguration(configuration)
         for configuration_error in configuration_errors:
@@ -146,8 +196,26 @@ class LumberMill():
         """Merge custom global configuration values to default settings."""
         for idx, configuration in enumerate(self.configuration):
             if 'Global' in configuration:
+                # Keep the configured section, so a reload can tell if it changed.
+                self.global_configuration_section = copy.deepcopy(configuration['Global'])
                 self.global_configuration = mergeNestedDicts(self.global_configuration, configuration['Global'])
                 self.configuration.pop(idx)
+        try:
+            setEventIdStrategy(self.global_configuration['event_id_strategy'])
+        except ValueError:
+            etype, evalue, etb = sys.exc_info()
+            self.logger.error("Could not configure event ids. Exception: %s, Error: %s." % (etype, evalue))
+            self.shutDown()
+        if self.global_configuration['ipc_transport'] not in IPC_TRANSPORTS:
+            self.logger.error("Unknown ipc transport %s. Valid transports: %s." % (self.global_configuration['ipc_transport'], IPC_TRANSPORTS))
+            self.shutDown()
+        try:
+            getBackpressure().configure(self.global_configuration['backpressure']['high_water_mark'],
+                                        self.global_configuration['backpressure']['low_water_mark'])
+        except (ValueError, TypeError, KeyError):
+            etype, evalue, etb = sys.exc_info()
+            self.logger.error("Could not configure backpressure. Exception: %s, Error: %s." % (etype, evalue))
+            self.shutDown()
 
     def configureLogging(self):
         # Reinit logger configuration.
@@ -169,73 +237,58 @@ class LumberMill():
     def initModule(self, module_name):
         """ Initalize a module."""
         self.logger.debug("Initializing module %s." % (module_name))
-        instance = None
+        startup_profiler = getStartupProfiler()
+        is_imported = self.module_registry.isImported(module_name)
         try:
-            module = __import__("lumbermill.%s" % module_name, globals(), locals(), module_name, 0)
+            module_class = self.module_registry.getModuleClass(module_name)
         except ImportError:
             etype, evalue, etb = sys.exc_info()
-            self.logger.error("Unknown module %s. Exception: %s, Error: %s." % (module_name, etype, evalue))
+            if module_name in self.module_registry.getModuleNames():
+                self.logger.error("Could not import module %s. Exception: %s, Error: %s." % (module_name, etype, evalue))
+            else:
+                similar_module_names = self.module_registry.getSimilarModuleNames(module_name)
+                self.logger.error("Unknown module %s.%s" % (module_name, " Did you mean: %s?" % ", ".join(similar_module_names) if similar_module_names else ""))
             self.shutDown()
-        module_class = getattr(module, module_name.split(".")[1])
-        instance = module_class(self)
-        """
-        try:
-            module = importlib.import_module(module_name, 'LumberMill')
-            #module = __import__(module_name, globals(), locals(), class_name, -1)
-            module_class = getattr(module, module_name)
+        if not is_imported:
+            import_time = self.module_registry.getImportTimes()[module_name]
+            startup_profiler.addStep("import", module_name, import_time['duration'], "(%s python modules)" % import_time['imported_modules'])
+        with startup_profiler.measure("create", module_name):
             instance = module_class(self)
-        except:
-            etype, evalue, etb = sys.exc_info()
-            self.logger.error("Could not init module %s. Exception: %s, Error: %s." % (module_name, etype, evalue))
-            self.shutDown()
-        """
         return instance
 
     def initModulesFromConfig(self):
         """ Initalize all modules from the current config."""
+        try:
+            module_definitions = getModuleDefinitions(self.configuration)
+        except ValueError:
+            # Something is wrong with the configuration. Tell user.
+            etype, evalue, etb = sys.exc_info()
+            self.logger.error("Error in configuration file. Exception: %s, Error: %s. Please check configuration." % (etype, evalue))
+            self.shutDown()
         # Init modules as defined in config
-        for idx, module_info in enumerate(self.configuration):
-            module_config = {}
-            module_id = None
-            if isinstance(module_info, dict):    
-                module_class_name = list(module_info.keys())[0]
-                module_config = module_info[module_class_name]
-                # Set module id. If the id field was used in configuration use it else use class name of module.
-                try:
-                    module_id = module_class_name if 'id' not in module_config else module_config['id']
-                except:
-                    etype, evalue, etb = sys.exc_info()
-                    self.logger.error("Error in configuration file for module %s. Exception: %s, Error: %s. Please check configuration." % (module_class_name, etype, evalue))
-                    self.shutDown()
-            else:
-                module_id = module_class_name = module_info
-            counter = 1
-            # Modules ids have to be unique. Add a counter like "_1" to id if it is already used.
-            while module_id in self.modules:
-                tmp_mod_name = module_id.split("_", 1)[0]
-                module_id = "%s_%s" % (tmp_mod_name, counter)
-                counter += 1
-            # Ignore some reserved module names. At the moment this is just the Global keyword.
-            if module_id in ['Global']:
-                continue
+        for module_id, module_definition in module_definitions.items():
             module_instances = []
-            module_instance = self.initModule(module_class_name)
+            module_instance = self.initModule(module_definition['module_class_name'])
             module_instances.append(module_instance)
-            self.modules[module_id] = {'idx': idx,
+            self.modules[module_id] = {'idx': module_definition['idx'],
                                        'instances': module_instances,
                                        'type': module_instance.module_type,
-                                       'configuration': module_config}
+                                       'module_class_name': module_definition['module_class_name'],
+                                       'configuration': module_definition['configuration']}
 
-    def setDefaultReceivers(self):
+    def setDefaultReceivers(self, modules=None):
         """
         Add default receivers if none are provided by configuration.
 
         To make configuration less complicated, a module does not need to provide a receivers setting.
         if receivers is not set, events are send to the next module in the configuration by default.
         This method takes care of setting the default receivers settings.
+        Returns False if the configuration is faulty.
         """
+        if modules is None:
+            modules = self.modules
         # Iterate over all configured modules ordered as they appear in the current configuration.
-        for module_name, module_info in self.modules.items():
+        for module_name, module_info in modules.items():
             # If receivers is configured we can skip to next module.
             if 'receivers' in module_info['configuration']:
                 continue
@@ -244,28 +297,31 @@ class LumberMill():
                 module_info['configuration']['receivers'] = []
                 continue
             # Break on last module since it can have no following receivers.
-            if module_info['idx'] == len(self.modules) - 1:
+            if module_info['idx'] == len(modules) - 1:
                 break
             # Set receiver to next module in config if no receivers were set.
             # Get next module in configuration.
             try:
-                receiver_module_name = [nxt_mod_name for nxt_mod_name, nxt_mod_info in self.modules.items() if nxt_mod_info['idx'] == module_info['idx'] + 1][0]
+                receiver_module_name = [nxt_mod_name for nxt_mod_name, nxt_mod_info in modules.items() if nxt_mod_info['idx'] == module_info['idx'] + 1][0]
             except:
                 # Something is wrong with the configuration. Tell user.
                 etype, evalue, etb = sys.exc_info()
                 self.logger.error("Error in configuration for module %s. Exception: %s, Error: %s. Please check configuration." % (module_name, etype, evalue))
-                self.shutDown()
+                return False
             # Some modules are not allowed to act as receivers. Exit if configuration is faulty.
-            if self.modules[receiver_module_name]['type'] in ['stand_alone', 'input']:
-                self.logger.error("Error in configuration. %s not allowed to act as receiver for events from %s. %s modules are not allowed as receivers. Please check configuration." % (receiver_module_name, module_name, self.modules[receiver_module_name]['type']))
-                self.shutDown()
+            if modules[receiver_module_name]['type'] in ['stand_alone', 'input']:
+                self.logger.error("Error in configuration. %s not allowed to act as receiver for events from %s. %s modules are not allowed as receivers. Please check configuration." % (receiver_module_name, module_name, modules[receiver_module_name]['type']))
+                return False
             module_info['configuration']['receivers'] = [receiver_module_name]
+        return True
 
     def configureModules(self):
         """Call configuration method of module."""
+        startup_profiler = getStartupProfiler()
         for module_name, module_info in sorted(self.modules.items(), key=lambda x: x[1]['idx']):
             for module_instance in module_info['instances']:
-                module_instance.configure(module_info['configuration'])
+                with startup_profiler.measure("configure", module_name):
+                    module_instance.configure(module_info['configuration'])
 
     def initEventStream(self):
         """
@@ -292,12 +348,24 @@ class LumberMill():
                     self.shutDown()
                 # If we run multiprocessed and the module is not capable of running parallel, this module will only be
                 # started in the main process. Connect the module via a queue to all receivers that can run forked.
+                # Modules with a partition_by field will always be connected via a partitioned queue, so that events
+                # with the same key end up in the same worker.
                 for receiver_instance in self.modules[receiver_name]['instances']:
-                    if (self.global_configuration['workers'] > 1 and sender_instance.can_run_forked != receiver_instance.can_run_forked):
+                    partition_by = self.getPartitionField(receiver_instance)
+                    if partition_by:
                         try:
                             queue = queues[receiver_name]
                         except KeyError:
-                            queue = self.produceQueue('multiprocess', self.global_configuration['queue_size'], self.global_configuration['queue_buffer_size'])
+                            self.logger.debug("%s will receive its input partitioned by %s." % (receiver_name, partition_by))
+                            queue = self.produceQueue('partitioned', self.global_configuration['queue_size'], self.global_configuration['queue_buffer_size'], partition_by)
+                            queues[receiver_name] = queue
+                        receiver_instance.setInputQueue(queue)
+                    elif (self.global_configuration['workers'] > 1 and sender_instance.can_run_forked != receiver_instance.can_run_forked):
+                        try:
+                            queue = queues[receiver_name]
+                        except KeyError:
+                            # A receiver that only runs in the main process can be bound to by the senders in all workers.
+                            queue = self.produceQueue('multiprocess', self.global_configuration['queue_size'], self.global_configuration['queue_buffer_size'], bind_receiver=not receiver_instance.can_run_forked)
                             queues[receiver_name] = queue
                         receiver_instance.setInputQueue(queue)
                 # Add the receiver to senders. If a corresponding queue exist, use this else use the normal mod instance.
@@ -308,6 +376,47 @@ class LumberMill():
                     else:
                         self.logger.debug("%s will send its output directly to %s." % (module_name, receiver_name))
                         instance.addReceiver(receiver_name, receiver_instance)
+        for module_name, module_info in self.modules.items():
+            for module_instance in module_info['instances']:
+                module_instance.compileReceiverFilters()
+        if self.global_configuration['pipeline_fusion']:
+            self.fuseModuleChains()
+
+    def getPartitionField(self, module_instance):
+        """
+        Return the partition_by field of a module or None if its input does not need to be partitioned.
+
+        Partitioning is only needed if the module runs in more than one process.
+        """
+        if 'partition_by' not in module_instance.configuration_data:
+            return None
+        partition_by = module_instance.getConfigurationValue('partition_by')
+        if not partition_by or self.global_configuration['workers'] < 2:
+            return None
+        if not module_instance.can_run_forked:
+            self.logger.debug("%s only runs in the main process. Ignoring partition_by." % module_instance.__class__.__name__)
+            return None
+        return partition_by
+
+    def fuseModuleChains(self, modules=None):
+        """
+        Fuse linear chains of directly connected modules.
+
+        A module with exactly one unfiltered receiver, that is not connected via a queue, hands its events to this
+        receiver via the generic sendEvent/receiveEvent methods. For such chains, the receiveEvent method of the
+        first module will be replaced with one compiled callable that runs the whole chain.
+        """
+        if modules is None:
+            modules = self.modules
+        for module_name, module_info in modules.items():
+            for module_instance in module_info['instances']:
+                if module_instance.module_type == 'input' or not isFusable(module_instance):
+                    continue
+                module_chain = getModuleChain(module_instance)
+                if len(module_chain) < 2:
+                    continue
+                self.logger.debug("Fusing module chain %s." % " -> ".join([module.__class__.__name__ for module in module_chain]))
+                fuseModuleChain(module_chain)
 
     def getModuleInfoById(self, module_id, silent=True):
         """
@@ -322,27 +431,184 @@ class LumberMill():
                 self.logger.error("Get module by id %s failed. No such module." % (module_id))
             return None
 
-    def initModulesAfterFork(self):
+    def initModulesAfterFork(self, module_names=None):
         """
         All modules are completely configured, call modules initAfterFork method.
         initAfterFork is used to (re)init modules after a process fork.
         BufferedQueue i.e. uses a thread to flush its buffer in given intervals.
         The thread will not survive a fork of the main process. So we need to start this
         after the fork was executed.
+        If module_names is set, only these modules will be initialized.
         """
         for module_name, module_info in sorted(self.modules.items(), key=lambda x: x[1]['idx']):
+            if module_names is not None and module_name not in module_names:
+                continue
             for instance in module_info['instances']:
-                if instance.can_run_forked:
-                    instance.initAfterFork()
+                if not instance.can_run_forked:
+                    continue
+                # Let partitioned queues know which partition the module instance in this process reads from.
+                if isinstance(getattr(instance, 'input_queue', None), PartitionedQueue):
+                    instance.input_queue.setWorkerIndex(self.worker_index)
+                instance.initAfterFork()
                 #else:
                 #    print("Not calling initAfterFork on %s." % module_name)
 
-    def runModules(self):
+    def initBackpressure(self):
+        """
+        Let the buffers and queues of this process pause the input modules running here while they are congested.
+        """
+        backpressure = getBackpressure()
+        for module_name, module_info in self.modules.items():
+            for instance in module_info['instances']:
+                if instance.module_type != "input" or (not self.is_master() and not instance.can_run_forked):
+                    continue
+                backpressure.addInput(instance)
+        backpressure.start()
+
+    def enableModuleStatistics(self):
+        for module_name, module_info in self.modules.items():
+            for instance in module_info['instances']:
+                instance.countEvents()
+        self.published_event_counts = {}
+
+    def enableModuleTimings(self):
+        for module_name, module_info in self.modules.items():
+            for instance in module_info['instances']:
+                instance.measureTimings()
+        self.published_timings = {}
+
+    def enableQueueWaitTimes(self):
+        for module_name, input_queue in self.getAllQueues().items():
+            input_queue.measureWaitTime()
+
+    def enableTracing(self):
+        getEventTracer().configure(self.global_configuration['tracing']['path'], self.global_configuration['tracing']['max_spans'])
+        for module_name, module_info in self.modules.items():
+            for instance in module_info['instances']:
+                instance.traceEvents(module_name, self.global_configuration['tracing']['sample_interval'])
+
+    def getTraceWriter(self):
+        @setInterval(10)
+        def writeTrace():
+            getEventTracer().write()
+        return writeTrace
+
+    def getModuleStatisticsPublisher(self):
+        @setInterval(1)
+        def publishModuleStatistics():
+            if self.global_configuration['module_statistics']:
+                self.publishModuleStatistics()
+            if self.global_configuration['module_timings']:
+                self.publishModuleTimings()
+        return publishModuleStatistics
+
+    def publishModuleStatistics(self):
+        """
+        Add the event counts of the modules running in this process to the shared statistics.
+        """
+        stats_collector = SharedMemoryStatisticCollector()
+        for module_name, module_info in self.modules.items():
+            for instance in module_info['instances']:
+                if not self.is_master() and not instance.can_run_forked:
+                    continue
+                published_event_counts = self.published_event_counts.setdefault(module_name, [0] * len(MODULE_EVENT_COUNTERS))
+                for idx, counter_name in enumerate(MODULE_EVENT_COUNTERS):
+                    count = instance.event_counts[idx]
+                    if count == published_event_counts[idx]:
+                        continue
+                    stats_collector.incrementCounter((module_name, counter_name), count - published_event_counts[idx], namespace="ModuleStatistics")
+                    published_event_counts[idx] = count
+        for module_name, buffer_type, buffer in self.getBuffers():
+            blocked_count, blocked_time = buffer.getBlockedDelta()
+            if not blocked_count:
+                continue
+            stats_collector.incrementCounter((module_name, buffer_type, 'blocked_count'), blocked_count, namespace="BufferStatistics")
+            # Counters are integers, so blocked times are published in milliseconds.
+            stats_collector.incrementCounter((module_name, buffer_type, 'blocked_ms'), int(blocked_time * 1000), namespace="BufferStatistics")
+
+    def getBuffers(self):
+        """
+        Return the Buffers of the modules and of their input queues in this process as (module_name, buffer_type, buffer).
+        """
+        buffers = []
+        for module_name, module_info in self.modules.items():
+            for instance in module_info['instances']:
+                if not self.is_master() and not instance.can_run_forked:
+                    continue
+                if isinstance(getattr(instance, 'buffer', None), Buffer):
+                    buffers.append((module_name, 'module', instance.buffer))
+        for module_name, input_queue in self.getAllQueues().items():
+            for buffered_queue in getattr(input_queue, 'queues', [input_queue]):
+                if isinstance(buffered_queue, BufferedQueue):
+                    buffers.append((module_name, 'queue', buffered_queue.buffer))
+        return buffers
+
+    def publishModuleTimings(self):
+        """
+        Add the timing histograms of the modules running in this process to the shared statistics.
+        Each bucket is a counter, keyed by module, worker index, timing and bucket index.
+        """
+        stats_collector = SharedMemoryStatisticCollector()
+        for module_name, module_info in self.modules.items():
+            histograms = {}
+            for instance in module_info['instances']:
+                if not self.is_master() and not instance.can_run_forked:
+                    continue
+                for timing, histogram in instance.timing_histograms.items():
+                    histograms.setdefault(timing, LogHistogram()).merge(histogram)
+                if hasattr(instance, 'getInputQueue') and instance.getInputQueue() and instance.getInputQueue().getWaitTimeHistogram():
+                    histograms.setdefault('queue_wait_time', LogHistogram()).merge(instance.getInputQueue().getWaitTimeHistogram())
+            for timing, histogram in histograms.items():
+                published_histogram = self.published_timings.setdefault((module_name, timing), LogHistogram())
+                if histogram.count == published_histogram.count:
+                    continue
+                for bucket_index, count in enumerate(histogram.buckets):
+                    if count != published_histogram.buckets[bucket_index]:
+                        stats_collector.incrementCounter((module_name, self.worker_index, timing, bucket_index), count - published_histogram.buckets[bucket_index], namespace="ModuleTimings")
+                # Counters are integers, so sums are published in microseconds.
+                stats_collector.incrementCounter((module_name, self.worker_index, timing, 'sum'), int(histogram.sum * 1000000) - int(published_histogram.sum * 1000000), namespace="ModuleTimings")
+                self.published_timings[(module_name, timing)] = histogram
+
+    def handleProfilerSignal(self, signum=False, frame=False):
+        self.startProfiler()
+
+    def startProfiler(self, duration=None):
+        """
+        Sample the thread stacks of all processes for duration seconds, see SamplingProfiler.
+        Called in the master process, the workers will be signalled to start their profilers as well. They read the
+        duration from the internal datastore.
+        """
+        if self.is_master():
+            self.setInInternalDataStore('lumbermill.profiler_duration', duration or self.global_configuration['profiler']['duration'])
+            for worker in self.child_processes:
+                os.kill(worker.pid, signal.SIGUSR1)
+        duration = self.getFromInternalDataStore('lumbermill.profiler_duration', self.global_configuration['profiler']['duration'])
+        if not self.profiler:
+            self.profiler = SamplingProfiler(interval=self.global_configuration['profiler']['interval'],
+                                             path=self.global_configuration['profiler']['path'],
+                                             get_thread_labels=self.getThreadLabels)
+        return self.profiler.start(duration)
+
+    def getThreadLabels(self):
+        """
+        Return the names of the modules running in threads of this process by thread ident.
+        """
+        thread_labels = {}
+        for module_name, module_info in self.modules.items():
+            for instance in module_info['instances']:
+                if isinstance(instance, threading.Thread) and instance.is_alive():
+                    thread_labels[instance.ident] = module_name
+        return thread_labels
+
+    def runModules(self, module_names=None):
         """
         Start the configured modules if they poll queues.
+        If module_names is set, only these modules will be started.
         """
         # All modules are completely configured, call modules run method if it exists.
         for module_name, module_info in sorted(self.modules.items(), key=lambda x: x[1]['idx']):
+            if module_names is not None and module_name not in module_names:
+                continue
             if self.is_master():
                 start_message = "%s - %s" % (module_name, module_info['instances'][0].getStartMessage())
                 self.logger.info(start_message)
@@ -378,8 +644,8 @@ class LumberMill():
         # This way of sharing data between modules and filters does not seem to be as flexible as one could wish for.
         # A better idea might be to give access to module data via a dynamic value like:
         # module.<module_name>.get.<key> instead of e.g. internal.<key>
-        # This datastore is based on multiprocessing.Manager(), using multiprocessing.Lock() for mp synchronization.
-        # So frequent usage of this store might impact performance.
+        # Writes to this datastore take a multiprocessing lock and make all processes refresh their local copy.
+        # So frequent writes might impact performance. Reads are cheap.
         if not self.internal_datastore:
             return False
         self.internal_datastore.setValue(key, value)
@@ -408,29 +674,67 @@ class LumberMill():
         self.logger.info("Running configuration test for %s." % self.path_to_config_file)
         self.configureGlobal()
         self.initModulesFromConfig()
-        self.setDefaultReceivers()
+        if not self.setDefaultReceivers():
+            self.shutDown()
         self.configureModules()
-        self.initEventStream()
+        with getStartupProfiler().measure("connect", "event stream"):
+            self.initEventStream()
+        getStartupProfiler().logReport()
         self.logger.info("Configuration is valid.")
         return
 
+    def benchmarkIpc(self):
+        """
+        Measure throughput and worker balance of all ipc transports on this host and report which one to use.
+        """
+        self.configureLogging()
+        self.configureGlobal()
+        self.logger.info("Benchmarking ipc transports with %s workers." % self.getWorkerCount())
+        results = benchmarkIpcTransports(self.getWorkerCount(), batch_size=self.global_configuration['queue_buffer_size'], queue_max_size=self.global_configuration['queue_size'])
+        for result in results:
+            if result['error']:
+                self.logger.info("%s: failed. Error: %s" % (result['ipc_transport'], result['error']))
+            else:
+                self.logger.info("%s: %d events/s, balance between workers: %.2f" % (result['ipc_transport'], result['events_per_second'], result['balance']))
+        recommended_ipc_transport = getRecommendedIpcTransport(results)
+        if recommended_ipc_transport:
+            self.logger.info("Recommended setting for this host: ipc_transport: %s" % recommended_ipc_transport)
+        return recommended_ipc_transport
+
     def start(self):
         self.configureGlobal()
         self.configureLogging()
         self.initModulesFromConfig()
-        self.setDefaultReceivers()
+        if not self.setDefaultReceivers():
+            self.shutDown()
         self.configureModules()
-        self.initEventStream()
+        if self.global_configuration['module_statistics']:
+            # Must be done before module chains get fused.
+            self.enableModuleStatistics()
+        if self.global_configuration['module_timings']:
+            self.enableModuleTimings()
+        if self.global_configuration['tracing']['sample_interval']:
+            self.enableTracing()
+        with getStartupProfiler().measure("connect", "event stream"):
+            self.initEventStream()
+        if self.global_configuration['module_timings']:
+            self.enableQueueWaitTimes()
+        if self.global_configuration['tracing']['sample_interval']:
+            for module_name, input_queue in self.getAllQueues().items():
+                input_queue.traceEvents()
+        # The shared memory of the collector must exist before the workers are forked.
+        SharedMemoryStatisticCollector()
+        getStartupProfiler().logReport()
         self.runWorkers()
 
     def runWorkers(self):
         for i in range(1, self.global_configuration['workers']):
-            worker = multiprocessing.Process(target=self.run)
+            worker = multiprocessing.Process(target=self.run, args=(i,))
             worker.start()
             self.child_processes.append(worker)
         self.run()
 
-    def run(self):
+    def run(self, worker_index=0):
         # Catch Keyboard interrupt here. Catching the signal seems
         # to be more reliable then using try/except when running
         # multiple processes under pypy.
@@ -442,11 +746,25 @@ class LumberMill():
             signal.signal(signal.SIGTERM, self.shutDown)
             # Register SIGALARM only for master process. This will take care to kill all subprocesses.
             signal.signal(signal.SIGALRM, self.restart)
+        # Register SIGUSR1 to profile all processes. The master process passes the signal on to the workers.
+        signal.signal(signal.SIGUSR1, self.handleProfilerSignal)
+        # Register SIGHUP to reload the configuration. The master process passes the signal on to the workers.
+        signal.signal(signal.SIGHUP, self.handleReloadSignal)
         self.alive = True
+        self.worker_index = worker_index
+        self.io_loop = tornado.ioloop.IOLoop.current()
         self.initModulesAfterFork()
+        self.initBackpressure()
+        if self.global_configuration['module_statistics'] or self.global_configuration['module_timings']:
+            TimedFunctionManager.startTimedFunction(self.getModuleStatisticsPublisher())
+        if self.global_configuration['tracing']['sample_interval']:
+            TimedFunctionManager.startTimedFunction(self.getTraceWriter())
         self.runModules()
         if self.is_master():
             self.logger.info("LumberMill started with %s processes(%s)." % (len(self.child_processes) + 1, os.getpid()))
+            # If this process was started by a restart with socket handoff, the previous process can drain and exit now.
+            if getSocketHandoff().sendReady():
+                self.logger.info("Took over the listening sockets from the previous LumberMill process.")
         tries = 0
         while self.alive:
             # Sometimes tornado throws an obscure <error: [Errno 0] Success> exception self._sslobj.do_handshake().
@@ -466,28 +784,412 @@ class LumberMill():
             self.shutDown();
 
     def restart(self, signum=False, frame=False):
+        if self.global_configuration['socket_handoff']['enabled']:
+            self.startSocketHandoff()
+            return
         for worker in list(self.child_processes):
             os.kill(worker.pid, signal.SIGINT)
             worker.join()
             self.child_processes.remove(worker)
         self.logger.info("Restarting LumberMill.")
-        self.shutDown()
+        try:
+            self.shutDown()
+        except SystemExit:
+            # The process gets replaced below.
+            pass
         time.sleep(5)
         restartMainProcess()
 
+    def startSocketHandoff(self):
+        """
+        Restart without closing the listening sockets of the input modules, see SocketHandoff.
+
+        A new LumberMill process is started, which takes over the listening sockets of this process. Until it is
+        running, this process keeps handling events. Then this process drains its pipeline and exits.
+        If the new process exits or does not get ready within socket_handoff.timeout seconds, this process keeps running.
+        """
+        socket_handoff = getSocketHandoff()
+        if socket_handoff.isServing():
+            self.logger.warning("Restart with socket handoff already in progress.")
+            return
+        handoff_path = os.path.join(self.global_configuration['socket_handoff']['path'], "lumbermill_handoff_%s.sock" % os.getpid())
+        try:
+            socket_handoff.startServer(handoff_path, on_ready=lambda: self.io_loop.add_callback(self.finishSocketHandoff))
+            handoff_process = startMainProcess({HANDOFF_PATH_ENVIRONMENT_VARIABLE: handoff_path})
+        except (OSError, socket.error):
+            etype, evalue, etb = sys.exc_info()
+            self.logger.error("Could not start new LumberMill process. Exception: %s, Error: %s." % (etype, evalue))
+            socket_handoff.stopServer()
+            return
+        self.logger.info("Restarting LumberMill. Started new process %s to take over the listening sockets." % handoff_process.pid)
+        self.socket_handoff_monitor = TimedFunctionManager.startTimedFunction(self.getSocketHandoffMonitor(handoff_process, time.time()))
+
+    def getSocketHandoffMonitor(self, handoff_process, started):
+        @setInterval(1)
+        def monitorSocketHandoff():
+            if not getSocketHandoff().isServing():
+                return
+            if handoff_process.poll() is not None:
+                self.logger.error("New LumberMill process exited with code %s before taking over the listening sockets." % handoff_process.returncode)
+                self.stopSocketHandoff()
+            elif time.time() - started > self.global_configuration['socket_handoff']['timeout']:
+                self.logger.error("New LumberMill process did not take over the listening sockets within %s seconds. Stopping it." % self.global_configuration['socket_handoff']['timeout'])
+                handoff_process.terminate()
+                self.stopSocketHandoff()
+        return monitorSocketHandoff
+
+    def stopSocketHandoff(self):
+        getSocketHandoff().stopServer()
+        if self.socket_handoff_monitor:
+            TimedFunctionManager.stopTimedFunctions(self.socket_handoff_monitor)
+            self.socket_handoff_monitor = None
+
+    def finishSocketHandoff(self):
+        """
+        Called, when the new process took over the listening sockets. Drain the pipeline and exit.
+        """
+        self.stopSocketHandoff()
+        self.logger.info("New LumberMill process took over the listening sockets.")
+        # Tell the input modules of all processes to only close the listening sockets, not to shut them down.
+        self.setInInternalDataStore('lumbermill.socket_handoff', True)
+        self.shutDown()
+
+    def requestRestart(self):
+        """
+        Restart LumberMill. Workers ask the master process to restart via SIGALRM.
+        """
+        if self.is_master():
+            self.restart()
+        else:
+            os.kill(self.getMainProcessId(), signal.SIGALRM)
+
+    def handleReloadSignal(self, signum=False, frame=False):
+        # Apply the new configuration from the ioloop, so no module gets interrupted while handling an event.
+        tornado.ioloop.IOLoop.current().add_callback_from_signal(self.reload)
+
+    def reload(self):
+        """
+        Apply the changes of the configuration file to the running modules, without restarting any process.
+
+        The new configuration is compared with the running modules by module id. Only added, removed and changed
+        modules are created or shut down. Modules of which only the receivers changed get connected to their new
+        receivers. All other modules keep running, along with their queues, buffers and connections.
+        Called in the master process, the workers will be signalled to reload as well. They read the new
+        configuration from the internal datastore.
+        Changes that can not be applied to the running processes fall back to a restart, e.g. changes of the Global
+        section or changes that would need new queues between the processes.
+        """
+        self.reloading = True
+        try:
+            if self.is_master():
+                configuration = self.readConfiguration(self.path_to_config_file)
+            else:
+                configuration = self.getFromInternalDataStore('lumbermill.reload_configuration')
+            reload_plan = self.getReloadPlan(configuration)
+        except ReloadError:
+            etype, evalue, etb = sys.exc_info()
+            self.logger.error("Could not reload configuration. Exception: %s, Error: %s." % (etype, evalue))
+            return {'reloaded': False, 'error': str(evalue)}
+        finally:
+            self.reloading = False
+        if reload_plan['restart_reason']:
+            # Instances of the plan were already shut down by getReloadPlan.
+            self.logger.info("%s Restarting LumberMill." % reload_plan['restart_reason'])
+            self.requestRestart()
+            return {'reloaded': False, 'restart_reason': reload_plan['restart_reason']}
+        if self.is_master():
+            self.setInInternalDataStore('lumbermill.reload_configuration', configuration)
+            for worker in self.child_processes:
+                os.kill(worker.pid, signal.SIGHUP)
+        reload_error = None
+        self.reloading = True
+        try:
+            self.applyReloadPlan(reload_plan)
+        except ReloadError:
+            etype, reload_error, etb = sys.exc_info()
+        finally:
+            self.reloading = False
+        if reload_error:
+            # Some modules might already be replaced. The new instances that are not running yet are not needed anymore.
+            self.shutDownReloadedInstances(reload_plan)
+            self.logger.error("Could not apply new configuration. Error: %s. Restarting LumberMill." % reload_error)
+            self.requestRestart()
+            return {'reloaded': False, 'restart_reason': str(reload_error)}
+        module_changes = reload_plan['module_changes']
+        if self.is_master():
+            self.logger.info("Reloaded configuration. Added: %s, removed: %s, changed: %s, rewired: %s." % (module_changes['added'], module_changes['removed'],
+                                                                                                         module_changes['changed'], module_changes['rewired']))
+        return {'reloaded': True,
+                'added': module_changes['added'],
+                'removed': module_changes['removed'],
+                'changed': module_changes['changed'],
+                'rewired': module_changes['rewired']}
+
+    def getReloadPlan(self, configuration):
+        """
+        Compare configuration with the running modules and create the instances of added and changed modules.
+
+        Raises ReloadError if the configuration is faulty. If the changes can not be applied to the running processes,
+        restart_reason of the returned plan is set. In both cases, the instances created so far are shut down again.
+        """
+        if not configuration:
+            raise ReloadError("Configuration is empty.")
+        for configuration_error in ConfigurationValidator().validateConfiguration(configuration):
+            self.logger.error(configuration_error)
+            raise ReloadError("Configuration is not valid.")
+        configuration = copy.deepcopy(configuration)
+        global_configuration_section = {}
+        module_configuration = []
+        for module_info in configuration:
+            if isinstance(module_info, dict) and 'Global' in module_info:
+                global_configuration_section = module_info['Global']
+            else:
+                module_configuration.append(module_info)
+        try:
+            module_definitions = getModuleDefinitions(module_configuration)
+        except ValueError:
+            etype, evalue, etb = sys.exc_info()
+            raise ReloadError(evalue)
+        for module_id, module_definition in module_definitions.items():
+            try:
+                module_class = self.module_registry.getModuleClass(module_definition['module_class_name'])
+            except ImportError:
+                etype, evalue, etb = sys.exc_info()
+                raise ReloadError("Could not import module %s. Exception: %s, Error: %s." % (module_definition['module_class_name'], etype, evalue))
+            # ModuleDocstringParser wraps the module class.
+            module_definition['type'] = getattr(module_class, '__wrapped__', module_class).module_type
+        if not self.setDefaultReceivers(module_definitions):
+            raise ReloadError("Could not set default receivers.")
+        for module_id, module_definition in module_definitions.items():
+            for receiver_name in getReceiverNames(module_definition['configuration']):
+                if receiver_name not in module_definitions:
+                    raise ReloadError("Could not add %s as receiver for %s. Module not found." % (receiver_name, module_id))
+        module_changes = diffModuleDefinitions(self.modules, module_definitions)
+        reload_plan = {'configuration': module_configuration,
+                       'module_definitions': module_definitions,
+                       'module_changes': module_changes,
+                       'instances': {},
+                       'queues': {},
+                       'restart_reason': None}
+        if global_configuration_section != self.global_configuration_section:
+            reload_plan['restart_reason'] = "Global configuration changed."
+            return reload_plan
+        changed_input_ids = []
+        for module_id in module_changes['added'] + module_changes['changed']:
+            is_input = module_definitions[module_id]['type'] == 'input' or (module_id in self.modules and self.modules[module_id]['type'] == 'input')
+            if is_input and self.getWorkerCount() > 1:
+                reload_plan['restart_reason'] = "Input module %s changed. With multiple workers, inputs are set up before the workers are forked." % module_id
+                return reload_plan
+            if is_input and module_id in module_changes['changed']:
+                changed_input_ids.append(module_id)
+        # Instances are only created once the plan does not need a restart for the reasons above.
+        try:
+            for module_id in module_changes['added'] + module_changes['changed']:
+                # A changed input is created after its running instance was shut down, since e.g. a port can only be bound once.
+                if module_id in changed_input_ids:
+                    continue
+                reload_plan['instances'][module_id] = self.initReloadedModule(module_definitions[module_id])
+            reload_plan['restart_reason'] = self.setReloadQueues(reload_plan)
+        except ReloadError:
+            self.shutDownReloadedInstances(reload_plan)
+            raise
+        if reload_plan['restart_reason']:
+            self.shutDownReloadedInstances(reload_plan)
+        return reload_plan
+
+    def initReloadedModule(self, module_definition):
+        module_instance = self.initModule(module_definition['module_class_name'])
+        try:
+            module_instance.configure(module_definition['configuration'])
+        except ReloadError:
+            # Release what the module set up before its configuration failed, e.g. timers.
+            self.shutDownReloadedInstance(module_instance)
+            raise
+        return module_instance
+
+    def shutDownReloadedInstances(self, reload_plan):
+        """
+        Shut down the instances of reload_plan that did not replace a running module.
+        """
+        running_instances = set([id(instance) for module_info in self.modules.values() for instance in module_info['instances']])
+        for instance in reload_plan['instances'].values():
+            if id(instance) not in running_instances:
+                self.shutDownReloadedInstance(instance)
+        reload_plan['instances'] = {}
+
+    def shutDownReloadedInstance(self, instance):
+        reloading = self.reloading
+        # Errors while shutting down must not be taken for errors of the reload.
+        self.reloading = True
+        try:
+            instance.shutDown()
+        except:
+            etype, evalue, etb = sys.exc_info()
+            self.logger.warning("Could not shut down %s of aborted reload. Exception: %s, Error: %s." % (instance.__class__.__name__, etype, evalue))
+        finally:
+            self.reloading = reloading
+
+    def getReloadedInstance(self, reload_plan, module_id):
+        if module_id in reload_plan['instances']:
+            return reload_plan['instances'][module_id]
+        return self.modules[module_id]['instances'][0]
+
+    def setReloadQueues(self, reload_plan):
+        """
+        Find the running queues that receivers of the new configuration will read from.
+
+        Queues between processes have to be created before the workers are forked. So if a receiver would need a new
+        queue, or its queue is not needed anymore, the reason for a restart is returned.
+        """
+        if self.getWorkerCount() < 2:
+            return None
+        module_changes = reload_plan['module_changes']
+        affected_module_ids = set(module_changes['added'] + module_changes['changed'] + module_changes['rewired'])
+        sender_ids = OrderedDict()
+        for module_id, module_definition in reload_plan['module_definitions'].items():
+            for receiver_name in getReceiverNames(module_definition['configuration']):
+                sender_ids.setdefault(receiver_name, []).append(module_id)
+        for receiver_id, receiver_sender_ids in sender_ids.items():
+            if receiver_id not in affected_module_ids and not affected_module_ids.intersection(receiver_sender_ids):
+                continue
+            receiver_instance = self.getReloadedInstance(reload_plan, receiver_id)
+            needs_queue = bool(self.getPartitionField(receiver_instance))
+            for sender_id in receiver_sender_ids:
+                if self.getReloadedInstance(reload_plan, sender_id).can_run_forked != receiver_instance.can_run_forked:
+                    needs_queue = True
+            running_instance = self.modules[receiver_id]['instances'][0] if receiver_id in self.modules else None
+            running_queue = running_instance.getInputQueue() if hasattr(running_instance, 'getInputQueue') else None
+            if needs_queue != bool(running_queue):
+                return "Connection of %s between processes changed." % receiver_id
+            if not running_queue or receiver_id not in module_changes['changed']:
+                continue
+            if (not hasattr(receiver_instance, 'setInputQueue')
+                    or running_instance.can_run_forked != receiver_instance.can_run_forked
+                    or self.getPartitionField(running_instance) != self.getPartitionField(receiver_instance)):
+                return "Queue of %s between processes changed." % receiver_id
+            reload_plan['queues'][receiver_id] = running_queue
+        return None
+
+    def applyReloadPlan(self, reload_plan):
+        """
+        Replace the running modules with the ones of reload_plan.
+
+        Unchanged modules keep their instances. New instances are connected to the queues their predecessors read from.
+        """
+        module_changes = reload_plan['module_changes']
+        module_definitions = reload_plan['module_definitions']
+        backpressure = getBackpressure()
+        # Changed inputs release their resources, like a bound port, before their replacement gets configured.
+        for module_id in module_changes['changed']:
+            if module_id in reload_plan['instances']:
+                continue
+            for instance in self.modules[module_id]['instances']:
+                backpressure.removeInput(instance)
+                instance.shutDown()
+            reload_plan['instances'][module_id] = self.initReloadedModule(module_definitions[module_id])
+        replaced_instances = []
+        for module_id in module_changes['removed'] + module_changes['changed']:
+            if self.modules[module_id]['type'] == 'input' and module_id in module_changes['changed']:
+                continue
+            replaced_instances.extend(self.modules[module_id]['instances'])
+        for module_id, instance in reload_plan['instances'].items():
+            # Must be done before module chains get fused.
+            if self.global_configuration['module_statistics']:
+                instance.countEvents()
+                self.published_event_counts.pop(module_id, None)
+            if self.global_configuration['module_timings']:
+                instance.measureTimings()
+                for published_timing in [published_timing for published_timing in self.published_timings if published_timing[0] == module_id]:
+                    self.published_timings.pop(published_timing)
+            if self.global_configuration['tracing']['sample_interval']:
+                instance.traceEvents(module_id, self.global_configuration['tracing']['sample_interval'])
+            if module_id in reload_plan['queues']:
+                instance.setInputQueue(reload_plan['queues'][module_id])
+        modules = OrderedDict()
+        for module_id, module_definition in module_definitions.items():
+            if module_id in reload_plan['instances']:
+                instance = reload_plan['instances'][module_id]
+                modules[module_id] = {'idx': module_definition['idx'],
+                                      'instances': [instance],
+                                      'type': instance.module_type,
+                                      'module_class_name': module_definition['module_class_name'],
+                                      'configuration': module_definition['configuration']}
+            else:
+                modules[module_id] = dict(self.modules[module_id], idx=module_definition['idx'], configuration=module_definition['configuration'])
+        # Fused chains call their modules directly. They get fused again after all modules were connected.
+        for module_name, module_info in self.modules.items():
+            for instance in module_info['instances']:
+                unfuseModuleChain(instance)
+        self.connectModules(modules)
+        self.modules = modules
+        self.configuration = reload_plan['configuration']
+        # Stop the replaced modules, inputs first.
+        for instance in sorted(replaced_instances, key=lambda instance: instance.module_type != "input"):
+            backpressure.removeInput(instance)
+            instance.shutDown()
+        # Queues of removed modules are not read anymore.
+        reused_queue_ids = set([id(input_queue) for input_queue in reload_plan['queues'].values()])
+        for instance in replaced_instances:
+            input_queue = instance.getInputQueue() if hasattr(instance, 'getInputQueue') else None
+            if input_queue and id(input_queue) not in reused_queue_ids:
+                input_queue.stop()
+        new_module_names = list(reload_plan['instances'].keys())
+        self.initModulesAfterFork(new_module_names)
+        for module_name in new_module_names:
+            for instance in modules[module_name]['instances']:
+                if instance.module_type == "input" and (self.is_master() or instance.can_run_forked):
+                    backpressure.addInput(instance)
+        self.runModules(new_module_names)
+
+    def connectModules(self, modules):
+        """
+        Connect the modules of a reloaded configuration with their receivers.
+
+        Receivers reading from a queue are connected via this queue, like in initEventStream. The receivers of a module
+        are replaced at once, since other threads might be sending events right now.
+        """
+        for module_name, module_info in modules.items():
+            receivers = {}
+            for receiver_name in getReceiverNames(module_info['configuration']):
+                receiver_instance = modules[receiver_name]['instances'][0]
+                input_queue = receiver_instance.getInputQueue() if hasattr(receiver_instance, 'getInputQueue') else None
+                receivers[receiver_name] = input_queue if input_queue else receiver_instance
+            for instance in module_info['instances']:
+                if instance.module_type != "output":
+                    instance.receivers = dict(receivers)
+        for module_name, module_info in modules.items():
+            for instance in module_info['instances']:
+                instance.compileReceiverFilters()
+        if self.global_configuration['pipeline_fusion']:
+            self.fuseModuleChains(modules)
+
     def shutDown(self, signum=False, frame=False):
         kill_master = False;
+        if self.reloading and not signum:
+            # Errors while a new configuration gets applied abort the reload, not LumberMill.
+            raise ReloadError("Module failed while reloading. See errors above.")
+        if self.io_loop and threading.current_thread() is not threading.main_thread():
+            # Module threads, e.g. an input that sent all its events, can not stop the io loop of the process.
+            # Hand the shutdown over to it and end the calling thread as before.
+            self.io_loop.add_callback(self.shutDown)
+            sys.exit(0)
         self.logger.debug("shutDown called in process %s" % os.getpid())
+        if not self.alive:
+            sys.exit(0)
         if self.is_master():
             self.logger.info("Shutting down LumberMill.")
             # Send SIGINT to workers for good measure.
             for worker in list(self.child_processes):
                 os.kill(worker.pid, signal.SIGINT)
-        if not self.alive:
-            sys.exit(0)
         self.alive = False
         self.shutDownModules()
         TimedFunctionManager.stopTimedFunctions()
+        if self.global_configuration['module_statistics']:
+            self.publishModuleStatistics()
+        if self.global_configuration['module_timings']:
+            self.publishModuleTimings()
+        if self.global_configuration['tracing']['sample_interval']:
+            getEventTracer().write()
         try:
             tornado.ioloop.IOLoop.current().stop()
         except RuntimeError:
@@ -508,30 +1210,47 @@ class LumberMill():
             for instance in module_info['instances']:
                 if instance.module_type == "input":
                     instance.shutDown()
-        # Get all configured queues to check for pending events.
-        module_queues = self.getAllQueues()
-        if len(module_queues) > 0:
-            wait_loops = 0
-            while wait_loops < 5:
-                wait_loops += 1
-                events_in_queues = 0
-                for module_name, queue in module_queues.items():
-                    events_in_queues += queue.qsize()
-                if events_in_queues > 0:
-                    # Give remaining queued events some time to finish.
-                    if self.is_master():
-                        self.logger.info("%s event(s) still in flight. Waiting %s secs. Press ctrl+c again to exit directly." % (events_in_queues, (.5 * wait_loops)))
-                    time.sleep(.5 * wait_loops)
-                    continue
-                break
+        # Hand on the events still in flight within the deadline.
+        pipeline_drain = PipelineDrain(self.getDrainStages(), self.global_configuration['drain']['timeout'], count_queued_events=self.is_master())
+        in_flight_event_count = sum(pipeline_drain.getInFlightEventCounts().values())
+        if in_flight_event_count:
+            self.logger.info("%s event(s) still in flight. Draining for max. %s secs. Press ctrl+c again to exit directly." % (in_flight_event_count, self.global_configuration['drain']['timeout']))
+        flushed_event_count = pipeline_drain.drain()
         # Shutdown all other modules.
         for module_name, module_info in self.modules.items():
             for instance in module_info['instances']:
                 if instance.module_type != "input":
                     instance.shutDown()
+        for module_name, input_queue in self.getAllQueues().items():
+            input_queue.stop()
+        lost_event_counts = pipeline_drain.getLostEventCounts()
+        for module_name, lost_event_count in lost_event_counts.items():
+            self.logger.warning("%s event(s) in %s lost." % (lost_event_count, module_name))
+        lost_event_count = sum(lost_event_counts.values())
+        if lost_event_count:
+            countLostEvents('shutdown', lost_event_count)
+        if flushed_event_count or lost_event_count:
+            self.logger.info("Drained pipeline in %.2f secs. Flushed %s event(s), lost %s event(s)." % (pipeline_drain.duration, flushed_event_count, lost_event_count))
+
+    def getDrainStages(self):
+        """
+        Return the modules as stages for PipelineDrain, senders before receivers.
+        """
+        module_receivers = OrderedDict()
+        for module_name, module_info in sorted(self.modules.items(), key=lambda x: x[1]['idx']):
+            module_receivers[module_name] = list(module_info['instances'][0].receivers.keys())
+        stages = []
+        for module_name in getTopologicalOrder(module_receivers):
+            instances = self.modules[module_name]['instances']
+            stages.append({'name': module_name,
+                           'queue': instances[0].getInputQueue() if hasattr(instances[0], 'getInputQueue') else None,
+                           # Modules that can not run forked only run in the master.
+                           'instances': [instance for instance in instances if self.is_master() or instance.can_run_forked]})
+        return stages
 
 def usage():
-    print('Usage: ' + sys.argv[0] + ' -c <path/to/config.conf> --configtest')
+    print('Usage: ' + sys.argv[0] + ' -c <path/to/config.conf> [--configtest] [--benchmark-ipc] [--startup-profile]')
+    print('       ' + sys.argv[0] + ' --benchmark <path/to/suite.yml>')
 
 def main():
     """
@@ -540,8 +1259,10 @@ def main():
     """
     path_to_config_file = ""
     run_configtest = False
+    run_ipc_benchmark = False
+    path_to_benchmark_suite = ""
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "hc:", ["help", "configtest", "conf="])
+        opts, args = getopt.getopt(sys.argv[1:], "hc:", ["help", "configtest", "benchmark-ipc", "benchmark=", "startup-profile", "conf="])
     except getopt.GetoptError:
         usage()
         sys.exit(2)
@@ -553,9 +1274,21 @@ def main():
             path_to_config_file = arg
         elif opt in ("--configtest"):
             run_configtest = True
+        elif opt == "--benchmark":
+            path_to_benchmark_suite = arg
+        elif opt == "--benchmark-ipc":
+            run_ipc_benchmark = True
+        elif opt == "--startup-profile":
+            getStartupProfiler().enable()
+    if path_to_benchmark_suite:
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        report = runBenchmarkSuite(path_to_benchmark_suite)
+        sys.exit(1 if report['regressions'] else 0)
     lm = LumberMill(path_to_config_file)
     if run_configtest:
         lm.configTest()
+    elif run_ipc_benchmark:
+        lm.benchmarkIpc()
     else:
         lm.start()
 
@@ -155,6 +155,9 @@ class BeatsConnectionHandler(object):
                         self.bytesio_stream = None
                         self.bytesio_size = 0
                 else:
+                    # Stop reading while the pipeline is congested. Beats will wait for the ack of its window.
+                    while self.gp_module.input_paused:
+                        yield gen.sleep(.1)
                     self.logger.debug("Reading %d byte(s) from tcp stream." % self.required_bytes)
                     stream_data = yield self.tcp_stream.read_bytes(self.required_bytes)
                 # Empty stream data signals an error in stream. Reset to scan for next frame header.
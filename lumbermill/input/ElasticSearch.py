@@ -194,6 +194,7 @@ class ElasticSearch(BaseThreadedModule):
 
     def run(self):
         while self.alive:
+            self.waitWhilePaused()
             found_documents = None
             if self.search_type == 'scroll':
                 found_documents = self.executeScrollQuery()
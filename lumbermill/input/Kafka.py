@@ -74,6 +74,7 @@ class Kafka(BaseThreadedModule):
     def run(self):
         while self.alive:
             for kafka_event in self.consumer:
+                self.waitWhilePaused()
                 event = DictUtils.getDefaultEventDict(dict={"topic": kafka_event.topic, "data": kafka_event.value}, caller_class_name=self.__class__.__name__)
                 self.sendEvent(event)
                 if(self.enable_auto_commit):
@@ -74,6 +74,7 @@ class RedisList(BaseThreadedModule):
 
     def handleSingleEvent(self):
         while self.alive:
+            self.waitWhilePaused()
             event = None
             try:
                 event = self.client.blpop(self.lists, timeout=self.timeout)
@@ -91,6 +92,7 @@ class RedisList(BaseThreadedModule):
     def handleBatchEvents(self):
         pipeline = self.client.pipeline()
         while self.alive:
+            self.waitWhilePaused()
             for _ in range(0, self.batch_size):
                 pipeline.blpop(self.lists, timeout=self.timeout)
             try:
@@ -77,6 +77,7 @@ class SQS(BaseThreadedModule):
 
     def run(self):
         while self.alive:
+            self.waitWhilePaused()
             messages_to_delete = []
             response = self.sqs_client.receive_message(QueueUrl=self.sqs_queue_url,
                                                        MaxNumberOfMessages=self.batch_size,
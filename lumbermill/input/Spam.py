@@ -63,6 +63,7 @@ class Spam(BaseThreadedModule):
         counter = 0
         while self.alive:
             for event_data in self.events:
+                self.waitWhilePaused()
                 if isinstance(event_data, str):
                     event = DictUtils.getDefaultEventDict({'data': event_data}, caller_class_name=self.__class__.__name__)
                 elif isinstance(event_data, dict):
@@ -36,6 +36,7 @@ class StdIn(BaseThreadedModule):
         hostname = socket.gethostname()
         multiline_data = ""
         while self.alive:
+            self.waitWhilePaused()
             data = sys.stdin.readline()
             if data.__len__() > 0:
                 if not self.multiline:
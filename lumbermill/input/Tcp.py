@@ -5,6 +5,7 @@ import socket
 import logging
 
 from tornado import autoreload
+from tornado.ioloop import IOLoop
 from tornado.iostream import StreamClosedError
 from tornado.netutil import bind_sockets
 from tornado.tcpserver import TCPServer
@@ -12,6 +13,7 @@ from tornado.tcpserver import TCPServer
 import lumbermill.utils.DictUtils as DictUtils
 from lumbermill.BaseModule import BaseModule
 from lumbermill.utils.Decorators import ModuleDocstringParser
+from lumbermill.utils.SocketHandoff import getSocketHandoff
 
 
 class TornadoTcpServer(TCPServer):
@@ -44,14 +46,25 @@ class ConnectionHandler(object):
         self.address = address
         self.host, self.port = self.address[0], self.address[1]
         self.stream.set_close_callback(self._on_close)
+        self.readNext()
+
+    def readNext(self):
+        # Data already in the read buffer of a closed stream can still be read, so do not check for closed() here.
+        if self.gp_module.input_paused:
+            # Stop reading while the pipeline is congested. Unread data stays in the socket buffers, so the tcp window
+            # will close and throttle the sender. Reading continues when the module resumes its connections.
+            self.gp_module.paused_connections.add(self)
+            return
         try:
-            if not self.stream.closed():
+            if not self.stream.reading():
                 if self.mode == 'line' and self.regex_separator:
                     self.stream.read_until_regex(bytes(self.regex_separator, "utf-8"), self._on_read_line)
                 elif self.mode == 'line':
                     self.stream.read_until(bytes(self.simple_separator, "utf-8"), self._on_read_line)
                 else:
                     self.stream.read_bytes(self.chunksize, self._on_read_chunk)
+        except StreamClosedError:
+            pass
         except:
             etype, evalue, etb = sys.exc_info()
             self.logger.error("Could not read from socket %s. Exception: %s, Error: %s." % (self.address, etype, evalue))
@@ -61,31 +74,14 @@ class ConnectionHandler(object):
         if data == "":
             return
         self.sendEvent(data)
-        try:
-            if not self.stream.reading():
-                if self.regex_separator:
-                    self.stream.read_until_regex(bytes(self.regex_separator, "utf-8"), self._on_read_line)
-                else:
-                    self.stream.read_until(bytes(self.simple_separator, "utf-8"), self._on_read_line)
-        except StreamClosedError:
-            pass
-        except:
-            etype, evalue, etb = sys.exc_info()
-            self.logger.error("Could not read from socket %s. Exception: %s, Error: %s." % (self.address, etype, evalue))
+        self.readNext()
 
     def _on_read_chunk(self, data):
         data = data.strip()
         if data == "":
             return
         self.sendEvent(data)
-        try:
-            if not self.stream.reading():
-                self.stream.read_bytes(self.chunksize, self._on_read_chunk)
-        except StreamClosedError:
-            pass
-        except:
-            etype, evalue, etb = sys.exc_info()
-            self.logger.error("Failed to read from socket %s. Exception: %s, Error: %s." % (self.address, etype, evalue))
+        self.readNext()
 
     def _on_close(self):
         # Send remaining buffer if neccessary.
@@ -101,6 +97,7 @@ class ConnectionHandler(object):
                     sys.exit()
         if data != "":
             self.sendEvent(data)
+        self.gp_module.paused_connections.discard(self)
         self.stream.close()
 
     def sendEvent(self, data):
@@ -158,10 +155,17 @@ class Tcp(BaseModule):
         self.server = False
         self.max_buffer_size = self.getConfigurationValue('max_buffer_size') * 10240 #* 10240
         self.start_ioloop = False
+        self.paused_connections = set()
+        socket_handoff = getSocketHandoff()
+        handoff_key = "tcp:%s:%s" % (self.getConfigurationValue("interface"), self.getConfigurationValue("port"))
         try:
-            self.sockets = bind_sockets(self.getConfigurationValue("port"), self.getConfigurationValue("interface"), backlog=128)
-            for server_socket in self.sockets:
-                server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            # After a restart with socket handoff, the listening sockets are taken over from the previous process.
+            self.sockets = socket_handoff.getInheritedSockets(handoff_key)
+            if not self.sockets:
+                self.sockets = bind_sockets(self.getConfigurationValue("port"), self.getConfigurationValue("interface"), backlog=128)
+                for server_socket in self.sockets:
+                    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            socket_handoff.addSockets(handoff_key, self.sockets)
         except:
             etype, evalue, etb = sys.exc_info()
             self.logger.error("Could not listen on %s:%s. Exception: %s, Error: %s." % (self.getConfigurationValue("interface"),
@@ -185,15 +189,30 @@ class Tcp(BaseModule):
                            'keyfile': self.getConfigurationValue("key")}
         self.server = TornadoTcpServer(ssl_options=ssl_options, gp_module=self, max_buffer_size=self.max_buffer_size)
         self.server.add_sockets(self.sockets)
+        self.io_loop = IOLoop.current()
+
+    def resumeInput(self):
+        BaseModule.resumeInput(self)
+        # Backpressure calls this from a timer thread. Streams must only be used from the ioloop.
+        self.io_loop.add_callback(self.resumeConnections)
+
+    def resumeConnections(self):
+        paused_connections = self.paused_connections
+        self.paused_connections = set()
+        for connection in paused_connections:
+            connection.readNext()
 
     def shutDown(self):
         if not self.is_configured:
             return
         if self.server:
             self.server.stop()
+        # Sockets handed over to a new LumberMill process are still listening there, so they must only be closed.
+        handed_off = self.lumbermill.getFromInternalDataStore('lumbermill.socket_handoff', False)
         for server_socket in self.sockets:
-            try:
-                server_socket.shutdown(socket.SHUT_RDWR)
-            except socket.error:
-                pass
+            if not handed_off:
+                try:
+                    server_socket.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
             server_socket.close()
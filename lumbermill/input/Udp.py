@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import queue
+import select
 import socketserver
 import logging
 import socket
@@ -9,6 +10,7 @@ import threading
 import lumbermill.utils.DictUtils as DictUtils
 from lumbermill.BaseModule import BaseModule
 from lumbermill.utils.Decorators import ModuleDocstringParser
+from lumbermill.utils.SocketHandoff import getSocketHandoff
 
 
 class ThreadPoolMixIn(socketserver.ThreadingMixIn):
@@ -23,6 +25,8 @@ class ThreadPoolMixIn(socketserver.ThreadingMixIn):
     numThreads = 15
     allow_reuse_address = True  # seems to fix socket.error on server restart
     alive = True
+    gp_module = None
+    poll_interval = .5
 
     def serve_forever(self):
         """
@@ -38,6 +42,10 @@ class ThreadPoolMixIn(socketserver.ThreadingMixIn):
 
         # server main loop
         while self.alive:
+            # Stop receiving while the pipeline is congested. Datagrams will queue up in the socket buffer and get
+            # dropped by the os if it is full.
+            if self.gp_module:
+                self.gp_module.waitWhilePaused()
             self.handle_request()
         self.server_close()
 
@@ -47,15 +55,26 @@ class ThreadPoolMixIn(socketserver.ThreadingMixIn):
         obtain request from queue instead of directly from server socket
         """
         while True:
-            socketserver.ThreadingMixIn.process_request_thread(self, *self.requests.get())
+            request, client_address = self.requests.get()
+            try:
+                socketserver.ThreadingMixIn.process_request_thread(self, request, client_address)
+            finally:
+                self.requests.task_done()
 
 
     def handle_request(self):
         """
         simply collect requests and put them on the queue for the workers.
         """
+        # Wait with a timeout, so the server loop notices when the module gets shut down.
+        readable, writable, errored = select.select([self.socket], [], [], self.poll_interval)
+        if not readable:
+            return
         try:
             request, client_address = self.get_request()
+        except BlockingIOError:
+            # Another process sharing the socket read the datagram first.
+            return
         except:
             etype, evalue, etb = sys.exc_info()
             print("Exception: %s, Error: %s." % (etype, evalue))
@@ -89,10 +108,20 @@ class ThreadedUdpServer(ThreadPoolMixIn, socketserver.UDPServer):
 
     allow_reuse_address = True
 
-    def __init__(self, server_address, RequestHandlerClass, bind_and_activate=True, timeout=None):
-        socketserver.UDPServer.__init__(self, server_address, RequestHandlerClass)
+    def __init__(self, server_address, RequestHandlerClass, bind_and_activate=True, timeout=None, gp_module=None, server_socket=None):
+        socketserver.UDPServer.__init__(self, server_address, RequestHandlerClass, bind_and_activate=server_socket is None)
+        if server_socket is not None:
+            # Use the socket taken over from the previous LumberMill process, see SocketHandoff.
+            self.socket.close()
+            self.socket = server_socket
         self.socket.settimeout(timeout)
         self.timeout = timeout
+        self.gp_module = gp_module
+
+    def get_request(self):
+        # Do not block, since other processes read from the same socket.
+        data, client_address = self.socket.recvfrom(self.max_packet_size, socket.MSG_DONTWAIT)
+        return (data, self.socket), client_address
 
 class UdpRequestHandlerFactory:
     def produce(self, udp_server_instance):
@@ -129,11 +158,18 @@ class Udp(BaseModule):
         BaseModule.configure(self, configuration)
         self.server = False
         handler_factory = UdpRequestHandlerFactory()
+        socket_handoff = getSocketHandoff()
+        handoff_key = "udp:%s:%s" % (self.getConfigurationValue("interface"), self.getConfigurationValue("port"))
         try:
+            # After a restart with socket handoff, the socket is taken over from the previous process.
+            inherited_sockets = socket_handoff.getInheritedSockets(handoff_key)
             self.server = ThreadedUdpServer((self.getConfigurationValue("interface"),
                                              self.getConfigurationValue("port")),
                                              handler_factory.produce(self),
-                                             timeout=self.getConfigurationValue("timeout"))
+                                             timeout=self.getConfigurationValue("timeout"),
+                                             gp_module=self,
+                                             server_socket=inherited_sockets[0] if inherited_sockets else None)
+            socket_handoff.addSockets(handoff_key, [self.server.socket])
         except:
             etype, evalue, etb = sys.exc_info()
             self.logger.error("Could not listen on %s:%s. Exception: %s, Error: %s" % (self.getConfigurationValue("interface"),
@@ -158,6 +194,13 @@ class Udp(BaseModule):
         server_thread.daemon = True
         server_thread.start()
 
+    def getPendingEventCount(self):
+        # Datagrams received but not yet sent on as events.
+        try:
+            return self.server.requests.unfinished_tasks
+        except AttributeError:
+            return 0
+
     def shutDown(self):
         try:
             self.server.alive = False
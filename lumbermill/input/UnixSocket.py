@@ -4,11 +4,13 @@ import socket
 import sys
 
 from tornado import netutil
+from tornado.ioloop import IOLoop
 from tornado.tcpserver import TCPServer
 
 import lumbermill.utils.DictUtils as DictUtils
 from lumbermill.BaseThreadedModule import BaseThreadedModule
 from lumbermill.utils.Decorators import ModuleDocstringParser
+from lumbermill.utils.SocketHandoff import getSocketHandoff
 
 
 class SocketServer(TCPServer):
@@ -31,15 +33,23 @@ class ConnectionHandler(object):
         self.stream = stream
         self.address = address
         self.stream.set_close_callback(self._on_close)
-        if not self.stream.closed():
-            self.stream.read_until_regex(b'\r?\n', self._on_read_line)
+        self.readNext()
+
+    def readNext(self):
+        if self.stream.closed():
+            return
+        if self.gp_module.input_paused:
+            # Stop reading while the pipeline is congested, see Tcp.
+            self.gp_module.paused_connections.add(self)
+            return
+        self.stream.read_until_regex(b'\r?\n', self._on_read_line)
 
     def _on_read_line(self, data):
         self.gp_module.sendEvent(DictUtils.getDefaultEventDict({"data": data}, caller_class_name='UnixSocket', received_from=self.address))
-        if not self.stream.closed():
-            self.stream.read_until_regex(b'\r?\n', self._on_read_line)
+        self.readNext()
 
     def _on_close(self):
+        self.gp_module.paused_connections.discard(self)
         self.stream.close()
 
 @ModuleDocstringParser
@@ -62,13 +72,22 @@ class UnixSocket(BaseThreadedModule):
         # Call parent configure method
         BaseThreadedModule.configure(self, configuration)
         self.running = False
-
-    def start(self):
+        self.paused_connections = set()
+        # Bind before the workers are forked, so all processes accept connections from the same socket.
+        socket_handoff = getSocketHandoff()
+        handoff_key = "unix:%s" % self.getConfigurationValue('path_to_socket')
         try:
-            self.unix_socket = netutil.bind_unix_socket(self.getConfigurationValue('path_to_socket'))
+            # After a restart with socket handoff, the socket is taken over from the previous process.
+            inherited_sockets = socket_handoff.getInheritedSockets(handoff_key)
+            self.unix_socket = inherited_sockets[0] if inherited_sockets else netutil.bind_unix_socket(self.getConfigurationValue('path_to_socket'))
+            socket_handoff.addSockets(handoff_key, [self.unix_socket])
         except:
             etype, evalue, etb = sys.exc_info()
             self.logger.error("Will not start module %s. Could not create unix socket %s. Exception: %s, Error: %s." % (self.__class__.__name__, self.getConfigurationValue('path_to_socket'), etype, evalue))
+            self.unix_socket = None
+
+    def start(self):
+        if not self.unix_socket:
             return
         try:
             self.server = SocketServer(gp_module=self)
@@ -77,12 +96,25 @@ class UnixSocket(BaseThreadedModule):
             etype, evalue, etb = sys.exc_info()
             self.logger.error("Could not access socket %s. Exception: %s, Error: %s" % (self.getConfigurationValue("path_to_socket"), etype, evalue))
             return
+        self.io_loop = IOLoop.current()
         self.running = True
         #self.server.start(0)
         #ioloop.IOLoop.instance().start()
 
+    def resumeInput(self):
+        BaseThreadedModule.resumeInput(self)
+        # Backpressure calls this from a timer thread. Streams must only be used from the ioloop.
+        self.io_loop.add_callback(self.resumeConnections)
+
+    def resumeConnections(self):
+        paused_connections = self.paused_connections
+        self.paused_connections = set()
+        for connection in paused_connections:
+            connection.readNext()
+
     def shutDown(self):
-        if self.running:
+        # The socket of a LumberMill process that handed it over to a new process is still in use there.
+        if self.running and not self.lumbermill.getFromInternalDataStore('lumbermill.socket_handoff', False):
             try:
                 os.remove(self.getConfigurationValue('path_to_socket'))
             except:
@@ -102,6 +102,7 @@ class ZeroMQ(BaseThreadedModule):
             self.logger.error("Shutting down module %s since no receivers are set." % (self.__class__.__name__))
             return
         while self.alive:
+            self.waitWhilePaused()
             for event in self.getEventFromZmq():
                 event = DictUtils.getDefaultEventDict({"data": event}, caller_class_name="Zmq")
                 if self.pattern == 'sub':
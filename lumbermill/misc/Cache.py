@@ -68,10 +68,12 @@ class Cache(BaseThreadedModule):
             self.lumbermill.shutDown();
 
         if self.getConfigurationValue('store_interval_in_secs') or self.getConfigurationValue('batch_size'):
+            # Pending values are looked up in set_buffer.buffer. Flush in the calling thread, so values being stored
+            # stay visible there.
             if self.backend == 'RedisStore':
-                self.set_buffer = Buffer(self.getConfigurationValue('batch_size'), self._setRedisBufferedCallback, self.getConfigurationValue('store_interval_in_secs'), maxsize=self.getConfigurationValue('backlog_size'))
+                self.set_buffer = Buffer(self.getConfigurationValue('batch_size'), self._setRedisBufferedCallback, self.getConfigurationValue('store_interval_in_secs'), maxsize=self.getConfigurationValue('backlog_size'), background_flush=False)
             else:
-                self.set_buffer = Buffer(self.getConfigurationValue('batch_size'), self._setBufferedCallback, self.getConfigurationValue('store_interval_in_secs'), maxsize=self.getConfigurationValue('backlog_size'))
+                self.set_buffer = Buffer(self.getConfigurationValue('batch_size'), self._setBufferedCallback, self.getConfigurationValue('store_interval_in_secs'), maxsize=self.getConfigurationValue('backlog_size'), background_flush=False)
             self._set = self.set
             self.set = self._setBuffered
             self._get = self.get
@@ -262,7 +264,8 @@ class Cache(BaseThreadedModule):
 
     def shutDown(self):
         try:
-            self.buffer.flush()
+            self.set_buffer.flush()
+            self.set_buffer.stop()
         except:
             pass
         BaseThreadedModule.shutDown(self)
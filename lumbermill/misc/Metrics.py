@@ -5,7 +5,7 @@ import lumbermill.utils.DictUtils as DictUtils
 from collections import defaultdict
 from lumbermill.BaseThreadedModule import BaseThreadedModule
 from lumbermill.utils.Decorators import ModuleDocstringParser, setInterval
-from lumbermill.utils.StatisticCollector import StatisticCollector, MultiProcessStatisticCollector
+from lumbermill.utils.StatisticCollector import MultiProcessStatisticCollector
 from lumbermill.utils.DynamicValues import mapDynamicValue
 from lumbermill.utils.misc import TimedFunctionManager
 
@@ -18,6 +18,9 @@ class Metrics(BaseThreadedModule):
     As a side note: This module inits MultiProcessStatisticCollector. As it uses multiprocessing.Manager().dict()
     this will start another process. So if you use SimpleStats, you will see workers + 1 processes in the process
     list.
+    The counts are aggregated per process and only passed to the collector once per interval. Unlike the fixed size
+    key table of SharedMemoryStatisticCollector, the collector does not limit the number or length of the names and
+    values, so high cardinality fields like urls or client ips can be counted.
 
     This module keeps track of the number of times a field occured in an event during interval.
     So, if you want to count the http_status codes encountered during the last 10s, you would use this configuration:
@@ -117,9 +120,10 @@ class Metrics(BaseThreadedModule):
         return evaluateStats
 
     def accumulateMetrics(self):
-        for idx, count in self.aggregations_counter.items():
-            self.mp_stats_collector.incrementCounter(idx, count, namespace=self.stats_namespace)
-            self.aggregations_counter[idx] = 0
+        aggregations_counter, self.aggregations_counter = self.aggregations_counter, defaultdict(int)
+        for idx, count in aggregations_counter.items():
+            if count:
+                self.mp_stats_collector.incrementCounter(idx, count, namespace=self.stats_namespace)
         for idx, values in self.percentile_values.items():
             if not values:
                 continue
@@ -133,6 +137,8 @@ class Metrics(BaseThreadedModule):
         for name_value in sorted(self.mp_stats_collector.getAllCounters(namespace=self.stats_namespace).keys()):
             field_count = self.mp_stats_collector.getCounter(name_value, namespace=self.stats_namespace)
             self.mp_stats_collector.resetCounter(name_value, namespace=self.stats_namespace)
+            if not field_count:
+                continue
             field_name, field_value = name_value
             if not last_field_name:
                 last_field_name = field_name
@@ -29,3 +29,6 @@ class Noop(BaseThreadedModule):
         @return data: dictionary
         """
         yield event
+
+    def processEvent(self, event):
+        return event
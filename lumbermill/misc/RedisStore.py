@@ -71,7 +71,7 @@ class RedisStore(BaseThreadedModule):
             self.lumbermill.shutDown()
         self.set_buffer = None
         if self.getConfigurationValue('store_interval_in_secs') or self.getConfigurationValue('batch_size'):
-            self.set_buffer = Buffer(self.getConfigurationValue('batch_size'), self.setBufferedCallback, self.getConfigurationValue('store_interval_in_secs'), maxsize=self.getConfigurationValue('backlog_size'))
+            self.set_buffer = Buffer(self.getConfigurationValue('batch_size'), self.setBufferedCallback, self.getConfigurationValue('store_interval_in_secs'), maxsize=self.getConfigurationValue('backlog_size'), background_flush=False)
             self._set = self.set
             self.set = self.setBuffered
             self._get = self.get
@@ -220,7 +220,8 @@ class RedisStore(BaseThreadedModule):
 
     def shutDown(self):
         try:
-            self.buffer.flush()
+            self.set_buffer.flush()
+            self.set_buffer.stop()
         except:
             pass
         BaseThreadedModule.shutDown(self)
@@ -10,7 +10,8 @@ from collections import defaultdict
 import lumbermill.utils.DictUtils as DictUtils
 from lumbermill.BaseThreadedModule import BaseThreadedModule
 from lumbermill.utils.Decorators import ModuleDocstringParser, setInterval
-from lumbermill.utils.StatisticCollector import StatisticCollector, MultiProcessStatisticCollector
+from lumbermill.utils.Histogram import LogHistogram, MODULE_TIMINGS, getModuleTimings
+from lumbermill.utils.StatisticCollector import StatisticCollector, SharedMemoryStatisticCollector, MODULE_EVENT_COUNTERS
 from lumbermill.utils.misc import AnsiColors, TimedFunctionManager
 
 
@@ -22,9 +23,13 @@ class SimpleStats(BaseThreadedModule):
     Use this module if you just need some simple statistics on how many events are passing through 
     Per default, statistics will just be send to stdout.
 
-    As a side note: This module inits MultiProcessStatisticCollector. As it uses multiprocessing.Manager().dict()
-    this will start another process. So if you use SimpleStats, you will see workers + 1 processes in the process
-    list.
+    Counters of all processes are collected via SharedMemoryStatisticCollector, so no extra process is needed.
+    If module_statistics is enabled in the Global section, the events in, out, dropped and errored per module are
+    logged as well, together with how often and how long modules were blocked by full buffers or input queues.
+    Events lost, e.g. because a buffer could not be flushed, are always logged.
+    If module_timings is enabled in the Global section, the mean, median and 99th percentile of the handling time,
+    the cpu time per event and the time events waited in the input queue are logged per module. The cpu usage
+    is given in percent of one core, summed over all workers.
 
     For possible values for process_statistics see: https://code.google.com/archive/p/psutil/wikis/Documentation.wiki#CPU
 
@@ -51,12 +56,13 @@ class SimpleStats(BaseThreadedModule):
         self.process_statistics = self.getConfigurationValue('process_statistics')
         self.stats_namespace = "SimpleStats"
         self.stats_collector = StatisticCollector()
-        self.mp_stats_collector = MultiProcessStatisticCollector()
+        self.mp_stats_collector = SharedMemoryStatisticCollector()
         self.stats_collector.initCounter(self.stats_namespace)
         self.mp_stats_collector.initCounter(self.stats_namespace)
         self.module_queues = {}
         self.psutil_processes = []
         self.last_values = {'events_received': 0}
+        self.last_module_timings = {}
         self.methods = dir(self)
 
     def getRunTimedFunctionsFunc(self):
@@ -78,7 +84,7 @@ class SimpleStats(BaseThreadedModule):
     def accumulateReceiveRateStats(self):
         if self.stats_collector.getCounter('events_received', namespace=self.stats_namespace) == 0:
             return
-        self.mp_stats_collector.incrementCounter('events_received', self.stats_collector.getCounter('events_received'), namespace=self.stats_namespace)
+        self.mp_stats_collector.incrementCounter('events_received', self.stats_collector.getCounter('events_received', namespace=self.stats_namespace), namespace=self.stats_namespace)
         self.stats_collector.resetCounter('events_received', namespace=self.stats_namespace)
 
     def printIntervalStatistics(self):
@@ -89,6 +95,10 @@ class SimpleStats(BaseThreadedModule):
             self.eventTypeStatistics()
         if self.getConfigurationValue('waiting_event_statistics'):
             self.eventsInQueuesStatistics()
+        self.moduleStatistics()
+        self.moduleTimingStatistics()
+        self.bufferStatistics()
+        self.lostEventsStatistics()
         if self.getConfigurationValue('process_statistics'):
             self.processStatistics()
 
@@ -128,6 +138,96 @@ class SimpleStats(BaseThreadedModule):
             else:
                 raise e
 
+    def moduleStatistics(self):
+        module_counters = self.getModuleCounters()
+        if not module_counters:
+            return
+        self.logger.info(">> Module stats")
+        for module_name, counters in sorted(module_counters.items()):
+            self.logger.info("%s: %s" % (module_name, ", ".join(["%s: %s%s%s" % (counter_name, AnsiColors.YELLOW, counters[counter_name], AnsiColors.ENDC) for counter_name in MODULE_EVENT_COUNTERS])))
+            if self.emit_as_event:
+                stats_event = {"stats_type": "module_stats", "module": module_name, "interval": self.interval, "timestamp": time.time()}
+                stats_event.update(counters)
+                self.sendEvent(DictUtils.getDefaultEventDict(stats_event, caller_class_name="Statistics", event_type="statistic"))
+
+    def getModuleCounters(self):
+        """
+        Return the events in, out, dropped and errored per module, summed over all processes since start.
+        """
+        module_counters = {}
+        for (module_name, counter_name), count in self.mp_stats_collector.getAllCounters(namespace="ModuleStatistics").items():
+            module_counters.setdefault(module_name, dict.fromkeys(MODULE_EVENT_COUNTERS, 0))[counter_name] = count
+        return module_counters
+
+    def moduleTimingStatistics(self):
+        module_timings = self.getModuleTimings()
+        if not module_timings:
+            return
+        self.logger.info(">> Module timings")
+        for module_name, worker_timings in sorted(module_timings.items()):
+            histograms = {}
+            for timings in worker_timings.values():
+                for timing, histogram in timings.items():
+                    histograms.setdefault(timing, LogHistogram()).merge(histogram)
+            last_histograms = self.last_module_timings.setdefault(module_name, {})
+            timing_summaries = {}
+            for timing in MODULE_TIMINGS:
+                if timing not in histograms:
+                    continue
+                timing_summaries[timing] = histograms[timing].getDelta(last_histograms.get(timing, LogHistogram())).getSummary()
+                last_histograms[timing] = histograms[timing]
+            if not any([summary['count'] for summary in timing_summaries.values()]):
+                continue
+            if 'cpu_time' in timing_summaries:
+                cpu_percent = 100 * timing_summaries['cpu_time']['sum'] / self.interval
+            else:
+                cpu_percent = 0
+            self.logger.info("%s: cpu: %s%.1f%%%s, %s" % (module_name, AnsiColors.YELLOW, cpu_percent, AnsiColors.ENDC, ", ".join(["%s: mean %s%s%s, p50 %s, p99 %s" % (timing, AnsiColors.YELLOW, self.formatDuration(summary['mean']), AnsiColors.ENDC, self.formatDuration(summary['p50']), self.formatDuration(summary['p99'])) for timing, summary in sorted(timing_summaries.items())])))
+            if self.emit_as_event:
+                stats_event = {"stats_type": "module_timings", "module": module_name, "cpu_percent": cpu_percent, "interval": self.interval, "timestamp": time.time()}
+                for timing, summary in timing_summaries.items():
+                    summary.pop('buckets')
+                    stats_event[timing] = summary
+                self.sendEvent(DictUtils.getDefaultEventDict(stats_event, caller_class_name="Statistics", event_type="statistic"))
+
+    def getModuleTimings(self):
+        """
+        Return the timing histograms per module and worker, summed since start.
+        """
+        return getModuleTimings(self.mp_stats_collector)
+
+    def formatDuration(self, seconds):
+        if seconds < .001:
+            return "%.1fus" % (seconds * 1000000)
+        if seconds < 1:
+            return "%.2fms" % (seconds * 1000)
+        return "%.2fs" % seconds
+
+    def bufferStatistics(self):
+        buffer_counters = {}
+        for (module_name, buffer_type, counter_name), count in self.mp_stats_collector.getAllCounters(namespace="BufferStatistics").items():
+            buffer_counters.setdefault((module_name, buffer_type), {'blocked_count': 0, 'blocked_ms': 0})[counter_name] = count
+            self.mp_stats_collector.resetCounter((module_name, buffer_type, counter_name), namespace="BufferStatistics")
+        if not buffer_counters:
+            return
+        self.logger.info(">> Blocked buffers")
+        for (module_name, buffer_type), counters in sorted(buffer_counters.items()):
+            self.logger.info("%s %s: blocked %s%s%s times for %s%sms%s" % (module_name, buffer_type, AnsiColors.YELLOW, counters['blocked_count'], AnsiColors.ENDC, AnsiColors.YELLOW, counters['blocked_ms'], AnsiColors.ENDC))
+            if self.emit_as_event:
+                stats_event = {"stats_type": "buffer_stats", "module": module_name, "buffer_type": buffer_type, "interval": self.interval, "timestamp": time.time()}
+                stats_event.update(counters)
+                self.sendEvent(DictUtils.getDefaultEventDict(stats_event, caller_class_name="Statistics", event_type="statistic"))
+
+    def lostEventsStatistics(self):
+        lost_events = dict([(reason, count) for reason, count in self.mp_stats_collector.getAllCounters(namespace="LostEvents").items() if count])
+        if not lost_events:
+            return
+        self.logger.info(">> Lost events")
+        for reason, count in sorted(lost_events.items()):
+            self.logger.info("%s: %s%s%s" % (reason, AnsiColors.YELLOW, count, AnsiColors.ENDC))
+        if self.emit_as_event:
+            self.sendEvent(DictUtils.getDefaultEventDict({"stats_type": "lost_events", "lost_events": lost_events, "interval": self.interval, "timestamp": time.time()}, caller_class_name="Statistics", event_type="statistic"))
+
     def eventsInQueuesStatistics(self):
         if len(self.module_queues) == 0:
             return
@@ -3,7 +3,7 @@ import os
 import lumbermill.utils.DictUtils as DictUtils
 from lumbermill.BaseThreadedModule import BaseThreadedModule
 from lumbermill.utils.Decorators import ModuleDocstringParser, setInterval
-from lumbermill.utils.StatisticCollector import StatisticCollector, MultiProcessStatisticCollector
+from lumbermill.utils.StatisticCollector import StatisticCollector, SharedMemoryStatisticCollector
 from lumbermill.utils.misc import AnsiColors, TimedFunctionManager
 
 
@@ -35,7 +35,7 @@ class SimpleStats(BaseThreadedModule):
         self.interval = self.getConfigurationValue('interval')
         self.stats_collector = StatisticCollector()
         for counter_name in ['events_received', 'event_type_Unknown', 'event_type_httpd_access_log']:
-            MultiProcessStatisticCollector().initCounter(counter_name)
+            SharedMemoryStatisticCollector().initCounter(counter_name)
         self.module_queues = {}
 
     def getRunTimedFunctionsFunc(self):
@@ -49,11 +49,13 @@ class SimpleStats(BaseThreadedModule):
 
     def accumulateEventTypeStats(self):
         for event_type, count in self.stats_collector.getAllCounters().items():
-            MultiProcessStatisticCollector().incrementCounter(event_type, count)
+            if count == 0:
+                continue
+            SharedMemoryStatisticCollector().incrementCounter(event_type, count)
             self.stats_collector.resetCounter(event_type)
 
     def accumulateReceiveRateStats(self):
-        MultiProcessStatisticCollector().incrementCounter('events_received', self.stats_collector.getCounter('events_received'))
+        SharedMemoryStatisticCollector().incrementCounter('events_received', self.stats_collector.getCounter('events_received'))
         self.stats_collector.resetCounter('events_received')
 
     def printIntervalStatistics(self):
@@ -67,22 +69,21 @@ class SimpleStats(BaseThreadedModule):
 
     def eventTypeStatistics(self):
         self.logger.info(">> EventTypes Statistics")
-        for event_type, count in sorted(MultiProcessStatisticCollector().getAllCounters().items()):
-            count = count.value
+        for event_type, count in sorted(SharedMemoryStatisticCollector().getAllCounters().items()):
             if not event_type.startswith('event_type_'):
                 continue
             event_name = event_type.replace('event_type_', '')
             self.logger.info("EventType: %s%s%s - Hits: %s%s%s" % (AnsiColors.YELLOW, event_name, AnsiColors.ENDC, AnsiColors.YELLOW, count, AnsiColors.ENDC))
             if self.emit_as_event:
                 self.sendEvent(DictUtils.getDefaultEventDict({"total_count": count, "count_per_sec": (count/self.interval), "field_name": event_name, "interval": self.interval }, caller_class_name="Statistics", event_type="statistic"))
-            MultiProcessStatisticCollector().resetCounter(event_type)
+            SharedMemoryStatisticCollector().resetCounter(event_type)
 
     def receiveRateStatistics(self):
         self.logger.info(">> Receive rate stats")
-        events_received = MultiProcessStatisticCollector().getCounter('events_received')
+        events_received = SharedMemoryStatisticCollector().getCounter('events_received')
         if not events_received:
             events_received = 0
-        MultiProcessStatisticCollector().resetCounter('events_received')
+        SharedMemoryStatisticCollector().resetCounter('events_received')
         self.logger.info("Received events in %ss: %s%s (%s/eps)%s" % (self.getConfigurationValue('interval'), AnsiColors.YELLOW, events_received, (events_received/self.interval), AnsiColors.ENDC))
         if self.emit_as_event:
             self.sendEvent(DictUtils.getDefaultEventDict({"total_count": events_received, "count_per_sec": (events_received/self.interval), "field_name": "all_events", "interval": self.interval }, caller_class_name="Statistics", event_type="statistic"))
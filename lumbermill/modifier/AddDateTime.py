@@ -39,13 +39,16 @@ class AddDateTime(BaseThreadedModule):
         self.target_format = self.getConfigurationValue('target_format')
         self.target_field = self.getConfigurationValue('target_field')
         if self.source_fields:
-            self.handleEvent = self.handleEventWithSourceFields
+            self.processEvent = self.processEventWithSourceFields
 
     def handleEvent(self, event):
+        yield self.processEvent(event)
+
+    def processEvent(self, event):
         event[self.target_field] = datetime.datetime.utcnow().strftime(self.target_format)
-        yield event
+        return event
 
-    def handleEventWithSourceFields(self, event):
+    def processEventWithSourceFields(self, event):
         for source_field in self.source_fields:
             try:
                 time_field = event[source_field]
@@ -57,4 +60,4 @@ class AddDateTime(BaseThreadedModule):
                 except ValueError:
                     continue
                 event[self.target_field] = date_time.strftime(self.target_format)
-        yield event
+        return event
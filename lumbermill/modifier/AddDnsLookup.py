@@ -70,6 +70,10 @@ class AddDnsLookup(BaseThreadedModule):
                             'event': event})
         yield None
 
+    def getPendingEventCount(self):
+        # Events waiting for a lookup thread or being looked up.
+        return self.queue.unfinished_tasks + BaseThreadedModule.getPendingEventCount(self)
+
     def shutDown(self):
         BaseThreadedModule.shutDown(self)
         for thread in self.lookup_threads:
@@ -91,24 +95,30 @@ class LookupThread(threading.Thread):
     def run(self):
         while self.alive:
             try:
-                payload = self.queue.get(block=False, timeout=.2)
+                payload = self.queue.get(timeout=.2)
             except queue.Empty:
                 continue
-            source_field = payload['source_field']
-            target_field = payload['target_field']
-            event = payload['event']
-            host_or_ip = event[source_field]
-            # Try to get it from cache.
             try:
-                result = self.caller.in_mem_cache.get(host_or_ip)
-            except KeyError:
-                if self.lookup_type == 'resolve':
-                    result = self.doLookup(host_or_ip)
-                elif self.lookup_type == 'reverse':
-                    result = self.doReverseLookup(host_or_ip)
-            self.caller.in_mem_cache.set(host_or_ip, result)
-            event[target_field] = result
-            self.caller.sendEvent(event)
+                self.lookup(payload)
+            finally:
+                self.queue.task_done()
+
+    def lookup(self, payload):
+        source_field = payload['source_field']
+        target_field = payload['target_field']
+        event = payload['event']
+        host_or_ip = event[source_field]
+        # Try to get it from cache.
+        try:
+            result = self.caller.in_mem_cache.get(host_or_ip)
+        except KeyError:
+            if self.lookup_type == 'resolve':
+                result = self.doLookup(host_or_ip)
+            elif self.lookup_type == 'reverse':
+                result = self.doReverseLookup(host_or_ip)
+        self.caller.in_mem_cache.set(host_or_ip, result)
+        event[target_field] = result
+        self.caller.sendEvent(event)
 
     def doReverseLookup(self, ip_address):
         #started = time.time()
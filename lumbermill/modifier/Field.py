@@ -251,10 +251,10 @@ class Field(BaseThreadedModule):
             if isinstance(regex_pattern, list):
                 i = iter(regex_pattern)
                 # Pattern is the first entry
-                regex_pattern = i.next()
+                regex_pattern = next(i)
                 # Regex options the second
                 try:
-                    regex_options = eval(i.next())
+                    regex_options = eval(next(i))
                 except:
                     etype, evalue, etb = sys.exc_info()
                     self.logger.error("RegEx error for options %s. Exception: %s, Error: %s" % (regex_options, etype, evalue))
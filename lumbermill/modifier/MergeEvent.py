@@ -106,12 +106,21 @@ class MergeEvent(BaseThreadedModule):
 
     def initAfterFork(self):
         # As the buffer uses a threaded timed function to flush its buffer and thread will not survive a fork, init buffer here.
+        # There is one buffer per key, so flush in the calling thread instead of starting a flusher thread per buffer.
         self.buffers = collections.defaultdict(lambda: Buffer(flush_size=self.buffer_size,
                                                               callback=self.sendMergedEvent,
                                                               interval=self.flush_interval_in_secs,
-                                                              maxsize=self.buffer_size))
+                                                              maxsize=self.buffer_size,
+                                                              background_flush=False))
         BaseThreadedModule.initAfterFork(self)
 
+    def getPendingEventCount(self):
+        return sum([buffer.bufsize() for buffer in list(self.buffers.values())]) + BaseThreadedModule.getPendingEventCount(self)
+
+    def flushPendingEvents(self, timeout=None):
+        for buffer in list(self.buffers.values()):
+            buffer.flush()
+
     def handleEventStartPattern(self, event):
         key = self.getConfigurationValue("buffer_key", event)
         # No pattern was defined, to merging of event data will only be based on the buffer key.
@@ -169,3 +178,9 @@ class MergeEvent(BaseThreadedModule):
             merged_event = DictUtils.getDefaultEventDict(root_event, caller_class_name=caller_class_name, received_from=received_from)
             self.sendEvent(merged_event)
             return True
+
+    def shutDown(self):
+        for buffer in list(getattr(self, 'buffers', {}).values()):
+            buffer.flush()
+            buffer.stop()
+        BaseThreadedModule.shutDown(self)
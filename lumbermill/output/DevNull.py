@@ -18,3 +18,6 @@ class DevNull(BaseThreadedModule):
 
     def handleEvent(self, event):
         yield None
+
+    def handleEvents(self, events):
+        return []
@@ -14,6 +14,7 @@ from lumbermill.constants import IS_PYPY
 from lumbermill.BaseThreadedModule import BaseThreadedModule
 from lumbermill.utils.Buffers import Buffer
 from lumbermill.utils.Decorators import ModuleDocstringParser
+from lumbermill.utils.DictUtils import getSerializableEvent
 from lumbermill.utils.DynamicValues import mapDynamicValue, mapDynamicValueInString
 
 # For pypy the default json module is the fastest.
@@ -163,6 +164,21 @@ class ElasticSearch(BaseThreadedModule):
         self.buffer.append(publish_data)
         yield None
 
+    def handleEvents(self, events):
+        append = self.buffer.append
+        for event in events:
+            if self.fields:
+                publish_data = {}
+                for field in self.fields:
+                    try:
+                        publish_data.update(event[field])
+                    except KeyError:
+                        continue
+            else:
+                publish_data = event
+            append(publish_data)
+        return []
+
     def dataToElasticSearchJson(self, events):
         """
         Format data for elasticsearch bulk update.
@@ -183,6 +199,7 @@ class ElasticSearch(BaseThreadedModule):
                 header['index']['_routing'] = routing
             if self.ttl:
                 header['index']['_ttl'] = self.ttl
+            event = getSerializableEvent(event)
             if self.action == 'update':
                 event = {'doc': event}
             try:
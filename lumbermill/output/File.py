@@ -96,6 +96,12 @@ class File(BaseThreadedModule):
         self.buffer.append(event)
         yield None
 
+    def handleEvents(self, events):
+        append = self.buffer.append
+        for event in events:
+            append(event)
+        return []
+
     def getOrCreateFileHandle(self, path, mode):
         file_handle = None
         try:
@@ -119,3 +119,4 @@ class Graphite(BaseThreadedModule):
             self.connection.close()
         except:
             pass
+        BaseThreadedModule.shutDown(self)
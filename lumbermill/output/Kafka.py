@@ -6,6 +6,7 @@ import logging
 from lumbermill.constants import IS_PYPY
 from lumbermill.BaseThreadedModule import BaseThreadedModule
 from lumbermill.utils.Decorators import ModuleDocstringParser
+from lumbermill.utils.DictUtils import getSerializableEvent
 from lumbermill.utils.DynamicValues import mapDynamicValue
 
 # For pypy the default json module is the fastest.
@@ -74,7 +75,7 @@ class Kafka(BaseThreadedModule):
         if self.format:
             publish_data = mapDynamicValue(self.format, event).encode('utf-8')
         else:
-            publish_data = json.dumps(event).encode('utf-8')
+            publish_data = json.dumps(getSerializableEvent(event)).encode('utf-8')
         key = None
         if self.has_key:
             key = self.getConfigurationValue('key', event).encode('utf-8')
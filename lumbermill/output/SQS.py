@@ -9,6 +9,7 @@ from lumbermill.constants import IS_PYPY
 from lumbermill.BaseThreadedModule import BaseThreadedModule
 from lumbermill.utils.Buffers import Buffer
 from lumbermill.utils.Decorators import ModuleDocstringParser
+from lumbermill.utils.DictUtils import getSerializableEvent
 from lumbermill.utils.DynamicValues import mapDynamicValue
 
 # For pypy the default json module is the fastest.
@@ -114,7 +115,7 @@ class SQS(BaseThreadedModule):
                 event = mapDynamicValue(self.format, event)
             else:
                 try:
-                    event = json.dumps(event)
+                    event = json.dumps(getSerializableEvent(event))
                 except:
                     etype, evalue, etb = sys.exc_info()
                     self.logger.warning("Error while encoding event data: %s to json. Exception: %s, Error: %s." % (event, etype, evalue))
@@ -128,4 +129,5 @@ class SQS(BaseThreadedModule):
 
     def shutDown(self):
         self.buffer.flush()
+        BaseThreadedModule.shutDown(self)
 
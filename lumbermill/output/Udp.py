@@ -6,6 +6,7 @@ from lumbermill.constants import IS_PYPY
 from lumbermill.BaseThreadedModule import BaseThreadedModule
 from lumbermill.utils.Buffers import Buffer
 from lumbermill.utils.Decorators import ModuleDocstringParser
+from lumbermill.utils.DictUtils import getSerializableEvent
 from lumbermill.utils.DynamicValues import mapDynamicValue
 
 # For pypy the default json module is the fastest.
@@ -70,7 +71,7 @@ class Udp(BaseThreadedModule):
         if self.format:
             publish_data = mapDynamicValue(self.format, event).encode('utf-8')
         else:
-            publish_data = json.dumps(event).encode('utf-8')
+            publish_data = json.dumps(getSerializableEvent(event)).encode('utf-8')
         publish_data += "\n".encode('utf-8')
         try:
             self.socket.sendto(publish_data, self.target_address)
@@ -106,3 +106,4 @@ class Zabbix(BaseThreadedModule):
 
     def shutDown(self):
         self.buffer.flush()
+        BaseThreadedModule.shutDown(self)
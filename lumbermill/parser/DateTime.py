@@ -5,6 +5,7 @@ import pytz
 
 from lumbermill.BaseThreadedModule import BaseThreadedModule
 from lumbermill.utils.Decorators import ModuleDocstringParser
+from lumbermill.utils.DictUtils import getFieldGetter, getFieldSetter
 
 
 @ModuleDocstringParser
@@ -43,6 +44,8 @@ class DateTime(BaseThreadedModule):
             self.lumbermill.shutDown()
         self.target_field = self.getConfigurationValue('target_field') if self.getConfigurationValue('target_field') else self.source_field
         self.target_date_pattern = self.getConfigurationValue('target_date_pattern')
+        self.getSourceField = getFieldGetter(self.source_field)
+        self.setTargetField = getFieldSetter(self.target_field)
         try:
             self.target_timezone = pytz.timezone(self.getConfigurationValue('target_timezone'))
         except pytz.UnknownTimeZoneError:
@@ -51,13 +54,19 @@ class DateTime(BaseThreadedModule):
             self.lumbermill.shutDown()
 
     def handleEvent(self, event):
-        if self.source_field in event:
-            try:
-                datetime_object = datetime.datetime.strptime(event[self.source_field], self.source_date_pattern)
-                if self.source_timezone != self.target_timezone:
-                    datetime_object = self.source_timezone.localize(datetime_object).astimezone(self.target_timezone)
-                event[self.target_field] = datetime_object.strftime(self.target_date_pattern)
-            except:
-                etype, evalue, etb = sys.exc_info()
-                self.logger.warning("Could not parse datetime %s with pattern %s. Exception: %s, Error: %s." % (event[self.source_field], self.source_date_pattern, etype, evalue))
-        yield event
+        yield self.processEvent(event)
+
+    def processEvent(self, event):
+        try:
+            source_value = self.getSourceField(event)
+        except KeyError:
+            return event
+        try:
+            datetime_object = datetime.datetime.strptime(source_value, self.source_date_pattern)
+            if self.source_timezone != self.target_timezone:
+                datetime_object = self.source_timezone.localize(datetime_object).astimezone(self.target_timezone)
+            self.setTargetField(event, datetime_object.strftime(self.target_date_pattern))
+        except:
+            etype, evalue, etb = sys.exc_info()
+            self.logger.warning("Could not parse datetime %s with pattern %s. Exception: %s, Error: %s." % (source_value, self.source_date_pattern, etype, evalue))
+        return event
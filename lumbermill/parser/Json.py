@@ -7,6 +7,7 @@ from bs4 import UnicodeDammit
 from lumbermill.constants import IS_PYPY
 from lumbermill.BaseThreadedModule import BaseThreadedModule
 from lumbermill.utils.Decorators import ModuleDocstringParser
+from lumbermill.utils.DictUtils import getSerializableEvent
 
 # For pypy the default json module is the fastest.
 if IS_PYPY:
@@ -79,62 +80,79 @@ class Json(BaseThreadedModule):
         self.drop_original = not self.getConfigurationValue('keep_original')
         self.event_buffer = {}
         if self.getConfigurationValue('action') == 'decode':
-           self.handleEvent = self.decodeEvent
+           self.handle_events = self.decodeEvents
         else:
-           self.handleEvent = self.encodeEvent
+           self.handle_events = self.encodeEvents
+        self.handleEvents = self.handle_events
+
+    def handleEvent(self, event):
+        # Call the configured method directly. handleEvents might be wrapped for module statistics.
+        for event in self.handle_events([event]):
+            yield event
 
     def decodeEvent(self, event):
-        for source_field in self.source_fields:
-            try:
-                json_string = event[source_field].decode()
-            except (AttributeError, UnicodeEncodeError, UnicodeDecodeError):
-                json_string = UnicodeDammit(event[source_field]).unicode_markup
-            except KeyError:
-                continue
-            try:
-                decoded_datasets = json.loads(json_string)
-            except:
-                # Maybe we got a stream of multiple json messages. Try to parse them.
-                try:
-                    decoded_datasets = json.loads(json_string, cls=ConcatJSONDecoder)
-                except:
-                    etype, evalue, etb = sys.exc_info()
-                    self.logger.warning("Could not json decode event.%s: %s. Exception: %s, Error: %s." % (source_field, json_string, etype, evalue))
-                    self.logger.warning("Maybe your json string contains single quotes?")
-                    continue
-            if not isinstance(decoded_datasets, list):
-                decoded_datasets = [decoded_datasets]
-            copy_event = False
-            for decoded_data in decoded_datasets:
-                if copy_event:
-                    event = event.copy()
-                copy_event = True
-                if self.drop_original:
-                    event.pop(source_field, None)
-                if self.target_field:
-                    event[self.target_field] = decoded_data
-                else:
-                    event.update(decoded_data)
-                yield event
+        for event in self.decodeEvents([event]):
+            yield event
 
-    def encodeEvent(self, event):
-        if 'all' in self.source_fields:
-            encode_data = event
-        else:
-            encode_data = {}
+    def decodeEvents(self, events):
+        decoded_events = []
+        for event in events:
             for source_field in self.source_fields:
                 try:
-                    encode_data.update({source_field: event[source_field]})
+                    json_string = event[source_field].decode()
+                except (AttributeError, UnicodeEncodeError, UnicodeDecodeError):
+                    json_string = UnicodeDammit(event[source_field]).unicode_markup
                 except KeyError:
                     continue
-                if self.drop_original:
-                    event.pop(source_field, None)
-        try:
-            encode_data = json.dumps(encode_data)
-        except:
-            etype, evalue, etb = sys.exc_info()
-            self.logger.warning("Could not json encode event data: %s. Exception: %s, Error: %s." % (encode_data, etype, evalue))
+                try:
+                    decoded_datasets = json.loads(json_string)
+                except:
+                    # Maybe we got a stream of multiple json messages. Try to parse them.
+                    try:
+                        decoded_datasets = json.loads(json_string, cls=ConcatJSONDecoder)
+                    except:
+                        etype, evalue, etb = sys.exc_info()
+                        self.logger.warning("Could not json decode event.%s: %s. Exception: %s, Error: %s." % (source_field, json_string, etype, evalue))
+                        self.logger.warning("Maybe your json string contains single quotes?")
+                        continue
+                if not isinstance(decoded_datasets, list):
+                    decoded_datasets = [decoded_datasets]
+                copy_event = False
+                for decoded_data in decoded_datasets:
+                    if copy_event:
+                        event = event.clone()
+                    copy_event = True
+                    if self.drop_original:
+                        event.pop(source_field, None)
+                    if self.target_field:
+                        event[self.target_field] = decoded_data
+                    else:
+                        event.update(decoded_data)
+                    decoded_events.append(event)
+        return decoded_events
+
+    def encodeEvent(self, event):
+        for event in self.encodeEvents([event]):
             yield event
-            return
-        event[self.target_field] = encode_data
-        yield event
+
+    def encodeEvents(self, events):
+        for event in events:
+            if 'all' in self.source_fields:
+                encode_data = event
+            else:
+                encode_data = {}
+                for source_field in self.source_fields:
+                    try:
+                        encode_data.update({source_field: event[source_field]})
+                    except KeyError:
+                        continue
+                    if self.drop_original:
+                        event.pop(source_field, None)
+            try:
+                encode_data = json.dumps(getSerializableEvent(encode_data))
+            except:
+                etype, evalue, etb = sys.exc_info()
+                self.logger.warning("Could not json encode event data: %s. Exception: %s, Error: %s." % (encode_data, etype, evalue))
+                continue
+            event[self.target_field] = encode_data
+        return events
@@ -7,6 +7,7 @@ from operator import itemgetter
 from lumbermill.constants import LUMBERMILL_BASEPATH
 from lumbermill.BaseThreadedModule import BaseThreadedModule
 from lumbermill.utils.Decorators import ModuleDocstringParser, setInterval
+from lumbermill.utils.DictUtils import getFieldGetter
 from lumbermill.utils.misc import TimedFunctionManager
 
 
@@ -51,6 +52,7 @@ class Regex(BaseThreadedModule):
         supported_regex_match_types = ['search', 'findall']
         self.timed_func_handler = None
         self.source_field = self.getConfigurationValue('source_field')
+        self.getSourceField = getFieldGetter(self.source_field)
         self.mark_unmatched_as = self.getConfigurationValue('mark_unmatched_as')
         self.break_on_match = self.getConfigurationValue('break_on_match')
         self.hot_rules_first = self.getConfigurationValue('hot_rules_first')
@@ -148,18 +150,27 @@ class Regex(BaseThreadedModule):
         """
         When an event type was successfully detected, extract the fields with to corresponding regex pattern.
         """
+        yield self.processEvent(event)
+
+    def handleEvents(self, events):
+        """
+        Apply the regex patterns to a batch of events. Each event will be passed on, matched or not.
+        """
+        process_event = self.processEvent
+        for event in events:
+            process_event(event)
+        return events
+
+    def processEvent(self, event):
         try:
-            string_to_match = event[self.source_field]
+            string_to_match = self.getSourceField(event)
         except KeyError:
-            yield event
-            return
-        if not isinstance(event[self.source_field], str):
+            return event
+        if not isinstance(string_to_match, str):
             self.logger.warning("Data in event[%s] not of type string. Skipping." % self.source_field)
-            yield event
-            return
+            return event
         matches_dict = False
         for regex_data in self.fieldextraction_regexpressions:
-            event_type = regex_data['event_type']
             matches_dict = {}
             if regex_data['match_type'] == 'search':
                 matches = regex_data['pattern'].search(string_to_match)
@@ -174,11 +185,11 @@ class Regex(BaseThreadedModule):
                             matches_dict[key] = [value]
             if matches_dict:
                 event.update(matches_dict)
-                event['lumbermill']['event_type'] = event_type
+                event['lumbermill']['event_type'] = regex_data['event_type']
                 if self.hot_rules_first:
                     regex_data['hitcounter'] += 1
-                if(self.break_on_match):
+                if self.break_on_match:
                     break
         if not matches_dict:
             event['lumbermill']['event_type'] = self.mark_unmatched_as
-        yield event
+        return event
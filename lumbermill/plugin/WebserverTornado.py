@@ -7,12 +7,14 @@ import time
 import tornado.autoreload
 import tornado.httpserver
 import tornado.ioloop
+import tornado.netutil
 import tornado.web
 import handler.ActionHandler
 import handler.WebsocketHandler
 
 from lumbermill.BaseThreadedModule import BaseThreadedModule
 from lumbermill.utils.Decorators import ModuleDocstringParser
+from lumbermill.utils.SocketHandoff import getSocketHandoff
 
 
 @ModuleDocstringParser
@@ -45,8 +47,11 @@ class WebserverTornado(BaseThreadedModule):
         # Default handlers.
         handlers = [ # REST ActionHandler
                      (r"/rest/server/restart", handler.ActionHandler.RestartHandler),
+                     (r"/rest/server/reload", handler.ActionHandler.ReloadHandler),
                      (r"/rest/server/info", handler.ActionHandler.GetServerInformation),
                      (r"/rest/server/statistics", handler.ActionHandler.GetServerStatistics),
+                     (r"/rest/server/module_timings", handler.ActionHandler.GetModuleTimings),
+                     (r"/rest/server/profile", handler.ActionHandler.StartProfilerHandler),
                      (r"/rest/server/configuration", handler.ActionHandler.GetServerConfiguration),
                       # WebsocketHandler
                       (r"/websockets/statistics", handler.WebsocketHandler.StatisticsWebSocketHandler),
@@ -91,9 +96,16 @@ class WebserverTornado(BaseThreadedModule):
                             'keyfile': self.getConfigurationValue("key")}
         try:
             self.server = tornado.httpserver.HTTPServer(self.application, ssl_options=ssl_options)
-            self.server.listen(self.getConfigurationValue('port'))
-            for fd, server_socket in self.server._sockets.items():
-                server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            # After a restart with socket handoff, the listening sockets are taken over from the previous process.
+            socket_handoff = getSocketHandoff()
+            handoff_key = "tcp::%s" % self.getConfigurationValue('port')
+            server_sockets = socket_handoff.getInheritedSockets(handoff_key)
+            if not server_sockets:
+                server_sockets = tornado.netutil.bind_sockets(self.getConfigurationValue('port'))
+                for server_socket in server_sockets:
+                    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.server.add_sockets(server_sockets)
+            socket_handoff.addSockets(handoff_key, server_sockets)
         except:
             etype, evalue, etb = sys.exc_info()
             self.logger.error("Could not start webserver on %s. Exception: %s, Error: %s." % (self.getConfigurationValue('port'), etype, evalue))
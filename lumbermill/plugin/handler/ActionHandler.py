@@ -80,6 +80,24 @@ class GetServerStatistics(BaseHandler):
             statistic_data.update(self.eventTypeStatistics(statistic_module))
         self.write(tornado.escape.json_encode(statistic_data))
 
+class GetModuleTimings(BaseHandler):
+    """
+    Return handling time, cpu time and queue wait time histograms per module and worker, summed since start.
+    This will only work, if module_timings is enabled and the statistic module is configured for the running LumberMill.
+    """
+    def get(self):
+        stat_module_id = self.webserver_module.getConfigurationValue('statistic_module_id')
+        statistic_module_info = self.webserver_module.lumbermill.getModuleInfoById(stat_module_id)
+        if not statistic_module_info:
+            return
+        statistic_module = statistic_module_info['instances'][0]
+        module_timings = {}
+        for module_name, worker_timings in statistic_module.getModuleTimings().items():
+            module_timings[module_name] = {}
+            for worker_index, timings in worker_timings.items():
+                module_timings[module_name][worker_index] = dict([(timing, histogram.getSummary()) for timing, histogram in timings.items()])
+        self.write(tornado.escape.json_encode(module_timings))
+
 class GetServerInformation(BaseHandler):
     def get(self):
         mem = psutil.virtual_memory()
@@ -115,6 +133,23 @@ class GetServerConfiguration(BaseHandler):
             modules_info[module_id] = {'id': module_id, 'type': module_info['type'], 'configuration': module_info['configuration']}
         self.write(tornado.escape.json_encode(modules_info))
 
+class StartProfilerHandler(BaseHandler):
+    """
+    Profile all LumberMill processes for the given duration in seconds, e.g. /rest/server/profile?duration=10.
+    Results are written to the path configured in the profiler section of Global.
+    """
+    def get(self):
+        duration = self.get_argument("duration", None)
+        try:
+            duration = float(duration) if duration else None
+        except ValueError:
+            raise tornado.web.HTTPError(400, "Invalid duration %s." % duration)
+        lumbermill = self.webserver_module.lumbermill
+        started = lumbermill.startProfiler(duration)
+        self.write(tornado.escape.json_encode({'profiling': started,
+                                               'duration': duration or lumbermill.global_configuration['profiler']['duration'],
+                                               'path': lumbermill.global_configuration['profiler']['path']}))
+
 class RestartHandler(BaseHandler):
     def get(self):
         self.add_header('Cache-Control', 'no-store, no-cache, must-revalidate, max-age=0')
@@ -122,6 +157,14 @@ class RestartHandler(BaseHandler):
         self.flush()
         self.webserver_module.lumbermill.restart()
 
+class ReloadHandler(BaseHandler):
+    """
+    Apply changes of the configuration file without restarting LumberMill, see LumberMill.reload.
+    """
+    def get(self):
+        self.add_header('Cache-Control', 'no-store, no-cache, must-revalidate, max-age=0')
+        self.write(tornado.escape.json_encode(self.webserver_module.lumbermill.reload()))
+
 class AuthLoginHandler(BaseHandler):
     @tornado.gen.coroutine
     def get(self):
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+import logging
+import sys
+import weakref
+
+from lumbermill.utils.Decorators import setInterval
+from lumbermill.utils.misc import TimedFunctionManager
+
+
+class Backpressure:
+    """
+    Pause the input modules of a process while its buffers and queues are congested.
+
+    Buffers and queues register themselves as sources. A source reports its fill level via getFillLevel, a value
+    between 0 (empty) and 1 (full). In intervals, the highest fill level of all sources of the process is checked.
+    If it reaches high_water_mark, the congested sources that can flush, e.g. buffers, are asked to do so first. If
+    the fill level is still high at the next check, pauseInput is called on all registered input modules. Inputs are
+    resumed via resumeInput as soon as the fill level drops below low_water_mark again.
+
+    A paused input stops reading from its source, e.g. tcp inputs stop reading from their sockets, so the tcp
+    window of the senders closes. Polling inputs like Kafka, RedisList or SQS stop polling. This keeps the memory
+    usage bounded while an output backend is slow or down.
+    Stopped buffers and queues unregister via removeSource. Sources are held as weak references, so short lived
+    buffers do not need to unregister.
+    """
+
+    def __init__(self, high_water_mark=.8, low_water_mark=.5, interval=.1):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.high_water_mark = high_water_mark
+        self.low_water_mark = low_water_mark
+        self.interval = interval
+        self.sources = weakref.WeakSet()
+        self.inputs = []
+        self.is_paused = False
+        self.is_flush_requested = False
+        self.pause_count = 0
+        self.timed_func_handle = None
+
+    def configure(self, high_water_mark, low_water_mark):
+        if not 0 < low_water_mark < high_water_mark <= 1:
+            raise ValueError("Water marks must satisfy 0 < low_water_mark < high_water_mark <= 1. Got %s and %s." % (low_water_mark, high_water_mark))
+        self.high_water_mark = high_water_mark
+        self.low_water_mark = low_water_mark
+
+    def addSource(self, source):
+        self.sources.add(source)
+
+    def removeSource(self, source):
+        self.sources.discard(source)
+
+    def addInput(self, input_module):
+        if input_module not in self.inputs:
+            self.inputs.append(input_module)
+
+    def removeInput(self, input_module):
+        # Replace the list at once, the timed check might be iterating over it.
+        self.inputs = [registered_input for registered_input in self.inputs if registered_input is not input_module]
+
+    def getFillLevel(self):
+        fill_level = 0
+        for source in list(self.sources):
+            try:
+                fill_level = max(fill_level, source.getFillLevel())
+            except NotImplementedError:
+                # qsize is not implemented for multiprocessing.Queue on some platforms.
+                pass
+        return fill_level
+
+    def requestFlushes(self):
+        """
+        Ask the congested sources to flush. Returns True if any source was asked.
+        """
+        is_flush_requested = False
+        for source in list(self.sources):
+            request_flush = getattr(source, 'requestFlush', None)
+            if not request_flush:
+                continue
+            try:
+                if source.getFillLevel() < self.high_water_mark:
+                    continue
+                request_flush()
+                is_flush_requested = True
+            except NotImplementedError:
+                pass
+            except:
+                etype, evalue, etb = sys.exc_info()
+                self.logger.error("Could not flush %s. Exception: %s, Error: %s." % (source.__class__.__name__, etype, evalue))
+        return is_flush_requested
+
+    def check(self):
+        fill_level = self.getFillLevel()
+        if fill_level < self.high_water_mark:
+            self.is_flush_requested = False
+        if not self.is_paused and fill_level >= self.high_water_mark:
+            if not self.is_flush_requested and self.requestFlushes():
+                # Give the flushes time until the next check before pausing the inputs.
+                self.is_flush_requested = True
+                return
+            self.logger.warning("Pipeline congested, fill level %.2f. Pausing inputs." % fill_level)
+            self.is_paused = True
+            self.pause_count += 1
+            self.setInputsPaused(True)
+        elif self.is_paused and fill_level < self.low_water_mark:
+            self.logger.info("Pipeline drained, fill level %.2f. Resuming inputs." % fill_level)
+            self.is_paused = False
+            self.setInputsPaused(False)
+
+    def setInputsPaused(self, paused):
+        for input_module in self.inputs:
+            try:
+                if paused:
+                    input_module.pauseInput()
+                else:
+                    input_module.resumeInput()
+            except:
+                etype, evalue, etb = sys.exc_info()
+                self.logger.error("Could not %s input %s. Exception: %s, Error: %s." % ("pause" if paused else "resume", input_module.__class__.__name__, etype, evalue))
+
+    def getTimedCheckMethod(self):
+        @setInterval(self.interval)
+        def timedCheck():
+            self.check()
+        return timedCheck
+
+    def start(self):
+        """
+        Start checking the fill level. Timers do not survive a fork, so this needs to be called in each process.
+        """
+        self.stop()
+        self.timed_func_handle = TimedFunctionManager.startTimedFunction(self.getTimedCheckMethod())
+
+    def stop(self):
+        if self.timed_func_handle:
+            TimedFunctionManager.stopTimedFunctions(self.timed_func_handle)
+            self.timed_func_handle = None
+        if self.is_paused:
+            self.is_paused = False
+            self.setInputsPaused(False)
+
+
+backpressure = Backpressure()
+
+
+def getBackpressure():
+    """
+    Return the backpressure instance of the current process.
+    """
+    return backpressure
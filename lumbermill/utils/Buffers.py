@@ -1,11 +1,25 @@
 # -*- coding: utf-8 -*-
+import collections
 import logging
-import socket
+import mmap
+import multiprocessing
+import os
+import struct
 import sys
+import tempfile
+import threading
 import time
+import uuid
+import zlib
 
 import pylru
 
+# Conditional imports for python2/3
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
 try:
     import msgpack
     msgpack_avaiable = True
@@ -18,65 +32,297 @@ try:
 except ImportError:
     zmq_avaiable = False
 
+from lumbermill.utils.Backpressure import getBackpressure
 from lumbermill.utils.Decorators import setInterval
+from lumbermill.utils.Histogram import LogHistogram
 from lumbermill.utils.misc import TimedFunctionManager
-from lumbermill.utils.DictUtils import KeyDotNotationDict
+from lumbermill.utils.StatisticCollector import countLostEvents
+from lumbermill.utils.Tracing import getTraceMetadata
+from lumbermill.utils.DictUtils import KeyDotNotationDict, EventMetaData, getFieldGetterWithDefault
+
+class MessageTooLargeError(ValueError):
+    """
+    Raised by a queue if a message can never fit into it.
+    """
+    pass
 
 class Buffer:
-    def __init__(self, flush_size=None, callback=None, interval=1, maxsize=5000):
+    """
+    Collect items and hand them in batches to callback.
+
+    A batch is swapped out when it reaches flush_size items, when the flush interval passed or when flush is called.
+    Producers go on appending to a new active batch, while a flusher thread hands the swapped out batches to
+    callback. So a slow callback, e.g. a bulk request to a backend, does not hold up the producers.
+    Producers only block if maxsize items are buffered. Blocking uses a condition variable, so producers wake up as
+    soon as a flush finished. The time spent blocked is collected in blocked_time and blocked_count. With
+    module_statistics enabled, LumberMill publishes these via getBlockedDelta.
+
+    If callback returns a false value, the batch is kept and will be retried with the next flush. If callback raises
+    an exception, the batch is dropped.
+    With background_flush set to False, batches are flushed in the thread of the caller, like before. Use this for
+    many small buffers, e.g. one per key, to avoid one flusher thread per buffer.
+    Threads do not survive a fork, so startInterval has to be called in each process, e.g. in initAfterFork. Until
+    then, and after stop was called, batches are flushed in the thread of the caller as well.
+    The buffer reports its fill level to the Backpressure of the process, so inputs get paused before producers block.
+    """
+    def __init__(self, flush_size=None, callback=None, interval=1, maxsize=5000, background_flush=True):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.flush_size = flush_size
         self.buffer = []
+        self.pending_batches = collections.deque()
+        self.pending_size = 0
         self.maxsize = maxsize
         self.append = self.put
         self.flush_interval = interval
         self.flush_callback = callback
-        self.flush_timed_func = self.getTimedFlushMethod()
-        self.timed_func_handle = TimedFunctionManager.startTimedFunction(self.flush_timed_func)
+        self.background_flush = background_flush
+        self.condition = threading.Condition()
         self.is_flushing = False
+        self.flushing_size = 0
+        self.flush_failed = False
+        self.flush_count = 0
+        self.failed_flush_count = 0
+        self.blocked_time = 0.0
+        self.blocked_count = 0
+        self.published_blocked_time = 0.0
+        self.published_blocked_count = 0
+        self.dropped_count = 0
+        self.flusher = None
+        self.flusher_pid = None
+        self.flusher_lock = threading.Lock()
+        self.is_stopped = False
+        self.flush_timed_func = self.getTimedFlushMethod()
+        self.timed_func_handle = False
+        self.startInterval()
 
     def stopInterval(self):
         TimedFunctionManager.stopTimedFunctions(self.timed_func_handle)
         self.timed_func_handle = False
 
     def startInterval(self):
+        """
+        Start the flush interval and the flusher thread in the current process.
+        """
         if self.timed_func_handle:
             self.stopInterval()
+        self.is_stopped = False
         self.timed_func_handle = TimedFunctionManager.startTimedFunction(self.flush_timed_func)
+        if self.background_flush:
+            self.startFlusher()
+        getBackpressure().addSource(self)
+
+    def stop(self, timeout=5):
+        """
+        Stop the flush interval and the flusher thread and unregister from Backpressure.
+
+        The flusher thread still hands the pending batches to the callback, stop waits at most timeout seconds for
+        this. Items put afterwards are flushed in the thread of the caller.
+        """
+        self.stopInterval()
+        with self.condition:
+            self.is_stopped = True
+            self.condition.notify_all()
+        flusher = self.flusher
+        if flusher and self.flusher_pid == os.getpid() and flusher is not threading.current_thread():
+            flusher.join(timeout)
+        getBackpressure().removeSource(self)
 
     def getTimedFlushMethod(self):
         @setInterval(self.flush_interval)
         def timedFlush():
-            self.flush()
+            self.requestFlush()
         return timedFlush
 
+    def startFlusher(self):
+        with self.flusher_lock:
+            if self.flusher_pid == os.getpid() and self.flusher.is_alive():
+                return
+            if self.flusher_pid != os.getpid():
+                # Threads do not survive a fork, so a buffer created before a fork needs a new flusher thread. The
+                # condition might have been held by a thread of the parent process.
+                self.condition = threading.Condition()
+                self.is_flushing = False
+                self.flushing_size = 0
+            self.flusher = threading.Thread(target=self.runFlusher, name="BufferFlusher")
+            self.flusher.daemon = True
+            self.flusher.start()
+            self.flusher_pid = os.getpid()
+
+    def hasFlusher(self):
+        """
+        Return True if a flusher thread hands the batches of this process to the callback.
+        """
+        return self.flusher_pid == os.getpid() and not self.is_stopped
+
     def append(self, item):
         self.put(item)
 
     def put(self, item):
-        # Wait till a running store is finished to avoid strange race conditions when using this buffer with multiprocessing.
-        while self.is_flushing:
-            time.sleep(.00001)
-        while len(self.buffer) > self.maxsize:
-            self.logger.warning("Maximum number of items (%s) in buffer reached. Waiting for flush." % self.maxsize)
-            time.sleep(1)
-        self.buffer.append(item)
-        if self.flush_size and len(self.buffer) == self.flush_size:
+        with self.condition:
+            if self.bufsize() >= self.maxsize:
+                self.waitWhileFull()
+            self.buffer.append(item)
+            if not self.flush_size or len(self.buffer) < self.flush_size:
+                return
+            self.swapBuffer()
+            if self.hasFlusher():
+                return
+        self.flushPendingBatches()
+
+    def swapBuffer(self):
+        """
+        Move the active batch to the pending batches. Must be called with the condition held.
+        """
+        if self.buffer:
+            self.pending_batches.append(self.buffer)
+            self.pending_size += len(self.buffer)
+            self.buffer = []
+        self.flush_failed = False
+        self.condition.notify_all()
+
+    def waitWhileFull(self):
+        """
+        Block until there is room in the buffer again. Must be called with the condition held.
+        """
+        started = time.time()
+        warned = False
+        while self.bufsize() >= self.maxsize:
+            if not warned and time.time() - started > 1:
+                self.logger.warning("Maximum number of items (%s) in buffer reached. Waiting for flush." % self.maxsize)
+                warned = True
+            if self.flush_failed:
+                # Give a failing backend some time before retrying.
+                self.condition.wait(1)
+            self.swapBuffer()
+            if self.hasFlusher() or self.is_flushing:
+                self.condition.wait(1)
+                continue
+            # Nobody else is flushing, so flush in this thread.
+            self.condition.release()
+            try:
+                self.flushPendingBatches()
+            finally:
+                self.condition.acquire()
+        self.blocked_time += time.time() - started
+        self.blocked_count += 1
+
+    def requestFlush(self):
+        """
+        Let the flusher thread flush all buffered items without waiting for it.
+        Without a flusher thread, the items are flushed in the thread of the caller.
+        """
+        if not self.hasFlusher():
             self.flush()
+            return
+        with self.condition:
+            self.swapBuffer()
 
-    def flush(self):
-        if self.bufsize() == 0 or self.is_flushing:
+    def flush(self, timeout=None):
+        """
+        Flush all buffered items and return when done.
+
+        With timeout set, wait at most timeout seconds for the flusher thread. Without a flusher thread, items are
+        flushed in the thread of the caller and timeout is not used.
+        """
+        if threading.current_thread() is self.flusher:
             return
-        self.is_flushing = True
-        self.stopInterval()
-        success = self.flush_callback(self.buffer)
-        if success:
-            self.buffer = []
-        self.startInterval()
-        self.is_flushing = False
+        if not self.hasFlusher():
+            with self.condition:
+                self.swapBuffer()
+            self.flushPendingBatches()
+            return
+        started = time.time()
+        with self.condition:
+            self.swapBuffer()
+            failed_flush_count = self.failed_flush_count
+            while (self.pending_batches or self.is_flushing) and self.failed_flush_count == failed_flush_count:
+                if timeout is None:
+                    self.condition.wait()
+                    continue
+                remaining_time = started + timeout - time.time()
+                if remaining_time <= 0:
+                    break
+                self.condition.wait(remaining_time)
+        self.blocked_time += time.time() - started
+        self.blocked_count += 1
+
+    def runFlusher(self):
+        while True:
+            with self.condition:
+                # After a failed flush, wait for the next flush request before retrying.
+                while not self.pending_batches or self.flush_failed:
+                    if self.is_stopped:
+                        return
+                    self.condition.wait()
+            self.flushPendingBatches()
+
+    def flushPendingBatches(self):
+        """
+        Hand the pending batches to the flush callback, one after the other.
+        """
+        while True:
+            with self.condition:
+                while self.is_flushing:
+                    self.condition.wait()
+                if not self.pending_batches or self.flush_failed:
+                    return
+                batch = self.pending_batches.popleft()
+                self.pending_size -= len(batch)
+                self.is_flushing = True
+                self.flushing_size = len(batch)
+            try:
+                success = self.flush_callback(batch)
+            except:
+                # Retrying would fail the same way and block the buffer, so drop the batch.
+                etype, evalue, etb = sys.exc_info()
+                self.logger.error("Flushing buffer failed. Dropping %s items. Exception: %s, Error: %s." % (len(batch), etype, evalue))
+                self.dropped_count += len(batch)
+                countLostEvents('buffer_flush', len(batch))
+                success = True
+            with self.condition:
+                if not success:
+                    self.pending_batches.appendleft(batch)
+                    self.pending_size += len(batch)
+                    self.flush_failed = True
+                    self.failed_flush_count += 1
+                self.is_flushing = False
+                self.flushing_size = 0
+                self.flush_count += 1
+                self.condition.notify_all()
 
     def bufsize(self):
-        return len(self.buffer)
+        return len(self.buffer) + self.pending_size + self.flushing_size
+
+    def getFillLevel(self):
+        """
+        Return the fill level for Backpressure.
+
+        The active batch gets swapped out as soon as it reaches flush_size, so up to flush_size items do not mean
+        congestion. Otherwise buffers with a maxsize close to flush_size would report congestion between two flushes.
+        """
+        if not self.flush_size:
+            return self.bufsize() / float(self.maxsize)
+        headroom = self.maxsize - self.flush_size
+        if headroom > 0:
+            return max(self.bufsize() - self.flush_size, 0) / float(headroom)
+        return (self.pending_size + self.flushing_size) / float(self.maxsize)
+
+    def getBlockedDelta(self):
+        """
+        Return how often and for how many seconds callers were blocked since the last call.
+        """
+        blocked_count, blocked_time = self.blocked_count, self.blocked_time
+        delta = (blocked_count - self.published_blocked_count, blocked_time - self.published_blocked_time)
+        self.published_blocked_count, self.published_blocked_time = blocked_count, blocked_time
+        return delta
+
+    def getStatistics(self):
+        return {'bufsize': self.bufsize(),
+                'flush_count': self.flush_count,
+                'failed_flush_count': self.failed_flush_count,
+                'dropped_count': self.dropped_count,
+                'blocked_time': self.blocked_time,
+                'blocked_count': self.blocked_count}
 
 class RedisBuffer:
     def __init__(self, flush_size=None, callback=None, interval=1, maxsize=5000):
@@ -135,22 +381,57 @@ class RedisBuffer:
         return len(self.buffer)
 
 class BufferedQueue:
-    def __init__(self, queue, buffersize=500):
+    def __init__(self, queue, buffersize=500, queue_max_size=20):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.queue = queue
         self.buffersize = buffersize
+        self.queue_max_size = queue_max_size
         self.buffer = Buffer(buffersize, self.sendBuffer, 5)
+        self.wait_time_histogram = None
+        # Shared counters: events put into the queue, events got from the queue. The queue itself only knows the
+        # number of batches.
+        self.event_counts = multiprocessing.Array('Q', 2)
+        getBackpressure().addSource(self)
 
     def startInterval(self):
         self.buffer.startInterval()
 
+    def stop(self):
+        """
+        Stop the buffer of this process. Events put afterwards are sent to the queue in the thread of the caller.
+        """
+        self.buffer.stop()
+        getBackpressure().removeSource(self)
+
     def put(self, payload):
         self.buffer.append(payload)
 
+    def measureWaitTime(self):
+        """
+        Send the time a batch was put into the queue along with it and record the time it waited until it was read.
+        Sender and receiver must agree on this, so it has to be called before the worker processes are forked.
+        """
+        self.wait_time_histogram = LogHistogram()
+
+    def getWaitTimeHistogram(self):
+        return self.wait_time_histogram
+
+    def traceEvents(self):
+        """
+        Store the time events marked for tracing were put into the queue, see EventTracer.
+        """
+        buffer_append = self.buffer.append
+
+        def put(payload):
+            trace_metadata = getTraceMetadata(payload)
+            if trace_metadata is not None:
+                trace_metadata['trace_queued_at'] = time.time()
+            buffer_append(payload)
+        self.put = put
+
     def sendBuffer(self, buffered_data):
         try:
-            buffered_data = msgpack.packb(buffered_data)
-            self.queue.put(buffered_data)
+            self.putBatch(buffered_data)
             return True
         except (KeyboardInterrupt, SystemExit):
             # Keyboard interrupt is catched in GambolPuttys main run method.
@@ -160,27 +441,142 @@ class BufferedQueue:
             etype, evalue, etb = sys.exc_info()
             self.logger.error("Could not append data to queue. Exception: %s, Error: %s." % (etype, evalue))
 
+    def putBatch(self, batch):
+        """
+        Put a batch of events into the queue. Batches too large for the queue are split, single events that still
+        do not fit are dropped. Retrying these would block the buffer forever.
+        """
+        if self.wait_time_histogram is not None:
+            packed_batch = msgpack.packb([time.time(), batch])
+        else:
+            packed_batch = msgpack.packb(batch)
+        try:
+            self.queue.put(packed_batch)
+        except MessageTooLargeError:
+            if len(batch) == 1:
+                self.logger.error("Event of %s bytes exceeds the capacity of the queue. Dropping it." % len(packed_batch))
+                countLostEvents('queue_message_too_large')
+                return
+            split = len(batch) // 2
+            self.putBatch(batch[:split])
+            self.putBatch(batch[split:])
+            return
+        with self.event_counts.get_lock():
+            self.event_counts[0] += len(batch)
+
     def get(self, block=True, timeout=None):
         try:
             buffered_data = self.queue.get(block, timeout)
             buffered_data = msgpack.unpackb(buffered_data)
+            if self.wait_time_histogram is not None:
+                sent, buffered_data = buffered_data
+                self.wait_time_histogram.add(max(time.time() - sent, 0), len(buffered_data))
+            with self.event_counts.get_lock():
+                self.event_counts[1] += len(buffered_data)
             # After msgpack.uppackb we just have a normal dict. Cast this to KeyDotNotationDict.
             for data in buffered_data:
-                yield KeyDotNotationDict(data)
+                event = KeyDotNotationDict(data)
+                if isinstance(data.get('lumbermill'), dict):
+                    dict.__setitem__(event, 'lumbermill', EventMetaData(data['lumbermill']))
+                yield event
         except (KeyboardInterrupt, SystemExit, ValueError, OSError):
             # Keyboard interrupt is catched in GambolPuttys main run method.
             # This will take care to shutdown all running modules.
             pass
 
+    def flush(self, timeout=None):
+        """
+        Put the events buffered in this process into the queue.
+        """
+        self.buffer.flush(timeout)
+
+    def getBufferedCount(self):
+        """
+        Return the number of events buffered in this process, that are not in the queue yet.
+        """
+        return self.buffer.bufsize()
+
+    def getQueuedCount(self):
+        """
+        Return the number of events in the queue. If the queue is shared between processes, these are the events of
+        all processes.
+        """
+        return self.event_counts[0] - self.event_counts[1]
+
     def qsize(self):
-        try:
-            return self.buffer.bufsize() + self.queue.qsize()
-        except NotImplementedError:
-            return 0
+        return self.getBufferedCount() + self.getQueuedCount()
+
+    def getFillLevel(self):
+        """
+        Return the fill level of the underlying queue. The buffer reports its own fill level.
+        """
+        return min(self.queue.qsize() / float(self.queue_max_size), 1.0)
 
     def __getattr__(self, name):
         return getattr(self.queue, name)
 
+class PartitionedQueue:
+    """
+    Distribute events over one queue per worker, based on the value of the partition_by field.
+
+    Events with the same value will always be put into the same queue. Each worker only reads from the queue with
+    its own worker index. So all events with the same key are handled by the same process and modules can keep
+    their per key state locally.
+    The partition is calculated via crc32, since the builtin hash of strings is randomized per interpreter.
+    """
+    def __init__(self, queues, partition_by):
+        self.queues = queues
+        self.partition_by = partition_by
+        self.getPartitionValue = getFieldGetterWithDefault(partition_by, None)
+        self.worker_index = 0
+
+    def setWorkerIndex(self, worker_index):
+        self.worker_index = worker_index
+
+    def getPartitionIndex(self, event):
+        partition_value = self.getPartitionValue(event)
+        if not isinstance(partition_value, bytes):
+            partition_value = str(partition_value).encode('utf-8')
+        return zlib.crc32(partition_value) % len(self.queues)
+
+    def startInterval(self):
+        for partition_queue in self.queues:
+            partition_queue.startInterval()
+
+    def stop(self):
+        for partition_queue in self.queues:
+            partition_queue.stop()
+
+    def put(self, event):
+        self.queues[self.getPartitionIndex(event)].put(event)
+
+    def measureWaitTime(self):
+        for partition_queue in self.queues:
+            partition_queue.measureWaitTime()
+
+    def getWaitTimeHistogram(self):
+        return self.queues[self.worker_index].getWaitTimeHistogram()
+
+    def traceEvents(self):
+        for partition_queue in self.queues:
+            partition_queue.traceEvents()
+
+    def get(self, block=True, timeout=None):
+        return self.queues[self.worker_index].get(block, timeout)
+
+    def flush(self, timeout=None):
+        for partition_queue in self.queues:
+            partition_queue.flush(timeout)
+
+    def getBufferedCount(self):
+        return sum([partition_queue.getBufferedCount() for partition_queue in self.queues])
+
+    def getQueuedCount(self):
+        return sum([partition_queue.getQueuedCount() for partition_queue in self.queues])
+
+    def qsize(self):
+        return sum([partition_queue.qsize() for partition_queue in self.queues])
+
 class ZeroMqMpQueue:
     """
     Use ZeroMQ for IPC.
@@ -188,58 +584,60 @@ class ZeroMqMpQueue:
 
     Sender and receiver will be initalized on first put/get. This is neccessary since a zmq context will not
     survive a fork.
+    The sockets communicate via a unix domain socket (ipc://), saving the tcp stack overhead of the loopback device.
+    Only one side can bind to the socket. If the receiving module only runs in one process, set bind_receiver, so
+    that senders in all worker processes can connect to it. Otherwise the sender binds and the receivers connect.
+    PUSH sockets distribute messages round robin to all connected receivers.
 
     send_pyobj and recv_pyobj is not used since it performance is slower than using msgpack for serialization.
     (A test for a simple dict using send_pyobj et.al performed around 12000 eps, while msgpack and casting to
     KeyDotNotationDict after unpacking resulted in around 17000 eps)
     """
-    def __init__(self, queue_max_size=20):
-        # Get a free random port.
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, 0)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        sock.bind(('127.0.0.1', 0))
-        sock.listen(socket.SOMAXCONN)
-        ipaddr, self.port = sock.getsockname()
-        sock.close()
+    def __init__(self, queue_max_size=20, bind_receiver=False):
+        self.address = "ipc://%s" % os.path.join(tempfile.gettempdir(), "lumbermill-%s.ipc" % uuid.uuid4().hex)
         self.queue_max_size = queue_max_size
-        self.queue_size = 0
+        self.bind_receiver = bind_receiver
+        # Shared counters: messages sent, messages received. zmq does not know the number of queued messages.
+        self.counters = multiprocessing.Array('Q', 2)
+        self.zmq_context = None
         self.sender = None
         self.receiver = None
 
-    def initSender(self):
-        zmq_context = zmq.Context()
-        self.sender = zmq_context.socket(zmq.PUSH)
-        try:
-            self.sender.setsockopt(zmq.SNDHWM, self.queue_max_size)
-        except AttributeError:
-            self.sender.setsockopt(zmq.HWM, self.queue_max_size)
-        try:
-            self.sender.bind("tcp://127.0.0.1:%d" % self.port)
-        except zmq.error.ZMQError:
-            print("Address in use. Connecting only.")
-            self.sender.connect("tcp://127.0.0.1:%d" % self.port)
+    def initSocket(self, socket_type, high_water_mark_option, bind):
+        if not self.zmq_context:
+            self.zmq_context = zmq.Context()
+        zmq_socket = self.zmq_context.socket(socket_type)
+        zmq_socket.setsockopt(high_water_mark_option, self.queue_max_size)
+        if bind:
+            zmq_socket.bind(self.address)
+        else:
+            zmq_socket.connect(self.address)
+        return zmq_socket
 
+    def initSender(self):
+        self.sender = self.initSocket(zmq.PUSH, zmq.SNDHWM, not self.bind_receiver)
 
     def initReceiver(self):
-        zmq_context = zmq.Context()
-        self.receiver = zmq_context.socket(zmq.PULL)
-        try:
-            self.receiver.setsockopt(zmq.RCVHWM, self.queue_max_size)
-        except AttributeError:
-            self.receiver.setsockopt(zmq.HWM, self.queue_max_size)
-        self.receiver.connect("tcp://127.0.0.1:%d" % self.port)
+        self.receiver = self.initSocket(zmq.PULL, zmq.RCVHWM, self.bind_receiver)
 
     def put(self, data):
         if not self.sender:
             self.initSender()
         self.sender.send(data)
+        with self.counters.get_lock():
+            self.counters[0] += 1
 
-    def get(self, block=None, timeout=None):
+    def get(self, block=True, timeout=None):
         if not self.receiver:
             self.initReceiver()
         events = ""
+        if not block or timeout is not None:
+            if not self.receiver.poll(0 if not block else timeout * 1000):
+                raise queue.Empty
         try:
             events = self.receiver.recv()
+            with self.counters.get_lock():
+                self.counters[1] += 1
             return events
         except zmq.error.ZMQError as e:
             # Ignore iterrupt error caused by SIGINT
@@ -247,7 +645,162 @@ class ZeroMqMpQueue:
                 return events
 
     def qsize(self):
-        return self.queue_size
+        return self.counters[0] - self.counters[1]
+
+    def close(self):
+        """
+        Close the sockets.
+
+        Pending messages will be sent, but if the receiver has not read them yet, zmq may drop them when the
+        connection is closed.
+        """
+        if not self.zmq_context:
+            return
+        for zmq_socket in (self.sender, self.receiver):
+            if zmq_socket:
+                zmq_socket.close()
+        self.zmq_context.term()
+        self.zmq_context = self.sender = self.receiver = None
+
+class PipeQueue:
+    """
+    Use a pipe for IPC.
+
+    Messages are written as they are via Connection.send_bytes, so, compared to multiprocessing.Queue, there is no
+    pickling and no feeder thread. A put will block if the pipe buffer of the os is full. So queue_max_size is
+    not used here.
+    As a pipe has no message boundaries, reads and writes are serialized via locks.
+    """
+    def __init__(self, queue_max_size=20):
+        self.reader, self.writer = multiprocessing.Pipe(duplex=False)
+        self.read_lock = multiprocessing.Lock()
+        self.write_lock = multiprocessing.Lock()
+        # Shared counters: messages put, messages got.
+        self.counters = multiprocessing.RawArray('Q', 2)
+
+    def put(self, data):
+        with self.write_lock:
+            self.writer.send_bytes(data)
+            self.counters[0] += 1
+
+    def get(self, block=True, timeout=None):
+        if not self.read_lock.acquire(block, timeout):
+            raise queue.Empty
+        try:
+            if not block or timeout is not None:
+                if not self.reader.poll(0 if not block else timeout):
+                    raise queue.Empty
+            data = self.reader.recv_bytes()
+            self.counters[1] += 1
+        finally:
+            self.read_lock.release()
+        return data
+
+    def qsize(self):
+        return self.counters[0] - self.counters[1]
+
+class SharedMemoryQueue:
+    """
+    Use a ring buffer in shared memory for IPC.
+
+    The buffer is split into queue_max_size pre-allocated segments of segment_size bytes. Each message starts at a
+    segment boundary with its length and spans as many segments as needed. Messages are copied directly into the
+    shared memory, so, compared to multiprocessing.Queue, there is no pickling and no feeder thread writing to a pipe.
+    Two semaphores count the free and the filled segments. Producers and consumers only block on these if the
+    buffer is full or empty.
+
+    The shared memory is an anonymous mmap, so the queue must be created before the worker processes are forked.
+    A message larger than the whole buffer raises a MessageTooLargeError. BufferedQueue then splits the batch.
+    """
+    header = struct.Struct('<I')
+
+    def __init__(self, queue_max_size=20, segment_size=65536):
+        self.segment_count = queue_max_size
+        self.segment_size = segment_size
+        self.capacity = queue_max_size * segment_size
+        self.buffer = mmap.mmap(-1, self.capacity)
+        # Shared counters: next segment to write, next segment to read, messages put, messages got.
+        self.counters = multiprocessing.RawArray('Q', 4)
+        self.free_segments = multiprocessing.Semaphore(queue_max_size)
+        self.filled_messages = multiprocessing.Semaphore(0)
+        self.put_lock = multiprocessing.Lock()
+        self.get_lock = multiprocessing.Lock()
+
+    def getSegmentCount(self, data_size):
+        return -(-(self.header.size + data_size) // self.segment_size)
+
+    def write(self, offset, data):
+        end = offset + len(data)
+        if end <= self.capacity:
+            self.buffer[offset:end] = data
+        else:
+            split = self.capacity - offset
+            self.buffer[offset:] = data[:split]
+            self.buffer[:end - self.capacity] = data[split:]
+
+    def read(self, offset, size):
+        end = offset + size
+        if end <= self.capacity:
+            return self.buffer[offset:end]
+        return self.buffer[offset:] + self.buffer[:end - self.capacity]
+
+    def put(self, data):
+        segments = self.getSegmentCount(len(data))
+        if segments > self.segment_count:
+            raise MessageTooLargeError("Message of %s bytes exceeds queue capacity of %s bytes." % (len(data), self.capacity - self.header.size))
+        with self.put_lock:
+            for _ in range(segments):
+                self.free_segments.acquire()
+            offset = self.counters[0] * self.segment_size
+            self.buffer[offset:offset + self.header.size] = self.header.pack(len(data))
+            self.write(offset + self.header.size, data)
+            self.counters[0] = (self.counters[0] + segments) % self.segment_count
+            self.counters[2] += 1
+        self.filled_messages.release()
+
+    def get(self, block=True, timeout=None):
+        if not self.filled_messages.acquire(block, timeout):
+            raise queue.Empty
+        with self.get_lock:
+            offset = self.counters[1] * self.segment_size
+            data_size = self.header.unpack(self.buffer[offset:offset + self.header.size])[0]
+            data = self.read(offset + self.header.size, data_size)
+            segments = self.getSegmentCount(data_size)
+            self.counters[1] = (self.counters[1] + segments) % self.segment_count
+            self.counters[3] += 1
+        for _ in range(segments):
+            self.free_segments.release()
+        return data
+
+    def qsize(self):
+        return self.counters[2] - self.counters[3]
+
+IPC_TRANSPORTS = ['multiprocessing', 'shared_memory', 'zmq', 'pipe']
+
+SHARED_MEMORY_SEGMENT_SIZE = 65536
+""" Minimum segment size of SharedMemoryQueue. """
+SHARED_MEMORY_EVENT_SIZE = 2048
+""" Expected size of a packed event, used to size the segments of SharedMemoryQueue for a batch size. """
+
+def produceIpcQueue(ipc_transport, queue_max_size=20, bind_receiver=False, batch_size=None):
+    """
+    Return a queue passing data between processes via ipc_transport.
+
+    bind_receiver is only used by the zmq transport, see ZeroMqMpQueue.
+    batch_size is only used by the shared_memory transport. A segment should hold a whole batch of events.
+    """
+    if ipc_transport == 'multiprocessing':
+        return multiprocessing.Queue(queue_max_size)
+    if ipc_transport == 'shared_memory':
+        segment_size = max(SHARED_MEMORY_SEGMENT_SIZE, (batch_size or 0) * SHARED_MEMORY_EVENT_SIZE)
+        return SharedMemoryQueue(queue_max_size, segment_size)
+    if ipc_transport == 'pipe':
+        return PipeQueue(queue_max_size)
+    if ipc_transport == 'zmq':
+        if not zmq_avaiable:
+            raise ValueError("ipc transport zmq needs the pyzmq package.")
+        return ZeroMqMpQueue(queue_max_size, bind_receiver)
+    raise ValueError("Unknown ipc transport %s. Valid transports: %s." % (ipc_transport, IPC_TRANSPORTS))
 
 class MemoryCache():
 
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+from collections import OrderedDict
+
+
+def getModuleDefinitions(configuration):
+    """
+    Return the modules of configuration as ordered dict of module id to idx, module class name and configuration.
+
+    If the id field was used in the configuration of a module, it is used as module id, else the class name of the
+    module. Module ids have to be unique, so a counter like "_1" is added to ids already used.
+    The Global section is skipped. Raises ValueError, if a module configuration is not a dict.
+    """
+    module_definitions = OrderedDict()
+    idx = 0
+    for module_info in configuration:
+        if isinstance(module_info, dict):
+            module_class_name = list(module_info.keys())[0]
+            module_config = module_info[module_class_name]
+            if not isinstance(module_config, dict):
+                raise ValueError("Configuration of module %s must be a dict." % module_class_name)
+            module_id = module_class_name if 'id' not in module_config else module_config['id']
+        else:
+            module_id = module_class_name = module_info
+            module_config = {}
+        # Ignore some reserved module names. At the moment this is just the Global keyword.
+        if module_id in ['Global']:
+            continue
+        counter = 1
+        while module_id in module_definitions:
+            tmp_mod_name = module_id.split("_", 1)[0]
+            module_id = "%s_%s" % (tmp_mod_name, counter)
+            counter += 1
+        module_definitions[module_id] = {'idx': idx,
+                                         'module_class_name': module_class_name,
+                                         'configuration': module_config}
+        idx += 1
+    return module_definitions
+
+
+def getReceiverNames(module_configuration):
+    """
+    Return the names of the receivers in a module configuration. Receivers can be configured with an output filter.
+    """
+    receiver_names = []
+    for receiver_data in module_configuration.get('receivers') or []:
+        if isinstance(receiver_data, dict):
+            receiver_names.append(next(iter(receiver_data.keys())))
+        else:
+            receiver_names.append(receiver_data)
+    return receiver_names
+
+
+def hasOutputFilters(module_configuration):
+    return any(isinstance(receiver_data, dict) for receiver_data in module_configuration.get('receivers') or [])
+
+
+def diffModuleDefinitions(running_modules, module_definitions):
+    """
+    Compare the running modules with new module definitions by module id.
+
+    Returns a dict with lists of module ids:
+    added:     Modules only in module_definitions.
+    removed:   Modules only in running_modules.
+    changed:   Modules with a different class or configuration.
+    rewired:   Modules where only the receivers changed. A change of receivers with output filters counts as change.
+    unchanged: All other modules.
+    """
+    module_changes = {'added': [], 'removed': [], 'changed': [], 'rewired': [], 'unchanged': []}
+    for module_id in running_modules:
+        if module_id not in module_definitions:
+            module_changes['removed'].append(module_id)
+    for module_id, module_definition in module_definitions.items():
+        if module_id not in running_modules:
+            module_changes['added'].append(module_id)
+            continue
+        running_module = running_modules[module_id]
+        running_configuration = dict(running_module['configuration'])
+        configuration = dict(module_definition['configuration'])
+        running_receivers = running_configuration.pop('receivers', [])
+        receivers = configuration.pop('receivers', [])
+        if running_module['module_class_name'] != module_definition['module_class_name'] or running_configuration != configuration:
+            module_changes['changed'].append(module_id)
+        elif running_receivers != receivers:
+            if hasOutputFilters(running_module['configuration']) or hasOutputFilters(module_definition['configuration']):
+                module_changes['changed'].append(module_id)
+            else:
+                module_changes['rewired'].append(module_id)
+        else:
+            module_changes['unchanged'].append(module_id)
+    return module_changes
@@ -11,7 +11,15 @@ else:
 
 yaml_valid_config_template = {
     'Global': {'types': [dict],
-               'fields': {'workers': {'types': [int]}}},
+               'fields': {'workers': {'types': [int]},
+                          'pipeline_fusion': {'types': [bool]},
+                          'ipc_transport': {'types': [str]},
+                          'event_id_strategy': {'types': [str]},
+                          'backpressure': {'types': [dict]},
+                          'module_statistics': {'types': [bool]},
+                          'module_timings': {'types': [bool]},
+                          'tracing': {'types': [dict]},
+                          'profiler': {'types': [dict]}}},
     'Module': {'types': [dict,str],
                'fields': {'id': {'types': [str]},
                           'filter': {'types': [str]},
@@ -19,6 +27,7 @@ yaml_valid_config_template = {
                           'delete_fields': {'types': [list]},
                           'event_type': {'types': [str]},
                           'set_internal': {'types': [dict]},
+                          'partition_by': {'types': [str]},
                           'receivers': {'types': [list]}}
                }
 }
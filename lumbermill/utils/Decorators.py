@@ -1,12 +1,14 @@
 # -*- coding: utf-8 -*-
 import codecs
+import copy
 import sys
 import functools
-import threading
 import re
 import ast
 import collections
 
+from lumbermill.utils.TimerWheel import getTimerWheel
+
 
 def Singleton(class_):
     instances = {}
@@ -19,74 +21,89 @@ def Singleton(class_):
     return getinstance
 
 def setInterval(interval, max_run_count=0, call_on_init=False):
+    """
+    Call the decorated function every interval seconds once the returned wrapper is called.
+
+    The wrapper returns a handle. Call its set method to stop the timed function.
+    All timed functions of a process share one scheduler thread and a pool of worker threads, see TimerWheel.
+    Functions that block for longer than one tick of the wheel make it start extra workers, up to 64 per process.
+    Beyond that, timed functions get delayed until a worker is free again.
+    """
     def decorator(function):
         def wrapper(*args, **kwargs):
-            stopped = threading.Event()
-            def loop(): # executed in another thread
-                run_count = 0
-                if call_on_init:
-                    function(*args, **kwargs)
-                while not stopped.wait(interval): # until stopped
-                    function(*args, **kwargs)
-                    if max_run_count > 0:
-                        run_count += 1
-                        if run_count == max_run_count:
-                            break
-            t = threading.Thread(target=loop)
-            t.daemon = True # stop if the program exits
-            t.start()
-            return stopped
+            return getTimerWheel().schedule(functools.partial(function, *args, **kwargs), interval, max_run_count, call_on_init)
         return wrapper
     return decorator
 
+CONFIG_OPTION_REGEX = re.compile("\s*(?P<name>.*?):.*?#\s*<(?P<props>.*?)>", re.MULTILINE)
+
+def parseModuleDocstring(cls, logger):
+    """
+    Return the default configuration values and the configuration metadata of a module class as parsed from the
+    configuration template in its docstring.
+    """
+    configuration_defaults = {}
+    configuration_metadata = {}
+    docstring = ""
+    # Get docstring from parents. Only single inheritance supported.
+    for parent_class in cls.__bases__:
+        if parent_class.__doc__:
+            docstring += parent_class.__doc__
+    if cls.__doc__:
+        docstring += cls.__doc__
+    for matches in CONFIG_OPTION_REGEX.finditer(docstring):
+        config_option_info = matches.groupdict()
+        for prop_info in config_option_info['props'].split(";"):
+            try:
+                prop_name, prop_value = [m.strip() for m in prop_info.split(":", 1)]
+                # Replace escaped backslashes.
+                if "//" in prop_value:
+                    prop_value = codecs.escape_decode(prop_value)
+            except ValueError:
+                logger.debug("Could not parse config setting %s." % config_option_info)
+                continue
+            if prop_name in ["default", "values"]:
+                try:
+                    prop_value = ast.literal_eval(prop_value)
+                except:
+                    etype, evalue, etb = sys.exc_info()
+                    logger.error("Could not parse %s from docstring. Exception: %s, Error: %s." % (prop_value, etype, evalue))
+                    continue
+                # Set default values in module configuration. Will be overwritten by custom values
+                if prop_name == "default":
+                    configuration_defaults[config_option_info['name'].strip()] = prop_value
+                # Support for multiple datatypes using the pattern: "type: string||list;"
+            if prop_name == "type":
+                prop_value = prop_value.split("||")
+                prop_value.append('Unicode')
+            try:
+                configuration_metadata[config_option_info['name'].strip()].update({prop_name: prop_value})
+            except:
+                configuration_metadata[config_option_info['name'].strip()] = {prop_name: prop_value}
+    return configuration_defaults, configuration_metadata
+
 def ModuleDocstringParser(cls):
+    """
+    Set the configuration defaults and metadata from the docstring of the module class on each new instance.
+
+    The docstring is only parsed once per class, when the first instance is created. All instances share the
+    metadata, so it must not be changed. Defaults are copied, since they might be mutable.
+    """
+    parsed_docstring = []
+
     @functools.wraps(cls)
     def wrapper(*args, **kwargs):
         instance = cls(*args, **kwargs)
-        instance.configuration_metadata = {}
-        config_option_regex = "\s*(?P<name>.*?):.*?#\s*<(?P<props>.*?)>"
-        regex = re.compile(config_option_regex, re.MULTILINE)
-        docstring = ""
-        # Get docstring from parents. Only single inheritance supported.
-        for parent_class in cls.__bases__:
-            if parent_class.__doc__:
-                docstring += parent_class.__doc__
-        if cls.__doc__:
-            docstring += cls.__doc__
-        for matches in regex.finditer(docstring):
-            config_option_info = matches.groupdict()
-            for prop_info in config_option_info['props'].split(";"):
-                try:
-                    prop_name, prop_value = [m.strip() for m in prop_info.split(":", 1)]
-                    # Replace escaped backslashes.
-                    if "//" in prop_value:
-                        prop_value = codecs.escape_decode(prop_value)
-                except ValueError:
-                    instance.logger.debug("Could not parse config setting %s." % config_option_info)
-                    continue
-                if prop_name in ["default", "values"]:
-                    try:
-                        prop_value = ast.literal_eval(prop_value)
-                    except:
-                        etype, evalue, etb = sys.exc_info()
-                        instance.logger.error("Could not parse %s from docstring. Exception: %s, Error: %s." % (prop_value, etype, evalue))
-                        continue
-                    # Set default values in module configuration. Will be overwritten by custom values
-                    if prop_name == "default":
-                        instance.configuration_data[config_option_info['name'].strip()] = prop_value
-                    # Support for multiple datatypes using the pattern: "type: string||list;"
-                if prop_name == "type":
-                    prop_value = prop_value.split("||")
-                    prop_value.append('Unicode')
-                try:
-                    instance.configuration_metadata[config_option_info['name'].strip()].update({prop_name: prop_value})
-                except:
-                    instance.configuration_metadata[config_option_info['name'].strip()] = {prop_name: prop_value}
-        # Set self_hostname
+        if not parsed_docstring:
+            parsed_docstring.append(parseModuleDocstring(cls, instance.logger))
+        configuration_defaults, configuration_metadata = parsed_docstring[0]
+        instance.configuration_data.update(copy.deepcopy(configuration_defaults))
+        instance.configuration_metadata = configuration_metadata
         return instance
 
     return wrapper
 
+
 class BoundedOrderedDict(collections.OrderedDict):
     def __init__(self, *args, **kwds):
         self.maxlen = kwds.pop("maxlen", None)
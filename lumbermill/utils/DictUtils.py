@@ -1,11 +1,146 @@
 # -*- coding: utf-8 -*-
 import os
+import time
 import random
 import copy
+import itertools
 from string import Formatter
 
 from lumbermill.constants import MY_HOSTNAME
 
+EVENT_ID_STRATEGIES = ['random', 'monotonic', 'lazy']
+""" random: 128 bit random hex string plus pid, monotonic: host, pid and a counter, lazy: monotonic id created on first access. """
+
+
+def createRandomEventId():
+    return "%032x%s" % (random.getrandbits(128), os.getpid())
+
+
+# The counter starts at the current time in microseconds, so ids will not repeat if a pid gets reused after a restart.
+_event_id_counter = itertools.count(int(time.time() * 1000000))
+_process_id = None
+_event_id_prefix = None
+
+
+def _resetProcessInfo():
+    global _process_id, _event_id_prefix
+    _process_id = os.getpid()
+    _event_id_prefix = "%s-%s-" % (MY_HOSTNAME, _process_id)
+    EventMetaData.shared_fields = {'pid': _process_id, 'received_by': MY_HOSTNAME}
+
+
+def createMonotonicEventId():
+    return "%s%x" % (_event_id_prefix, next(_event_id_counter))
+
+
+_create_event_id = createRandomEventId
+_lazy_event_ids = False
+
+
+def setEventIdStrategy(strategy):
+    """
+    Set the way new event ids are created. See EVENT_ID_STRATEGIES.
+    """
+    global _create_event_id, _lazy_event_ids
+    if strategy not in EVENT_ID_STRATEGIES:
+        raise ValueError("Unknown event id strategy %s. Use one of %s." % (strategy, EVENT_ID_STRATEGIES))
+    _create_event_id = createRandomEventId if strategy == 'random' else createMonotonicEventId
+    _lazy_event_ids = strategy == 'lazy'
+
+
+def createEventId():
+    return _create_event_id()
+
+
+def _renewEventId(meta_data):
+    """
+    Give copied meta data its own event id. With lazy event ids, the id will only be created if it is accessed.
+    """
+    if "event_id" not in meta_data:
+        return
+    if _lazy_event_ids and isinstance(meta_data, EventMetaData):
+        del meta_data['event_id']
+    else:
+        meta_data['event_id'] = _create_event_id()
+
+
+class EventMetaData(dict):
+    """
+    The lumbermill meta data of an event.
+
+    Fields that are the same for all events of a process, like pid and received_by, are not stored per event but
+    taken from shared_fields, unless an event sets its own value. The dict methods used by serializers (json, msgpack,
+    pickle) include the shared fields, so serialized events look the same as before.
+    A missing event_id will be created on first access. Serializers only see the event_id once it was accessed.
+    """
+
+    shared_fields = {}
+    """ Per process constant fields. """
+
+    def __missing__(self, key):
+        try:
+            return self.shared_fields[key]
+        except KeyError:
+            pass
+        if key != 'event_id':
+            raise KeyError(key)
+        event_id = _create_event_id()
+        dict.__setitem__(self, 'event_id', event_id)
+        return event_id
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def setdefault(self, key, default=None):
+        if key in self.shared_fields and not dict.__contains__(self, key):
+            return self.shared_fields[key]
+        return dict.setdefault(self, key, default)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self.shared_fields
+
+    def _getSharedItems(self):
+        return [(key, value) for key, value in self.shared_fields.items() if not dict.__contains__(self, key)]
+
+    def items(self):
+        return list(dict.items(self)) + self._getSharedItems()
+
+    def keys(self):
+        return [key for key, _ in self.items()]
+
+    def values(self):
+        return [value for _, value in self.items()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return dict.__len__(self) + len(self._getSharedItems())
+
+    def __eq__(self, other):
+        return dict(self.items()) == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def copy(self):
+        return EventMetaData(dict.items(self))
+
+    def __deepcopy__(self, memo):
+        return EventMetaData((key, copy.deepcopy(value, memo)) for key, value in dict.items(self))
+
+
+_resetProcessInfo()
+# Forked workers need their own pid in the event id prefix and the shared meta data.
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_resetProcessInfo)
+
 
 class KeyDotNotationDict(dict):
     """
@@ -13,76 +148,89 @@ class KeyDotNotationDict(dict):
     >>> my_dict = {"key1": {"key2": "value"}}
     >>> my_dict["key1.key2"]
     "value"
+
+    Events cloned via clone() are copy-on-write: nested dicts and lists are shared between the clones
+    until one of them accesses such a value as container or writes to a path below it.
     """
 
-    def __getitem__(self, key, item=None):
-        item = item if item is not None else super(KeyDotNotationDict, self)
+    _cow_shared_keys = None
+    """ Top level keys whose values are still shared with a clone. """
+
+    def __getitem__(self, key):
         if "." not in key:
-            if isinstance(item, list):
-                key = int(key)
             try:
-                value = item.__getitem__(key)
-            except (KeyError, IndexError, TypeError, AttributeError):
+                value = dict.__getitem__(self, key)
+            except TypeError:
                 raise KeyError(key)
+            if self._cow_shared_keys and isinstance(value, (dict, list)) and key in self._cow_shared_keys:
+                # Containers might get changed in place by the caller. Hand out a private copy.
+                self._unshare(key)
+                value = dict.__getitem__(self, key)
             return value
-        current_key, remaining_keys = key.split('.', 1)
-        try:
-            item = item.__getitem__(current_key)
-        except TypeError:
-            item = item.__getitem__(int(current_key))
-        return self.__getitem__(remaining_keys, item)
+        return self.getPath(compileFieldPath(key))
 
-    def __setitem__(self, key, value, item=None):
-        item = item if item is not None else super(KeyDotNotationDict, self)
+    def __setitem__(self, key, value):
         if "." not in key:
-            if isinstance(item, list):
-                key = int(key)
+            if self._cow_shared_keys:
+                self._cow_shared_keys.discard(key)
             try:
-                ret = item.__setitem__(key, value)
-            except (KeyError, IndexError, TypeError, AttributeError):
+                return dict.__setitem__(self, key, value)
+            except TypeError:
                 raise KeyError(key)
-            return ret
-        current_key, remaining_keys = key.split('.', 1)
-        try:
-            item = item.__getitem__(current_key)
-        except TypeError:
-            item = item.__getitem__(int(current_key))
-        return self.__setitem__(remaining_keys, value, item)
+        return self.setPath(compileFieldPath(key), value)
 
-    def __delitem__(self, key, item=None):
-        item = item if item is not None else super(KeyDotNotationDict, self)
-        if "." not in key:
-            if isinstance(item, list):
-                key = int(key)
-            try:
-                ret = item.__delitem__(key)
-            except (KeyError, IndexError, TypeError, AttributeError):
-                raise KeyError(key)
-            return ret
-        current_key, remaining_keys = key.split('.', 1)
+    def __delitem__(self, key):
+        path = compileFieldPath(key)
+        if self._cow_shared_keys:
+            self._unshare(path[0][0])
+        container = _getPathValue(self, path[:-1])
         try:
-            item = item.__getitem__(current_key)
-        except TypeError:
-            item = item.__getitem__(int(current_key))
-        return self.__delitem__(remaining_keys, item)
+            _deletePathStep(container, path[-1])
+        except (KeyError, IndexError, TypeError, AttributeError):
+            raise KeyError(key)
 
-    def __contains__(self, key, item=None):
-        item = item if item is not None else super(KeyDotNotationDict, self)
+    def __contains__(self, key):
         if "." not in key:
             try:
-                value = item.__contains__(key)
-            except (KeyError, IndexError, TypeError, AttributeError):
+                return dict.__contains__(self, key)
+            except TypeError:
                 raise KeyError(key)
-            return value
-        current_key, remaining_keys = key.split('.', 1)
+        path = compileFieldPath(key)
         try:
-            item = item.__getitem__(current_key)
-            return self.__contains__(remaining_keys, item)
-        except TypeError:
-            item = item.__getitem__(int(current_key))
-            return self.__contains__(remaining_keys, item)
+            container = _getPathValue(self, path[:-1])
         except KeyError:
             return False
+        try:
+            return path[-1][0] in container
+        except TypeError:
+            raise KeyError(key)
+
+    def getPath(self, path):
+        """
+        Return the value for a path compiled via compileFieldPath.
+        """
+        value = _getPathValue(self, path)
+        if self._cow_shared_keys and isinstance(value, (dict, list)) and path[0][0] in self._cow_shared_keys:
+            # Containers might get changed in place by the caller. Hand out a private copy.
+            self._unshare(path[0][0])
+            value = _getPathValue(self, path)
+        return value
+
+    def setPath(self, path, value):
+        """
+        Set the value for a path compiled via compileFieldPath.
+        """
+        if self._cow_shared_keys:
+            self._unshare(path[0][0])
+        container = _getPathValue(self, path[:-1])
+        key, index = path[-1]
+        try:
+            if isinstance(container, list):
+                container[index] = value
+            else:
+                container[key] = value
+        except (KeyError, IndexError, TypeError, AttributeError):
+            raise KeyError(key)
 
     #def __del__(self, key):
     #    pass
@@ -92,10 +240,67 @@ class KeyDotNotationDict(dict):
 
     def copy(self):
         new_dict = KeyDotNotationDict(copy.deepcopy(super(KeyDotNotationDict, self)))
-        if "event_id" in new_dict.get("lumbermill", {}):
-            new_dict['lumbermill']['event_id'] = "%032x%s" % (random.getrandbits(128), os.getpid())
+        meta_data = dict.get(new_dict, "lumbermill")
+        if isinstance(meta_data, dict):
+            _renewEventId(meta_data)
         return new_dict
 
+    def clone(self):
+        """
+        Return a copy-on-write clone of this dict.
+
+        Only the top level dict is copied. Nested dicts and lists are shared with the clone and will be deep copied
+        by whichever side first writes below them or fetches them as container, e.g. event['params'].
+        The lumbermill meta data is copied right away, as the clone needs a new event_id.
+        Values fetched via items() or values() are not tracked, so do not modify these in place.
+        """
+        new_dict = KeyDotNotationDict()
+        dict.update(new_dict, self)
+        shared_keys = set()
+        for key, value in dict.items(self):
+            if isinstance(value, (dict, list)):
+                shared_keys.add(key)
+        meta_data = dict.get(self, 'lumbermill')
+        if isinstance(meta_data, dict):
+            shared_keys.discard('lumbermill')
+            meta_data = type(meta_data)((key, copy.deepcopy(value) if isinstance(value, (dict, list)) else value) for key, value in dict.items(meta_data))
+            _renewEventId(meta_data)
+            dict.__setitem__(new_dict, 'lumbermill', meta_data)
+        if shared_keys:
+            new_dict._cow_shared_keys = shared_keys
+            if self._cow_shared_keys:
+                self._cow_shared_keys.update(shared_keys)
+            else:
+                self._cow_shared_keys = set(shared_keys)
+        return new_dict
+
+    def _unshare(self, key):
+        """
+        Replace the top level value for key with a private deep copy if it is still shared with a clone.
+        """
+        top_level_key = compileFieldPath(key)[0][0]
+        if top_level_key not in self._cow_shared_keys:
+            return
+        self._cow_shared_keys.discard(top_level_key)
+        try:
+            value = dict.__getitem__(self, top_level_key)
+        except KeyError:
+            return
+        dict.__setitem__(self, top_level_key, copy.deepcopy(value))
+
+    def setdefault(self, key, default=None):
+        if self._cow_shared_keys:
+            self._unshare(key)
+        return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs):
+        if not self._cow_shared_keys:
+            return dict.update(self, *args, **kwargs)
+        update_dict = dict(*args, **kwargs)
+        # Replaced values are no longer shared.
+        self._cow_shared_keys.difference_update(update_dict)
+        dict.update(self, update_dict)
+
     def get(self, key, *args):
         try:
             return self.__getitem__(key)
@@ -123,25 +328,130 @@ class KeyDotNotationDict(dict):
         except KeyError:
             return default
 
-    def pop(self, key, default=None, item=None):
-        item = item if item else super(KeyDotNotationDict, self)
-        if "." not in key:
-            if not isinstance(item, list):
-                return item.pop(key, default)
+    def pop(self, key, default=None):
+        path = compileFieldPath(key)
+        if self._cow_shared_keys:
+            self._unshare(path[0][0])
+        try:
+            container = _getPathValue(self, path[:-1])
+        except KeyError:
+            return default
+        key, index = path[-1]
+        if not isinstance(container, list):
+            return dict.pop(container, key, default) if container is self else container.pop(key, default)
+        try:
+            return container[index]
+        except (IndexError, TypeError):
+            return default
+
+
+FIELD_PATH_CACHE_SIZE = 10000
+""" Maximum number of compiled field paths to keep. """
+_field_path_cache = {}
+
+
+def compileFieldPath(field_path):
+    """
+    Parse a dot separated field path into a tuple of (key, list_index) steps, e.g.:
+    >>> compileFieldPath("lumbermill.list.0")
+    (('lumbermill', None), ('list', None), ('0', 0))
+
+    list_index is None if the key can not be used to index a list.
+    Compiled paths are cached, so each path only gets parsed once.
+    """
+    try:
+        return _field_path_cache[field_path]
+    except KeyError:
+        pass
+    steps = []
+    for key in field_path.split('.'):
+        try:
+            index = int(key)
+        except ValueError:
+            index = None
+        steps.append((key, index))
+    path = tuple(steps)
+    if len(_field_path_cache) >= FIELD_PATH_CACHE_SIZE:
+        _field_path_cache.clear()
+    _field_path_cache[field_path] = path
+    return path
+
+
+def _getPathValue(item, path):
+    try:
+        for key, index in path:
+            if isinstance(item, list):
+                item = item[index]
+            elif isinstance(item, KeyDotNotationDict):
+                # Use the plain dict method, so KeyDotNotationDict values are not parsed or unshared again.
+                item = dict.__getitem__(item, key)
             else:
                 try:
-                    return item[int(key)]
-                except KeyError:
-                    return default
-        current_key, remaining_keys = key.split('.', 1)
+                    item = item[key]
+                except TypeError:
+                    # Sequences other than lists, e.g. tuples.
+                    if index is None:
+                        raise
+                    item = item[index]
+    except (KeyError, IndexError, TypeError, AttributeError):
+        raise KeyError(key)
+    return item
+
+
+def _deletePathStep(container, step):
+    key, index = step
+    if isinstance(container, list):
+        del container[index]
+    elif isinstance(container, KeyDotNotationDict):
+        dict.__delitem__(container, key)
+    else:
+        del container[key]
+
+
+def getFieldGetter(field_path):
+    """
+    Return a function that reads field_path from an event, raising a KeyError if the field does not exist.
+
+    The path is only parsed once. Modules should use this for fields they access for every event.
+    """
+    path = compileFieldPath(field_path)
+    if len(path) == 1:
+        def getField(event):
+            return event[field_path]
+    else:
+        def getField(event):
+            return event.getPath(path)
+    return getField
+
+
+def getFieldGetterWithDefault(field_path, default):
+    """
+    Return a function that reads field_path from an event, returning default if the field does not exist.
+    """
+    path = compileFieldPath(field_path)
+    def getField(event):
         try:
-            try:
-                item = item.__getitem__(current_key)
-            except TypeError:
-                item = item.__getitem__(int(current_key))
-            return self.pop(remaining_keys, default, item)
+            return event.getPath(path)
         except KeyError:
             return default
+    return getField
+
+
+def getFieldSetter(field_path):
+    """
+    Return a function(event, value) that sets field_path in an event.
+    """
+    path = compileFieldPath(field_path)
+    if len(path) == 1:
+        def setField(event, value):
+            event[field_path] = value
+    else:
+        def setField(event, value):
+            event.setPath(path, value)
+    return setField
+
+_dict_update = dict.update
+
 
 class DotDictFormatter(Formatter):
     try:  # deal with Py 2 & 3 difference
@@ -174,25 +484,33 @@ def mergeNestedDicts(a, b, path=None):
     return a
 
 def getDefaultEventDict(dict={}, caller_class_name='', received_from="Unknown", event_type="Unknown"):
-    default_dict = { "data": "",
-                     "lumbermill": {
-                         'pid': os.getpid(),
-                         'event_type': event_type,
-                         'event_id': "%032x%s" % (random.getrandbits(128), os.getpid()),
-                         'source_module': caller_class_name,
-                         'received_from': received_from,
-                         'received_by': MY_HOSTNAME
-                     }
-                }
-    default_dict.update(dict)
-    default_dict = KeyDotNotationDict(default_dict)
+    meta_data = EventMetaData()
+    meta_data['event_type'] = event_type
+    meta_data['source_module'] = caller_class_name
+    meta_data['received_from'] = received_from
+    if not _lazy_event_ids:
+        meta_data['event_id'] = _create_event_id()
+    default_dict = KeyDotNotationDict()
+    default_dict['data'] = ""
+    default_dict['lumbermill'] = meta_data
+    _dict_update(default_dict, dict)
     return default_dict
 
 def cloneDefaultDict(orig_dict):
     cloned_dict = copy.deepcopy(orig_dict)
-    cloned_dict['lumbermill']['event_id'] = "%032x%s" % (random.getrandbits(128), os.getpid())
-    #try:
-    #    cloned_dict['lumbermill']['event_id'] = "%032x%s" % (random.getrandbits(128), os.getpid())
-    #except KeyError:
-    #    pass
+    _renewEventId(cloned_dict['lumbermill'])
     return cloned_dict
+
+def getSerializableEvent(event):
+    """
+    Return the event with its meta data as a plain dict.
+
+    C encoders like ujson read the storage of dict subclasses directly and would miss the shared fields of EventMetaData.
+    The returned dict is a shallow copy and only meant to be serialized.
+    """
+    meta_data = dict.get(event, 'lumbermill')
+    if not isinstance(meta_data, EventMetaData):
+        return event
+    serializable_event = dict.copy(event)
+    serializable_event['lumbermill'] = dict(meta_data.items())
+    return serializable_event
@@ -5,6 +5,8 @@ import logging
 import datetime
 import re
 
+from lumbermill.utils.DictUtils import compileFieldPath, getFieldGetterWithDefault
+
 LM_DYNAMIC_VAL_REGEX = re.compile('[\$%]\(([^\)]*)\)')
 LM_DYNAMIC_VAL_REGEX_WITH_TYPES = re.compile('[\$%]\(([^\)]*)\)(-?\d*[-\.\*]?\d*[sdf]?)')
 PYTHON_DYNAMIC_VAL_REGEX = re.compile('%\((.*?)\)')
@@ -63,7 +65,231 @@ class ReplaceVars(ast.NodeTransformer):
         new_node = ast.parse(self.replacement % node.id).body[0].value
         return new_node
 
+def getFieldAccess(node):
+    """
+    Return (field_path, default) if node is a field lookup of the form event.get('field.path', default).
+    """
+    if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == 'get'
+            and isinstance(node.func.value, ast.Name) and node.func.value.id == 'event'
+            and len(node.args) in (1, 2) and not node.keywords
+            and all(isinstance(arg, ast.Constant) for arg in node.args) and isinstance(node.args[0].value, str)):
+        return None
+    return node.args[0].value, node.args[1].value if len(node.args) == 2 else None
+
+
+def getIndexablePredicate(filter_string):
+    """
+    If a filter only tests a field for equality with or membership in constants, e.g.:
+    $(lumbermill.event_type) == 'httpd_access_log'
+    $(lumbermill.event_type) in ['httpd_access_log', 'nginx_access_log']
+    return (field_path, default, values). Otherwise return None.
+    """
+    expression = parseFilterExpression(filter_string)
+    if not isinstance(expression, ast.Compare) or len(expression.ops) != 1:
+        return None
+    field, operator, compared = expression.left, expression.ops[0], expression.comparators[0]
+    if isinstance(operator, ast.Eq):
+        if getFieldAccess(compared) and isinstance(field, ast.Constant):
+            field, compared = compared, field
+        if not isinstance(compared, ast.Constant):
+            return None
+        values = (compared.value,)
+    elif isinstance(operator, ast.In):
+        if not isinstance(compared, (ast.List, ast.Tuple, ast.Set)) or not all(isinstance(element, ast.Constant) for element in compared.elts):
+            return None
+        values = tuple(element.value for element in compared.elts)
+    else:
+        return None
+    field_access = getFieldAccess(field)
+    if not field_access:
+        return None
+    field_path, default = field_access
+    return field_path, default, values
+
+
+class ReplaceFieldAccess(ast.NodeTransformer):
+    """
+    Replace event.get('field.path', default) calls with calls to precompiled field accessors.
+
+    The accessors are collected in the accessors dict, name -> function(event).
+    """
+    def __init__(self, accessors):
+        ast.NodeTransformer.__init__(self)
+        self.accessors = accessors
+        self.accessor_names = {}
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        field_access = getFieldAccess(node)
+        if not field_access:
+            return node
+        field_path, default = field_access
+        accessor_key = (field_path, type(default), default)
+        try:
+            accessor_name = self.accessor_names[accessor_key]
+        except KeyError:
+            accessor_name = "_field_%d" % len(self.accessor_names)
+            self.accessor_names[accessor_key] = accessor_name
+            self.accessors[accessor_name] = getFieldGetterWithDefault(field_path, default)
+        new_node = ast.Call(func=ast.Name(id=accessor_name, ctx=ast.Load()), args=[ast.Name(id='event', ctx=ast.Load())], keywords=[])
+        return ast.copy_location(new_node, node)
+
+
+SHAREABLE_NODE_TYPES = (ast.Compare, ast.BoolOp, ast.BinOp, ast.UnaryOp, ast.Subscript, ast.Call)
+SCOPE_NODE_TYPES = (ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+SIDE_EFFECT_FREE_FUNCTIONS = ('int', 'float', 'str', 'bool', 'len', 'abs', 'min', 'max', 'round', 'any', 'all', 'sorted')
+UNSET = object()
+
+
+def isShareable(node):
+    """
+    Only side effect free expressions are shared: all calls in it need to be field accessor calls or calls of
+    SIDE_EFFECT_FREE_FUNCTIONS.
+    """
+    if not isinstance(node, SHAREABLE_NODE_TYPES):
+        return False
+    for child in ast.walk(node):
+        if isinstance(child, SCOPE_NODE_TYPES):
+            return False
+        if isinstance(child, ast.Call) and not (isinstance(child.func, ast.Name) and (child.func.id.startswith('_field_') or child.func.id in SIDE_EFFECT_FREE_FUNCTIONS)):
+            return False
+    return True
+
+
+def getShareableNodes(node):
+    # Nodes inside of lambdas or comprehensions have their own scope and can not be assigned to the shared variables.
+    if isinstance(node, SCOPE_NODE_TYPES):
+        return
+    if isShareable(node):
+        yield node
+    for child in ast.iter_child_nodes(node):
+        for shareable_node in getShareableNodes(child):
+            yield shareable_node
+
+
+class ReplaceSharedExpressions(ast.NodeTransformer):
+    """
+    Replace shared expressions with an expression that computes the value only on first use:
+    (_shared[0] if _shared[0] is not _UNSET else _share(_shared, 0, <expression>))
+    """
+    def __init__(self, shared_expressions):
+        ast.NodeTransformer.__init__(self)
+        self.shared_expressions = shared_expressions
+
+    def visit(self, node):
+        if isinstance(node, SCOPE_NODE_TYPES):
+            return node
+        shared_index = self.shared_expressions.get(ast.dump(node)) if isinstance(node, SHAREABLE_NODE_TYPES) else None
+        node = self.generic_visit(node)
+        if shared_index is None:
+            return node
+        new_node = ast.parse("(_shared[%d] if _shared[%d] is not _UNSET else _share(_shared, %d, _shared_expression))" % (shared_index, shared_index, shared_index), mode='eval').body
+        new_node = ReplacePlaceholders({'_shared_expression': node}).visit(new_node)
+        return ast.copy_location(new_node, node)
+
+
+class ReplacePlaceholders(ast.NodeTransformer):
+    """
+    Replace the names of placeholders in a template with expressions.
+    """
+    def __init__(self, expressions):
+        ast.NodeTransformer.__init__(self)
+        self.expressions = expressions
+
+    def visit_Name(self, node):
+        return self.expressions.get(node.id, node)
+
+
+def shareValue(shared_values, index, value):
+    shared_values[index] = value
+    return value
+
+
+def parseFilterExpression(filter_string):
+    """
+    Return the body of a filter lambda, as created by parseDynamicValuesinFilterString.
+    """
+    filter_ast = ast.parse(filter_string.strip(), mode='eval').body
+    if not isinstance(filter_ast, ast.Lambda) or [arg.arg for arg in filter_ast.args.args] != ['lumbermill', 'event']:
+        raise ValueError("Filter %s is not of the form: lambda lumbermill, event : <expression>" % filter_string)
+    return filter_ast.body
+
+
+def compileFunction(function_name, template, expressions, namespace):
+    """
+    Compile the function defined in template, with the placeholders replaced by expressions.
+
+    The ast is compiled directly, so no source code has to be generated from the expressions.
+    """
+    module_ast = ReplacePlaceholders(expressions).visit(ast.parse(template))
+    module_ast = ast.fix_missing_locations(module_ast)
+    namespace = dict(namespace)
+    namespace['__builtins__'] = builtins
+    namespace['_UNSET'] = UNSET
+    namespace['_share'] = shareValue
+    exec(compile(module_ast, '<filter>', 'exec'), namespace)
+    return namespace[function_name]
+
+
+def compileFilter(filter_string, global_namespace=None):
+    """
+    Compile a filter, as created by parseDynamicValuesinFilterString, to a function(lumbermill, event).
+
+    Field lookups in the filter use precompiled field accessors. Besides these and the builtins, the filter can use
+    the names in global_namespace, e.g. imported modules.
+    """
+    accessors = {}
+    expression = ReplaceFieldAccess(accessors).visit(parseFilterExpression(filter_string))
+    namespace = dict(global_namespace or {})
+    namespace.update(accessors)
+    return compileFunction('_filter', "def _filter(lumbermill, event):\n    return _filter_expression\n", {'_filter_expression': expression}, namespace)
+
+
+def compileFilterGroup(filter_strings, global_namespace=None):
+    """
+    Compile several filters into one function(lumbermill, event), that returns a list with the result of each filter.
+    If a filter raises an exception, the exception will be its result.
+
+    Subexpressions used more than once, e.g. the same comparison in two filters, are computed at most once per call.
+    """
+    accessors = {}
+    field_access_transformer = ReplaceFieldAccess(accessors)
+    expressions = [field_access_transformer.visit(parseFilterExpression(filter_string)) for filter_string in filter_strings]
+    expression_counts = {}
+    for expression in expressions:
+        for node in getShareableNodes(expression):
+            node_dump = ast.dump(node)
+            expression_counts[node_dump] = expression_counts.get(node_dump, 0) + 1
+    shared_expressions = {}
+    for node_dump, count in expression_counts.items():
+        if count > 1:
+            shared_expressions[node_dump] = len(shared_expressions)
+    shared_expressions_transformer = ReplaceSharedExpressions(shared_expressions)
+    template = ["def _filter_group(lumbermill, event):"]
+    if shared_expressions:
+        template.append("    _shared = [_UNSET] * %d" % len(shared_expressions))
+    template.append("    results = []")
+    filter_expressions = {}
+    for idx, expression in enumerate(expressions):
+        filter_expressions['_filter_expression_%d' % idx] = shared_expressions_transformer.visit(expression)
+        template.append("    try:")
+        template.append("        results.append(_filter_expression_%d)" % idx)
+        template.append("    except Exception as e:")
+        template.append("        results.append(e)")
+    template.append("    return results")
+    namespace = dict(global_namespace or {})
+    namespace.update(accessors)
+    return compileFunction('_filter_group', "\n".join(template) + "\n", filter_expressions, namespace)
+
+def compileFieldPathsInString(value):
+    """
+    Compile the field paths referenced in value, so event lookups at runtime will not have to parse them again.
+    """
+    for field_path in LM_DYNAMIC_VAL_REGEX.findall(value):
+        compileFieldPath(re.sub(r'^event\.', '', field_path))
+
 def parseDynamicValuesinFilterString(filter_string):
+    compileFieldPathsInString(filter_string)
     # Remove possible leading "if".
     filter_string_tmp = re.sub('^if\s+', "", filter_string)
     # Remove event reference.
@@ -87,6 +313,7 @@ def parseDynamicValuesInString(value):
     matches = LM_DYNAMIC_VAL_REGEX_WITH_TYPES.search(value)
     if not matches:
         return value
+    compileFieldPathsInString(value)
     # Get custom format if set.
     # Defaults to string.
     if matches.group(2):
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import math
+
+MODULE_TIMINGS = ('handling_time', 'cpu_time', 'queue_wait_time')
+SUB_BUCKET_COUNT = 4
+BUCKET_COUNT = 32 * SUB_BUCKET_COUNT + 1
+
+
+class LogHistogram:
+    """
+    A histogram of durations with logarithmic buckets.
+
+    Values are given in seconds and stored in microseconds. Bucket 0 holds values below 1 microsecond. Above that,
+    each power of two is split into SUB_BUCKET_COUNT buckets, so the bucket bounds are at most 25% apart. Adding a
+    value only needs a frexp and an increment, no matter how many values were added. Values above 2^32 microseconds
+    (about 71 minutes) are counted in the last bucket.
+    """
+
+    def __init__(self):
+        self.buckets = [0] * BUCKET_COUNT
+        self.count = 0
+        self.sum = 0
+
+    @staticmethod
+    def getBucketIndex(value):
+        value = value * 1000000
+        if value < 1:
+            return 0
+        mantissa, exponent = math.frexp(value)
+        return min((exponent - 1) * SUB_BUCKET_COUNT + int((mantissa - .5) * 2 * SUB_BUCKET_COUNT) + 1, BUCKET_COUNT - 1)
+
+    @staticmethod
+    def getBucketUpperBound(bucket_index):
+        """
+        Return the upper bound of a bucket in seconds.
+        """
+        exponent, sub_bucket = divmod(bucket_index, SUB_BUCKET_COUNT)
+        return (2 ** exponent) * (1 + float(sub_bucket) / SUB_BUCKET_COUNT) / 1000000
+
+    def add(self, value, count=1):
+        self.buckets[self.getBucketIndex(value)] += count
+        self.count += count
+        self.sum += value * count
+
+    def addBucketCount(self, bucket_index, count):
+        self.buckets[bucket_index] += count
+        self.count += count
+
+    def merge(self, histogram):
+        for bucket_index, count in enumerate(histogram.buckets):
+            self.buckets[bucket_index] += count
+        self.count += histogram.count
+        self.sum += histogram.sum
+
+    def getDelta(self, previous):
+        """
+        Return a histogram of the values added since previous was copied from this histogram.
+        """
+        delta = LogHistogram()
+        delta.buckets = [count - previous_count for count, previous_count in zip(self.buckets, previous.buckets)]
+        delta.count = self.count - previous.count
+        delta.sum = self.sum - previous.sum
+        return delta
+
+    def getMean(self):
+        if not self.count:
+            return 0
+        return self.sum / self.count
+
+    def getPercentile(self, percentile):
+        """
+        Return the upper bound of the bucket holding the given percentile (0-100) in seconds.
+        """
+        if not self.count:
+            return 0
+        threshold = self.count * percentile / 100.0
+        seen = 0
+        for bucket_index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= threshold:
+                return self.getBucketUpperBound(bucket_index)
+        return self.getBucketUpperBound(BUCKET_COUNT - 1)
+
+    def getSummary(self):
+        return {'count': self.count,
+                'sum': self.sum,
+                'mean': self.getMean(),
+                'p50': self.getPercentile(50),
+                'p90': self.getPercentile(90),
+                'p99': self.getPercentile(99),
+                'buckets': dict([(self.getBucketUpperBound(bucket_index), count) for bucket_index, count in enumerate(self.buckets) if count])}
+
+
+def getModuleTimings(stats_collector):
+    """
+    Return the module timings published by all workers as {module_name: {worker_index: {timing: LogHistogram}}}.
+    """
+    module_timings = {}
+    for (module_name, worker_index, timing, bucket_index), value in stats_collector.getAllCounters(namespace="ModuleTimings").items():
+        if not value:
+            continue
+        histogram = module_timings.setdefault(module_name, {}).setdefault(worker_index, {}).setdefault(timing, LogHistogram())
+        if bucket_index == 'sum':
+            # Sums are published in microseconds.
+            histogram.sum += value / 1000000.0
+        else:
+            histogram.addBucketCount(bucket_index, value)
+    return module_timings
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+import sys
+import time
+
+from lumbermill.utils.Buffers import BufferedQueue, IPC_TRANSPORTS, produceIpcQueue
+from lumbermill.utils.DictUtils import getDefaultEventDict
+
+# Conditional imports for python2/3
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+DATA = '192.168.2.20 - - [28/Jul/2006:10:27:10 -0300] "GET /cgi-bin/try/ HTTP/1.0" 200 3395'
+MIN_BALANCE = 0.5
+""" Transports that distribute less events than this to the least busy worker, relative to the busiest one, will only
+be recommended if no other transport works. """
+
+
+def consumeEvents(buffered_queue, received_counts, worker_index, event_count):
+    # Each worker only writes its own counter, so no lock is needed.
+    while sum(received_counts) < event_count:
+        try:
+            for event in buffered_queue.get(True, .1):
+                received_counts[worker_index] += 1
+        except queue.Empty:
+            continue
+
+
+def benchmarkIpcTransport(ipc_transport, worker_count, event_count=100000, batch_size=50, queue_max_size=20, timeout=60):
+    """
+    Send event_count events from this process to worker_count worker processes via ipc_transport.
+
+    Returns a dictionary with the throughput in events per second and the balance between the workers.
+    Balance is the number of events received by the least busy worker divided by the number of events received by
+    the busiest one, so 1.0 means perfectly balanced.
+    """
+    # Make sure each batch is completely sent.
+    event_count -= event_count % batch_size
+    result = {'ipc_transport': ipc_transport, 'events_per_second': 0, 'balance': 0, 'error': None}
+    try:
+        ipc_queue = produceIpcQueue(ipc_transport, queue_max_size, batch_size=batch_size)
+    except ValueError:
+        etype, evalue, etb = sys.exc_info()
+        result['error'] = str(evalue)
+        return result
+    buffered_queue = BufferedQueue(queue=ipc_queue, buffersize=batch_size)
+    received_counts = multiprocessing.RawArray('Q', worker_count)
+    workers = [multiprocessing.Process(target=consumeEvents, args=(buffered_queue, received_counts, worker_index, event_count)) for worker_index in range(worker_count)]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+    events = [getDefaultEventDict({'data': DATA}) for _ in range(event_count)]
+    start = time.time()
+    for event in events:
+        buffered_queue.put(event)
+    buffered_queue.buffer.flush()
+    for worker in workers:
+        worker.join(max(0, timeout - (time.time() - start)))
+    duration = time.time() - start
+    buffered_queue.stop()
+    for worker in workers:
+        if worker.is_alive():
+            worker.terminate()
+    if sum(received_counts) < event_count:
+        result['error'] = "Only %s of %s events received within %s seconds." % (sum(received_counts), event_count, timeout)
+        return result
+    result['events_per_second'] = event_count / duration
+    result['balance'] = min(received_counts) / float(max(received_counts))
+    return result
+
+
+def benchmarkIpcTransports(worker_count, event_count=100000, batch_size=50, queue_max_size=20, ipc_transports=IPC_TRANSPORTS):
+    return [benchmarkIpcTransport(ipc_transport, worker_count, event_count, batch_size, queue_max_size) for ipc_transport in ipc_transports]
+
+
+def getRecommendedIpcTransport(results):
+    """
+    Return the transport with the highest throughput, preferring transports that balance the load between workers.
+    """
+    working_results = [result for result in results if not result['error']]
+    if not working_results:
+        return None
+    balanced_results = [result for result in working_results if result['balance'] >= MIN_BALANCE]
+    return max(balanced_results or working_results, key=lambda result: result['events_per_second'])['ipc_transport']
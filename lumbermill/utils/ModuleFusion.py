@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+import sys
+
+from lumbermill.BaseModule import BaseModule
+from lumbermill.utils.StatisticCollector import EVENTS_ERRORED
+
+RECEIVE_METHOD_NAMES = ('receiveEvent', 'receiveEvents', 'receiveMatchedEvent', 'receiveMatchedEvents')
+
+def isFusable(module):
+    """
+    Only modules that use the default event passing methods of BaseModule can be part of a fused chain.
+    """
+    module_class = type(module)
+    for method_name in ('receiveEvent', 'receiveEvents', 'receiveMatchedEvent', 'receiveMatchedEvents', 'sendEvent', 'sendEvents'):
+        if getattr(module_class, method_name) is not getattr(BaseModule, method_name):
+            return False
+    return True
+
+
+def getDirectSuccessor(module):
+    """
+    Return the receiver of module if it is the only one, has no output filter and is connected without a queue.
+    """
+    if module.output_filters or len(module.receivers) != 1:
+        return None
+    receiver = next(iter(module.receivers.values()))
+    if not isinstance(receiver, BaseModule) or not isFusable(receiver):
+        return None
+    return receiver
+
+
+def getModuleChain(module):
+    """
+    Follow the direct successors of module and return the linear chain starting with module.
+    """
+    chain = [module]
+    successor = getDirectSuccessor(module)
+    while successor and successor not in chain:
+        chain.append(successor)
+        successor = getDirectSuccessor(successor)
+    return chain
+
+
+def compileModuleChain(chain, apply_input_filter=True):
+    """
+    Compile a chain of modules into one callable.
+
+    The callable does the same as the receiveEvent/sendEvent calls of the single modules but without the per hop
+    receiver lookups. The last module in the chain sends its events via its own sendEvent method, so output
+    filters, multiple receivers and queues behind the chain work as before.
+    If apply_input_filter is False, the input filter of the first module is skipped.
+    """
+    head, last_module = chain[0], chain[-1]
+
+    def passToReceivers(event):
+        # Common actions will only be applied if the filter for the module matched.
+        last_module.sendEvent(event, apply_common_actions=False)
+    step = compileStep(last_module, last_module.sendEvent, passToReceivers, apply_input_filter or last_module is not head)
+    for module in reversed(chain[:-1]):
+        step = compileStep(module, compileCommonActions(module, step), step, apply_input_filter or module is not head)
+    return step
+
+
+def compileCommonActions(module, next_step):
+    if not module.hasCommonActions():
+        return next_step
+    common_actions = module.commonActions
+
+    def sendEvent(event):
+        next_step(common_actions(event))
+    return sendEvent
+
+
+def compileStep(module, send_event, pass_event, apply_input_filter=True):
+    """
+    Return a callable that handles an event with module and hands the result to send_event.
+
+    Events not matching the input filter of the module will be handed to pass_event unchanged.
+    Modules that provide a processEvent method will be called via this method, saving the generator overhead.
+    """
+    process_event = module.processEvent
+    handle_event = module.handleEvent
+    if process_event:
+        def handleStep(event):
+            send_event(process_event(event))
+    else:
+        def handleStep(event):
+            for handled_event in handle_event(event):
+                if handled_event:
+                    send_event(handled_event)
+    if not module.input_filter or not apply_input_filter:
+        return handleStep
+    input_filter = module.input_filter
+    lumbermill = module.lumbermill
+
+    def filteredStep(event):
+        try:
+            matched = input_filter(lumbermill, event)
+        except:
+            etype, evalue, etb = sys.exc_info()
+            module.logger.warning("Filter <%s> failed. Exception: %s, Error: %s." % (module.input_filter_string, etype, evalue))
+            module.event_counts[EVENTS_ERRORED] += 1
+            matched = False
+        if matched:
+            handleStep(event)
+        else:
+            pass_event(event)
+    return filteredStep
+
+
+def fuseModuleChain(chain):
+    """
+    Replace the receive methods of the first module in chain with the compiled chain.
+    """
+    fused_chain = compileModuleChain(chain)
+    fused_matched_chain = compileModuleChain(chain, apply_input_filter=False)
+
+    def receiveEvents(events):
+        for event in events:
+            fused_chain(event)
+
+    def receiveMatchedEvents(events):
+        for event in events:
+            fused_matched_chain(event)
+    head = chain[0]
+    # Keep the methods set on the instance, e.g. by an input filter, so unfuseModuleChain can restore them.
+    head.unfused_receive_methods = dict((method_name, head.__dict__.get(method_name)) for method_name in RECEIVE_METHOD_NAMES)
+    head.receiveEvent = fused_chain
+    head.receiveEvents = receiveEvents
+    head.receiveMatchedEvent = fused_matched_chain
+    head.receiveMatchedEvents = receiveMatchedEvents
+
+
+def unfuseModuleChain(head):
+    """
+    Restore the receive methods head had before its chain was fused, e.g. before its modules get connected anew.
+    Does nothing if head is not the first module of a fused chain.
+    """
+    unfused_receive_methods = head.__dict__.pop('unfused_receive_methods', None)
+    if unfused_receive_methods is None:
+        return
+    for method_name, method in unfused_receive_methods.items():
+        if method is None:
+            delattr(head, method_name)
+        else:
+            setattr(head, method_name, method)
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import difflib
+import pkgutil
+import importlib
+
+from lumbermill.constants import LUMBERMILL_BASEPATH
+
+
+class ModuleRegistry:
+    """
+    Resolve module names like parser.Regex to module classes.
+
+    A module file is only imported when a configuration references the module, since many modules import heavy
+    libraries like elasticsearch, kafka or geoip2 at module level. Resolved classes are cached. For each import, the
+    duration and the number of python modules it pulled in are recorded, see getImportTimes.
+    Available module names are read from the module directories without importing anything.
+    """
+
+    def __init__(self, module_dirs, package='lumbermill', package_path=LUMBERMILL_BASEPATH):
+        self.module_dirs = module_dirs
+        self.package = package
+        self.package_path = package_path
+        self.module_classes = {}
+        self.import_times = {}
+
+    def getModuleNames(self):
+        module_names = []
+        for module_dir in self.module_dirs:
+            for module_info in pkgutil.iter_modules([os.path.join(self.package_path, module_dir)]):
+                if module_info[2] or module_info[1].startswith('_'):
+                    continue
+                module_names.append("%s.%s" % (module_dir, module_info[1]))
+        return sorted(module_names)
+
+    def getSimilarModuleNames(self, module_name):
+        return difflib.get_close_matches(module_name, self.getModuleNames(), n=3)
+
+    def isImported(self, module_name):
+        return module_name in self.module_classes
+
+    def getModuleClass(self, module_name):
+        """
+        Return the class of module_name, importing its module on first use.
+
+        Raises ImportError if the module or a library it depends on can not be imported.
+        """
+        try:
+            return self.module_classes[module_name]
+        except KeyError:
+            pass
+        imported_module_count = len(sys.modules)
+        started = time.time()
+        module = importlib.import_module("%s.%s" % (self.package, module_name))
+        try:
+            module_class = getattr(module, module_name.split(".")[-1])
+        except AttributeError:
+            raise ImportError("Module %s does not define class %s." % (module_name, module_name.split(".")[-1]))
+        self.import_times[module_name] = {'duration': time.time() - started,
+                                          'imported_modules': len(sys.modules) - imported_module_count}
+        self.module_classes[module_name] = module_class
+        return module_class
+
+    def getImportTimes(self):
+        return self.import_times
@@ -1,17 +1,54 @@
 # -*- coding: utf-8 -*-
+import os
+import mmap
+import pickle
+import struct
+import logging
+import threading
 import multiprocessing
 
 import lumbermill.utils.Decorators as Decorators
 
 
-@Decorators.Singleton
-class MultiProcessDataStore:
+class SharedMemoryDataStore:
+    """
+    A key value store shared by all LumberMill processes.
+
+    Writes are appended as pickled (key, value) records to a log in shared memory and increase a version counter.
+    Each process keeps a local copy of the data. A read only compares the shared version with the version of the
+    local copy. Only if it changed, the new records are read from the log. So as long as nothing is written, a read
+    is a local dict lookup.
+    When the log is full, it is compacted to the current data. Compacting changes the epoch, which tells the other
+    processes to reload their copy. Readers never lock; they check that the epoch did not change while copying.
+
+    Setting a key to the value last written does not write anything. This is checked on the pickled value, not on the
+    local copy, which getValue returns and the caller might have changed in place. Values must be picklable.
+    Like with SharedMemoryQueue, the memory is an anonymous mmap, so the store must be created before the worker
+    processes are forked.
+    """
+    record_header = struct.Struct('<I')
+
+    def __init__(self, size=8 * 1024 * 1024):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.size = size
+        self.log = mmap.mmap(-1, size)
+        # Version, epoch, used bytes of the log. The epoch is odd while the log is being compacted.
+        self.header = multiprocessing.RawArray('q', 3)
+        # Reentrant, so acquireLock can be used to wrap a getValue/setValue sequence.
+        self.lock = multiprocessing.RLock()
+        self.data_dict = {}
+        # Pickled record of each key, to detect writes that would not change anything.
+        self.records = {}
+        self.version = 0
+        self.epoch = 0
+        self.log_offset = 0
+        self.initLocalLock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.initLocalLock)
 
-    def __init__(self):
-        self.lock = multiprocessing.Lock()
-        self.sync_manager = multiprocessing.Manager()
-        self.data_dict = self.sync_manager.dict()
-        """ Stores the statistic data """
+    def initLocalLock(self):
+        # A thread might have held the lock when the process was forked.
+        self.local_lock = threading.Lock()
 
     def acquireLock(self):
         self.lock.acquire()
@@ -19,24 +56,100 @@ class MultiProcessDataStore:
     def releaseLock(self):
         self.lock.release()
 
-    def setValue(self, key, value):
-        with self.lock:
-            try:
-                self.data_dict[key] = value
-            except OSError:
-                # OSError: [Errno 32] Broken pipe may be thrown when exiting via CTRL+C. Ignore it
-                pass
+    def encodeRecord(self, key, value):
+        record = pickle.dumps((key, value), protocol=2)
+        return self.record_header.pack(len(record)) + record
+
+    def decodeRecords(self, records, data_dict, encoded_records):
+        offset = 0
+        while offset < len(records):
+            record_length = self.record_header.unpack_from(records, offset)[0]
+            record = records[offset:offset + self.record_header.size + record_length]
+            offset += self.record_header.size
+            key, value = pickle.loads(records[offset:offset + record_length])
+            data_dict[key] = value
+            encoded_records[key] = record
+            offset += record_length
+
+    def readLog(self, from_offset):
+        """
+        Return epoch, end offset and a consistent copy of the log from from_offset.
+        """
+        while True:
+            epoch = self.header[1]
+            if epoch % 2:
+                # Log is being compacted.
+                continue
+            log_end = self.header[2]
+            records = self.log[from_offset:log_end]
+            if self.header[1] == epoch:
+                return epoch, log_end, records
 
-    def getValue(self, key, value):
+    def refresh(self):
+        """
+        Update the local copy of the data with the records written since the last refresh.
+        """
+        with self.local_lock:
+            version = self.header[0]
+            if version == self.version:
+                return
+            epoch, log_end, records = self.readLog(self.log_offset)
+            if epoch == self.epoch:
+                self.decodeRecords(records, self.data_dict, self.records)
+            else:
+                epoch, log_end, records = self.readLog(0)
+                data_dict = {}
+                encoded_records = {}
+                self.decodeRecords(records, data_dict, encoded_records)
+                self.data_dict = data_dict
+                self.records = encoded_records
+                self.epoch = epoch
+            self.log_offset = log_end
+            self.version = version
+
+    def compact(self, key, record):
+        """
+        Rewrite the log with the current data and the record for key. Must be called with the lock held.
+
+        The log is rebuilt from the pickled records, since the local copy might have been changed in place.
+        """
+        records = b"".join([stored_record for stored_key, stored_record in self.records.items() if stored_key != key] + [record])
+        if len(records) > self.size:
+            self.logger.error("Datastore full. Could not set %s." % (key,))
+            return False
+        self.header[1] += 1
+        self.log[0:len(records)] = records
+        self.header[2] = len(records)
+        self.header[1] += 1
+        return True
+
+    def setValue(self, key, value):
         with self.lock:
-            try:
-                self.data_dict[key] = value
-            except OSError:
-                # OSError: [Errno 32] Broken pipe may be thrown when exiting via CTRL+C. Ignore it
-                pass
+            self.refresh()
+            record = self.encodeRecord(key, value)
+            if self.records.get(key) == record:
+                return
+            log_end = self.header[2]
+            if log_end + len(record) > self.size:
+                if not self.compact(key, record):
+                    return
+            else:
+                self.log[log_end:log_end + len(record)] = record
+                self.header[2] = log_end + len(record)
+            self.header[0] += 1
 
-    def getDataDict(self):
-        return self.data_dict
+    def getValue(self, key):
+        if self.header[0] != self.version:
+            self.refresh()
+        return self.data_dict[key]
 
     def shutDown(self):
-        self.sync_manager.shutdown()
+        pass
+
+
+@Decorators.Singleton
+class MultiProcessDataStore(SharedMemoryDataStore):
+    """
+    The internal datastore of LumberMill, used by $(internal.<key>) filters.
+    """
+    pass
@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import sys
+import json
+import glob
+import time
+import shutil
+import logging
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+
+import yaml
+import psutil
+
+import lumbermill
+from lumbermill.constants import LUMBERMILL_BASEPATH
+
+HTTPD_LOG_LINE = '192.168.2.20 - - [28/Jul/2006:10:27:10 -0300] "GET /cgi-bin/try/ HTTP/1.0" 200 3395 "http://www.example.com/start.html" "Mozilla/4.08 [en] (Win98; I ;Nav)"'
+JSON_LOG_LINE = '{"remote_ip": "192.168.2.20", "verb": "GET", "request": "/cgi-bin/try/", "response": 200, "bytes": 3395, "agent": "Mozilla/4.08 [en] (Win98; I ;Nav)"}'
+
+PIPELINES = {'passthrough': {'event': HTTPD_LOG_LINE,
+                             'modules': []},
+             'regex_httpd': {'event': HTTPD_LOG_LINE,
+                             'modules': [{'parser.Regex': {'field_extraction_patterns': [{'httpd_access_log': '%{COMBINEDAPACHELOG}'}]}}]},
+             'json_decode': {'event': JSON_LOG_LINE,
+                             'modules': [{'parser.Json': {'source_fields': 'data'}}]},
+             'field_chain': {'event': {'data': HTTPD_LOG_LINE, 'remote_ip': '192.168.2.20', 'verb': 'get', 'request': '/cgi-bin/try/'},
+                             'modules': [{'modifier.Field': {'action': 'insert', 'target_field': 'environment', 'value': 'benchmark'}},
+                                         {'modifier.Field': {'action': 'upper', 'source_fields': ['verb']}},
+                                         {'modifier.Field': {'action': 'concat', 'source_fields': ['verb', 'request'], 'target_field': 'verb_request'}},
+                                         {'modifier.Field': {'action': 'rename', 'source_field': 'remote_ip', 'target_field': 'client_ip'}},
+                                         {'modifier.Field': {'action': 'delete', 'source_fields': ['data']}}]},
+             'geoip': {'event': {'data': HTTPD_LOG_LINE, 'remote_ip': '8.8.8.8'},
+                       'modules': [{'modifier.AddGeoInfo': {'source_fields': ['remote_ip']}}]},
+             'fanout': {'event': HTTPD_LOG_LINE,
+                        'modules': [{'modifier.Field': {'action': 'insert', 'target_field': 'environment', 'value': 'benchmark', 'receivers': ['Out1', 'Out2', 'Out3']}},
+                                    {'output.DevNull': {'id': 'Out1'}},
+                                    {'output.DevNull': {'id': 'Out2'}},
+                                    {'output.DevNull': {'id': 'Out3'}}]}}
+""" The canonical pipelines. Events are emitted by input.Spam and discarded by output.DevNull. """
+
+DEFAULT_SUITE = {'pipelines': sorted(PIPELINES.keys()),
+                 'workers': [1, 2, 'N'],
+                 'events_count': 200000,
+                 'sample_interval': 100,
+                 'timeout': 300,
+                 'result': None,
+                 'baseline': None,
+                 'max_regression': {'events_per_second': .1,
+                                    'latency_p50_ms': .25,
+                                    'latency_p99_ms': .5,
+                                    'peak_rss_mb': .2}}
+""" Settings of a suite file that are not given fall back to these. "N" workers means one worker per cpu. """
+
+RESULT_METRICS = ('events_per_second', 'latency_p50_ms', 'latency_p99_ms', 'peak_rss_mb')
+HIGHER_IS_BETTER = ('events_per_second',)
+MIN_LATENCY_CHANGE_MS = .1
+""" Latencies of simple pipelines are a few microseconds. Changes below this are not reported as regression. """
+ANSI_ESCAPE_RE = re.compile(r'\x1b\[[0-9;]*m')
+
+
+def readSuite(path_to_suite_file):
+    with open(path_to_suite_file, "r") as suite_file:
+        suite = yaml.safe_load(suite_file) or {}
+    for key, value in DEFAULT_SUITE.items():
+        if key not in suite:
+            suite[key] = value
+        elif isinstance(value, dict):
+            suite[key] = dict(value, **suite[key])
+    # Paths in the suite file are relative to the suite file.
+    suite_dir = os.path.dirname(os.path.abspath(path_to_suite_file))
+    for key in ('result', 'baseline'):
+        if suite[key]:
+            suite[key] = os.path.join(suite_dir, suite[key])
+    return suite
+
+
+def getWorkerCounts(workers):
+    worker_counts = []
+    for worker_count in workers:
+        if worker_count in ('N', 'n', 'auto'):
+            worker_count = multiprocessing.cpu_count()
+        worker_count = int(worker_count)
+        if worker_count not in worker_counts:
+            worker_counts.append(worker_count)
+    return worker_counts
+
+
+def getPipeline(pipeline):
+    """
+    Return name and definition of a pipeline. Pipelines are given either by name of a canonical pipeline or as a
+    dict with a name, the event to spam and the modules to run.
+    """
+    if not isinstance(pipeline, dict):
+        return pipeline, PIPELINES[pipeline]
+    return pipeline['name'], {'event': pipeline.get('event', HTTPD_LOG_LINE), 'modules': pipeline.get('modules', [])}
+
+
+def getPipelineConfiguration(pipeline, worker_count, events_count, sample_interval, trace_path):
+    """
+    Return a LumberMill configuration running pipeline with worker_count workers.
+
+    Latencies are taken from the spans of the event tracer, so tracing is enabled with sample_interval.
+    If the pipeline has no output module, an output.DevNull is appended.
+    """
+    configuration = [{'Global': {'workers': worker_count,
+                                 'logging': {'level': 'warn'},
+                                 'tracing': {'sample_interval': sample_interval,
+                                             'path': trace_path}}},
+                     {'input.Spam': {'event': pipeline['event'],
+                                     'events_count': events_count}}]
+    has_output = False
+    for module_config in pipeline['modules']:
+        module_name = module_config if not isinstance(module_config, dict) else list(module_config.keys())[0]
+        if module_name.startswith('output.'):
+            has_output = True
+        configuration.append(module_config)
+    if not has_output:
+        configuration.append('output.DevNull')
+    return configuration
+
+
+def getPercentile(sorted_values, percentile):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(int(len(sorted_values) * percentile / 100.0), len(sorted_values) - 1)]
+
+
+def getTraceStatistics(trace_path, sample_interval):
+    """
+    Read the traces written by all processes of a run.
+
+    The latency of an event is the time from being marked by the input module to the end of its last span. Clones of
+    an event keep its trace id, so with multiple receivers this is the time until the last receiver is done.
+    Throughput is estimated from the number of traced events, since only every sample_interval-th event is traced.
+    """
+    marks = {}
+    span_ends = {}
+    for filename in glob.glob(os.path.join(trace_path, "lumbermill_trace_*.json")):
+        with open(filename, "r") as trace_file:
+            trace = json.load(trace_file)
+        for trace_event in trace['traceEvents']:
+            trace_id = trace_event['tid']
+            if trace_event['ph'] == 'i':
+                marks[trace_id] = trace_event['ts']
+            elif trace_event['ph'] == 'X':
+                span_ends[trace_id] = max(span_ends.get(trace_id, 0), trace_event['ts'] + trace_event['dur'])
+    latencies = sorted([(span_ends[trace_id] - marked) / 1000.0 for trace_id, marked in marks.items() if trace_id in span_ends])
+    if not latencies:
+        return None
+    duration = (max(span_ends.values()) - min(marks.values())) / 1000000.0
+    return {'events_per_second': len(latencies) * sample_interval / duration if duration > 0 else 0,
+            'latency_p50_ms': getPercentile(latencies, 50),
+            'latency_p99_ms': getPercentile(latencies, 99),
+            'traced_events': len(latencies)}
+
+
+def getProcessTreeRss(process):
+    try:
+        processes = [process] + process.children(recursive=True)
+    except psutil.Error:
+        return 0
+    rss = 0
+    for process in processes:
+        try:
+            rss += process.memory_info().rss
+        except psutil.Error:
+            pass
+    return rss
+
+
+def runPipeline(name, pipeline, worker_count, events_count=200000, sample_interval=100, timeout=300):
+    """
+    Run pipeline in a LumberMill process with worker_count workers until input.Spam sent events_count events.
+
+    Returns a dictionary with throughput, p50 and p99 latency and the peak rss summed over all LumberMill processes.
+    """
+    logger = logging.getLogger("PipelineBenchmark")
+    result = {'pipeline': name, 'workers': worker_count, 'events_per_second': 0, 'latency_p50_ms': 0, 'latency_p99_ms': 0, 'peak_rss_mb': 0, 'error': None}
+    work_path = tempfile.mkdtemp(prefix="lumbermill_benchmark_")
+    try:
+        path_to_config_file = os.path.join(work_path, "%s.yml" % name)
+        with open(path_to_config_file, "w") as config_file:
+            yaml.safe_dump(getPipelineConfiguration(pipeline, worker_count, events_count, sample_interval, work_path), config_file, default_flow_style=False)
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join([os.path.dirname(LUMBERMILL_BASEPATH)] + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+        logger.info("Running pipeline %s with %s worker(s)." % (name, worker_count))
+        with open(os.path.join(work_path, "lumbermill.log"), "w+") as log_file:
+            process = subprocess.Popen([sys.executable, "-m", "lumbermill.LumberMill", "-c", path_to_config_file], stdout=log_file, stderr=subprocess.STDOUT, env=env, cwd=work_path)
+            ps_process = psutil.Process(process.pid)
+            # Workers might outlive the master process, e.g. while still writing their traces.
+            worker_processes = {}
+            peak_rss = 0
+            started = time.time()
+            while process.poll() is None:
+                try:
+                    for child in ps_process.children(recursive=True):
+                        worker_processes.setdefault(child.pid, child)
+                except psutil.Error:
+                    pass
+                if time.time() - started > timeout:
+                    for worker_process in worker_processes.values():
+                        try:
+                            worker_process.kill()
+                        except psutil.Error:
+                            pass
+                    process.kill()
+                    process.wait()
+                    result['error'] = "Pipeline did not finish within %s seconds." % timeout
+                    return result
+                peak_rss = max(peak_rss, getProcessTreeRss(ps_process))
+                time.sleep(.05)
+            psutil.wait_procs(list(worker_processes.values()), timeout=max(timeout - (time.time() - started), 1))
+            log_file.seek(0)
+            log_lines = [ANSI_ESCAPE_RE.sub('', line).strip() for line in log_file.readlines() if line.strip()]
+        statistics = getTraceStatistics(work_path, sample_interval)
+        if not statistics:
+            result['error'] = "No events reached the end of the pipeline. Exit code: %s. Last log line: %s" % (process.returncode, log_lines[-1] if log_lines else "")
+            return result
+        result.update(statistics)
+        result['peak_rss_mb'] = peak_rss / 1024.0 / 1024.0
+    except:
+        etype, evalue, etb = sys.exc_info()
+        result['error'] = "Exception: %s, Error: %s." % (etype, evalue)
+    finally:
+        shutil.rmtree(work_path, ignore_errors=True)
+    return result
+
+
+def compareWithBaseline(results, baseline_results, max_regression):
+    """
+    Return a list of regressions of results against baseline_results.
+
+    A metric regressed, if it is worse than its baseline value by more than the relative tolerance in max_regression.
+    Only runs of the same pipeline with the same worker count that succeeded in both are compared.
+    """
+    baseline_by_run = dict([((result['pipeline'], result['workers']), result) for result in baseline_results if not result.get('error')])
+    regressions = []
+    for result in results:
+        baseline_result = baseline_by_run.get((result['pipeline'], result['workers']))
+        if result['error'] or not baseline_result:
+            continue
+        for metric in RESULT_METRICS:
+            baseline_value = baseline_result.get(metric)
+            if not baseline_value:
+                continue
+            if metric.startswith('latency') and result[metric] - baseline_value < MIN_LATENCY_CHANGE_MS:
+                continue
+            change = (result[metric] - baseline_value) / float(baseline_value)
+            if metric in HIGHER_IS_BETTER:
+                change = -change
+            if change > max_regression.get(metric, 0):
+                regressions.append({'pipeline': result['pipeline'],
+                                    'workers': result['workers'],
+                                    'metric': metric,
+                                    'baseline': baseline_value,
+                                    'value': result[metric],
+                                    'change': change})
+    return regressions
+
+
+def runBenchmarkSuite(path_to_suite_file):
+    """
+    Run all pipelines of a suite file with all configured worker counts and compare the results with the baseline.
+
+    The report is printed as json and written to the result file, if configured. If the baseline file does not exist
+    yet, the results are stored as new baseline. Returns the report.
+    """
+    logger = logging.getLogger("PipelineBenchmark")
+    suite = readSuite(path_to_suite_file)
+    results = []
+    for pipeline in suite['pipelines']:
+        try:
+            name, pipeline = getPipeline(pipeline)
+        except KeyError:
+            logger.error("Unknown pipeline %s. Canonical pipelines are: %s." % (pipeline, sorted(PIPELINES.keys())))
+            continue
+        for worker_count in getWorkerCounts(suite['workers']):
+            result = runPipeline(name, pipeline, worker_count, suite['events_count'], suite['sample_interval'], suite['timeout'])
+            if result['error']:
+                logger.warning("%s with %s worker(s): failed. Error: %s" % (name, worker_count, result['error']))
+            else:
+                logger.info("%s with %s worker(s): %d events/s, p50: %.3fms, p99: %.3fms, rss: %.1fMB" % (name, worker_count, result['events_per_second'], result['latency_p50_ms'], result['latency_p99_ms'], result['peak_rss_mb']))
+            results.append(result)
+    report = {'lumbermill_version': lumbermill.__version__,
+              'python_version': platform.python_version(),
+              'python_implementation': platform.python_implementation(),
+              'cpu_count': multiprocessing.cpu_count(),
+              'events_count': suite['events_count'],
+              'results': results,
+              'baseline': suite['baseline'],
+              'regressions': []}
+    if suite['baseline']:
+        if os.path.exists(suite['baseline']):
+            with open(suite['baseline'], "r") as baseline_file:
+                baseline = json.load(baseline_file)
+            report['regressions'] = compareWithBaseline(results, baseline['results'], suite['max_regression'])
+            for regression in report['regressions']:
+                logger.warning("Regression in %s with %s worker(s): %s %.3f -> %.3f (%+.1f%% worse)." % (regression['pipeline'], regression['workers'], regression['metric'], regression['baseline'], regression['value'], regression['change'] * 100))
+        else:
+            logger.info("Baseline %s does not exist. Storing results as new baseline." % suite['baseline'])
+            with open(suite['baseline'], "w") as baseline_file:
+                json.dump(report, baseline_file, indent=2)
+    if suite['result']:
+        with open(suite['result'], "w") as result_file:
+            json.dump(report, result_file, indent=2)
+    print(json.dumps(report, indent=2))
+    return report
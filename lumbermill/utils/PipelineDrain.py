@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+import sys
+import time
+import logging
+from collections import OrderedDict
+
+
+def getTopologicalOrder(module_receivers):
+    """
+    Return the module ids of module_receivers, an ordered dict of module id to receiver ids, so that each module
+    comes before its receivers. Modules in a cycle and the modules after them keep their configured order.
+    """
+    sender_counts = OrderedDict((module_id, 0) for module_id in module_receivers)
+    for receiver_ids in module_receivers.values():
+        for receiver_id in set(receiver_ids):
+            if receiver_id in sender_counts:
+                sender_counts[receiver_id] += 1
+    module_ids = [module_id for module_id, sender_count in sender_counts.items() if not sender_count]
+    for module_id in module_ids:
+        for receiver_id in sorted(set(module_receivers[module_id]), key=list(module_receivers).index):
+            if receiver_id not in sender_counts:
+                continue
+            sender_counts[receiver_id] -= 1
+            if not sender_counts[receiver_id]:
+                module_ids.append(receiver_id)
+    module_ids.extend([module_id for module_id in module_receivers if module_id not in module_ids])
+    return module_ids
+
+
+class PipelineDrain:
+    """
+    Drain the events in flight on shutdown, after the inputs were stopped.
+
+    Events in flight are the events in the input queue of a stage and the events its modules report via
+    getPendingEventCount, e.g. events in an output buffer, in a MergeEvent buffer or waiting for a dns lookup.
+    Stages are drained in topological order. For each stage, the queue is flushed and the modules flush their
+    events, until nothing is pending anymore. So a stage is drained only after all its senders handed their events
+    on. All stages share one deadline. Events still held when LumberMill exits are lost.
+
+    stages is a list of dicts with:
+    name:      Module id.
+    queue:     Input queue of the module or None.
+    instances: Module instances running in the current process. If empty, the module runs in another process and
+               only the events buffered in this process for its queue are drained.
+    The queued events of queues shared between processes are counted as lost only if count_queued_events is set,
+    so that not every process counts them.
+    """
+
+    def __init__(self, stages, timeout, count_queued_events=True, poll_interval=.05):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.stages = stages
+        self.timeout = timeout
+        self.count_queued_events = count_queued_events
+        self.poll_interval = poll_interval
+        self.flushed_event_counts = OrderedDict()
+        self.duration = 0
+
+    def getPendingEventCount(self, stage, count_queued_events=True):
+        pending_event_count = 0
+        if stage['queue']:
+            pending_event_count += stage['queue'].getBufferedCount()
+            if count_queued_events:
+                pending_event_count += stage['queue'].getQueuedCount()
+        for instance in stage['instances']:
+            pending_event_count += instance.getPendingEventCount()
+        return pending_event_count
+
+    def getInFlightEventCounts(self):
+        in_flight_event_counts = OrderedDict()
+        for stage in self.stages:
+            # Queued events of a module running in another process are drained by that process.
+            in_flight_event_counts[stage['name']] = self.getPendingEventCount(stage, bool(stage['instances']))
+        return in_flight_event_counts
+
+    def flushStage(self, stage, timeout):
+        if stage['queue']:
+            stage['queue'].flush(timeout)
+        for instance in stage['instances']:
+            try:
+                instance.flushPendingEvents(timeout)
+            except:
+                etype, evalue, etb = sys.exc_info()
+                self.logger.error("Could not flush events of %s. Exception: %s, Error: %s." % (stage['name'], etype, evalue))
+
+    def drain(self):
+        """
+        Drain the stages one after the other until nothing is pending or the deadline passed.
+
+        Returns the number of events flushed. Events are counted at the stage that held them when the drain started,
+        so an event passing several stages on its way to an output is counted once.
+        """
+        started = time.time()
+        deadline = started + self.timeout
+        in_flight_event_counts = self.getInFlightEventCounts()
+        for stage in self.stages:
+            count_queued_events = bool(stage['instances'])
+            held_event_count = pending_event_count = self.getPendingEventCount(stage, count_queued_events)
+            while pending_event_count and time.time() < deadline:
+                self.flushStage(stage, max(deadline - time.time(), 0))
+                pending_event_count = self.getPendingEventCount(stage, count_queued_events)
+                if pending_event_count:
+                    time.sleep(self.poll_interval)
+            # Events received from senders during the drain were already counted at their sender.
+            flushed_event_count = min(in_flight_event_counts[stage['name']], max(held_event_count - pending_event_count, 0))
+            if flushed_event_count:
+                self.flushed_event_counts[stage['name']] = flushed_event_count
+        self.duration = time.time() - started
+        return sum(self.flushed_event_counts.values())
+
+    def getLostEventCounts(self):
+        """
+        Return the number of events per stage, that are still held. Call this after the modules were shut down.
+        """
+        lost_event_counts = OrderedDict()
+        for stage in self.stages:
+            lost_event_count = self.getPendingEventCount(stage, self.count_queued_events)
+            if lost_event_count:
+                lost_event_counts[stage['name']] = lost_event_count
+        return lost_event_counts
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import marshal
+import contextlib
+import logging
+import threading
+from collections import defaultdict
+
+
+class SamplingProfiler:
+    """
+    Sample the stacks of all threads of this process in intervals.
+
+    Unlike cProfile, nothing is traced. A background thread takes a snapshot of all stacks via sys._current_frames
+    every interval seconds, so the overhead only depends on the interval and the number of threads, not on the
+    number of calls. The module under observation keeps running like before.
+
+    Results are written to path as:
+    - <prefix>.collapsed: one line per distinct stack, frames separated by ";" and followed by the sample count.
+      This is the input format of flamegraph.pl and speedscope. The root frames are the pid and the name of the
+      thread, or the name of the module, if the thread belongs to a module.
+    - <prefix>.pstats: the samples converted to a marshalled stats dict, readable via pstats.Stats. Times are
+      estimated as sample count * interval, call counts are sample counts.
+    """
+
+    def __init__(self, interval=.01, path=None, get_thread_labels=None):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.interval = interval
+        self.path = path
+        self.get_thread_labels = get_thread_labels
+        self.is_running = False
+        self.thread = None
+        self.stack_counts = defaultdict(int)
+        self.sample_count = 0
+
+    def start(self, duration):
+        """
+        Sample for duration seconds in a background thread and write the results afterwards.
+        """
+        if self.is_running:
+            self.logger.warning("Profiler already running in process %s." % os.getpid())
+            return False
+        self.is_running = True
+        self.stack_counts = defaultdict(int)
+        self.sample_count = 0
+        self.thread = threading.Thread(target=self.run, args=(duration,), name="SamplingProfiler")
+        self.thread.daemon = True
+        self.thread.start()
+        return True
+
+    def stop(self):
+        self.is_running = False
+
+    def run(self, duration):
+        self.logger.info("Profiling process %s for %ss." % (os.getpid(), duration))
+        next_sample_time = time.time()
+        stop_time = next_sample_time + duration
+        while self.is_running and next_sample_time < stop_time:
+            self.takeSample()
+            # Keep the sample rate, even if taking a sample was delayed.
+            next_sample_time = max(next_sample_time + self.interval, time.time())
+            time.sleep(max(next_sample_time - time.time(), 0))
+        self.is_running = False
+        try:
+            self.writeResults()
+        except:
+            etype, evalue, etb = sys.exc_info()
+            self.logger.error("Could not write profiling results. Exception: %s, Error: %s." % (etype, evalue))
+
+    def getThreadLabels(self):
+        thread_labels = dict([(thread.ident, thread.name) for thread in threading.enumerate()])
+        if self.get_thread_labels:
+            thread_labels.update(self.get_thread_labels())
+        return thread_labels
+
+    def takeSample(self):
+        thread_labels = self.getThreadLabels()
+        own_ident = threading.current_thread().ident
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            stack.reverse()
+            self.stack_counts[(thread_labels.get(ident, str(ident)), tuple(stack))] += 1
+        self.sample_count += 1
+
+    def getFilePrefix(self):
+        path = self.path or os.getcwd()
+        return os.path.join(path, "lumbermill_profile_%s_%s" % (os.getpid(), time.strftime("%Y%m%d-%H%M%S")))
+
+    def writeResults(self):
+        file_prefix = self.getFilePrefix()
+        self.writeCollapsedStacks("%s.collapsed" % file_prefix)
+        self.writePstats("%s.pstats" % file_prefix)
+        self.logger.info("Took %s samples in process %s. Wrote %s.collapsed and %s.pstats." % (self.sample_count, os.getpid(), file_prefix, file_prefix))
+
+    def getFrameLabel(self, frame_key):
+        filename, line_number, function_name = frame_key
+        return "%s (%s:%s)" % (function_name, os.path.basename(filename), line_number)
+
+    def writeCollapsedStacks(self, filename):
+        root_label = "pid %s" % os.getpid()
+        with open(filename, 'w') as collapsed_file:
+            for (thread_label, stack), count in sorted(self.stack_counts.items()):
+                frames = [root_label, thread_label] + [self.getFrameLabel(frame_key) for frame_key in stack]
+                # ";" separates the frames and the last space the count.
+                collapsed_file.write("%s %d\n" % (";".join([frame.replace(";", ":") for frame in frames]), count))
+
+    def getPstats(self):
+        """
+        Return the samples as stats dict like cProfile creates it: {function: (cc, nc, tt, ct, {caller: (cc, nc, tt, ct)})}.
+        """
+        stats = {}
+        for (thread_label, stack), count in self.stack_counts.items():
+            if not stack:
+                continue
+            seen = set()
+            for idx, frame_key in enumerate(stack):
+                is_leaf = idx == len(stack) - 1
+                function_stats = stats.setdefault(frame_key, [0, 0, 0, 0, {}])
+                if is_leaf:
+                    function_stats[2] += count
+                if frame_key in seen:
+                    # Recursion, only count the cumulative time once per stack.
+                    continue
+                seen.add(frame_key)
+                function_stats[0] += count
+                function_stats[1] += count
+                function_stats[3] += count
+                if idx:
+                    caller_stats = function_stats[4].setdefault(stack[idx - 1], [0, 0, 0, 0])
+                    caller_stats[0] += count
+                    caller_stats[1] += count
+                    caller_stats[3] += count
+                    if is_leaf:
+                        caller_stats[2] += count
+        interval = self.interval
+        return dict([(frame_key, (cc, nc, tt * interval, ct * interval, dict([(caller, (caller_cc, caller_nc, caller_tt * interval, caller_ct * interval)) for caller, (caller_cc, caller_nc, caller_tt, caller_ct) in callers.items()])))
+                     for frame_key, (cc, nc, tt, ct, callers) in stats.items()])
+
+    def writePstats(self, filename):
+        with open(filename, 'wb') as pstats_file:
+            marshal.dump(self.getPstats(), pstats_file)
+
+
+class StartupProfiler:
+    """
+    Measure how long the steps of the LumberMill startup take, e.g. reading the configuration, importing,
+    creating and configuring each module and connecting the modules.
+
+    Steps are only measured while the profiler is enabled, see --startup-profile.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.is_enabled = False
+        self.started = time.time()
+        self.steps = []
+
+    def enable(self):
+        self.is_enabled = True
+        self.started = time.time()
+        self.steps = []
+
+    @contextlib.contextmanager
+    def measure(self, step, name="", info=""):
+        if not self.is_enabled:
+            yield
+            return
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.addStep(step, name, time.time() - started, info)
+
+    def addStep(self, step, name, duration, info=""):
+        if self.is_enabled:
+            self.steps.append({'step': step, 'name': name, 'duration': duration, 'info': info})
+
+    def getReport(self):
+        return {'steps': list(self.steps),
+                'total': time.time() - self.started}
+
+    def logReport(self):
+        if not self.is_enabled:
+            return
+        report = self.getReport()
+        # The profile was asked for, so show it even if the configured log level is above info.
+        log_level = max(logging.INFO, logging.getLogger().getEffectiveLevel())
+        self.logger.log(log_level, "Startup profile of process %s:" % os.getpid())
+        for step in report['steps']:
+            self.logger.log(log_level, "%-10s %-40s %9.2fms %s" % (step['step'], step['name'], step['duration'] * 1000, step['info']))
+        slowest_steps = sorted(report['steps'], key=lambda step: step['duration'], reverse=True)[:5]
+        self.logger.log(log_level, "Slowest steps: %s" % ", ".join(["%s %s (%.2fms)" % (step['step'], step['name'], step['duration'] * 1000) for step in slowest_steps]))
+        self.logger.log(log_level, "Startup took %.2fms." % (report['total'] * 1000))
+
+
+startup_profiler = StartupProfiler()
+
+
+def getStartupProfiler():
+    return startup_profiler
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from lumbermill.utils.DictUtils import getFieldGetterWithDefault
+from lumbermill.utils.DynamicValues import getIndexablePredicate
+
+
+class RoutingIndex:
+    """
+    Route events to receivers via dict lookups instead of evaluating one output filter per receiver.
+
+    Output filters that test a field for equality with or membership in constants, e.g.:
+    $(lumbermill.event_type) == 'httpd_access_log'
+    are added to an index per field. For each event, the field is looked up once and the matching receivers are
+    taken from the index. All other output filters are not indexed and need to be evaluated one by one.
+    """
+
+    def __init__(self):
+        self.receiver_names = set()
+        self.field_indexes = {}
+
+    def __contains__(self, receiver_name):
+        return receiver_name in self.receiver_names
+
+    def __len__(self):
+        return len(self.receiver_names)
+
+    def addFilter(self, receiver_name, filter_string):
+        """
+        Add the output filter of a receiver to the index. Returns False if the filter can not be indexed.
+        """
+        predicate = getIndexablePredicate(filter_string)
+        if not predicate:
+            return False
+        field_path, default, values = predicate
+        index_key = (field_path, type(default), default)
+        try:
+            get_field, value_index = self.field_indexes[index_key]
+        except KeyError:
+            get_field, value_index = self.field_indexes[index_key] = (getFieldGetterWithDefault(field_path, default), {})
+        for value in values:
+            value_index.setdefault(value, set()).add(receiver_name)
+        self.receiver_names.add(receiver_name)
+        return True
+
+    def getMatchingReceiverNames(self, event):
+        matching_receiver_names = set()
+        for get_field, value_index in self.field_indexes.values():
+            try:
+                matching_receiver_names.update(value_index.get(get_field(event), ()))
+            except TypeError:
+                # Unhashable values, like lists or dicts, can not be equal to one of the constants.
+                continue
+        return matching_receiver_names
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import array
+import socket
+import struct
+import logging
+import threading
+
+HANDOFF_PATH_ENVIRONMENT_VARIABLE = 'LUMBERMILL_HANDOFF_PATH'
+MAX_HANDOFF_SOCKETS = 64
+
+
+class SocketHandoff:
+    """
+    Hand the listening sockets of input modules over to a new LumberMill process.
+
+    Input modules register their listening sockets by a key like tcp:0.0.0.0:5151. On a restart with handoff, the old
+    process serves these sockets on a unix socket and starts the new process with the path of this unix socket set in
+    the environment variable LUMBERMILL_HANDOFF_PATH. Instead of binding, the input modules of the new process request
+    the sockets for their key and receive duplicates of the file descriptors via SCM_RIGHTS.
+    So the listening sockets stay open all the time. The kernel queues connections and datagrams until one of the
+    processes reads them. As soon as the new process is running, it sends READY and the old process drains its
+    pipeline and exits. Both processes share the same sockets, so the old one must only close them, not shut them down.
+    Only processes of the same user are served.
+    """
+
+    def __init__(self, handoff_path=None):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.sockets = {}
+        # Path of the unix socket the previous process serves its sockets on.
+        self.handoff_path = handoff_path
+        self.server_socket = None
+        self.server_path = None
+        self.on_ready = None
+
+    def addSockets(self, key, sockets):
+        self.sockets[key] = list(sockets)
+
+    def getInheritedSockets(self, key):
+        """
+        Return the sockets the previous process registered for key. Returns None, if this process was not started by a
+        restart with handoff or the previous process has no sockets for key.
+        """
+        if not self.handoff_path:
+            return None
+        try:
+            response, fds = self.sendRequest("GET %s" % key)
+        except socket.error:
+            etype, evalue, etb = sys.exc_info()
+            self.logger.warning("Could not get sockets for %s from %s. Exception: %s, Error: %s." % (key, self.handoff_path, etype, evalue))
+            return None
+        if not fds:
+            return None
+        self.logger.info("Took over %s socket(s) for %s." % (len(fds), key))
+        return [socket.socket(fileno=fd) for fd in fds]
+
+    def sendReady(self):
+        """
+        Tell the previous process, that this one is running. The previous process will then drain and exit.
+        """
+        if not self.handoff_path:
+            return False
+        try:
+            self.sendRequest("READY")
+        except socket.error:
+            etype, evalue, etb = sys.exc_info()
+            self.logger.warning("Could not send ready to %s. Exception: %s, Error: %s." % (self.handoff_path, etype, evalue))
+            return False
+        finally:
+            # Processes started later on must not request sockets from the previous process.
+            self.handoff_path = None
+            os.environ.pop(HANDOFF_PATH_ENVIRONMENT_VARIABLE, None)
+        return True
+
+    def sendRequest(self, request):
+        """
+        Send a request to the previous process and return its response and the received file descriptors.
+        """
+        client_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            client_socket.settimeout(10)
+            client_socket.connect(self.handoff_path)
+            client_socket.sendall(request.encode('utf-8') + b"\n")
+            fds = array.array('i')
+            message, ancillary_data, flags, address = client_socket.recvmsg(1024, socket.CMSG_LEN(MAX_HANDOFF_SOCKETS * fds.itemsize))
+            for cmsg_level, cmsg_type, cmsg_data in ancillary_data:
+                if cmsg_level == socket.SOL_SOCKET and cmsg_type == socket.SCM_RIGHTS:
+                    fds.frombytes(cmsg_data[:len(cmsg_data) - (len(cmsg_data) % fds.itemsize)])
+            return message.decode('utf-8').strip(), list(fds)
+        finally:
+            client_socket.close()
+
+    def isServing(self):
+        return self.server_socket is not None
+
+    def startServer(self, path, on_ready):
+        """
+        Serve the registered sockets on a unix socket at path. on_ready will be called from the server thread, when the
+        new process sent READY.
+        """
+        if os.path.exists(path):
+            os.remove(path)
+        server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server_socket.bind(path)
+        os.chmod(path, 0o600)
+        server_socket.listen(8)
+        # Check regularly if the server was stopped.
+        server_socket.settimeout(.5)
+        self.server_socket = server_socket
+        self.server_path = path
+        self.on_ready = on_ready
+        server_thread = threading.Thread(target=self.serve, args=(server_socket,))
+        server_thread.daemon = True
+        server_thread.start()
+
+    def stopServer(self):
+        server_socket = self.server_socket
+        self.server_socket = None
+        if not server_socket:
+            return
+        server_socket.close()
+        try:
+            os.remove(self.server_path)
+        except OSError:
+            pass
+
+    def serve(self, server_socket):
+        while self.server_socket is server_socket:
+            try:
+                connection, address = server_socket.accept()
+            except socket.timeout:
+                continue
+            except socket.error:
+                # Server socket was closed.
+                break
+            try:
+                self.handleRequest(connection)
+            except socket.error:
+                etype, evalue, etb = sys.exc_info()
+                self.logger.warning("Could not handle handoff request. Exception: %s, Error: %s." % (etype, evalue))
+            finally:
+                connection.close()
+
+    def handleRequest(self, connection):
+        connection.settimeout(10)
+        if not self.isSameUser(connection):
+            self.logger.warning("Refused handoff request of another user.")
+            return
+        request = b""
+        while not request.endswith(b"\n"):
+            data = connection.recv(1024)
+            if not data:
+                return
+            request += data
+        request = request.decode('utf-8').strip()
+        if request.startswith("GET "):
+            key = request[4:]
+            fds = array.array('i', [registered_socket.fileno() for registered_socket in self.sockets.get(key, [])])
+            ancillary_data = [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds)] if fds else []
+            connection.sendmsg([("%s\n" % len(fds)).encode('utf-8')], ancillary_data)
+            self.logger.info("Handed over %s socket(s) for %s." % (len(fds), key))
+        elif request == "READY":
+            connection.sendall(b"OK\n")
+            if not self.on_ready:
+                return
+            try:
+                self.on_ready()
+            except:
+                # The server thread has to keep running, so that the handoff can still be stopped.
+                etype, evalue, etb = sys.exc_info()
+                self.logger.error("Could not finish handoff. Exception: %s, Error: %s." % (etype, evalue))
+        else:
+            connection.sendall(b"ERROR\n")
+
+    def isSameUser(self, connection):
+        if not hasattr(socket, 'SO_PEERCRED'):
+            return True
+        credentials = connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+        pid, uid, gid = struct.unpack('3i', credentials)
+        return uid == os.getuid()
+
+
+socket_handoff = None
+
+
+def getSocketHandoff():
+    """
+    Return the socket handoff of the current process.
+    """
+    global socket_handoff
+    if socket_handoff is None:
+        socket_handoff = SocketHandoff(os.environ.get(HANDOFF_PATH_ENVIRONMENT_VARIABLE))
+    return socket_handoff
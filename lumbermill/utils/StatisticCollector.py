@@ -1,11 +1,21 @@
 # -*- coding: utf-8 -*-
+import os
 import sys
+import time
+import mmap
+import pickle
 import socket
+import struct
+import logging
+import threading
 import multiprocessing
 from collections import defaultdict
 
 from lumbermill.utils.Decorators import Singleton
 
+MODULE_EVENT_COUNTERS = ('events_in', 'events_out', 'events_dropped', 'events_errored')
+EVENTS_IN, EVENTS_OUT, EVENTS_DROPPED, EVENTS_ERRORED = range(len(MODULE_EVENT_COUNTERS))
+
 
 @Singleton
 class StatisticCollector:
@@ -181,3 +191,269 @@ class MultiProcessStatisticCollector:
 
     def shutDown(self):
         self.sync_manager.shutdown()
+
+@Singleton
+class SharedMemoryStatisticCollector:
+    """
+    Collect counters of all processes in shared memory.
+
+    Each process writes to its own row of a shared array, so updating a counter needs neither an ipc round trip
+    nor a lock shared between processes. Only the threads of one process share a (process local) lock.
+    Counters are aggregated over all rows when they are read.
+    Row 0 holds offsets. Resetting or setting a counter writes the difference to the current total into this row,
+    so the rows of the processes never have to be changed by another process.
+
+    The counter names are stored in a shared key table. Only adding or removing a key takes a multiprocessing lock,
+    every process then caches the slot of the key locally.
+    Resetting a counter removes its key and frees the slot, so dynamic keys do not use up the table. Every removal
+    bumps the key table version, which makes the processes drop their cached slots. A freed slot is only handed out
+    again after slot_reuse_delay seconds, so a process can not count to a reused slot via a stale cache entry.
+    A namespace can use at most max_namespace_counters slots, so a namespace with many dynamic keys can not use up
+    the slots of the others. Counters with unbounded keys, like the Metrics module, are better collected via
+    MultiProcessStatisticCollector.
+    Like with SharedMemoryQueue, the memory is an anonymous mmap, so the collector must be created before the
+    worker processes are forked. Counters are 64 bit integers.
+    """
+    key_header = struct.Struct('<H')
+
+    def __init__(self, max_processes=128, max_counters=16384, max_namespace_counters=4096, key_size=128, slot_reuse_delay=1):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.max_processes = max_processes
+        self.max_counters = max_counters
+        self.max_namespace_counters = max_namespace_counters
+        self.key_size = key_size
+        self.slot_reuse_delay = slot_reuse_delay
+        # Row 0 is the offset row, rows 1..max_processes belong to the processes.
+        self.counters = multiprocessing.RawArray('q', (max_processes + 1) * max_counters)
+        self.row_pids = multiprocessing.RawArray('q', max_processes + 1)
+        # Number of slots in use (including freed ones), number of rows in use, key table version.
+        self.sizes = multiprocessing.RawArray('q', 3)
+        # Monotonic time at which a slot was freed, 0 if the slot is in use.
+        self.freed_times = multiprocessing.RawArray('d', max_counters)
+        self.key_table = mmap.mmap(-1, max_counters * key_size)
+        self.lock = multiprocessing.Lock()
+        self.pid = None
+        self.initProcess()
+
+    def initProcess(self):
+        """
+        (Re)init the process local state. A forked process needs its own row and thread lock.
+        """
+        self.pid = os.getpid()
+        self.local_lock = threading.Lock()
+        self.row = None
+        self.indices = {}
+        self.slots = {}
+        self.namespace_sizes = defaultdict(int)
+        self.known_key_count = 0
+        self.known_version = self.sizes[2]
+        self.is_full = False
+        self.full_namespaces = set()
+
+    def encodeKey(self, key, namespace):
+        return pickle.dumps((namespace, key), protocol=2)
+
+    def readKeys(self):
+        """
+        Add keys registered by other processes to the local slot cache.
+        If keys were removed in the meantime, the whole cache is rebuilt.
+        """
+        if self.known_version != self.sizes[2]:
+            self.known_version = self.sizes[2]
+            self.known_key_count = 0
+            self.slots = {}
+            self.namespace_sizes = defaultdict(int)
+            self.indices = {}
+        key_count = self.sizes[0]
+        for slot in range(self.known_key_count, key_count):
+            offset = slot * self.key_size
+            key_length = self.key_header.unpack(self.key_table[offset:offset + self.key_header.size])[0]
+            if not key_length:
+                # Freed slot.
+                continue
+            encoded_key = self.key_table[offset + self.key_header.size:offset + self.key_header.size + key_length]
+            namespace_key = pickle.loads(encoded_key)
+            if namespace_key not in self.slots:
+                self.namespace_sizes[namespace_key[0]] += 1
+            self.slots[namespace_key] = slot
+        self.known_key_count = key_count
+
+    def refreshCache(self):
+        if self.pid != os.getpid():
+            self.initProcess()
+        elif self.known_version != self.sizes[2]:
+            with self.lock:
+                self.readKeys()
+
+    def getFreeSlot(self):
+        """
+        Return a slot for a new key, reusing freed slots. Must be called with the lock held.
+        """
+        reuse_before = time.monotonic() - self.slot_reuse_delay
+        for slot in range(self.sizes[0]):
+            freed_time = self.freed_times[slot]
+            if freed_time and freed_time < reuse_before:
+                self.freed_times[slot] = 0
+                # Counts might have been added by processes after the slot got freed. Start the new key at 0.
+                self.counters[slot] -= self.sumSlot(slot)
+                # Other processes might have cached the slot as free, make them reread the key table.
+                self.sizes[2] += 1
+                self.known_version = self.sizes[2]
+                return slot
+        slot = self.sizes[0]
+        if slot >= self.max_counters:
+            return None
+        self.sizes[0] = slot + 1
+        return slot
+
+    def getSlot(self, key, namespace, create=True):
+        self.refreshCache()
+        try:
+            return self.slots[(namespace, key)]
+        except KeyError:
+            pass
+        with self.lock:
+            self.readKeys()
+            if (namespace, key) in self.slots or not create:
+                return self.slots.get((namespace, key))
+            encoded_key = self.encodeKey(key, namespace)
+            if len(encoded_key) > self.key_size - self.key_header.size:
+                self.logger.error("Counter name %s too long. Not counting." % (key,))
+                return None
+            if self.namespace_sizes[namespace] >= self.max_namespace_counters:
+                if namespace not in self.full_namespaces:
+                    self.logger.error("Maximum number of counters (%s) for namespace %s reached. Not counting %s." % (self.max_namespace_counters, namespace, key))
+                    self.full_namespaces.add(namespace)
+                return None
+            slot = self.getFreeSlot()
+            if slot is None:
+                if not self.is_full:
+                    self.logger.error("Maximum number of counters (%s) reached. Not counting %s." % (self.max_counters, key))
+                    self.is_full = True
+                return None
+            offset = slot * self.key_size
+            self.key_table[offset + self.key_header.size:offset + self.key_header.size + len(encoded_key)] = encoded_key
+            self.key_table[offset:offset + self.key_header.size] = self.key_header.pack(len(encoded_key))
+            self.slots[(namespace, key)] = slot
+            self.namespace_sizes[namespace] += 1
+            self.readKeys()
+            return slot
+
+    def removeKey(self, key, namespace):
+        """
+        Remove a key and free its slot.
+        """
+        self.refreshCache()
+        with self.lock:
+            self.readKeys()
+            slot = self.slots.pop((namespace, key), None)
+            if slot is None:
+                return
+            self.namespace_sizes[namespace] -= 1
+            self.indices.pop((namespace, key), None)
+            offset = slot * self.key_size
+            self.key_table[offset:offset + self.key_header.size] = self.key_header.pack(0)
+            self.freed_times[slot] = time.monotonic()
+            self.sizes[2] += 1
+            # The local cache is up to date, only the other processes need to reread the key table.
+            self.known_version = self.sizes[2]
+            self.is_full = False
+            self.full_namespaces.discard(namespace)
+
+    def claimRow(self):
+        """
+        Claim a row for the current process. Rows of terminated processes are merged into the offset row and reused.
+        Must be called with the lock held.
+        """
+        for row in range(1, self.max_processes + 1):
+            pid = self.row_pids[row]
+            if pid and pid != self.pid:
+                try:
+                    os.kill(pid, 0)
+                    continue
+                except PermissionError:
+                    # The pid was reused by a process of another user. The row might still be in use.
+                    continue
+                except ProcessLookupError:
+                    pass
+                row_offset = row * self.max_counters
+                for slot in range(self.sizes[0]):
+                    self.counters[slot] += self.counters[row_offset + slot]
+                    self.counters[row_offset + slot] = 0
+            self.row_pids[row] = self.pid
+            self.sizes[1] = max(self.sizes[1], row + 1)
+            return row
+        self.logger.warning("Maximum number of processes (%s) reached. Counting via shared row." % self.max_processes)
+        return 0
+
+    def getIndex(self, key, namespace):
+        self.refreshCache()
+        try:
+            return self.indices[(namespace, key)]
+        except KeyError:
+            pass
+        slot = self.getSlot(key, namespace)
+        if slot is None:
+            return None
+        if self.row is None:
+            with self.lock:
+                self.row = self.claimRow()
+        index = self.row * self.max_counters + slot
+        self.indices[(namespace, key)] = index
+        return index
+
+    def sumSlot(self, slot):
+        return sum([self.counters[row * self.max_counters + slot] for row in range(max(self.sizes[1], 1))])
+
+    def initCounter(self, namespace="default"):
+        pass
+
+    def incrementCounter(self, key, increment_value=1, namespace="default"):
+        index = self.getIndex(key, namespace)
+        if index is None:
+            return
+        if index < self.max_counters:
+            # No own row, so this row is shared with other processes.
+            with self.lock:
+                self.counters[index] += increment_value
+            return
+        with self.local_lock:
+            self.counters[index] += increment_value
+
+    def decrementCounter(self, key, decrement_value=1, namespace="default"):
+        self.incrementCounter(key, -decrement_value, namespace)
+
+    def setCounter(self, key, value, namespace="default"):
+        slot = self.getSlot(key, namespace)
+        if slot is None:
+            return
+        with self.lock:
+            self.counters[slot] += value - self.sumSlot(slot)
+
+    def resetCounter(self, key, namespace="default"):
+        """
+        Reset a counter by removing it. It will be recreated by the next increment.
+        """
+        self.removeKey(key, namespace)
+
+    def getCounter(self, key, namespace="default"):
+        slot = self.getSlot(key, namespace, create=False)
+        if slot is None:
+            return 0
+        return self.sumSlot(slot)
+
+    def getAllCounters(self, namespace="default"):
+        self.refreshCache()
+        with self.lock:
+            self.readKeys()
+        return dict([(key, self.sumSlot(slot)) for (key_namespace, key), slot in list(self.slots.items()) if key_namespace == namespace])
+
+    def shutDown(self):
+        pass
+
+
+def countLostEvents(reason, count=1):
+    """
+    Count events that got lost, e.g. because a buffer could not be flushed.
+    """
+    SharedMemoryStatisticCollector().incrementCounter(reason, count, namespace="LostEvents")
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+import logging
+import math
+import os
+import sys
+import threading
+import time
+
+# Conditional imports for python2/3
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+SLOT_BITS = 6
+SLOT_COUNT = 1 << SLOT_BITS
+SLOT_MASK = SLOT_COUNT - 1
+LEVEL_COUNT = 4
+MAX_TICKS = SLOT_COUNT ** LEVEL_COUNT
+
+
+class Timer:
+    """
+    A timed function scheduled in a TimerWheel.
+
+    set() stops the timer. The name is kept from the threading.Event the setInterval decorator used to return, so
+    existing code can stop timers like before.
+    """
+    __slots__ = ('wheel', 'callback', 'interval', 'max_run_count', 'run_count', 'expires', 'slot', 'cancelled')
+
+    def __init__(self, wheel, callback, interval, max_run_count=0):
+        self.wheel = wheel
+        self.callback = callback
+        self.interval = interval
+        self.max_run_count = max_run_count
+        self.run_count = 0
+        self.expires = 0
+        self.slot = None
+        self.cancelled = False
+
+    def set(self):
+        if self.wheel.pid != os.getpid():
+            # Timer was started before a fork. The wheel of the parent process does not run here.
+            self.cancelled = True
+            return
+        self.wheel.cancel(self)
+
+    def is_set(self):
+        return self.cancelled
+
+
+class TimerWheel:
+    """
+    Run timed functions of a process with one scheduler thread.
+
+    Timers are kept in a hierarchical timer wheel: LEVEL_COUNT levels of SLOT_COUNT slots each. A slot on level 0
+    holds the timers expiring in one tick, a slot on level n the timers expiring in SLOT_COUNT^n ticks. Each time
+    level 0 wraps around, the next slot of level 1 is cascaded down into level 0, and so on. Adding and cancelling a
+    timer is O(1), no matter how many timers exist.
+
+    Expired timers are run by a pool of worker_count worker threads. A timer is only rescheduled after its function
+    returned, so, like before, the same function never runs concurrently and interval is the pause between two runs.
+    Some timed functions block for a long time, e.g. a network scan or a flush pushing events through the pipeline.
+    If expired timers are waiting, no worker is idle and a function has been running for longer than one tick, an
+    extra worker is started, up to max_worker_count. So slow functions do not delay the other timers, e.g. the
+    backpressure check. Extra workers exit after being idle for idle_timeout seconds.
+    Threads do not survive a fork, so each process gets its own wheel via getTimerWheel.
+    """
+
+    def __init__(self, tick=.01, worker_count=4, max_worker_count=64, idle_timeout=60):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.tick = tick
+        self.worker_count = worker_count
+        self.max_worker_count = max_worker_count
+        self.idle_timeout = idle_timeout
+        self.worker_lock = threading.Lock()
+        self.running_worker_count = 0
+        self.idle_worker_count = 0
+        # Start time of the running functions by worker thread.
+        self.busy_since = {}
+        self.warned_max_workers = False
+        self.levels = [[set() for _ in range(SLOT_COUNT)] for _ in range(LEVEL_COUNT)]
+        self.current_tick = 0
+        self.next_wakeup_tick = 0
+        self.start_time = time.monotonic()
+        self.condition = threading.Condition()
+        self.expired_timers = queue.Queue()
+        self.pid = os.getpid()
+        self.is_running = False
+
+    def start(self):
+        self.is_running = True
+        scheduler = threading.Thread(target=self.runScheduler, name="TimerWheel")
+        scheduler.daemon = True
+        scheduler.start()
+        with self.worker_lock:
+            for _ in range(self.worker_count):
+                self.startWorker()
+
+    def startWorker(self):
+        """
+        Start a worker thread. Must be called with the worker lock held.
+        """
+        self.running_worker_count += 1
+        self.idle_worker_count += 1
+        worker = threading.Thread(target=self.runWorker, name="TimerWheelWorker")
+        worker.daemon = True
+        worker.start()
+
+    def addWorkerIfBlocked(self):
+        """
+        Start an extra worker if expired timers are waiting for workers blocked by slow functions.
+        """
+        with self.worker_lock:
+            if self.idle_worker_count or self.expired_timers.empty():
+                return
+            now = time.monotonic()
+            if not any([now - started > self.tick for started in self.busy_since.values()]):
+                return
+            if self.running_worker_count >= self.max_worker_count:
+                if not self.warned_max_workers:
+                    self.logger.warning("All %s timer workers are busy. Timed functions get delayed." % self.max_worker_count)
+                    self.warned_max_workers = True
+                return
+            self.startWorker()
+
+
+    def schedule(self, callback, interval, max_run_count=0, call_on_init=False):
+        """
+        Call callback every interval seconds, max_run_count times if set. With call_on_init, callback will also be
+        called once right away. This call does not count as run.
+        """
+        timer = Timer(self, callback, interval, max_run_count)
+        if not self.is_running:
+            with self.condition:
+                if not self.is_running:
+                    self.start()
+        if call_on_init:
+            timer.run_count = -1
+            self.expired_timers.put(timer)
+        else:
+            self.add(timer, interval)
+        return timer
+
+    def add(self, timer, delay):
+        with self.condition:
+            if timer.cancelled:
+                return
+            timer.expires = max(self.current_tick + 1, int(math.ceil((time.monotonic() - self.start_time + delay) / self.tick)))
+            self.insert(timer)
+            if timer.expires < self.next_wakeup_tick:
+                self.condition.notify()
+
+    def insert(self, timer):
+        ticks = min(timer.expires - self.current_tick, MAX_TICKS - 1)
+        expires = self.current_tick + ticks
+        level = 0
+        while ticks >= SLOT_COUNT ** (level + 1):
+            level += 1
+        slot = self.levels[level][(expires >> (SLOT_BITS * level)) & SLOT_MASK]
+        slot.add(timer)
+        timer.slot = slot
+
+    def cancel(self, timer):
+        with self.condition:
+            timer.cancelled = True
+            if timer.slot is not None:
+                timer.slot.discard(timer)
+                timer.slot = None
+
+    def advance(self):
+        """
+        Move to the next tick and return the timers expiring in it.
+        """
+        self.current_tick += 1
+        level = 0
+        # Cascade timers of higher levels down when the lower level wrapped around.
+        while level < LEVEL_COUNT - 1 and (self.current_tick >> (SLOT_BITS * level)) & SLOT_MASK == 0:
+            level += 1
+            slot_index = (self.current_tick >> (SLOT_BITS * level)) & SLOT_MASK
+            timers = self.levels[level][slot_index]
+            self.levels[level][slot_index] = set()
+            for timer in timers:
+                self.insert(timer)
+        slot_index = self.current_tick & SLOT_MASK
+        timers = self.levels[0][slot_index]
+        self.levels[0][slot_index] = set()
+        expired_timers = []
+        for timer in timers:
+            timer.slot = None
+            if timer.expires > self.current_tick:
+                # Timer was clamped to the maximum range of the wheel.
+                self.insert(timer)
+            else:
+                expired_timers.append(timer)
+        return expired_timers
+
+    def getTicksUntilNextSlot(self):
+        """
+        Return the number of ticks until the next non empty slot on level 0 or the next cascade.
+        """
+        for ticks in range(1, SLOT_COUNT - (self.current_tick & SLOT_MASK)):
+            if self.levels[0][(self.current_tick + ticks) & SLOT_MASK]:
+                return ticks
+        return SLOT_COUNT - (self.current_tick & SLOT_MASK)
+
+    def runScheduler(self):
+        while True:
+            with self.condition:
+                now_tick = int((time.monotonic() - self.start_time) / self.tick)
+                if now_tick <= self.current_tick:
+                    # While timers wait for a worker, check every tick if an extra worker is needed.
+                    self.next_wakeup_tick = self.current_tick + (1 if not self.expired_timers.empty() else self.getTicksUntilNextSlot())
+                    self.condition.wait(self.start_time + self.next_wakeup_tick * self.tick - time.monotonic())
+                    continue
+                while self.current_tick < now_tick:
+                    for timer in self.advance():
+                        self.expired_timers.put(timer)
+            self.addWorkerIfBlocked()
+
+    def runWorker(self):
+        worker_id = threading.current_thread().ident
+        while True:
+            try:
+                timer = self.expired_timers.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                with self.worker_lock:
+                    if self.running_worker_count > self.worker_count:
+                        self.running_worker_count -= 1
+                        self.idle_worker_count -= 1
+                        return
+                continue
+            if timer.cancelled:
+                continue
+            with self.worker_lock:
+                self.idle_worker_count -= 1
+                self.busy_since[worker_id] = time.monotonic()
+            try:
+                timer.callback()
+            except:
+                etype, evalue, etb = sys.exc_info()
+                self.logger.error("Timed function %s failed. Exception: %s, Error: %s." % (timer.callback, etype, evalue))
+            finally:
+                with self.worker_lock:
+                    self.idle_worker_count += 1
+                    del self.busy_since[worker_id]
+            timer.run_count += 1
+            if timer.max_run_count and timer.run_count >= timer.max_run_count:
+                continue
+            self.add(timer, timer.interval)
+
+
+timer_wheel = None
+timer_wheel_lock = threading.Lock()
+
+
+def getTimerWheel():
+    """
+    Return the timer wheel of the current process.
+    """
+    global timer_wheel
+    if timer_wheel is None or timer_wheel.pid != os.getpid():
+        with timer_wheel_lock:
+            if timer_wheel is None or timer_wheel.pid != os.getpid():
+                timer_wheel = TimerWheel()
+    return timer_wheel
+
+
+def _resetAfterFork():
+    global timer_wheel, timer_wheel_lock
+    timer_wheel = None
+    timer_wheel_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_resetAfterFork)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import logging
+import itertools
+import threading
+
+
+class EventTracer:
+    """
+    Record the path of sampled events through the module graph as spans.
+
+    Input modules mark every sample_interval-th event by setting lumbermill.trace_id. Each module that handles a
+    marked event adds a span with the time the event spent in it. When a marked event is put into a BufferedQueue,
+    the time is stored in lumbermill.trace_queued_at, so the receiving module can add a span for the queue wait,
+    even if it runs in another process.
+
+    Spans are kept per process and written to path/lumbermill_trace_<pid>.json in the Chrome trace event format.
+    These files can be opened with chrome://tracing or https://ui.perfetto.dev. The trace id is used as thread id,
+    so each traced event gets its own row per process. Spans of a module that forwards the event to its receivers
+    within its handle method include the spans of these receivers.
+    """
+
+    def __init__(self, path=None, max_spans=100000):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.path = path
+        self.max_spans = max_spans
+        self.lock = threading.Lock()
+        self.trace_ids = itertools.count(1)
+        self.initProcess()
+
+    def configure(self, path, max_spans):
+        self.path = path
+        self.max_spans = max_spans
+
+    def initProcess(self):
+        # Spans recorded before a fork belong to the parent process.
+        self.pid = os.getpid()
+        self.spans = []
+        self.dropped_span_count = 0
+
+    def createTraceId(self):
+        if self.pid != os.getpid():
+            self.initProcess()
+        # Unique over all processes, since a pid is at most 2^22 on linux. Stays below 2^53, the largest integer a
+        # javascript based trace viewer can represent.
+        return (self.pid << 30) + next(self.trace_ids)
+
+    def addSpan(self, name, trace_id, started, duration, category="module", args=None):
+        if self.pid != os.getpid():
+            self.initProcess()
+        if len(self.spans) >= self.max_spans:
+            self.dropped_span_count += 1
+            return
+        span = {'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': started * 1000000,
+                'dur': duration * 1000000,
+                'pid': self.pid,
+                'tid': trace_id}
+        if args:
+            span['args'] = args
+        self.spans.append(span)
+
+    def addMark(self, name, trace_id, timestamp):
+        """
+        Add an instant event, e.g. when an input module marked an event.
+        """
+        if self.pid != os.getpid():
+            self.initProcess()
+        if len(self.spans) >= self.max_spans:
+            self.dropped_span_count += 1
+            return
+        self.spans.append({'name': name, 'cat': 'input', 'ph': 'i', 's': 't', 'ts': timestamp * 1000000, 'pid': self.pid, 'tid': trace_id})
+
+    def addQueueSpan(self, name, event_metadata, received):
+        """
+        Add a span for the time a marked event waited in a queue, if it was queued.
+        """
+        try:
+            queued = event_metadata.pop('trace_queued_at')
+        except KeyError:
+            return
+        self.addSpan("queue %s" % name, event_metadata['trace_id'], queued, max(received - queued, 0), category="queue")
+
+    def getChromeTrace(self):
+        return {'traceEvents': list(self.spans),
+                'displayTimeUnit': 'ms',
+                'otherData': {'pid': self.pid, 'dropped_spans': self.dropped_span_count}}
+
+    def getFilename(self):
+        return os.path.join(self.path or os.getcwd(), "lumbermill_trace_%s.json" % os.getpid())
+
+    def write(self):
+        if self.pid != os.getpid() or not self.spans:
+            return
+        filename = self.getFilename()
+        try:
+            with self.lock:
+                # Replace the file at once, so readers never see a partially written trace.
+                with open("%s.tmp" % filename, 'w') as trace_file:
+                    json.dump(self.getChromeTrace(), trace_file)
+                os.rename("%s.tmp" % filename, filename)
+        except:
+            etype, evalue, etb = sys.exc_info()
+            self.logger.error("Could not write trace to %s. Exception: %s, Error: %s." % (filename, etype, evalue))
+
+
+def getTraceMetadata(event):
+    """
+    Return the lumbermill meta data of event, if the event is marked for tracing.
+    """
+    try:
+        event_metadata = event['lumbermill']
+    except (KeyError, TypeError):
+        return None
+    if 'trace_id' in event_metadata:
+        return event_metadata
+    return None
+
+
+event_tracer = None
+
+
+def getEventTracer():
+    """
+    Return the event tracer of the current process.
+    """
+    global event_tracer
+    if event_tracer is None:
+        event_tracer = EventTracer()
+    return event_tracer
@@ -8,18 +8,19 @@ import subprocess
 class TimedFunctionManager:
     """
     The decorator setInterval provides a simple way to repeatedly execute a function in intervals.
-    This is done by starting a thread that calls the decorated method every interval seconds.
-    To make sure, all threads get stopped when exiting or reloading LumberMill, the decorated functions
+    This is done by scheduling the decorated method in the timer wheel of the process, so no matter how many timed
+    functions are running, only one scheduler thread is needed.
+    To make sure, all timed functions get stopped when exiting or reloading LumberMill, the decorated functions
     should be started like this e.g.:
     ...
     Utils.TimedFunctionManager.startTimedFunction(self.sendAliveRequests)
     ...
 
     The main process will call TimedFunctionManager.stopTimedFunctions() on exit or reload.
-    This makes sure all thread get terminated.
+    This makes sure all timed functions get stopped.
     """
 
-    timed_function_handlers = []
+    timed_function_handlers = set()
 
     @staticmethod
     def startTimedFunction(timed_function, *args, **kwargs):
@@ -27,27 +28,27 @@ class TimedFunctionManager:
         Start a timed function and keep track of all running functions.
         """
         handler = timed_function(*args, **kwargs)
-        TimedFunctionManager.timed_function_handlers.append(handler)
+        TimedFunctionManager.timed_function_handlers.add(handler)
         return handler
 
     @staticmethod
     def stopTimedFunctions(handler=False):
         """
-        Stop all timed functions. They are started as daemon, so when a reaload occurs, they will not finish cause the
-        main thread still is running. This takes care of this issue.
+        Stop all timed functions. The timer wheel runs as daemon, so when a reaload occurs, timed functions will not
+        stop cause the main thread still is running. This takes care of this issue.
         """
         if not TimedFunctionManager.timed_function_handlers:
             return
         # Clear provided handler only.
-        if handler and handler in TimedFunctionManager.timed_function_handlers:
-            handler.set()
-            TimedFunctionManager.timed_function_handlers.remove(handler)
+        if handler:
+            if handler in TimedFunctionManager.timed_function_handlers:
+                handler.set()
+                TimedFunctionManager.timed_function_handlers.discard(handler)
             return
         # Clear all timed functions
         for handler in TimedFunctionManager.timed_function_handlers:
             handler.set()
-            TimedFunctionManager.timed_function_handlers.remove(handler)
-        TimedFunctionManager.timed_function_handlers = []
+        TimedFunctionManager.timed_function_handlers = set()
 
 def restartMainProcess():
     """
@@ -73,7 +74,7 @@ def restartMainProcess():
         sys.exit(0)
     else:
         try:
-            os.execv(sys.executable, [sys.executable] + sys.argv)
+            os.execv(sys.executable, getMainProcessArguments())
         except OSError:
             # Mac OS X versions prior to 10.6 do not support execv in
             # a process that contains multiple threads.  Instead of
@@ -90,6 +91,24 @@ def restartMainProcess():
                       [sys.executable] + sys.argv)
             sys.exit(0)
 
+def getMainProcessArguments():
+    """
+    Return the arguments to start LumberMill again, like it was started. If it was started as module via -m, the new
+    process will be started the same way, so the package is found no matter where LumberMill was started from.
+    """
+    main_module_spec = getattr(sys.modules['__main__'], '__spec__', None)
+    if main_module_spec and main_module_spec.name:
+        return [sys.executable, '-m', main_module_spec.name] + sys.argv[1:]
+    return [sys.executable] + sys.argv
+
+def startMainProcess(environment=None):
+    """
+    Start a new LumberMill process next to the running one, e.g. to hand over the listening sockets.
+    """
+    process_environment = dict(os.environ)
+    process_environment.update(environment or {})
+    return subprocess.Popen(getMainProcessArguments(), env=process_environment)
+
 class AnsiColors:
     HEADER = '\033[95m'
     OKBLUE = '\033[94m'
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Measure the memory needed to buffer events, comparing the compact event meta data with plain dicts holding all meta
+data fields per event.
+
+Usage: python scripts/benchmark_event_memory.py [-e <event_count>] [-s <event_id_strategy>]
+"""
+import os
+import sys
+import tracemalloc
+from optparse import OptionParser
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import lumbermill.utils.DictUtils as DictUtils
+from lumbermill.constants import MY_HOSTNAME
+
+DATA = '192.168.2.20 - - [28/Jul/2006:10:27:10 -0300] "GET /cgi-bin/try/ HTTP/1.0" 200 3395'
+
+
+def getPlainEvent(data):
+    return DictUtils.KeyDotNotationDict({"data": data,
+                                         "lumbermill": {'pid': os.getpid(),
+                                                        'event_type': 'Unknown',
+                                                        'event_id': DictUtils.createEventId(),
+                                                        'source_module': 'Tcp',
+                                                        'received_from': '127.0.0.1',
+                                                        'received_by': MY_HOSTNAME}})
+
+
+def getCompactEvent(data):
+    return DictUtils.getDefaultEventDict({"data": data}, caller_class_name='Tcp', received_from='127.0.0.1')
+
+
+def getBufferedEventsSize(create_event, event_count):
+    tracemalloc.start()
+    events = [create_event(DATA) for _ in range(event_count)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del events
+    return size
+
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option("-e", "--events", dest="event_count", type="int", default=1000000)
+    parser.add_option("-s", "--event_id_strategy", dest="event_id_strategy", default="random")
+    (options, args) = parser.parse_args()
+    DictUtils.setEventIdStrategy(options.event_id_strategy)
+    plain = getBufferedEventsSize(getPlainEvent, options.event_count)
+    compact = getBufferedEventsSize(getCompactEvent, options.event_count)
+    print("Plain meta data:   %.1f MB for %d events" % (plain / 1024.0 / 1024, options.event_count))
+    print("Compact meta data: %.1f MB for %d events" % (compact / 1024.0 / 1024, options.event_count))
+    print("Saved:             %.1f%%" % ((1 - compact / float(plain)) * 100))
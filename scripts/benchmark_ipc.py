@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the throughput of the IPC transports used to pass events between LumberMill processes.
+To also measure the balance between multiple workers, run LumberMill with --benchmark-ipc.
+
+One producer process sends events via a BufferedQueue to one consumer process. The buffer size of the BufferedQueue
+sets the number of events that are sent as one msgpack encoded batch.
+
+Usage: python scripts/benchmark_ipc.py [-e <event_count>] [-b <batch_size>,<batch_size>,...]
+"""
+import os
+import sys
+import time
+import multiprocessing
+from optparse import OptionParser
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lumbermill.utils.Buffers import BufferedQueue, IPC_TRANSPORTS, produceIpcQueue
+from lumbermill.utils.DictUtils import getDefaultEventDict
+
+DATA = '192.168.2.20 - - [28/Jul/2006:10:27:10 -0300] "GET /cgi-bin/try/ HTTP/1.0" 200 3395'
+
+
+def consume(buffered_queue, event_count):
+    received = 0
+    while received < event_count:
+        for event in buffered_queue.get():
+            received += 1
+
+
+def getEventsPerSecond(transport, batch_size, event_count):
+    buffered_queue = BufferedQueue(queue=produceIpcQueue(transport, 20), buffersize=batch_size)
+    consumer = multiprocessing.Process(target=consume, args=(buffered_queue, event_count))
+    consumer.start()
+    events = [getDefaultEventDict({'data': DATA}) for _ in range(event_count)]
+    start = time.time()
+    for event in events:
+        buffered_queue.put(event)
+    buffered_queue.buffer.flush()
+    consumer.join()
+    buffered_queue.buffer.stopInterval()
+    return event_count / (time.time() - start)
+
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option("-e", "--events", dest="event_count", type="int", default=200000)
+    parser.add_option("-b", "--batch_sizes", dest="batch_sizes", default="1,10,50,250")
+    (options, args) = parser.parse_args()
+    print("%-16s %10s %14s" % ("Transport", "Batch size", "Events/s"))
+    for batch_size in [int(batch_size) for batch_size in options.batch_sizes.split(",")]:
+        # Make sure each batch is completely sent.
+        event_count = options.event_count - options.event_count % batch_size
+        for transport in IPC_TRANSPORTS:
+            print("%-16s %10d %14d" % (transport, batch_size, getEventsPerSecond(transport, batch_size, event_count)))
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the throughput of a six module chain with and without pipeline fusion.
+
+Usage: python -m scripts.benchmark_pipeline_fusion [-e <event_count>]
+"""
+import os
+import sys
+import time
+import tempfile
+from optparse import OptionParser
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lumbermill.LumberMill import LumberMill
+from lumbermill.utils.DictUtils import getDefaultEventDict
+
+CONFIGURATION = r"""
+- Global:
+   workers: 1
+   pipeline_fusion: %s
+   logging:
+    level: error
+
+- parser.Regex:
+   source_field: data
+   field_extraction_patterns:
+    - httpd_access_log: '(?P<remote_ip>\d+\.\d+\.\d+\.\d+)\s+(?P<identd>\w+|-)\s+(?P<user>\w+|-)\s+\[(?P<datetime>\d+\/\w+\/\d+:\d+:\d+:\d+)\s.\d+\]\s+\"(?P<url>.*)\"\s+(?P<http_status>\d+)\s+(?P<bytes_send>\d+)'
+
+- parser.DateTime:
+   source_field: datetime
+   source_date_pattern: '%%d/%%b/%%Y:%%H:%%M:%%S'
+   target_field: '@timestamp'
+   target_date_pattern: '%%Y-%%m-%%dT%%H:%%M:%%S'
+
+- modifier.AddDateTime:
+   target_field: received_at
+
+- misc.Noop:
+   add_fields: {'environment': 'benchmark'}
+
+- modifier.Math:
+   target_field: bytes_send
+   function: int($(bytes_send))
+
+- output.DevNull
+"""
+
+DATA = '192.168.2.20 - - [28/Jul/2006:10:27:10 -0300] "GET /cgi-bin/try/ HTTP/1.0" 200 3395'
+
+
+def getEventsPerSecond(pipeline_fusion, event_count):
+    with tempfile.NamedTemporaryFile('w', suffix='.conf', delete=False) as configuration_file:
+        configuration_file.write(CONFIGURATION % pipeline_fusion)
+    try:
+        lumbermill = LumberMill(configuration_file.name)
+        lumbermill.configureGlobal()
+        lumbermill.configureLogging()
+        lumbermill.initModulesFromConfig()
+        lumbermill.setDefaultReceivers()
+        lumbermill.configureModules()
+        lumbermill.initEventStream()
+    finally:
+        os.unlink(configuration_file.name)
+    first_module = next(iter(lumbermill.modules.values()))['instances'][0]
+    events = [getDefaultEventDict({'data': DATA}) for _ in range(event_count)]
+    start = time.time()
+    for event in events:
+        first_module.receiveEvent(event)
+    return event_count / (time.time() - start)
+
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option("-e", "--events", dest="event_count", type="int", default=100000)
+    (options, args) = parser.parse_args()
+    unfused = getEventsPerSecond(False, options.event_count)
+    fused = getEventsPerSecond(True, options.event_count)
+    print("Unfused: %d events/s" % unfused)
+    print("Fused:   %d events/s" % fused)
+    print("Gain:    %.1f%%" % ((fused / unfused - 1) * 100))
@@ -120,6 +120,10 @@ class MockReceiver(mock.Mock):
         self.handleEvent(event)
         return event
 
+    def receiveEvents(self, events):
+        for event in events:
+            self.handleEvent(event)
+
     def handleEvent(self, event):
         self.events.append(event)
 
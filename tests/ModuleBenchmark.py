@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+Microbenchmarks for single modules and the helpers on their hot path.
+
+ModuleBaseTestCase checks that a module works, ModuleBenchmark measures how fast it works. Each benchmark feeds a fixed
+corpus from tests/test_data/benchmark_corpus through a modules handleEvent or a helper function and reports events
+per second and memory allocations per event.
+
+Run all benchmarks and compare them with the results of a previous version:
+
+    python -m tests.ModuleBenchmark --iterations 20000 --output benchmark.json --baseline benchmark-0.9.json
+
+Use --include to select benchmarks by a regex on their name. Exits with 1 if a benchmark regressed.
+"""
+import argparse
+import copy
+import gc
+import json
+import os
+import platform
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.append('../')
+
+import lumbermill
+import lumbermill.utils.DictUtils as DictUtils
+from lumbermill.modifier import Field
+from lumbermill.parser import Csv, DateTime, Json, Regex
+from lumbermill.utils.DynamicValues import mapDynamicValue
+from tests.ModuleBaseTestCase import MockLumberMill
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "test_data", "benchmark_corpus")
+MAX_REGRESSION = {'events_per_second': .1,
+                  'allocated_blocks_per_event': .1}
+""" Relative change against the baseline that counts as regression. """
+
+
+def readCorpus(filename):
+    with open(os.path.join(CORPUS_PATH, filename), "r") as corpus_file:
+        return [line.rstrip("\n") for line in corpus_file if line.strip()]
+
+
+def getHttpdEventFields():
+    """
+    Return the fields the httpd corpus lines are parsed into, as input for modules working on parsed events.
+    """
+    regex = Regex.Regex(MockLumberMill())
+    regex.configure({'field_extraction_patterns': [{'httpd_access_log': '%{COMBINEDAPACHELOG}'}]})
+    events_fields = []
+    for line in readCorpus("httpd_access.log"):
+        for event in regex.handleEvent(DictUtils.getDefaultEventDict({'data': line})):
+            event_fields = dict(event)
+            event_fields.pop('lumbermill')
+            events_fields.append(event_fields)
+    return events_fields
+
+
+class ModuleBenchmark:
+    """
+    Run a function on a list of prepared arguments, e.g. events created from a corpus.
+
+    Throughput is measured on iterations arguments. Allocations are measured in a second run with tracemalloc on
+    allocation_iterations arguments, since tracing allocations slows everything down. Results of the function are
+    kept until the end of the run, so allocations per event are the memory blocks a call adds to its event or result,
+    plus leaks. Temporary objects freed within the call are not counted.
+    """
+
+    def __init__(self, iterations=10000, allocation_iterations=1000):
+        self.iterations = iterations
+        self.allocation_iterations = min(allocation_iterations, iterations)
+
+    def runFunction(self, function, arguments):
+        results = [None] * len(arguments)
+        for idx, argument in enumerate(arguments):
+            results[idx] = function(argument)
+        return results
+
+    def measureThroughput(self, function, arguments):
+        gc.collect()
+        started = time.perf_counter()
+        self.runFunction(function, arguments)
+        return len(arguments) / (time.perf_counter() - started)
+
+    def measureAllocations(self, function, arguments):
+        # Warm up caches like memoized field getters, so they are not counted.
+        function(copy.deepcopy(arguments[0]))
+        gc.collect()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            results = self.runFunction(function, arguments)
+            after = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+        trace_filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        statistics = after.filter_traces(trace_filters).compare_to(before.filter_traces(trace_filters), 'filename')
+        allocated_blocks = sum([statistic.count_diff for statistic in statistics])
+        allocated_bytes = sum([statistic.size_diff for statistic in statistics])
+        del results
+        return allocated_blocks / float(len(arguments)), allocated_bytes / float(len(arguments))
+
+    def benchmarkFunction(self, name, function, create_arguments):
+        """
+        Benchmark function. create_arguments(count) returns count arguments for function.
+        """
+        result = {'name': name, 'iterations': self.iterations, 'events_per_second': 0, 'allocated_blocks_per_event': 0, 'allocated_bytes_per_event': 0, 'error': None}
+        try:
+            result['events_per_second'] = self.measureThroughput(function, create_arguments(self.iterations))
+            result['allocated_blocks_per_event'], result['allocated_bytes_per_event'] = self.measureAllocations(function, create_arguments(self.allocation_iterations))
+        except:
+            etype, evalue, etb = sys.exc_info()
+            result['error'] = "Exception: %s, Error: %s." % (etype, evalue)
+        return result
+
+    def benchmarkModule(self, name, module_class, configuration, corpus):
+        """
+        Benchmark handleEvent of module_class configured with configuration. corpus is a list of event fields, each
+        event is created from the next entry of the corpus.
+        """
+        module = module_class(MockLumberMill())
+        try:
+            module.configure(configuration)
+        except:
+            etype, evalue, etb = sys.exc_info()
+            return {'name': name, 'iterations': self.iterations, 'events_per_second': 0, 'allocated_blocks_per_event': 0, 'allocated_bytes_per_event': 0, 'error': "Could not configure module. Exception: %s, Error: %s." % (etype, evalue)}
+
+        def handleEvent(event):
+            for handled_event in module.handleEvent(event):
+                pass
+            return event
+
+        def createEvents(count):
+            return [DictUtils.getDefaultEventDict(copy.deepcopy(corpus[idx % len(corpus)])) for idx in range(count)]
+        return self.benchmarkFunction(name, handleEvent, createEvents)
+
+
+def getBenchmarks():
+    """
+    Return the benchmarks as list of (name, function), function taking a ModuleBenchmark and returning its result.
+    """
+    httpd_lines = [{'data': line} for line in readCorpus("httpd_access.log")]
+    json_lines = [{'data': line} for line in readCorpus("events.json")]
+    csv_lines = [{'data': line} for line in readCorpus("events.csv")]
+    datetimes = [{'datetime': line} for line in readCorpus("datetimes.txt")]
+    httpd_events = getHttpdEventFields()
+    field_actions = [('insert', {'target_field': 'environment', 'value': 'benchmark'}),
+                     ('delete', {'source_fields': ['ident', 'auth']}),
+                     ('keep', {'source_fields': ['clientip', 'verb', 'request', 'response']}),
+                     ('concat', {'source_fields': ['verb', 'request'], 'target_field': 'verb_request'}),
+                     ('upper', {'source_fields': ['verb']}),
+                     ('rename', {'source_field': 'clientip', 'target_field': 'remote_ip'}),
+                     ('string_replace', {'source_field': 'request', 'old': '/', 'new': '_'}),
+                     ('replace', {'source_field': 'agent', 'regex': [r'\(.*?\)', 're.MULTILINE'], 'with': ''}),
+                     ('map', {'source_field': 'response', 'map': {'200': 'OK', '302': 'Found', '404': 'Not Found', '500': 'Internal Server Error'}}),
+                     ('cast_to_int', {'source_fields': ['bytes', 'response']})]
+    benchmarks = [('parser.Regex.httpd', lambda benchmark: benchmark.benchmarkModule('parser.Regex.httpd', Regex.Regex, {'field_extraction_patterns': [{'httpd_access_log': '%{COMBINEDAPACHELOG}'}]}, httpd_lines)),
+                  ('parser.Json.decode', lambda benchmark: benchmark.benchmarkModule('parser.Json.decode', Json.Json, {'source_fields': ['data']}, json_lines)),
+                  ('parser.Csv', lambda benchmark: benchmark.benchmarkModule('parser.Csv', Csv.Csv, {'delimiter': ';', 'escapechar': '\\', 'fieldnames': ['remote_ip', 'verb', 'request', 'http_status', 'bytes_send', 'agent']}, csv_lines)),
+                  ('parser.DateTime', lambda benchmark: benchmark.benchmarkModule('parser.DateTime', DateTime.DateTime, {'source_field': 'datetime', 'source_date_pattern': '%d/%b/%Y:%H:%M:%S %z', 'target_date_pattern': '%Y-%m-%dT%H:%M:%S%z'}, datetimes))]
+    for action, configuration in field_actions:
+        name = 'modifier.Field.%s' % action
+        configuration = dict(configuration, action=action)
+        benchmarks.append((name, lambda benchmark, name=name, configuration=configuration: benchmark.benchmarkModule(name, Field.Field, configuration, httpd_events)))
+    benchmarks += [('KeyDotNotationDict.get', lambda benchmark: benchmark.benchmarkFunction('KeyDotNotationDict.get', lambda event: (event['clientip'], event['lumbermill.event_id'], event['params.spam']), createHttpdEvents(httpd_events))),
+                   ('KeyDotNotationDict.set', lambda benchmark: benchmark.benchmarkFunction('KeyDotNotationDict.set', setNestedFields, createHttpdEvents(httpd_events))),
+                   ('mapDynamicValue', lambda benchmark: benchmark.benchmarkFunction('mapDynamicValue', lambda event: mapDynamicValue('%(clientip)s - %(lumbermill.event_id)s: %(verb)s %(params.spam)s', event), createHttpdEvents(httpd_events)))]
+    return benchmarks
+
+
+def createHttpdEvents(httpd_events):
+    def createEvents(count):
+        return [DictUtils.getDefaultEventDict(dict(httpd_events[idx % len(httpd_events)], params={'spam': ['eggs']})) for idx in range(count)]
+    return createEvents
+
+
+def setNestedFields(event):
+    event['params.knights'] = ['ni']
+    event['lumbermill.event_type'] = 'httpd_access_log'
+    event['params.spam'] = ['eggs', 'bacon']
+    return event
+
+
+def compareWithBaseline(results, baseline_results, max_regression=MAX_REGRESSION):
+    """
+    Return the benchmarks that got worse than their baseline by more than the relative tolerance in max_regression.
+    """
+    baseline_by_name = dict([(result['name'], result) for result in baseline_results if not result.get('error')])
+    regressions = []
+    for result in results:
+        baseline_result = baseline_by_name.get(result['name'])
+        if result['error'] or not baseline_result:
+            continue
+        for metric, tolerance in max_regression.items():
+            baseline_value = baseline_result.get(metric)
+            if not baseline_value:
+                continue
+            change = (result[metric] - baseline_value) / float(baseline_value)
+            if metric == 'events_per_second':
+                change = -change
+            if change > tolerance:
+                regressions.append({'name': result['name'], 'metric': metric, 'baseline': baseline_value, 'value': result[metric], 'change': change})
+    return regressions
+
+
+def runBenchmarks(iterations=10000, allocation_iterations=1000, include=None):
+    benchmark = ModuleBenchmark(iterations, allocation_iterations)
+    include_re = re.compile(include) if include else None
+    return [run(benchmark) for name, run in getBenchmarks() if not include_re or include_re.search(name)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run module microbenchmarks.")
+    parser.add_argument("--iterations", type=int, default=10000, help="Events per benchmark. Default: 10000")
+    parser.add_argument("--allocation-iterations", type=int, default=1000, help="Events per allocation measurement. Default: 1000")
+    parser.add_argument("--include", help="Regex pattern to select benchmarks by name. Default: all")
+    parser.add_argument("--output", help="Write the results as json to this file.")
+    parser.add_argument("--baseline", help="Compare the results with the results in this file.")
+    args = parser.parse_args()
+    results = runBenchmarks(args.iterations, args.allocation_iterations, args.include)
+    report = {'lumbermill_version': lumbermill.__version__,
+              'python_version': platform.python_version(),
+              'python_implementation': platform.python_implementation(),
+              'results': results,
+              'regressions': []}
+    if args.baseline:
+        with open(args.baseline, "r") as baseline_file:
+            report['regressions'] = compareWithBaseline(results, json.load(baseline_file)['results'])
+    for result in results:
+        if result['error']:
+            sys.stderr.write("%s: failed. Error: %s\n" % (result['name'], result['error']))
+        else:
+            sys.stderr.write("%s: %d events/s, %.1f blocks/event, %d bytes/event\n" % (result['name'], result['events_per_second'], result['allocated_blocks_per_event'], result['allocated_bytes_per_event']))
+    for regression in report['regressions']:
+        sys.stderr.write("Regression in %s: %s %.1f -> %.1f (%+.1f%% worse)\n" % (regression['name'], regression['metric'], regression['baseline'], regression['value'], regression['change'] * 100))
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report['regressions'] else 0)
+
+
+if __name__ == "__main__":
+    main()
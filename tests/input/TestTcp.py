@@ -54,6 +54,31 @@ class TestTcp(ModuleBaseTestCase):
         self.stopTornadoEventLoop()
         self.tearDown()
 
+    def testPausedTcpConnection(self):
+        ipaddr, port = getFreeTcpPortoOnLocalhost()
+        self.test_object.configure({'interface': ipaddr,
+                                    'port': port,
+                                    'simple_separator': '\n'})
+        self.checkConfiguration()
+        self.test_object.initAfterFork()
+        self.startTornadoEventLoop()
+        # Give server process time to startup.
+        time.sleep(.1)
+        self.test_object.pauseInput()
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.settimeout(1)
+        s.connect((ipaddr, port))
+        for _ in range(0, 10):
+            s.sendall(b"Spam, spam, spam, egg and spam.\n")
+        time.sleep(.3)
+        self.assertFalse(self.receiver.hasEvents())
+        self.test_object.resumeInput()
+        time.sleep(.3)
+        s.close()
+        self.assertEqual(len(self.receiver.events), 10)
+        self.stopTornadoEventLoop()
+        self.tearDown()
+
     def testATlsTcpConnection(self):
         ipaddr, port = getFreeTcpPortoOnLocalhost()
         self.test_object.configure({'interface': ipaddr,
@@ -40,6 +40,16 @@ class TestMetrics(ModuleBaseTestCase):
                     self.assertEqual({200: 1, 301: 2, 404: 3}, event['field_counts'])
         self.assertEqual(2, metrics_event_count)
 
+    def testLongValues(self):
+        self.test_object.configure({'interval': 1, 'aggregations': [{'name': 'urls', 'field': 'url'}]})
+        self.checkConfiguration()
+        url = "http://this.parrot.dead/%s" % ("spam/" * 20)
+        for _ in range(0, 3):
+            self.test_object.receiveEvent(DictUtils.getDefaultEventDict({'url': url}))
+        self.test_object.shutDown()
+        field_counts = [event['field_counts'] for event in self.receiver.getEvent() if event['lumbermill']['event_type'] == 'metrics']
+        self.assertEqual([{url: 3}], field_counts)
+
     def testBucketMetric(self):
         self.test_object.configure({'interval': 1, 'aggregations': [{'name': 'http_status_$(vhost)',
                                                                      'field': 'http_status',
@@ -29,6 +29,17 @@ To high eternal gain."""
             self.assert_('bytes_send' in event and event['bytes_send'] == '3395')
         self.assertIsNotNone(event)
 
+    def testHandleEvents(self):
+        self.test_object.configure({'field_extraction_patterns': [{'http_access_log': '(?P<remote_ip>\d+\.\d+\.\d+\.\d+)\s+(?P<identd>\w+|-)\s+(?P<user>\w+|-)\s+\[(?P<datetime>\d+\/\w+\/\d+:\d+:\d+:\d+\s.\d+)\]\s+\"(?P<url>.*)\"\s+(?P<http_status>\d+)\s+(?P<bytes_send>\d+)'}]})
+        self.checkConfiguration()
+        events = [DictUtils.getDefaultEventDict({'data': self.raw_data}),
+                  DictUtils.getDefaultEventDict({'data': 'Spam, spam, spam, lovely spam!'})]
+        events = self.test_object.handleEvents(events)
+        self.assertEqual(len(events), 2)
+        self.assertEqual(events[0]['bytes_send'], '3395')
+        self.assertEqual(events[0]['lumbermill.event_type'], 'http_access_log')
+        self.assertEqual(events[1]['lumbermill.event_type'], 'Unknown')
+
     def testMultilineWithoutRegexOptions(self):
         self.test_object.configure({'source_field': 'data',
                                     'field_extraction_patterns': [{'dame_irene': '(?P<poem>.*)'}]})
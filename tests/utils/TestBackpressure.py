@@ -0,0 +1,109 @@
+import threading
+import time
+import unittest
+
+from lumbermill.utils.Backpressure import Backpressure
+from lumbermill.utils.Buffers import Buffer
+
+
+class MockSource:
+
+    def __init__(self, fill_level=0):
+        self.fill_level = fill_level
+
+    def getFillLevel(self):
+        return self.fill_level
+
+
+class MockInput:
+
+    def __init__(self):
+        self.calls = []
+
+    def pauseInput(self):
+        self.calls.append('pause')
+
+    def resumeInput(self):
+        self.calls.append('resume')
+
+
+class TestBackpressure(unittest.TestCase):
+
+    def setUp(self):
+        self.backpressure = Backpressure(high_water_mark=.8, low_water_mark=.5)
+        self.input = MockInput()
+        self.backpressure.addInput(self.input)
+
+    def testPauseAndResumeBetweenWaterMarks(self):
+        source = MockSource()
+        self.backpressure.addSource(source)
+        for fill_level in [.1, .8, .9, .6, .5, .4, .3, .7]:
+            source.fill_level = fill_level
+            self.backpressure.check()
+        self.assertEqual(self.input.calls, ['pause', 'resume'])
+        self.assertEqual(self.backpressure.pause_count, 1)
+
+    def testHighestSourceWins(self):
+        sources = [MockSource(.1), MockSource(.95)]
+        self.backpressure.addSource(sources[0])
+        self.backpressure.addSource(sources[1])
+        self.backpressure.check()
+        self.assertTrue(self.backpressure.is_paused)
+        # Sources are only weakly referenced.
+        del sources[1]
+        self.backpressure.check()
+        self.assertFalse(self.backpressure.is_paused)
+
+    def testBufferAsSource(self):
+        buffer = Buffer(flush_size=None, callback=lambda batch: False, interval=10, maxsize=10)
+        self.backpressure.addSource(buffer)
+        for item in range(8):
+            buffer.put(item)
+        # The first check only asks the buffer to flush.
+        self.backpressure.check()
+        self.assertEqual(self.input.calls, [])
+        buffer.flush(timeout=1)
+        self.backpressure.check()
+        self.assertEqual(self.input.calls, ['pause'])
+        buffer.stopInterval()
+
+    def testFillingBatchIsNoCongestion(self):
+        batches = []
+        buffer = Buffer(flush_size=500, callback=batches.append, interval=10, maxsize=500)
+        self.backpressure.addSource(buffer)
+        for item in range(420):
+            buffer.put(item)
+        self.backpressure.check()
+        self.assertEqual(buffer.getFillLevel(), 0)
+        self.assertEqual(self.input.calls, [])
+        buffer.stopInterval()
+
+    def testFlushBeforePause(self):
+        batches = []
+        buffer = Buffer(flush_size=None, callback=lambda batch: batches.append(batch) or True, interval=10, maxsize=10)
+        self.backpressure.addSource(buffer)
+        for item in range(9):
+            buffer.put(item)
+        self.backpressure.check()
+        buffer.flush(timeout=1)
+        self.backpressure.check()
+        self.assertEqual(batches, [list(range(9))])
+        self.assertEqual(self.input.calls, [])
+        buffer.stopInterval()
+
+    def testInvalidWaterMarks(self):
+        self.assertRaises(ValueError, self.backpressure.configure, .5, .8)
+        self.assertRaises(ValueError, self.backpressure.configure, 1.5, .5)
+
+    def testWaitWhilePaused(self):
+        from lumbermill.BaseModule import BaseModule
+        module = BaseModule(None)
+        module.pauseInput()
+        resumed = []
+        waiter = threading.Thread(target=lambda: resumed.append(module.waitWhilePaused()))
+        waiter.start()
+        time.sleep(.1)
+        self.assertEqual(resumed, [])
+        module.resumeInput()
+        waiter.join(1)
+        self.assertEqual(resumed, [None])
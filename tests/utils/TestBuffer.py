@@ -0,0 +1,111 @@
+import gc
+import threading
+import time
+import unittest
+import weakref
+
+from lumbermill.utils.Backpressure import getBackpressure
+from lumbermill.utils.Buffers import Buffer
+
+
+class TestBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.batches = []
+        self.flush_threads = []
+        self.callback_delay = 0
+        self.callback_result = True
+        self.buffer = None
+
+    def tearDown(self):
+        if self.buffer:
+            self.buffer.stop()
+
+    def storeBatch(self, batch):
+        time.sleep(self.callback_delay)
+        self.flush_threads.append(threading.current_thread())
+        if self.callback_result:
+            self.batches.append(batch)
+        return self.callback_result
+
+    def testFlushSize(self):
+        self.buffer = Buffer(flush_size=5, callback=self.storeBatch, interval=10)
+        for item in range(12):
+            self.buffer.put(item)
+        self.buffer.flush()
+        self.assertEqual(self.batches, [[0, 1, 2, 3, 4], [5, 6, 7, 8, 9], [10, 11]])
+        self.assertTrue(threading.current_thread() not in self.flush_threads)
+
+    def testSlowCallbackDoesNotBlockProducer(self):
+        self.callback_delay = .3
+        self.buffer = Buffer(flush_size=5, callback=self.storeBatch, interval=10)
+        started = time.time()
+        for item in range(9):
+            self.buffer.put(item)
+        self.assertTrue(time.time() - started < .1)
+        self.assertEqual(self.buffer.bufsize(), 9)
+        self.buffer.flush()
+        self.assertEqual(self.batches, [[0, 1, 2, 3, 4], [5, 6, 7, 8]])
+        self.assertEqual(self.buffer.bufsize(), 0)
+
+    def testBlockWhenFull(self):
+        self.callback_delay = .1
+        self.buffer = Buffer(flush_size=10, callback=self.storeBatch, interval=10, maxsize=10)
+        for item in range(25):
+            self.buffer.put(item)
+        self.buffer.flush()
+        self.assertEqual([item for batch in self.batches for item in batch], list(range(25)))
+        statistics = self.buffer.getStatistics()
+        self.assertTrue(statistics['blocked_count'] > 1)
+        self.assertTrue(statistics['blocked_time'] > .1)
+        self.assertEqual(self.buffer.getBlockedDelta(), (statistics['blocked_count'], statistics['blocked_time']))
+        self.assertEqual(self.buffer.getBlockedDelta(), (0, 0))
+
+    def testIntervalFlush(self):
+        self.buffer = Buffer(flush_size=100, callback=self.storeBatch, interval=.1)
+        self.buffer.put('spam')
+        time.sleep(.3)
+        self.assertEqual(self.batches, [['spam']])
+
+    def testFailedFlushIsRetried(self):
+        self.callback_result = False
+        self.buffer = Buffer(flush_size=2, callback=self.storeBatch, interval=10)
+        self.buffer.put('spam')
+        self.buffer.put('eggs')
+        self.buffer.flush()
+        self.assertEqual(self.buffer.bufsize(), 2)
+        self.callback_result = True
+        self.buffer.put('bacon')
+        self.buffer.flush()
+        self.assertEqual(self.batches, [['spam', 'eggs'], ['bacon']])
+
+    def testFlushInCallerThread(self):
+        self.buffer = Buffer(flush_size=2, callback=self.storeBatch, interval=10, background_flush=False)
+        for item in range(3):
+            self.buffer.put(item)
+        self.assertEqual(self.batches, [[0, 1]])
+        self.buffer.flush()
+        self.assertEqual(self.batches, [[0, 1], [2]])
+        self.assertEqual(self.flush_threads, [threading.current_thread()] * 2)
+
+    def testStop(self):
+        # A backend that is down keeps the buffer congested.
+        self.callback_result = False
+        self.buffer = Buffer(flush_size=2, callback=self.storeBatch, interval=10, maxsize=4)
+        for item in range(4):
+            self.buffer.put(item)
+        self.assertIn(self.buffer, getBackpressure().sources)
+        flusher = self.buffer.flusher
+        self.buffer.stop()
+        self.assertFalse(flusher.is_alive())
+        self.assertNotIn(self.buffer, getBackpressure().sources)
+        # Items put after stop are flushed in the thread of the caller.
+        self.callback_result = True
+        self.buffer.put(4)
+        self.buffer.put(5)
+        self.assertEqual(self.batches, [[0, 1], [2, 3], [4, 5]])
+        self.assertEqual(self.flush_threads[-1], threading.current_thread())
+        buffer_reference = weakref.ref(self.buffer)
+        self.buffer = None
+        gc.collect()
+        self.assertIsNone(buffer_reference())
@@ -0,0 +1,63 @@
+import os
+import unittest
+
+import lumbermill.utils.DictUtils as DictUtils
+from lumbermill.utils.DynamicValues import parseDynamicValuesinFilterString, compileFilter, compileFilterGroup, getIndexablePredicate
+
+
+class CountingKeyDotNotationDict(DictUtils.KeyDotNotationDict):
+
+    path_lookups = 0
+
+    def getPath(self, path):
+        self.path_lookups += 1
+        return DictUtils.KeyDotNotationDict.getPath(self, path)
+
+
+class TestCompileFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.event = CountingKeyDotNotationDict({'data': 'Spam, egg, sausage and spam',
+                                                 'lumbermill': {'event_type': 'menu',
+                                                                'list': [10, 20, {'hovercraft': 'eels'}]},
+                                                 'price': '3'})
+
+    def testCompileFilter(self):
+        event_filter = compileFilter(parseDynamicValuesinFilterString('if $(lumbermill.event_type) == "menu" and $(lumbermill.list.2.hovercraft) == "eels"'))
+        self.assertTrue(event_filter(None, self.event))
+        event_filter = compileFilter(parseDynamicValuesinFilterString('if $(lumbermill.missing) == "menu"'))
+        self.assertFalse(event_filter(None, self.event))
+
+    def testCompileFilterRejectsNonFilter(self):
+        self.assertRaises(ValueError, compileFilter, "lambda event : True")
+
+    def testFilterGroupResults(self):
+        filter_group = compileFilterGroup([parseDynamicValuesinFilterString('if $(lumbermill.event_type) == "menu"'),
+                                           parseDynamicValuesinFilterString('if $(lumbermill.event_type) != "menu"'),
+                                           parseDynamicValuesinFilterString('if int($(data)) > 1')])
+        results = filter_group(None, self.event)
+        self.assertEqual(results[:2], [True, False])
+        self.assertTrue(isinstance(results[2], ValueError))
+
+    def testFilterGroupSharesSubexpressions(self):
+        filter_group = compileFilterGroup([parseDynamicValuesinFilterString('if $(lumbermill.event_type) == "menu" and int($(price)) > 2'),
+                                           parseDynamicValuesinFilterString('if $(lumbermill.event_type) == "menu" or int($(price)) > 2'),
+                                           parseDynamicValuesinFilterString('if int($(price)) > 2')])
+        self.assertEqual(filter_group(None, self.event), [True, True, True])
+        # lumbermill.event_type and price are only looked up once.
+        self.assertEqual(self.event.path_lookups, 2)
+
+    def testFilterUsesGlobalNamespace(self):
+        filter_string = parseDynamicValuesinFilterString('if os.path.basename($(data)) == "Spam, egg, sausage and spam"')
+        self.assertTrue(compileFilter(filter_string, {'os': os})(None, self.event))
+        self.assertEqual(compileFilterGroup([filter_string, filter_string], {'os': os})(None, self.event), [True, True])
+        # Without the module in the namespace, the filter fails when it is called.
+        self.assertRaises(NameError, compileFilter(filter_string), None, self.event)
+
+    def testIndexablePredicate(self):
+        self.assertEqual(getIndexablePredicate(parseDynamicValuesinFilterString('if $(lumbermill.event_type) == "menu"')), ('lumbermill.event_type', False, ('menu',)))
+        self.assertEqual(getIndexablePredicate(parseDynamicValuesinFilterString('if "menu" == $(lumbermill.event_type)')), ('lumbermill.event_type', False, ('menu',)))
+        self.assertEqual(getIndexablePredicate(parseDynamicValuesinFilterString('if $(price) in [1, 2]')), ('price', False, (1, 2)))
+        self.assertIsNone(getIndexablePredicate(parseDynamicValuesinFilterString('if $(price) != 1')))
+        self.assertIsNone(getIndexablePredicate(parseDynamicValuesinFilterString('if $(price) == 1 and $(data) == "spam"')))
+        self.assertIsNone(getIndexablePredicate(parseDynamicValuesinFilterString('if "spam" in $(data)')))
@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+import yaml
+
+from lumbermill.LumberMill import LumberMill
+from lumbermill.utils.ConfigurationDiff import getModuleDefinitions, getReceiverNames, diffModuleDefinitions
+
+
+class TestConfigurationDiff(unittest.TestCase):
+
+    def getConfiguration(self):
+        return [{'input.Spam': {'event': 'hello'}},
+                {'modifier.Field': {'action': 'insert', 'target_field': 'version', 'value': 'one', 'receivers': ['output.StdOut']}},
+                {'modifier.Field': {'action': 'delete', 'source_fields': ['data'], 'receivers': ['output.StdOut']}},
+                {'misc.Noop': {'id': 'Noop', 'receivers': [{'output.StdOut': {'filter': 'if $(version)'}}]}},
+                'output.StdOut']
+
+    def testGetModuleDefinitions(self):
+        module_definitions = getModuleDefinitions([{'Global': {'workers': 1}}] + self.getConfiguration())
+        self.assertEqual(list(module_definitions.keys()), ['input.Spam', 'modifier.Field', 'modifier.Field_1', 'Noop', 'output.StdOut'])
+        self.assertEqual([module_definition['idx'] for module_definition in module_definitions.values()], [0, 1, 2, 3, 4])
+        self.assertEqual(module_definitions['Noop']['module_class_name'], 'misc.Noop')
+        self.assertEqual(module_definitions['output.StdOut']['configuration'], {})
+        self.assertRaises(ValueError, getModuleDefinitions, [{'misc.Noop': 'Noop'}])
+
+    def testGetReceiverNames(self):
+        module_definitions = getModuleDefinitions(self.getConfiguration())
+        self.assertEqual(getReceiverNames(module_definitions['Noop']['configuration']), ['output.StdOut'])
+        self.assertEqual(getReceiverNames(module_definitions['input.Spam']['configuration']), [])
+
+    def testDiffModuleDefinitions(self):
+        running_modules = getModuleDefinitions(self.getConfiguration())
+        for module_definition in running_modules.values():
+            module_definition['configuration'].setdefault('receivers', [])
+        configuration = self.getConfiguration()
+        configuration[0]['input.Spam']['receivers'] = ['Noop']
+        configuration[1]['modifier.Field']['value'] = 'two'
+        configuration[3]['misc.Noop']['receivers'] = ['output.StdOut']
+        configuration[4] = {'output.File': {'id': 'output.StdOut'}}
+        del configuration[2]
+        configuration.append('output.DevNull')
+        module_definitions = getModuleDefinitions(configuration)
+        module_changes = diffModuleDefinitions(running_modules, module_definitions)
+        self.assertEqual(module_changes['added'], ['output.DevNull'])
+        self.assertEqual(module_changes['removed'], ['modifier.Field_1'])
+        # Receivers with output filters are part of the module configuration.
+        self.assertEqual(module_changes['changed'], ['modifier.Field', 'Noop', 'output.StdOut'])
+        self.assertEqual(module_changes['rewired'], ['input.Spam'])
+        self.assertEqual(module_changes['unchanged'], [])
+
+    def testAbortedReloadShutsDownNewInstances(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        path_to_config_file = os.path.join(path, "lumbermill.conf")
+        configuration = [{'Global': {'workers': 1}},
+                         {'misc.Noop': {'receivers': ['output.DevNull']}},
+                         'output.DevNull']
+        with open(path_to_config_file, 'w') as config_file:
+            yaml.dump(configuration, config_file)
+        lumbermill = LumberMill(path_to_config_file)
+        lumbermill.configureGlobal()
+        lumbermill.initModulesFromConfig()
+        lumbermill.setDefaultReceivers()
+        lumbermill.configureModules()
+        lumbermill.initEventStream()
+        configuration[1]['misc.Noop']['add_fields'] = {'reloaded': True}
+        with open(path_to_config_file, 'w') as config_file:
+            yaml.dump(configuration, config_file)
+        created_instances = []
+        init_reloaded_module = lumbermill.initReloadedModule
+
+        def initReloadedModule(module_definition):
+            created_instances.append(init_reloaded_module(module_definition))
+            return created_instances[-1]
+        with mock.patch.object(lumbermill, 'initReloadedModule', initReloadedModule), \
+             mock.patch.object(lumbermill, 'setReloadQueues', return_value="Queue of misc.Noop between processes changed."), \
+             mock.patch.object(lumbermill, 'requestRestart'):
+            self.assertFalse(lumbermill.reload()['reloaded'])
+        self.assertEqual(len(created_instances), 1)
+        self.assertFalse(created_instances[0].alive)
+        self.assertTrue(lumbermill.modules['misc.Noop']['instances'][0] is not created_instances[0])
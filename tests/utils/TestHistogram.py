@@ -0,0 +1,76 @@
+import mock
+import time
+import unittest
+
+import lumbermill.utils.DictUtils as DictUtils
+from lumbermill.misc import Noop
+from lumbermill.utils.Buffers import BufferedQueue
+from lumbermill.utils.Histogram import LogHistogram, getModuleTimings
+from lumbermill.utils.StatisticCollector import StatisticCollector
+
+# Conditional imports for python2/3
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+
+class TestHistogram(unittest.TestCase):
+
+    def testBuckets(self):
+        for value in [.0000005, .000001, .0000015, .00001, .0123, 1.5, 60]:
+            bucket_index = LogHistogram.getBucketIndex(value)
+            self.assertTrue(value < LogHistogram.getBucketUpperBound(bucket_index))
+            self.assertTrue(bucket_index == 0 or value >= LogHistogram.getBucketUpperBound(bucket_index - 1))
+            self.assertTrue(LogHistogram.getBucketUpperBound(bucket_index) <= max(value * 1.25, .000001) * 1.000001)
+
+    def testPercentiles(self):
+        histogram = LogHistogram()
+        for _ in range(98):
+            histogram.add(.001)
+        histogram.add(.1, 2)
+        self.assertEqual(histogram.count, 100)
+        self.assertAlmostEqual(histogram.getMean(), .00298)
+        self.assertTrue(.001 < histogram.getPercentile(50) <= .00125)
+        self.assertTrue(.1 < histogram.getPercentile(99) <= .125)
+        previous = LogHistogram()
+        previous.merge(histogram)
+        histogram.add(.1)
+        delta = histogram.getDelta(previous)
+        self.assertEqual(delta.count, 1)
+        self.assertTrue(.1 < delta.getPercentile(50) <= .125)
+
+    def testMeasureTimings(self):
+        noop = Noop.Noop(mock.Mock())
+        noop.configure({})
+        noop.measureTimings(sample_interval=4)
+        noop.addReceiver('MockReceiver', mock.Mock())
+        for _ in range(10):
+            noop.receiveEvent(DictUtils.getDefaultEventDict({}))
+        for _ in range(10):
+            noop.processEvent(DictUtils.getDefaultEventDict({}))
+        self.assertEqual(noop.timing_histograms['handling_time'].count, 20)
+        self.assertEqual(noop.timing_histograms['cpu_time'].count, 20)
+
+    def testQueueWaitTime(self):
+        buffered_queue = BufferedQueue(queue.Queue(), buffersize=2)
+        buffered_queue.measureWaitTime()
+        buffered_queue.put(DictUtils.getDefaultEventDict({}))
+        buffered_queue.put(DictUtils.getDefaultEventDict({}))
+        time.sleep(.05)
+        self.assertEqual(len(list(buffered_queue.get())), 2)
+        histogram = buffered_queue.getWaitTimeHistogram()
+        self.assertEqual(histogram.count, 2)
+        self.assertTrue(histogram.getMean() >= .05)
+        buffered_queue.buffer.stopInterval()
+
+    def testGetModuleTimings(self):
+        stats_collector = StatisticCollector()
+        stats_collector.setCounter(('Noop', 0, 'handling_time', LogHistogram.getBucketIndex(.001)), 3, namespace="ModuleTimings")
+        stats_collector.setCounter(('Noop', 0, 'handling_time', 'sum'), 3000, namespace="ModuleTimings")
+        stats_collector.setCounter(('Noop', 1, 'handling_time', 'sum'), 0, namespace="ModuleTimings")
+        module_timings = getModuleTimings(stats_collector)
+        self.assertEqual(list(module_timings['Noop'].keys()), [0])
+        histogram = module_timings['Noop'][0]['handling_time']
+        self.assertEqual(histogram.count, 3)
+        self.assertAlmostEqual(histogram.getMean(), .001)
@@ -0,0 +1,78 @@
+import multiprocessing
+import unittest
+
+from lumbermill.utils.Buffers import IPC_TRANSPORTS, PipeQueue, produceIpcQueue
+from lumbermill.utils.IpcBenchmark import benchmarkIpcTransport, getRecommendedIpcTransport
+
+# Conditional imports for python2/3
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+
+def produce(ipc_queue, message_count, received):
+    for idx in range(message_count):
+        ipc_queue.put(("%d" % idx).encode('utf-8'))
+    # Closing the queue before all messages were read might drop them.
+    received.wait(5)
+
+
+class TestIpcTransports(unittest.TestCase):
+
+    def testPipeQueue(self):
+        pipe_queue = PipeQueue()
+        pipe_queue.put(b'spam')
+        self.assertEqual(pipe_queue.qsize(), 1)
+        self.assertEqual(pipe_queue.get(), b'spam')
+        self.assertEqual(pipe_queue.qsize(), 0)
+        self.assertRaises(queue.Empty, pipe_queue.get, True, 0.01)
+        self.assertRaises(queue.Empty, pipe_queue.get, False)
+
+    def testAllTransportsBetweenProcesses(self):
+        for ipc_transport in IPC_TRANSPORTS:
+            try:
+                ipc_queue = produceIpcQueue(ipc_transport, bind_receiver=True)
+            except ValueError:
+                continue
+            received = multiprocessing.Event()
+            producer = multiprocessing.Process(target=produce, args=(ipc_queue, 100, received))
+            producer.start()
+            messages = [ipc_queue.get(timeout=5) for _ in range(100)]
+            received.set()
+            producer.join()
+            self.assertEqual(messages, [("%d" % idx).encode('utf-8') for idx in range(100)], ipc_transport)
+            self.assertEqual(ipc_queue.qsize(), 0, ipc_transport)
+            if hasattr(ipc_queue, 'close'):
+                ipc_queue.close()
+
+    def testZeroMqQueueSize(self):
+        try:
+            zmq_queue = produceIpcQueue('zmq', bind_receiver=True)
+        except ValueError:
+            self.skipTest("pyzmq is not installed.")
+        self.assertRaises(queue.Empty, zmq_queue.get, False)
+        for _ in range(3):
+            zmq_queue.put(b'spam')
+        self.assertEqual(zmq_queue.qsize(), 3)
+        self.assertEqual(zmq_queue.get(timeout=5), b'spam')
+        self.assertEqual(zmq_queue.qsize(), 2)
+        zmq_queue.close()
+
+    def testUnknownTransport(self):
+        self.assertRaises(ValueError, produceIpcQueue, 'carrier_pigeon')
+
+    def testBenchmarkIpcTransport(self):
+        result = benchmarkIpcTransport('shared_memory', worker_count=2, event_count=1000, batch_size=10)
+        self.assertIsNone(result['error'])
+        self.assertTrue(result['events_per_second'] > 0)
+        self.assertTrue(0 <= result['balance'] <= 1)
+
+    def testGetRecommendedIpcTransport(self):
+        results = [{'ipc_transport': 'multiprocessing', 'events_per_second': 1000, 'balance': 0.9, 'error': None},
+                   {'ipc_transport': 'zmq', 'events_per_second': 3000, 'balance': 0.1, 'error': None},
+                   {'ipc_transport': 'pipe', 'events_per_second': 5000, 'balance': 0, 'error': 'Failed.'},
+                   {'ipc_transport': 'shared_memory', 'events_per_second': 2000, 'balance': 0.8, 'error': None}]
+        self.assertEqual(getRecommendedIpcTransport(results), 'shared_memory')
+        self.assertEqual(getRecommendedIpcTransport(results[1:3]), 'zmq')
+        self.assertIsNone(getRecommendedIpcTransport(results[2:3]))
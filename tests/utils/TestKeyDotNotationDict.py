@@ -1,3 +1,6 @@
+import os
+import collections
+import json
 import unittest
 import lumbermill.utils.DictUtils as DictUtils
 
@@ -25,6 +28,9 @@ class TestKeyDotNotationDict(unittest.TestCase):
                  'user': '-'}
         self.event = DictUtils.getDefaultEventDict(event)
 
+    def tearDown(self):
+        DictUtils.setEventIdStrategy('random')
+
     def testDotAccessToDict(self):
         self.assertTrue(self.event['bytes_send'] == 3395)
         self.assertTrue(self.event['lumbermill.event_id'] == "715bd321b1016a442bf046682722c78e")
@@ -47,3 +53,90 @@ class TestKeyDotNotationDict(unittest.TestCase):
         self.assertTrue(self.event.get('params.nobody') == 'expects')
         self.assertTrue(self.event.get('empty.nobody') == 'expects')
         self.assertTrue(self.event.get('params.spanish.0') == 'inquisition')
+
+    def testCloneGetsNewEventId(self):
+        event_clone = self.event.clone()
+        self.assertTrue(event_clone['lumbermill.event_id'] != self.event['lumbermill.event_id'])
+        self.assertTrue(event_clone['lumbermill.event_type'] == 'httpd_access_log')
+
+    def testCloneSharesNestedValuesUntilWrite(self):
+        event_clone = self.event.clone()
+        self.assertTrue(dict.__getitem__(event_clone, 'params') is dict.__getitem__(self.event, 'params'))
+        self.assertTrue(event_clone['params.spanish.0'] == 'inquisition')
+        self.assertTrue(dict.__getitem__(event_clone, 'params') is dict.__getitem__(self.event, 'params'))
+        event_clone['params.spanish.0'] = 'parrot'
+        self.assertTrue(event_clone['params.spanish.0'] == 'parrot')
+        self.assertTrue(self.event['params.spanish.0'] == 'inquisition')
+
+    def testCloneContainerAccessDoesNotLeak(self):
+        event_clone = self.event.clone()
+        event_clone['fields'].append('spanish')
+        self.event['lumbermill']['list'][2]['hovercraft'] = 'spam'
+        self.event.pop('params')['eggs'] = 'bacon'
+        self.assertEqual(self.event['fields'], ['nobody', 'expects', 'the'])
+        self.assertEqual(event_clone['fields'], ['nobody', 'expects', 'the', 'spanish'])
+        self.assertTrue(event_clone['lumbermill.list.2.hovercraft'] == 'eels')
+        self.assertTrue('eggs' not in event_clone['params'])
+
+    def testCompileFieldPath(self):
+        self.assertEqual(DictUtils.compileFieldPath('lumbermill.list.2'), (('lumbermill', None), ('list', None), ('2', 2)))
+        self.assertTrue(DictUtils.compileFieldPath('lumbermill.list.2') is DictUtils.compileFieldPath('lumbermill.list.2'))
+
+    def testFieldGetterAndSetter(self):
+        get_hovercraft = DictUtils.getFieldGetter('lumbermill.list.2.hovercraft')
+        set_hovercraft = DictUtils.getFieldSetter('lumbermill.list.2.hovercraft')
+        self.assertEqual(get_hovercraft(self.event), 'eels')
+        set_hovercraft(self.event, 'spam')
+        self.assertEqual(self.event['lumbermill.list.2.hovercraft'], 'spam')
+        self.assertRaises(KeyError, DictUtils.getFieldGetter('lumbermill.list.3.hovercraft'), self.event)
+        DictUtils.getFieldSetter('user')(self.event, 'arthur')
+        self.assertEqual(DictUtils.getFieldGetter('user')(self.event), 'arthur')
+
+    def testDotAccessToOtherMappingsAndTuples(self):
+        self.event['ordered'] = collections.OrderedDict([('spanish', ('inquisition', {'nobody': 'expects'}))])
+        self.assertEqual(self.event['ordered.spanish.0'], 'inquisition')
+        self.assertEqual(self.event['ordered.spanish.1.nobody'], 'expects')
+        self.assertEqual(DictUtils.getFieldGetter('ordered.spanish.0')(self.event), 'inquisition')
+        self.assertTrue('ordered.spanish' in self.event)
+        self.assertRaises(KeyError, self.event.__getitem__, 'ordered.spanish.2')
+        del self.event['ordered.spanish']
+        self.assertTrue('ordered.spanish' not in self.event)
+
+    def testDeleteAndPopViaDotAccess(self):
+        del self.event['lumbermill.list.0']
+        self.assertEqual(self.event['lumbermill.list.0'], 20)
+        self.assertEqual(self.event.pop('params.spanish'), ['inquisition'])
+        self.assertTrue('params.spanish' not in self.event)
+        self.assertEqual(self.event.pop('params.missing.field', 'default value'), 'default value')
+        self.assertRaises(KeyError, self.event.__delitem__, 'lumbermill.missing')
+
+    def testMonotonicEventIds(self):
+        DictUtils.setEventIdStrategy('monotonic')
+        event = DictUtils.getDefaultEventDict({})
+        event_clone = event.clone()
+        self.assertTrue(event['lumbermill.event_id'].startswith("%s-%s-" % (DictUtils.MY_HOSTNAME, os.getpid())))
+        self.assertTrue(int(event_clone['lumbermill.event_id'].rsplit('-', 1)[1], 16) > int(event['lumbermill.event_id'].rsplit('-', 1)[1], 16))
+
+    def testLazyEventId(self):
+        DictUtils.setEventIdStrategy('lazy')
+        event = DictUtils.getDefaultEventDict({})
+        self.assertTrue('event_id' not in json.dumps(event))
+        event_id = event['lumbermill.event_id']
+        self.assertEqual(event['lumbermill']['event_id'], event_id)
+        self.assertTrue(event_id in json.dumps(event))
+        self.assertNotEqual(event.clone()['lumbermill.event_id'], event_id)
+        self.assertNotEqual(event.copy()['lumbermill']['event_id'], event_id)
+
+    def testUnknownEventIdStrategy(self):
+        self.assertRaises(ValueError, DictUtils.setEventIdStrategy, 'sequential')
+
+    def testCompactMetaData(self):
+        event = DictUtils.getDefaultEventDict({}, caller_class_name='Tcp')
+        self.assertTrue(dict.__contains__(event['lumbermill'], 'received_by') is False)
+        self.assertEqual(event['lumbermill.received_by'], DictUtils.MY_HOSTNAME)
+        self.assertEqual(event['lumbermill']['pid'], os.getpid())
+        self.assertTrue('lumbermill.pid' in event)
+        self.assertEqual(json.loads(json.dumps(event))['lumbermill']['received_by'], DictUtils.MY_HOSTNAME)
+        event['lumbermill.received_by'] = 'spam'
+        self.assertEqual(event['lumbermill'].get('received_by'), 'spam')
+        self.assertEqual(len(event['lumbermill']), 6)
@@ -0,0 +1,26 @@
+import unittest
+
+from tests.ModuleBenchmark import compareWithBaseline, getBenchmarks, runBenchmarks
+
+
+class TestModuleBenchmark(unittest.TestCase):
+
+    def testAllBenchmarksRun(self):
+        results = runBenchmarks(iterations=20, allocation_iterations=10)
+        self.assertEqual([result['name'] for result in results], [name for name, run in getBenchmarks()])
+        for result in results:
+            self.assertIsNone(result['error'], "%s: %s" % (result['name'], result['error']))
+            self.assertTrue(result['events_per_second'] > 0)
+
+    def testIncludeBenchmarks(self):
+        results = runBenchmarks(iterations=20, allocation_iterations=10, include="^modifier.Field.(insert|rename)$")
+        self.assertEqual([result['name'] for result in results], ['modifier.Field.insert', 'modifier.Field.rename'])
+
+    def testCompareWithBaseline(self):
+        baseline = [{'name': 'parser.Json.decode', 'events_per_second': 1000, 'allocated_blocks_per_event': 10, 'error': None},
+                    {'name': 'parser.Csv', 'events_per_second': 1000, 'allocated_blocks_per_event': 10, 'error': None}]
+        results = [{'name': 'parser.Json.decode', 'events_per_second': 950, 'allocated_blocks_per_event': 12, 'error': None},
+                   {'name': 'parser.Csv', 'events_per_second': 800, 'allocated_blocks_per_event': 10, 'error': None},
+                   {'name': 'parser.Regex.httpd', 'events_per_second': 1, 'allocated_blocks_per_event': 100, 'error': None}]
+        regressions = compareWithBaseline(results, baseline)
+        self.assertEqual(sorted([(regression['name'], regression['metric']) for regression in regressions]), [('parser.Csv', 'events_per_second'), ('parser.Json.decode', 'allocated_blocks_per_event')])
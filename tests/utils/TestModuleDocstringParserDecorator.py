@@ -38,6 +38,13 @@ class TestModuleDocStringParserDecorator(unittest.TestCase):
         self.assertEqual(doc_string_config_data['none'], None)
         self.assertEqual(doc_string_config_data['bool'], True)
 
-
-
-
+    def testDocstringIsParsedOncePerClass(self):
+        first_instance = DocStringExample()
+        second_instance = DocStringExample()
+        self.assertIs(first_instance.configuration_metadata, second_instance.configuration_metadata)
+        self.assertEqual(first_instance.configuration_metadata['none']['type'], ['None', 'string', 'Unicode'])
+        # Mutable defaults must not be shared between instances.
+        first_instance.configuration_data['list'].append('field4')
+        first_instance.configuration_data['dict']['field5'] = 'value5'
+        self.assertEqual(second_instance.configuration_data['list'], ['field2', 'field3'])
+        self.assertEqual(DocStringExample().configuration_data['dict'], {'filed1': 'value1'})
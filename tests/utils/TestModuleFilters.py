@@ -4,6 +4,7 @@ import tests.ModuleBaseTestCase
 
 import lumbermill.utils.DictUtils as DictUtils
 from lumbermill.modifier import Math
+from lumbermill.misc import Noop
 
 
 class TestModuleFilters(tests.ModuleBaseTestCase.ModuleBaseTestCase):
@@ -49,6 +50,33 @@ class TestModuleFilters(tests.ModuleBaseTestCase.ModuleBaseTestCase):
             self.assertTrue('test' not in event)
 
 
+    def testInputFilterWithInternalValue(self):
+        self.test_object.lumbermill.setInInternalDataStore('cache_enabled', True)
+        self.test_object.configure({'filter': 'if $(internal.cache_enabled) and $(lumbermill.source_module) == "StdIn"',
+                                    'target_field': 'test',
+                                    'function': 'int($(cache_hits)) * 2'})
+        self.checkConfiguration()
+        self.test_object.receiveEvent(self.event)
+        events = list(self.receiver.getEvent())
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['test'], 10)
+
+    def testInputFilterWithBatch(self):
+        self.test_object.configure({'filter': 'if $(lumbermill.source_module) == "StdIn"',
+                                    'target_field': 'test',
+                                    'function': 'int($(cache_hits)) * 2'})
+        self.checkConfiguration()
+        unmatched_event = self.event.copy()
+        unmatched_event['lumbermill']['source_module'] = 'Tcp'
+        self.test_object.receiveEvents([self.event, unmatched_event])
+        received_events = list(self.receiver.getEvent())
+        self.assertEqual(len(received_events), 2)
+        for event in received_events:
+            if event['lumbermill.source_module'] == 'StdIn':
+                self.assertTrue(event['test'] == 10)
+            else:
+                self.assertTrue('test' not in event)
+
     @unittest.skip("Some methodcalls are still failing due to problems with regex. Work in progress.")
     def testInputFilterMatchWithMethodCall(self):
         self.test_object.configure({'filter': 'if $(url).startswith("GET")',
@@ -92,6 +120,54 @@ class TestModuleFilters(tests.ModuleBaseTestCase.ModuleBaseTestCase):
             received_event = event
         self.assertTrue(received_event == None)
 
+    def testCompiledReceiverFilters(self):
+        self.test_object.configure({'target_field': 'test',
+                                    'function': 'int($(cache_hits)) * 2',
+                                    'receivers': [{'MockReceiver': {
+                                                      'filter': 'if $(lumbermill.source_module) == "StdIn" and $(http_status) == 200'}},
+                                                  'Noop']})
+        noop = Noop.Noop(mock.Mock())
+        noop.configure({'filter': 'if $(lumbermill.source_module) == "StdIn" and $(http_status) != 200',
+                        'add_fields': {'noop': True}})
+        noop_receiver = tests.ModuleBaseTestCase.MockReceiver()
+        noop.addReceiver('NoopReceiver', noop_receiver)
+        self.test_object.addReceiver('Noop', noop)
+        self.test_object.compileReceiverFilters()
+        self.assertTrue(self.test_object.receiver_filters)
+        self.test_object.receiveEvents([self.event])
+        received_events = list(self.receiver.getEvent())
+        self.assertEqual(len(received_events), 1)
+        self.assertEqual(received_events[0]['test'], 10)
+        # Noop filter did not match, so the event is passed on unchanged.
+        noop_received_events = list(noop_receiver.getEvent())
+        self.assertEqual(len(noop_received_events), 1)
+        self.assertTrue('noop' not in noop_received_events[0])
+        self.assertTrue(noop_received_events[0] is not received_events[0])
+
+    def testOutputFilterRoutingIndex(self):
+        receivers = {}
+        receivers_config = []
+        for event_type in ['httpd_access_log', 'nginx_access_log', 'syslog']:
+            receivers[event_type] = tests.ModuleBaseTestCase.MockReceiver()
+            receivers_config.append({event_type: {'filter': 'if $(lumbermill.event_type) == "%s"' % event_type}})
+        receivers_config.append({'Other': {'filter': 'if $(lumbermill.event_type) not in ["httpd_access_log", "nginx_access_log", "syslog"]'}})
+        receivers['Other'] = tests.ModuleBaseTestCase.MockReceiver()
+        self.test_object.configure({'target_field': 'test',
+                                    'function': 'int($(cache_hits)) * 2',
+                                    'receivers': receivers_config})
+        for receiver_name, receiver in receivers.items():
+            self.test_object.addReceiver(receiver_name, receiver)
+        self.assertEqual(len(self.test_object.routing_index), 3)
+        self.test_object.receiveEvent(self.event)
+        other_event = self.event.copy()
+        other_event['lumbermill']['event_type'] = 'unknown'
+        self.test_object.receiveEvent(other_event)
+        self.assertEqual(len(receivers['httpd_access_log'].events), 1)
+        self.assertEqual(len(receivers['nginx_access_log'].events), 0)
+        self.assertEqual(len(receivers['syslog'].events), 0)
+        self.assertEqual(len(receivers['Other'].events), 1)
+        self.assertEqual(receivers['Other'].events[0]['lumbermill.event_type'], 'unknown')
+
     @unittest.skip("Some methodcalls are still failing due to problems with regex. Work in progress.")
     def testOutputFilterMatchWithMethodCall(self):
         self.test_object.configure({'target_field': 'test',
@@ -0,0 +1,58 @@
+import mock
+import tests.ModuleBaseTestCase
+
+import lumbermill.utils.DictUtils as DictUtils
+from lumbermill.misc import Noop
+from lumbermill.modifier import Math, AddDateTime
+from lumbermill.utils.ModuleFusion import getModuleChain, fuseModuleChain, unfuseModuleChain
+
+
+class TestModuleFusion(tests.ModuleBaseTestCase.ModuleBaseTestCase):
+
+    def setUp(self):
+        self.math = Math.Math(mock.Mock())
+        self.math.configure({'filter': 'if $(lumbermill.source_module) == "StdIn"',
+                             'target_field': 'test',
+                             'function': 'int($(cache_hits)) * 2'})
+        self.noop = Noop.Noop(mock.Mock())
+        self.noop.configure({'add_fields': {'fused': True}})
+        self.add_date_time = AddDateTime.AddDateTime(mock.Mock())
+        self.add_date_time.configure({})
+        self.math.addReceiver('Noop', self.noop)
+        self.noop.addReceiver('AddDateTime', self.add_date_time)
+        super(TestModuleFusion, self).setUp(self.add_date_time)
+
+    def testGetModuleChain(self):
+        self.assertEqual(getModuleChain(self.math), [self.math, self.noop, self.add_date_time])
+        self.assertEqual(getModuleChain(self.add_date_time), [self.add_date_time])
+
+    def testGetModuleChainStopsAtOutputFilter(self):
+        self.noop.addOutputFilter('AddDateTime', "lambda lumbermill, event : True")
+        self.assertEqual(getModuleChain(self.math), [self.math, self.noop])
+
+    def testFusedChain(self):
+        fuseModuleChain(getModuleChain(self.math))
+        matched_event = DictUtils.getDefaultEventDict({'cache_hits': 5, 'lumbermill': {'source_module': 'StdIn'}})
+        unmatched_event = DictUtils.getDefaultEventDict({'cache_hits': 5, 'lumbermill': {'source_module': 'Tcp'}})
+        self.math.receiveEvents([matched_event, unmatched_event])
+        received_events = list(self.receiver.getEvent())
+        self.assertEqual(len(received_events), 2)
+        self.assertEqual(received_events[0]['test'], 10)
+        self.assertTrue('test' not in received_events[1])
+        for event in received_events:
+            self.assertTrue(event['fused'])
+            self.assertTrue('@timestamp' in event)
+
+    def testUnfuseModuleChain(self):
+        # The input filter of Math is set on the instance.
+        filtered_receive_event = self.math.receiveEvent
+        fuseModuleChain(getModuleChain(self.math))
+        self.assertIsNot(self.math.receiveEvent, filtered_receive_event)
+        unfuseModuleChain(self.math)
+        self.assertIs(self.math.receiveEvent, filtered_receive_event)
+        self.assertTrue('receiveEvents' not in self.math.__dict__)
+        # Unfusing a module that is not fused does nothing.
+        unfuseModuleChain(self.math)
+        self.math.receiveEvent(DictUtils.getDefaultEventDict({'cache_hits': 5, 'lumbermill': {'source_module': 'StdIn'}}))
+        received_events = list(self.receiver.getEvent())
+        self.assertEqual(received_events[0]['test'], 10)
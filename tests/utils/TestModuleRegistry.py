@@ -0,0 +1,30 @@
+import sys
+import unittest
+
+from lumbermill.LumberMill import module_dirs
+from lumbermill.utils.ModuleRegistry import ModuleRegistry
+
+
+class TestModuleRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.module_registry = ModuleRegistry(module_dirs)
+
+    def testModuleNamesAreListedWithoutImport(self):
+        sys.modules.pop('lumbermill.modifier.Permutate', None)
+        module_names = self.module_registry.getModuleNames()
+        self.assertTrue('parser.Regex' in module_names)
+        self.assertTrue('modifier.Permutate' in module_names)
+        self.assertFalse('lumbermill.modifier.Permutate' in sys.modules)
+
+    def testGetModuleClass(self):
+        self.assertFalse(self.module_registry.isImported('output.DevNull'))
+        module_class = self.module_registry.getModuleClass('output.DevNull')
+        self.assertEqual(module_class.__name__, 'DevNull')
+        self.assertTrue(self.module_registry.isImported('output.DevNull'))
+        self.assertIs(self.module_registry.getModuleClass('output.DevNull'), module_class)
+        self.assertEqual(list(self.module_registry.getImportTimes().keys()), ['output.DevNull'])
+
+    def testUnknownModule(self):
+        self.assertRaises(ImportError, self.module_registry.getModuleClass, 'parser.Regexp')
+        self.assertEqual(self.module_registry.getSimilarModuleNames('parser.Regexp')[0], 'parser.Regex')
@@ -0,0 +1,61 @@
+import multiprocessing
+import unittest
+
+from lumbermill.utils.MultiProcessDataStore import SharedMemoryDataStore
+
+
+def setValues(datastore, values):
+    for key, value in values:
+        datastore.setValue(key, value)
+
+
+def getValue(datastore, key, queue):
+    queue.put(datastore.getValue(key))
+
+
+class TestMultiProcessDataStore(unittest.TestCase):
+
+    def testSetAndGetValue(self):
+        datastore = SharedMemoryDataStore(size=4096)
+        self.assertRaises(KeyError, datastore.getValue, 'spam')
+        datastore.setValue('spam', {'eggs': [1, 2]})
+        self.assertEqual(datastore.getValue('spam'), {'eggs': [1, 2]})
+        version = datastore.header[0]
+        datastore.setValue('spam', {'eggs': [1, 2]})
+        self.assertEqual(datastore.header[0], version)
+
+    def testChangedValueIsWritten(self):
+        datastore = SharedMemoryDataStore(size=4096)
+        datastore.setValue('spam', ['eggs'])
+        version = datastore.header[0]
+        value = datastore.getValue('spam')
+        value.append('bacon')
+        datastore.setValue('spam', value)
+        self.assertEqual(datastore.header[0], version + 1)
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=getValue, args=(datastore, 'spam', queue))
+        process.start()
+        self.assertEqual(queue.get(timeout=5), ['eggs', 'bacon'])
+        process.join()
+
+    def testValuesAreSharedBetweenProcesses(self):
+        datastore = SharedMemoryDataStore(size=4096)
+        datastore.setValue('spam', 1)
+        self.assertEqual(datastore.getValue('spam'), 1)
+        process = multiprocessing.Process(target=setValues, args=(datastore, [('spam', 2), ('eggs', 3)]))
+        process.start()
+        process.join()
+        self.assertEqual(datastore.getValue('spam'), 2)
+        self.assertEqual(datastore.getValue('eggs'), 3)
+
+    def testCompaction(self):
+        datastore = SharedMemoryDataStore(size=512)
+        datastore.setValue('static', 'bacon')
+        self.assertEqual(datastore.getValue('static'), 'bacon')
+        process = multiprocessing.Process(target=setValues, args=(datastore, [('counter%d' % (idx % 5), idx) for idx in range(100)]))
+        process.start()
+        process.join()
+        self.assertTrue(datastore.header[1] > 0)
+        self.assertEqual(datastore.header[1] % 2, 0)
+        self.assertEqual(datastore.getValue('static'), 'bacon')
+        self.assertEqual([datastore.getValue('counter%d' % idx) for idx in range(5)], [95, 96, 97, 98, 99])
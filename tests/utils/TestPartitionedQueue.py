@@ -0,0 +1,47 @@
+import unittest
+
+import lumbermill.utils.DictUtils as DictUtils
+from lumbermill.utils.Buffers import BufferedQueue, PartitionedQueue
+
+# Conditional imports for python2/3
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+
+class TestPartitionedQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.queues = [BufferedQueue(queue=queue.Queue(), buffersize=1) for _ in range(3)]
+        self.partitioned_queue = PartitionedQueue(self.queues, 'remote_ip')
+
+    def tearDown(self):
+        for buffered_queue in self.queues:
+            buffered_queue.buffer.stopInterval()
+
+    def getEventsOfWorker(self, worker_index):
+        self.partitioned_queue.setWorkerIndex(worker_index)
+        events = []
+        while self.queues[worker_index].qsize():
+            events.extend(self.partitioned_queue.get(timeout=1))
+        return events
+
+    def testSameKeySamePartition(self):
+        for remote_ip in ['192.168.2.%d' % i for i in range(20)] * 2:
+            self.partitioned_queue.put(DictUtils.getDefaultEventDict({'remote_ip': remote_ip}))
+        self.assertEqual(self.partitioned_queue.qsize(), 40)
+        remote_ips_per_worker = []
+        for worker_index in range(len(self.queues)):
+            events = self.getEventsOfWorker(worker_index)
+            remote_ips = set([event['remote_ip'] for event in events])
+            self.assertEqual(len(events), len(remote_ips) * 2)
+            remote_ips_per_worker.append(remote_ips)
+        self.assertEqual(sum([len(remote_ips) for remote_ips in remote_ips_per_worker]), 20)
+        self.assertEqual(len(set.union(*remote_ips_per_worker)), 20)
+
+    def testMissingPartitionField(self):
+        event = DictUtils.getDefaultEventDict({'data': 'no remote ip'})
+        self.assertEqual(self.partitioned_queue.getPartitionIndex(event), self.partitioned_queue.getPartitionIndex(event.copy()))
+        self.partitioned_queue.put(event)
+        self.assertEqual(self.partitioned_queue.qsize(), 1)
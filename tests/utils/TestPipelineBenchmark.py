@@ -0,0 +1,66 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from lumbermill.utils.PipelineBenchmark import PIPELINES, compareWithBaseline, getPipelineConfiguration, getTraceStatistics, runPipeline
+
+
+class TestPipelineBenchmark(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def getResult(self, **metrics):
+        result = {'pipeline': 'passthrough', 'workers': 1, 'events_per_second': 100000, 'latency_p50_ms': 1, 'latency_p99_ms': 2, 'peak_rss_mb': 50, 'error': None}
+        result.update(metrics)
+        return result
+
+    def testPipelineConfiguration(self):
+        configuration = getPipelineConfiguration(PIPELINES['regex_httpd'], 2, 1000, 10, self.path)
+        self.assertEqual(configuration[0]['Global']['workers'], 2)
+        self.assertEqual(configuration[0]['Global']['tracing'], {'sample_interval': 10, 'path': self.path})
+        self.assertEqual(configuration[1]['input.Spam']['events_count'], 1000)
+        self.assertEqual(configuration[-1], 'output.DevNull')
+        # Pipelines with own outputs do not get an additional one.
+        configuration = getPipelineConfiguration(PIPELINES['fanout'], 1, 1000, 10, self.path)
+        self.assertEqual(len([module_config for module_config in configuration if 'output.DevNull' in module_config]), 3)
+
+    def testTraceStatistics(self):
+        trace_events = []
+        for trace_id in range(1, 101):
+            trace_events.append({'name': 'input.Spam', 'ph': 'i', 'ts': trace_id * 1000, 'tid': trace_id})
+            trace_events.append({'name': 'Out1', 'ph': 'X', 'ts': trace_id * 1000 + 10, 'dur': trace_id, 'tid': trace_id})
+            trace_events.append({'name': 'Out2', 'ph': 'X', 'ts': trace_id * 1000 + 10, 'dur': 2 * trace_id, 'tid': trace_id})
+        # A marked event that did not reach the end of the pipeline.
+        trace_events.append({'name': 'input.Spam', 'ph': 'i', 'ts': 101000, 'tid': 101})
+        with open(os.path.join(self.path, "lumbermill_trace_1.json"), "w") as trace_file:
+            json.dump({'traceEvents': trace_events}, trace_file)
+        statistics = getTraceStatistics(self.path, 10)
+        self.assertEqual(statistics['traced_events'], 100)
+        # Latency ends with the slower receiver.
+        self.assertAlmostEqual(statistics['latency_p50_ms'], (10 + 2 * 51) / 1000.0)
+        self.assertAlmostEqual(statistics['latency_p99_ms'], (10 + 2 * 100) / 1000.0)
+        self.assertAlmostEqual(statistics['events_per_second'], 1000 / ((100000 + 210 - 1000) / 1000000.0))
+        self.assertIsNone(getTraceStatistics(tempfile.gettempdir() + "/does_not_exist", 10))
+
+    def testCompareWithBaseline(self):
+        baseline = [self.getResult(), self.getResult(pipeline='fanout'), self.getResult(pipeline='geoip', error="No database.")]
+        results = [self.getResult(events_per_second=85000, latency_p99_ms=2.05),
+                   self.getResult(pipeline='fanout', events_per_second=200000, peak_rss_mb=70),
+                   self.getResult(pipeline='geoip', events_per_second=1)]
+        regressions = compareWithBaseline(results, baseline, {'events_per_second': .1, 'latency_p99_ms': .01, 'peak_rss_mb': .2})
+        self.assertEqual([(regression['pipeline'], regression['metric']) for regression in regressions], [('passthrough', 'events_per_second'), ('fanout', 'peak_rss_mb')])
+        self.assertAlmostEqual(regressions[0]['change'], .15)
+
+    def testRunPipeline(self):
+        result = runPipeline('passthrough', PIPELINES['passthrough'], 1, events_count=1000, sample_interval=10, timeout=60)
+        self.assertIsNone(result['error'])
+        self.assertEqual(result['traced_events'], 100)
+        self.assertTrue(result['events_per_second'] > 0)
+        self.assertTrue(0 < result['latency_p50_ms'] <= result['latency_p99_ms'])
+        self.assertTrue(result['peak_rss_mb'] > 0)
@@ -0,0 +1,88 @@
+import time
+import unittest
+from collections import OrderedDict
+
+import mock
+
+import lumbermill.utils.DictUtils as DictUtils
+from lumbermill.misc import Noop
+from lumbermill.utils.Buffers import Buffer, BufferedQueue
+from lumbermill.utils.PipelineDrain import PipelineDrain, getTopologicalOrder
+
+# Conditional imports for python2/3
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+
+class TestPipelineDrain(unittest.TestCase):
+
+    def setUp(self):
+        self.stored_events = []
+        self.backend_available = True
+        # A modifier holding events in a buffer and an output storing them in a backend.
+        self.merge = Noop.Noop(mock.Mock())
+        self.merge.configure({})
+        self.merge.buffer = Buffer(callback=self.sendToOutput, interval=60, background_flush=False)
+        self.output = Noop.Noop(mock.Mock())
+        self.output.configure({})
+        self.output.buffer = Buffer(callback=self.storeEvents, interval=60)
+        self.output_queue = BufferedQueue(queue=queue.Queue(), buffersize=100)
+        self.stages = [{'name': 'Merge', 'queue': None, 'instances': [self.merge]},
+                       {'name': 'Output', 'queue': None, 'instances': [self.output]},
+                       # Module running in another process.
+                       {'name': 'RemoteOutput', 'queue': self.output_queue, 'instances': []}]
+
+    def tearDown(self):
+        for buffer in (self.merge.buffer, self.output.buffer, self.output_queue.buffer):
+            buffer.stopInterval()
+
+    def sendToOutput(self, events):
+        for event in events:
+            self.output.buffer.append(event)
+        return True
+
+    def storeEvents(self, events):
+        if self.backend_available:
+            self.stored_events.extend(events)
+        return self.backend_available
+
+    def addEvents(self):
+        for _ in range(5):
+            self.merge.buffer.append(DictUtils.getDefaultEventDict({}))
+        for _ in range(3):
+            self.output.buffer.append(DictUtils.getDefaultEventDict({}))
+        for _ in range(2):
+            self.output_queue.put(DictUtils.getDefaultEventDict({}))
+
+    def testGetTopologicalOrder(self):
+        module_receivers = OrderedDict([('Output', []),
+                                        ('Input', ['Parser', 'Output']),
+                                        ('Parser', ['Merge']),
+                                        ('Merge', ['Output']),
+                                        ('Loop1', ['Loop2']),
+                                        ('Loop2', ['Loop1'])])
+        self.assertEqual(getTopologicalOrder(module_receivers), ['Input', 'Parser', 'Merge', 'Output', 'Loop1', 'Loop2'])
+
+    def testDrain(self):
+        self.addEvents()
+        pipeline_drain = PipelineDrain(self.stages, 5)
+        self.assertEqual(pipeline_drain.getInFlightEventCounts(), OrderedDict([('Merge', 5), ('Output', 3), ('RemoteOutput', 2)]))
+        # Each event is counted once, though the events of Merge passed Output as well.
+        self.assertEqual(pipeline_drain.drain(), 10)
+        self.assertEqual(len(self.stored_events), 8)
+        self.assertEqual(self.output_queue.getBufferedCount(), 0)
+        # The events in the queue are handled by the other process. Only one process counts them as lost.
+        self.assertEqual(pipeline_drain.getLostEventCounts(), OrderedDict([('RemoteOutput', 2)]))
+        self.assertEqual(PipelineDrain(self.stages, 5, count_queued_events=False).getLostEventCounts(), OrderedDict())
+
+    def testDrainStopsAtDeadline(self):
+        self.backend_available = False
+        self.addEvents()
+        pipeline_drain = PipelineDrain(self.stages, .5)
+        started = time.time()
+        self.assertEqual(pipeline_drain.drain(), 5)
+        self.assertTrue(time.time() - started < 2)
+        self.assertEqual(pipeline_drain.flushed_event_counts, OrderedDict([('Merge', 5)]))
+        self.assertEqual(pipeline_drain.getLostEventCounts(), OrderedDict([('Output', 8), ('RemoteOutput', 2)]))
@@ -0,0 +1,45 @@
+import glob
+import pstats
+import shutil
+import tempfile
+import threading
+import unittest
+
+from lumbermill.utils.Profiler import SamplingProfiler
+
+
+def spinSpam(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=spinSpam, args=(self.stop,))
+        self.thread.start()
+
+    def tearDown(self):
+        self.stop.set()
+        self.thread.join()
+        shutil.rmtree(self.path)
+
+    def testProfile(self):
+        profiler = SamplingProfiler(interval=.005, path=self.path, get_thread_labels=lambda: {self.thread.ident: 'misc.Spam'})
+        self.assertTrue(profiler.start(.3))
+        self.assertFalse(profiler.start(.3))
+        profiler.thread.join()
+        self.assertTrue(profiler.sample_count > 10)
+        collapsed_files = glob.glob("%s/*.collapsed" % self.path)
+        self.assertEqual(len(collapsed_files), 1)
+        with open(collapsed_files[0]) as collapsed_file:
+            spam_stacks = [line for line in collapsed_file if ";misc.Spam;" in line]
+        self.assertTrue(spam_stacks)
+        self.assertTrue(all(["spinSpam (TestProfiler.py:" in line for line in spam_stacks]))
+        self.assertTrue(sum([int(line.split(" ")[-1]) for line in spam_stacks]) >= profiler.sample_count - 1)
+        stats = pstats.Stats(glob.glob("%s/*.pstats" % self.path)[0])
+        spin_spam_stats = [function_stats for function, function_stats in stats.stats.items() if function[2] == 'spinSpam']
+        self.assertEqual(len(spin_spam_stats), 1)
+        self.assertAlmostEqual(spin_spam_stats[0][3], .3, delta=.1)
@@ -0,0 +1,72 @@
+import multiprocessing
+import threading
+import unittest
+
+import lumbermill.utils.DictUtils as DictUtils
+from lumbermill.utils.Buffers import BufferedQueue, SharedMemoryQueue
+from lumbermill.utils.StatisticCollector import SharedMemoryStatisticCollector
+
+# Conditional imports for python2/3
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+
+def produce(shared_memory_queue, message_count):
+    for idx in range(message_count):
+        shared_memory_queue.put(("%d" % idx).encode('utf-8') * 100)
+
+
+class TestSharedMemoryQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = SharedMemoryQueue(queue_max_size=4, segment_size=64)
+
+    def testPutGet(self):
+        self.queue.put(b'spam')
+        self.queue.put(b'')
+        self.assertEqual(self.queue.qsize(), 2)
+        self.assertEqual(self.queue.get(), b'spam')
+        self.assertEqual(self.queue.get(), b'')
+        self.assertEqual(self.queue.qsize(), 0)
+
+    def testMessagesSpanningSegments(self):
+        # Each message needs three segments, so every second message wraps around the end of the buffer.
+        for idx in range(10):
+            message = ("%d" % idx).encode('utf-8') * 150
+            self.queue.put(message)
+            self.assertEqual(self.queue.get(), message)
+
+    def testGetEmptyQueue(self):
+        self.assertRaises(queue.Empty, self.queue.get, True, 0.01)
+        self.assertRaises(queue.Empty, self.queue.get, False)
+
+    def testMessageTooLarge(self):
+        self.assertRaises(ValueError, self.queue.put, b'x' * 256)
+
+    def testBufferedQueueSplitsLargeBatches(self):
+        buffered_queue = BufferedQueue(SharedMemoryQueue(queue_max_size=8, segment_size=512), buffersize=100)
+        lost_events = SharedMemoryStatisticCollector().getCounter('queue_message_too_large', namespace='LostEvents')
+        events = [DictUtils.getDefaultEventDict({'data': 'x' * 1000}) for _ in range(8)]
+        # A single event that can never fit into the queue.
+        events.insert(4, DictUtils.getDefaultEventDict({'data': 'x' * 8192}))
+        received_events = []
+
+        def consume():
+            while len(received_events) < 8:
+                received_events.extend(buffered_queue.get(timeout=5))
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        self.assertTrue(buffered_queue.sendBuffer(events))
+        consumer.join(5)
+        self.assertEqual([event['data'] for event in received_events], ['x' * 1000] * 8)
+        self.assertEqual(SharedMemoryStatisticCollector().getCounter('queue_message_too_large', namespace='LostEvents'), lost_events + 1)
+        self.assertEqual(buffered_queue.getQueuedCount(), 0)
+
+    def testMultipleProcesses(self):
+        producer = multiprocessing.Process(target=produce, args=(self.queue, 100))
+        producer.start()
+        messages = [self.queue.get(timeout=5) for _ in range(100)]
+        producer.join()
+        self.assertEqual(messages, [("%d" % idx).encode('utf-8') * 100 for idx in range(100)])
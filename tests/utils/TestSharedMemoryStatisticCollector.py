@@ -0,0 +1,127 @@
+import multiprocessing
+import unittest
+
+import mock
+
+import lumbermill.utils.DictUtils as DictUtils
+from lumbermill.misc import Noop
+from lumbermill.parser import Json
+from lumbermill.modifier import DropEvent
+from lumbermill.utils.StatisticCollector import SharedMemoryStatisticCollector, EVENTS_IN, EVENTS_DROPPED, EVENTS_ERRORED
+
+
+def incrementCounters(count):
+    stats_collector = SharedMemoryStatisticCollector()
+    for _ in range(count):
+        stats_collector.incrementCounter('spam', namespace='TestProcesses')
+    stats_collector.incrementCounter(('eggs', 200), count, namespace='TestProcesses')
+
+
+class TestSharedMemoryStatisticCollector(unittest.TestCase):
+
+    def setUp(self):
+        self.stats_collector = SharedMemoryStatisticCollector()
+
+    def testCounters(self):
+        self.stats_collector.incrementCounter('spam', 5, namespace='TestCounters')
+        self.stats_collector.decrementCounter('spam', 2, namespace='TestCounters')
+        self.assertEqual(self.stats_collector.getCounter('spam', namespace='TestCounters'), 3)
+        self.stats_collector.setCounter('eggs', 42, namespace='TestCounters')
+        self.assertEqual(self.stats_collector.getAllCounters(namespace='TestCounters'), {'spam': 3, 'eggs': 42})
+        self.stats_collector.resetCounter('spam', namespace='TestCounters')
+        self.stats_collector.incrementCounter('spam', namespace='TestCounters')
+        self.assertEqual(self.stats_collector.getCounter('spam', namespace='TestCounters'), 1)
+        self.assertEqual(self.stats_collector.getCounter('bacon', namespace='TestCounters'), 0)
+
+    def testCountersOfAllProcessesAreAggregated(self):
+        workers = [multiprocessing.Process(target=incrementCounters, args=(1000,)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        incrementCounters(1000)
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.stats_collector.getAllCounters(namespace='TestProcesses'), {'spam': 5000, ('eggs', 200): 5000})
+        # Reset from another process than the writing ones.
+        self.stats_collector.resetCounter('spam', namespace='TestProcesses')
+        self.assertEqual(self.stats_collector.getCounter('spam', namespace='TestProcesses'), 0)
+
+    def testResetCounterFreesSlot(self):
+        self.stats_collector.incrementCounter(('status', 200), 3, namespace='TestRemoval')
+        self.stats_collector.incrementCounter(('status', 404), namespace='TestRemoval')
+        self.stats_collector.resetCounter(('status', 200), namespace='TestRemoval')
+        self.assertEqual(self.stats_collector.getAllCounters(namespace='TestRemoval'), {('status', 404): 1})
+        slot_count = self.stats_collector.sizes[0]
+        slot_reuse_delay = self.stats_collector.slot_reuse_delay
+        self.stats_collector.slot_reuse_delay = 0
+        try:
+            self.stats_collector.incrementCounter(('status', 500), namespace='TestRemoval')
+        finally:
+            self.stats_collector.slot_reuse_delay = slot_reuse_delay
+        self.assertEqual(self.stats_collector.sizes[0], slot_count)
+        self.assertEqual(self.stats_collector.getAllCounters(namespace='TestRemoval'), {('status', 404): 1, ('status', 500): 1})
+        # Processes forked after the removal start a new counter.
+        worker = multiprocessing.Process(target=incrementCounters, args=(10,))
+        worker.start()
+        worker.join()
+        self.stats_collector.resetCounter('spam', namespace='TestProcesses')
+        worker = multiprocessing.Process(target=incrementCounters, args=(10,))
+        worker.start()
+        worker.join()
+        self.assertEqual(self.stats_collector.getCounter('spam', namespace='TestProcesses'), 10)
+
+    def testNamespaceCapacity(self):
+        max_namespace_counters = self.stats_collector.max_namespace_counters
+        self.stats_collector.max_namespace_counters = 2
+        try:
+            for client_ip in ('10.0.0.1', '10.0.0.2', '10.0.0.3'):
+                self.stats_collector.incrementCounter(client_ip, namespace='TestCapacity')
+            # Other namespaces are not affected by a full one.
+            self.stats_collector.incrementCounter('spam', namespace='TestCapacityOther')
+            self.assertEqual(self.stats_collector.getAllCounters(namespace='TestCapacity'), {'10.0.0.1': 1, '10.0.0.2': 1})
+            self.assertEqual(self.stats_collector.getCounter('spam', namespace='TestCapacityOther'), 1)
+            # Removing a key makes room again.
+            self.stats_collector.resetCounter('10.0.0.1', namespace='TestCapacity')
+            self.stats_collector.incrementCounter('10.0.0.3', namespace='TestCapacity')
+            self.assertEqual(self.stats_collector.getAllCounters(namespace='TestCapacity'), {'10.0.0.2': 1, '10.0.0.3': 1})
+        finally:
+            self.stats_collector.max_namespace_counters = max_namespace_counters
+
+    def testRowOfPidReusedByOtherUserIsTaken(self):
+        row_pids = self.stats_collector.row_pids[:]
+        try:
+            self.stats_collector.row_pids[:] = [0] * len(row_pids)
+            self.stats_collector.row_pids[1] = 4242
+            with mock.patch('os.kill', side_effect=PermissionError):
+                with self.stats_collector.lock:
+                    self.assertEqual(self.stats_collector.claimRow(), 2)
+        finally:
+            self.stats_collector.row_pids[:] = row_pids
+
+    def testModuleEventCounts(self):
+        noop = Noop.Noop(mock.Mock())
+        noop.configure({})
+        drop_event = DropEvent.DropEvent(mock.Mock())
+        drop_event.configure({'filter': 'if $(drop)'})
+        drop_event.countEvents()
+        noop.countEvents()
+        drop_event.addReceiver('Noop', noop)
+        noop.addReceiver('MockReceiver', mock.Mock())
+        events = [DictUtils.getDefaultEventDict({'drop': idx % 2}) for idx in range(10)]
+        for event in events[:4]:
+            drop_event.receiveEvent(event)
+        drop_event.receiveEvents(events[4:])
+        self.assertEqual(drop_event.event_counts[EVENTS_IN], 5)
+        self.assertEqual(drop_event.event_counts[EVENTS_DROPPED], 5)
+        self.assertEqual(noop.event_counts[:EVENTS_ERRORED], [5, 5, 0])
+
+    def testModuleEventCountsOfInstanceBatchHandler(self):
+        # Json sets handleEvents in configure.
+        json_parser = Json.Json(mock.Mock())
+        json_parser.configure({'source_fields': ['json_data']})
+        json_parser.countEvents()
+        json_parser.addReceiver('MockReceiver', mock.Mock())
+        events = [DictUtils.getDefaultEventDict({'json_data': '{"spam": %s}' % idx}) for idx in range(10)]
+        for event in events[:4]:
+            json_parser.receiveEvent(event)
+        json_parser.receiveEvents(events[4:])
+        self.assertEqual(json_parser.event_counts[:EVENTS_ERRORED], [10, 10, 0])
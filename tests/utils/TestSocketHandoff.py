@@ -0,0 +1,104 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+import mock
+import yaml
+
+from lumbermill.LumberMill import LumberMill
+from lumbermill.utils.SocketHandoff import SocketHandoff, getSocketHandoff
+
+
+class TestSocketHandoff(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.handoff_path = os.path.join(self.path, "handoff.sock")
+        self.listening_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listening_socket.bind(('127.0.0.1', 0))
+        self.listening_socket.listen(8)
+        self.ready = threading.Event()
+        self.server = SocketHandoff()
+        self.server.addSockets("tcp:127.0.0.1:%s" % self.listening_socket.getsockname()[1], [self.listening_socket])
+        self.server.startServer(self.handoff_path, self.ready.set)
+
+    def tearDown(self):
+        self.server.stopServer()
+        self.listening_socket.close()
+        shutil.rmtree(self.path)
+
+    def testGetInheritedSockets(self):
+        client = SocketHandoff(self.handoff_path)
+        inherited_sockets = client.getInheritedSockets("tcp:127.0.0.1:%s" % self.listening_socket.getsockname()[1])
+        self.assertEqual(len(inherited_sockets), 1)
+        self.assertEqual(inherited_sockets[0].getsockname(), self.listening_socket.getsockname())
+        self.assertNotEqual(inherited_sockets[0].fileno(), self.listening_socket.fileno())
+        inherited_sockets[0].close()
+        self.assertIsNone(client.getInheritedSockets("tcp:127.0.0.1:1"))
+        # Without a handoff path, nothing is inherited.
+        self.assertIsNone(SocketHandoff().getInheritedSockets("tcp:127.0.0.1:1"))
+
+    def testSendReady(self):
+        client = SocketHandoff(self.handoff_path)
+        self.assertTrue(client.sendReady())
+        self.assertTrue(self.ready.wait(5))
+        # Sockets can only be requested before ready was sent.
+        self.assertIsNone(client.handoff_path)
+        self.assertFalse(client.sendReady())
+        self.server.stopServer()
+        self.assertFalse(os.path.exists(self.handoff_path))
+
+    def testFailingOnReadyKeepsServing(self):
+        def onReady():
+            raise AttributeError("on_ready failed")
+        self.server.on_ready = onReady
+        self.assertTrue(SocketHandoff(self.handoff_path).sendReady())
+        self.assertTrue(self.server.isServing())
+        client = SocketHandoff(self.handoff_path)
+        inherited_sockets = client.getInheritedSockets("tcp:127.0.0.1:%s" % self.listening_socket.getsockname()[1])
+        self.assertEqual(len(inherited_sockets), 1)
+        inherited_sockets[0].close()
+
+    def testRestartAfterReload(self):
+        path_to_config_file = os.path.join(self.path, "lumbermill.conf")
+        configuration = [{'Global': {'workers': 1, 'socket_handoff': {'enabled': True, 'path': self.path}}},
+                         {'misc.Noop': {'receivers': ['output.DevNull']}},
+                         'output.DevNull']
+        with open(path_to_config_file, 'w') as config_file:
+            yaml.dump(configuration, config_file)
+        lumbermill = LumberMill(path_to_config_file)
+        lumbermill.configureGlobal()
+        lumbermill.initModulesFromConfig()
+        lumbermill.setDefaultReceivers()
+        lumbermill.configureModules()
+        lumbermill.initEventStream()
+        lumbermill.io_loop = mock.Mock()
+        configuration[1]['misc.Noop']['add_fields'] = {'reloaded': True}
+        with open(path_to_config_file, 'w') as config_file:
+            yaml.dump(configuration, config_file)
+        self.assertTrue(lumbermill.reload()['reloaded'])
+        # A change of the Global section falls back to a restart, here with socket handoff.
+        configuration[0]['Global']['queue_size'] = 50
+        with open(path_to_config_file, 'w') as config_file:
+            yaml.dump(configuration, config_file)
+        with mock.patch('lumbermill.LumberMill.startMainProcess') as startMainProcess:
+            startMainProcess.return_value.poll.return_value = None
+            self.assertFalse(lumbermill.reload()['reloaded'])
+        try:
+            self.assertTrue(getSocketHandoff().isServing())
+            self.assertTrue(lumbermill.socket_handoff_monitor)
+            client = SocketHandoff(os.path.join(self.path, "lumbermill_handoff_%s.sock" % os.getpid()))
+            self.assertTrue(client.sendReady())
+            for _ in range(50):
+                if lumbermill.io_loop.add_callback.called:
+                    break
+                time.sleep(.1)
+            lumbermill.io_loop.add_callback.assert_called_once_with(lumbermill.finishSocketHandoff)
+        finally:
+            lumbermill.stopSocketHandoff()
+        self.assertFalse(getSocketHandoff().isServing())
+        self.assertIsNone(lumbermill.socket_handoff_monitor)
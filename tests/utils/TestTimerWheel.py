@@ -0,0 +1,63 @@
+import threading
+import time
+import unittest
+
+from lumbermill.utils.TimerWheel import Timer, TimerWheel, getTimerWheel
+
+
+class TestTimerWheel(unittest.TestCase):
+
+    def testTimersExpireInTheirTick(self):
+        wheel = TimerWheel()
+        expire_ticks = [1, 2, 63, 64, 65, 127, 128, 4095, 4096, 4097, 5000, 262143, 262144, 300000]
+        for expires in expire_ticks:
+            timer = Timer(wheel, None, 0)
+            timer.expires = expires
+            wheel.insert(timer)
+        expired = []
+        while wheel.current_tick < expire_ticks[-1]:
+            for timer in wheel.advance():
+                expired.append((timer.expires, wheel.current_tick))
+        self.assertEqual(expired, [(expires, expires) for expires in expire_ticks])
+
+    def testCancel(self):
+        wheel = TimerWheel()
+        timer = Timer(wheel, None, 0)
+        timer.expires = 100
+        wheel.insert(timer)
+        wheel.cancel(timer)
+        self.assertTrue(timer.is_set())
+        while wheel.current_tick < 200:
+            self.assertEqual(wheel.advance(), [])
+
+    def testManyTimersShareOneThread(self):
+        counts = [0] * 2000
+        thread_count = threading.active_count()
+
+        def countRuns(idx):
+            counts[idx] += 1
+        timers = [getTimerWheel().schedule(lambda idx=idx: countRuns(idx), .1) for idx in range(len(counts))]
+        time.sleep(.35)
+        for timer in timers:
+            timer.set()
+        self.assertTrue(threading.active_count() - thread_count <= getTimerWheel().worker_count + 1)
+        self.assertTrue(min(counts) >= 2)
+        stopped_counts = list(counts)
+        time.sleep(.25)
+        self.assertEqual(counts, stopped_counts)
+
+    def testSlowFunctionsDoNotDelayOtherTimers(self):
+        wheel = TimerWheel(worker_count=2, idle_timeout=.3)
+        blocked = threading.Event()
+        fast_runs = []
+        slow_timers = [wheel.schedule(lambda: blocked.wait(5), .01) for _ in range(wheel.worker_count + 2)]
+        fast_timer = wheel.schedule(lambda: fast_runs.append(time.monotonic()), .05)
+        time.sleep(.5)
+        self.assertTrue(len(fast_runs) >= 5)
+        self.assertTrue(wheel.running_worker_count > wheel.worker_count)
+        for timer in slow_timers + [fast_timer]:
+            timer.set()
+        blocked.set()
+        # Extra workers exit when idle.
+        time.sleep(1)
+        self.assertEqual(wheel.running_worker_count, wheel.worker_count)
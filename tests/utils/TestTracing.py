@@ -0,0 +1,81 @@
+import json
+import mock
+import shutil
+import tempfile
+import unittest
+
+import lumbermill.utils.DictUtils as DictUtils
+from lumbermill.misc import Noop
+from lumbermill.modifier import AddDateTime
+from lumbermill.output import DevNull
+from lumbermill.utils.Buffers import BufferedQueue
+from lumbermill.utils.Tracing import getEventTracer
+
+# Conditional imports for python2/3
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+
+class TestTracing(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.tracer = getEventTracer()
+        self.tracer.configure(self.path, 1000)
+        self.tracer.initProcess()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def getSpanNames(self, trace_id):
+        return [span['name'] for span in self.tracer.spans if span['tid'] == trace_id]
+
+    def testTraceEventsThroughModules(self):
+        spam = Noop.Noop(mock.Mock())
+        spam.configure({})
+        spam.markEventsForTracing('input.Spam', 2)
+        add_date_time = AddDateTime.AddDateTime(mock.Mock())
+        add_date_time.configure({'filter': 'if $(drop) == 0'})
+        add_date_time.traceEvents('modifier.AddDateTime', 2)
+        dev_null = DevNull.DevNull(mock.Mock())
+        dev_null.configure({})
+        dev_null.traceEvents('output.DevNull', 2)
+        spam.addReceiver('modifier.AddDateTime', add_date_time)
+        add_date_time.addReceiver('output.DevNull', dev_null)
+        events = [DictUtils.getDefaultEventDict({'drop': idx % 4 // 2}) for idx in range(4)]
+        for event in events:
+            spam.sendEvent(event)
+        self.assertEqual(['trace_id' in event['lumbermill'] for event in events], [False, True, False, True])
+        self.assertEqual(self.getSpanNames(events[1]['lumbermill']['trace_id']), ['input.Spam', 'modifier.AddDateTime', 'output.DevNull'])
+        # Event did not match the filter of AddDateTime.
+        self.assertEqual(self.getSpanNames(events[3]['lumbermill']['trace_id']), ['input.Spam', 'output.DevNull'])
+        dev_null.receiveEvents(events)
+        self.assertEqual(self.tracer.spans[-1]['name'], 'output.DevNull')
+        self.assertEqual(self.tracer.spans[-1]['args'], {'batch_size': 4})
+
+    def testQueueWait(self):
+        buffered_queue = BufferedQueue(queue.Queue(), buffersize=1)
+        buffered_queue.traceEvents()
+        noop = Noop.Noop(mock.Mock())
+        noop.configure({})
+        noop.traceEvents('misc.Noop', 2)
+        noop.addReceiver('MockReceiver', mock.Mock())
+        event = DictUtils.getDefaultEventDict({})
+        event['lumbermill']['trace_id'] = 1
+        buffered_queue.put(event)
+        received_event = next(buffered_queue.get())
+        self.assertTrue('trace_queued_at' in received_event['lumbermill'])
+        noop.receiveEvent(received_event)
+        self.assertEqual(self.getSpanNames(1), ['queue misc.Noop', 'misc.Noop'])
+        self.assertEqual(self.tracer.spans[0]['cat'], 'queue')
+        self.assertFalse('trace_queued_at' in received_event['lumbermill'])
+        buffered_queue.buffer.stopInterval()
+
+    def testWriteChromeTrace(self):
+        self.tracer.addSpan('misc.Noop', 1, 1.5, .25, args={'self_time_ms': 1})
+        self.tracer.write()
+        with open(self.tracer.getFilename()) as trace_file:
+            trace = json.load(trace_file)
+        self.assertEqual(trace['traceEvents'], [{'name': 'misc.Noop', 'cat': 'module', 'ph': 'X', 'ts': 1500000, 'dur': 250000, 'pid': self.tracer.pid, 'tid': 1, 'args': {'self_time_ms': 1}}])